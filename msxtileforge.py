@@ -21,19 +21,23 @@ from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import simpledialog
 from contextlib import suppress
+from collections import OrderedDict
 import tkinter.font as font
 import struct
 import os
 import sys
 import math
+import time
 import copy
 import base64
 import io
 from PIL import Image, ImageTk
+import numpy as np
 import webbrowser
 import logging
 import traceback
 import subprocess
+import signal
 import threading
 import queue
 from scipy.optimize import linear_sum_assignment
@@ -67,6 +71,10 @@ RESERVED_BYTES_COUNT = 4 # NEW constant for clarity
 
 MAX_RECENT_FILES = 10
 
+SCRIPT_OUTPUT_POLL_MS = 100  # Interval for draining helper script output
+SCRIPT_OUTPUT_MAX_LINES_PER_TICK = 2000  # Upper bound of lines consumed per drain, keeps the UI responsive
+QUICK_PREVIEW_TIME_BUDGET_SECONDS = 10  # --time-budget passed to msxtilemagic for "Quick preview" imports
+
 MIN_DIM = 1
 MAX_DIM = 1024
 
@@ -157,18 +165,688 @@ for r in range(8):
 
 # --- Data Structures ---
 
-# Initialize tileset with one "empty" tile. The list will grow dynamically.
-tileset_colors = [
-    [(WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)]
-]
-tileset_patterns = [
-    [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-]
+class TilesetStore:
+    """
+    The tileset in its .SC4Tiles layout: 'patterns' holds one byte per tile row (bit 7 is the
+    leftmost pixel, 1 = foreground) and 'colors' one byte per tile row (fg << 4 | bg).
+    As a sequence, every item is a (pattern bytes, color bytes) pair of uint8[8] copies, so
+    the generic list commands (insert/pop/reorder/swap) work on whole tiles.
+    """
+    BLANK_COLOR_BYTE = (WHITE_IDX << 4) | BLACK_IDX
+
+    def __init__(self, num_tiles=1):
+        self.reset(num_tiles)
+
+    def reset(self, num_tiles=1):
+        """Replaces the contents with num_tiles blank tiles."""
+        self.patterns = np.zeros((num_tiles, TILE_HEIGHT), dtype=np.uint8)
+        self.colors = np.full((num_tiles, TILE_HEIGHT), self.BLANK_COLOR_BYTE, dtype=np.uint8)
+
+    @classmethod
+    def blank_tile(cls):
+        return np.zeros(TILE_HEIGHT, dtype=np.uint8), np.full(TILE_HEIGHT, cls.BLANK_COLOR_BYTE, dtype=np.uint8)
+
+    @staticmethod
+    def pack_tile(pattern_rows, color_rows):
+        """Converts a pattern as 8 lists of 8 pixels and colors as 8 (fg, bg) tuples to a tile."""
+        pattern = np.packbits(np.asarray(pattern_rows, dtype=np.uint8).reshape(TILE_HEIGHT, TILE_WIDTH) & 1, axis=1).reshape(TILE_HEIGHT)
+        colors = np.array([((fg & 0x0F) << 4) | (bg & 0x0F) for fg, bg in color_rows], dtype=np.uint8)
+        return pattern, colors
+
+    # --- Sequence of (pattern, colors) tiles ---
+    def __len__(self):
+        return len(self.patterns)
+
+    def __getitem__(self, tile_index):
+        return self.patterns[tile_index].copy(), self.colors[tile_index].copy()
+
+    def __setitem__(self, tile_index, tile):
+        self.patterns[tile_index], self.colors[tile_index] = tile
+
+    def insert(self, tile_index, tile):
+        self.patterns = np.insert(self.patterns, tile_index, tile[0], axis=0)
+        self.colors = np.insert(self.colors, tile_index, tile[1], axis=0)
+
+    def pop(self, tile_index):
+        tile = self[tile_index]
+        self.patterns = np.delete(self.patterns, tile_index, axis=0)
+        self.colors = np.delete(self.colors, tile_index, axis=0)
+        return tile
+
+    def truncate(self, num_tiles):
+        self.patterns = self.patterns[:num_tiles].copy()
+        self.colors = self.colors[:num_tiles].copy()
+
+    def snapshot(self):
+        return self.patterns.copy(), self.colors.copy()
+
+    def restore(self, snapshot):
+        self.patterns, self.colors = snapshot[0].copy(), snapshot[1].copy()
+
+    # --- Pixel and row accessors ---
+    def get_pixel(self, tile_index, row, col):
+        return (int(self.patterns[tile_index, row]) >> (7 - col)) & 1
+
+    def set_pixel(self, tile_index, row, col, value):
+        bit = 1 << (7 - col)
+        if value:
+            self.patterns[tile_index, row] |= bit
+        else:
+            self.patterns[tile_index, row] &= ~bit & 0xFF
+
+    def get_row_colors(self, tile_index, row):
+        color_byte = int(self.colors[tile_index, row])
+        return color_byte >> 4, color_byte & 0x0F
+
+    def set_row_colors(self, tile_index, row, colors_tuple):
+        fg, bg = colors_tuple
+        self.colors[tile_index, row] = ((fg & 0x0F) << 4) | (bg & 0x0F)
+
+    def pattern_rows(self, tile_index):
+        """The pattern of one tile as 8 lists of 8 pixel values."""
+        return np.unpackbits(self.patterns[tile_index][:, None], axis=1).tolist()
+
+    def color_rows(self, tile_index):
+        """The colors of one tile as 8 (fg, bg) tuples."""
+        return [(c >> 4, c & 0x0F) for c in self.colors[tile_index].tolist()]
+
+    def set_tile_rows(self, tile_index, pattern_rows, color_rows):
+        self[tile_index] = self.pack_tile(pattern_rows, color_rows)
+
+    def remapped_colors(self, slot_map):
+        """A copy of the color bytes with both nibbles passed through a 16-entry palette slot mapping."""
+        lut = np.asarray(slot_map, dtype=np.uint8)
+        return (lut[self.colors >> 4] << 4) | lut[self.colors & 0x0F]
+
+    def replace_color(self, old_slot, new_slot):
+        slot_map = np.arange(16, dtype=np.uint8)
+        slot_map[old_slot] = new_slot
+        self.colors = self.remapped_colors(slot_map)
+
+    # --- Bulk views ---
+    def pixel_bits(self, tile_indices=None):
+        """(N,8,8) pixel values (1 = foreground) of the given tiles, or of all tiles."""
+        patterns = self.patterns if tile_indices is None else self.patterns[tile_indices]
+        return np.unpackbits(patterns[..., None], axis=-1)
+
+    def palette_indices(self, tile_indices=None):
+        """(N,8,8) palette slot of every pixel of the given tiles, or of all tiles."""
+        colors = self.colors if tile_indices is None else self.colors[tile_indices]
+        return np.where(self.pixel_bits(tile_indices) == 1, (colors >> 4)[..., None], (colors & 0x0F)[..., None])
+
+class SupertileStore:
+    """
+    Supertile definitions as one uint16[S, h, w] array of tile indices. As a sequence, every
+    item is the (h, w) definition of one supertile (a view, so cells can be written in place),
+    so the generic list commands (insert/pop/reorder/swap) work on whole supertiles.
+    """
+    def __init__(self, num_supertiles=1, grid_width=DEFAULT_SUPERTILE_GRID_WIDTH, grid_height=DEFAULT_SUPERTILE_GRID_HEIGHT):
+        # Bumped by every bulk change (anything but a write through a single definition view)
+        self.version = 0
+        self._definitions = None
+        self.reset(num_supertiles, grid_width, grid_height)
+
+    @property
+    def definitions(self):
+        return self._definitions
+
+    @definitions.setter
+    def definitions(self, definitions):
+        self._definitions = definitions
+        self.version += 1
+
+    def reset(self, num_supertiles=1, grid_width=None, grid_height=None):
+        """Replaces the contents with num_supertiles blank definitions, optionally changing the grid size."""
+        grid_width = self.grid_width if grid_width is None else grid_width
+        grid_height = self.grid_height if grid_height is None else grid_height
+        self.definitions = np.zeros((num_supertiles, grid_height, grid_width), dtype=np.uint16)
+
+    @property
+    def grid_width(self):
+        return self.definitions.shape[2]
+
+    @property
+    def grid_height(self):
+        return self.definitions.shape[1]
+
+    def blank_definition(self):
+        return np.zeros((self.grid_height, self.grid_width), dtype=np.uint16)
+
+    # --- Sequence of (h, w) definitions ---
+    def __len__(self):
+        return len(self.definitions)
+
+    def __iter__(self):
+        return iter(self.definitions)
+
+    def __getitem__(self, supertile_index):
+        return self.definitions[supertile_index]
+
+    def __setitem__(self, supertile_index, definition):
+        self.definitions[supertile_index] = definition
+        self.version += 1
+
+    def insert(self, supertile_index, definition):
+        self.definitions = np.insert(self.definitions, supertile_index, definition, axis=0)
+
+    def append(self, definition):
+        self.insert(len(self.definitions), definition)
+
+    def pop(self, supertile_index):
+        definition = self.definitions[supertile_index].copy()
+        self.definitions = np.delete(self.definitions, supertile_index, axis=0)
+        return definition
+
+    def truncate(self, num_supertiles):
+        self.definitions = self.definitions[:num_supertiles].copy()
+
+    def snapshot(self):
+        return self.definitions.copy()
+
+    def restore(self, snapshot):
+        self.definitions = snapshot.copy()
+
+    def remap_tiles(self, tile_map):
+        """Rewrites every tile reference through a reference LUT (see reference_lut)."""
+        self.definitions[...] = tile_map[self.definitions]
+        self.version += 1
+
+# --- Reference LUTs ---
+# Tile references (in supertile definitions) and supertile references (in the map) are
+# rewritten by indexing a full uint16 lookup table with the reference array, so inserting,
+# deleting, moving or swapping an item is a single vectorized pass.
+
+def reference_lut():
+    """The identity mapping over every possible uint16 reference."""
+    return np.arange(1 << 16, dtype=np.uint16)
+
+def insert_reference_lut(index, max_index=MAX_SUPERTILES - 1):
+    """References at or after an inserted item shift up by one, saturating at max_index."""
+    lut = reference_lut()
+    lut[index:max_index] += 1
+    return lut
+
+def delete_reference_lut(index):
+    """References to a deleted item fall back to 0; later references shift down by one."""
+    lut = reference_lut()
+    lut[index + 1:] -= 1
+    lut[index] = 0
+    return lut
+
+def move_reference_lut(source_index, target_index):
+    """The reference rewrite for popping source_index and re-inserting it at target_index."""
+    lut = reference_lut()
+    if source_index < target_index:
+        lut[source_index + 1:target_index + 1] -= 1
+    elif target_index < source_index:
+        lut[target_index:source_index] += 1
+    lut[source_index] = target_index
+    return lut
+
+def swap_reference_lut(index_a, index_b):
+    lut = reference_lut()
+    lut[index_a], lut[index_b] = index_b, index_a
+    return lut
+
+def replace_reference_lut(old_index, new_index):
+    lut = reference_lut()
+    lut[old_index] = new_index
+    return lut
+
+def clamp_reference_lut(limit):
+    """References at or beyond a new item limit fall back to 0."""
+    lut = reference_lut()
+    lut[limit:] = 0
+    return lut
+
+def new_map_array(width, height):
+    return np.zeros((height, width), dtype=np.uint16)
+
+# --- Usage Index ---
+class UsageIndex:
+    """
+    Reverse reference index: tile -> supertiles using it, supertile -> map cells using it.
+
+    Single-cell edits (placing a tile, painting a map cell) update it incrementally. Bulk
+    edits go through SupertileStore (which bumps its version) or rebind the map_data global,
+    and the affected half of the index is rebuilt, vectorized, on the next query.
+    """
+    def __init__(self):
+        self._definitions_version = None
+        self._indexed_map = None
+
+    # --- Tile -> supertiles ---
+    def _sync_tiles(self):
+        if self._definitions_version == supertiles_data.version:
+            return
+        tile_refs = supertiles_data.definitions.reshape(len(supertiles_data), supertiles_data.grid_height * supertiles_data.grid_width)
+        self.tile_placements = np.bincount(tile_refs.ravel(), minlength=1 << 16)
+        # One key per (tile, supertile) pair; its count is the placements of that tile in that supertile
+        num_supertiles = max(1, len(supertiles_data))
+        supertile_ids = np.repeat(np.arange(len(supertiles_data), dtype=np.int64), tile_refs.shape[1])
+        pair_keys, pair_counts = np.unique(tile_refs.ravel().astype(np.int64) * num_supertiles + supertile_ids, return_counts=True)
+        self.tile_users = {}
+        for pair_key, count in zip(pair_keys.tolist(), pair_counts.tolist()):
+            tile_index, supertile_index = divmod(pair_key, num_supertiles)
+            self.tile_users.setdefault(tile_index, {})[supertile_index] = count
+        self._definitions_version = supertiles_data.version
+
+    def tile_reference_changed(self, supertile_index, old_tile_index, new_tile_index):
+        """Call when one cell of a supertile definition is rewritten in place."""
+        if self._definitions_version != supertiles_data.version or old_tile_index == new_tile_index:
+            return
+        self.tile_placements[old_tile_index] -= 1
+        self.tile_placements[new_tile_index] += 1
+        old_users = self.tile_users[old_tile_index]
+        old_users[supertile_index] -= 1
+        if old_users[supertile_index] == 0:
+            del old_users[supertile_index]
+            if not old_users:
+                del self.tile_users[old_tile_index]
+        new_users = self.tile_users.setdefault(new_tile_index, {})
+        new_users[supertile_index] = new_users.get(supertile_index, 0) + 1
+
+    def supertiles_using_tile(self, tile_index):
+        self._sync_tiles()
+        return sorted(self.tile_users.get(tile_index, ()))
+
+    def tile_placement_count(self, tile_index):
+        self._sync_tiles()
+        return int(self.tile_placements[tile_index])
+
+    def tile_user_count(self, tile_index):
+        self._sync_tiles()
+        return len(self.tile_users.get(tile_index, ()))
+
+    def tile_count_in_supertile(self, tile_index, supertile_index):
+        self._sync_tiles()
+        return self.tile_users.get(tile_index, {}).get(supertile_index, 0)
+
+    def unused_tiles(self, num_tiles):
+        """Tiles 1..num_tiles-1 not referenced by any supertile (tile 0 is reserved)."""
+        self._sync_tiles()
+        return set((np.flatnonzero(self.tile_placements[1:num_tiles] == 0) + 1).tolist())
+
+    # --- Supertile -> map cells ---
+    def _sync_map(self):
+        if self._indexed_map is map_data:
+            return
+        self.supertile_placements = np.bincount(map_data.ravel(), minlength=1 << 16)
+        self._supertile_cells = None # Built on the first cell query
+        self._indexed_map = map_data
+
+    def _cell_sets(self):
+        self._sync_map()
+        if self._supertile_cells is None:
+            flat_refs = self._indexed_map.ravel()
+            order = np.argsort(flat_refs, kind="stable")
+            supertile_ids, starts = np.unique(flat_refs[order], return_index=True)
+            self._supertile_cells = {
+                supertile_index: set(cells.tolist())
+                for supertile_index, cells in zip(supertile_ids.tolist(), np.split(order, starts[1:]))
+            }
+        return self._supertile_cells
 
-# Initialize supertileset with one "empty" supertile. The list will grow dynamically.
-supertiles_data = [
-    [[0 for _ in range(DEFAULT_SUPERTILE_GRID_WIDTH)] for _ in range(DEFAULT_SUPERTILE_GRID_HEIGHT)]
-]
+    def map_reference_changed(self, r, c, old_supertile_index, new_supertile_index):
+        """Call when one map cell is rewritten in place."""
+        if self._indexed_map is not map_data or old_supertile_index == new_supertile_index:
+            return
+        self.supertile_placements[old_supertile_index] -= 1
+        self.supertile_placements[new_supertile_index] += 1
+        if self._supertile_cells is not None:
+            flat_cell = r * map_data.shape[1] + c
+            self._supertile_cells[old_supertile_index].discard(flat_cell)
+            self._supertile_cells.setdefault(new_supertile_index, set()).add(flat_cell)
+
+    def map_cells_using_supertile(self, supertile_index):
+        """(row, col) cells using a supertile, in row-major order."""
+        map_cols = map_data.shape[1]
+        return [divmod(flat_cell, map_cols) for flat_cell in sorted(self._cell_sets().get(supertile_index, ()))]
+
+    def supertile_placement_count(self, supertile_index):
+        self._sync_map()
+        return int(self.supertile_placements[supertile_index])
+
+    def supertile_placement_counts(self, num_supertiles):
+        self._sync_map()
+        return self.supertile_placements[:num_supertiles].tolist()
+
+    def unused_supertiles(self, num_supertiles):
+        """Supertiles 1..num_supertiles-1 not placed on the map (supertile 0 is reserved)."""
+        self._sync_map()
+        return set((np.flatnonzero(self.supertile_placements[1:num_supertiles] == 0) + 1).tolist())
+
+# --- Render Caches ---
+RENDER_CACHE_BUDGET_MB = 256 # Default memory budget shared by all render caches
+
+def estimate_render_bytes(image):
+    """Approximate memory held by a cached render (IndexedRender, NumPy array, PIL image or Tk photo image)."""
+    if isinstance(image, (IndexedRender, np.ndarray)):
+        return image.nbytes
+    if isinstance(image, Image.Image):
+        return image.width * image.height * len(image.getbands())
+    try:
+        return image.width() * image.height() * 4 # Tk keeps photo images as 32-bit pixels
+    except (AttributeError, tk.TclError):
+        return 0
+
+class RenderCacheBudget:
+    """
+    A memory budget shared by several RenderCaches. When the estimated total goes over it,
+    the least recently used entries across all of them are evicted. is_pinned(image) can keep
+    an entry that is still on screen (e.g. a Tk image shown by a canvas) from being evicted.
+    """
+    def __init__(self, max_bytes, is_pinned=None):
+        self.max_bytes = max_bytes
+        self.is_pinned = is_pinned
+        self.bytes = 0
+        self.caches = {}
+        self._lru = OrderedDict() # (cache name, key) -> entry bytes, least recently used first
+
+    def register(self, cache):
+        self.caches[cache.name] = cache
+
+    def added(self, cache, key, size):
+        self._lru[(cache.name, key)] = size
+        self.bytes += size
+        self.enforce()
+
+    def touched(self, cache, key):
+        self._lru.move_to_end((cache.name, key))
+
+    def removed(self, cache, key):
+        self.bytes -= self._lru.pop((cache.name, key), 0)
+
+    def enforce(self):
+        if self.bytes <= self.max_bytes:
+            return
+        for cache_name, key in list(self._lru):
+            if self.bytes <= self.max_bytes:
+                break
+            cache = self.caches[cache_name]
+            if self.is_pinned is not None and self.is_pinned(dict.__getitem__(cache, key)):
+                continue
+            cache.evict(key)
+
+    def stats(self):
+        return {
+            'budget_bytes': self.max_bytes,
+            'bytes': self.bytes,
+            'caches': {name: cache.stats() for name, cache in self.caches.items()},
+        }
+
+class RenderCache(dict):
+    """
+    Rendered images keyed by tuples whose first element is the tile or supertile index they
+    were rendered from. Keys are also grouped by that index, so invalidating one item only
+    touches its own entries instead of scanning the whole cache. Entries are counted against
+    a shared RenderCacheBudget and evicted least recently used first.
+
+    Look entries up with lookup() so hits, misses and recency are tracked.
+    """
+    def __init__(self, name, budget):
+        super().__init__()
+        self.name = name
+        self.budget = budget
+        self._keys_by_item = {}
+        self._entry_bytes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        budget.register(self)
+
+    def lookup(self, key):
+        """The cached render for key, or None on a miss."""
+        image = super().get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.budget.touched(self, key)
+        return image
+
+    def __setitem__(self, key, image):
+        if key in self:
+            self._forget(key)
+        super().__setitem__(key, image)
+        self._keys_by_item.setdefault(key[0], set()).add(key)
+        size = estimate_render_bytes(image)
+        self._entry_bytes[key] = size
+        self.bytes += size
+        self.budget.added(self, key, size)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._forget(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._forget(key)
+        return super().pop(key, *default)
+
+    def clear(self):
+        for key in list(self):
+            self.budget.removed(self, key)
+        super().clear()
+        self._keys_by_item.clear()
+        self._entry_bytes.clear()
+        self.bytes = 0
+
+    def _forget(self, key):
+        item_keys = self._keys_by_item.get(key[0])
+        if item_keys is not None:
+            item_keys.discard(key)
+            if not item_keys:
+                del self._keys_by_item[key[0]]
+        self.bytes -= self._entry_bytes.pop(key, 0)
+        self.budget.removed(self, key)
+
+    def evict(self, key):
+        self.pop(key, None)
+        self.evictions += 1
+
+    def invalidate(self, item_index):
+        """Drops every cached render of one tile or supertile."""
+        for key in list(self._keys_by_item.get(item_index, ())):
+            self.pop(key, None)
+
+    def stats(self):
+        return {'entries': len(self), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+# --- Map Raster ---
+def reduce_slots_2x2(pixels):
+    """
+    Halves the last two axes of an array of palette slots: every 2x2 block becomes its most
+    frequent slot, the top-left one on ties. Slots cannot be averaged, so this is the indexed
+    counterpart of a box filter.
+    """
+    top_left, top_right = pixels[..., 0::2, 0::2], pixels[..., 0::2, 1::2]
+    bottom_left, bottom_right = pixels[..., 1::2, 0::2], pixels[..., 1::2, 1::2]
+    # If the top-left slot repeats it is a mode (a tie at best); otherwise any repeated slot among the others is
+    reduced = np.where(bottom_left == bottom_right, bottom_left, top_left)
+    top_right_repeats = (top_right == bottom_left) | (top_right == bottom_right)
+    np.copyto(reduced, top_right, where=top_right_repeats)
+    top_left_repeats = (top_left == top_right) | (top_left == bottom_left) | (top_left == bottom_right)
+    np.copyto(reduced, top_left, where=top_left_repeats)
+    return reduced
+
+class MapRaster:
+    """
+    The whole map as one uint8 raster of palette slots at 1x (one byte per MSX pixel), used as
+    the map canvas backing store. Each sync compares the tileset, the supertile definitions and
+    the map against the snapshots the raster was built from, and re-patches only the blocks of
+    the tiles, supertiles and cells that changed. A viewport is then a crop, a nearest-neighbour
+    scale and a palette LUT, so its cost follows the viewport size rather than the zoom level.
+
+    Zoomed-out views sample a pyramid of the raster: level k is level k-1 reduced 2x2 to the
+    most frequent slot of each block, so thin details and dithering survive the zoom instead of
+    depending on which pixel a point sample hits. Levels are built a band of rows at a time by
+    build_next_level (the app runs it when idle) and only the map cells patched since a level
+    was last used are reduced again.
+    """
+    INVALID_TILE_SLOT = 16
+    INVALID_SUPERTILE_SLOT = 17
+    BACKGROUND_SLOT = 18
+    MAX_PYRAMID_LEVEL = 3 # 1/8 scale: one pixel per tile, the map's minimum zoom
+    # Past this many dirty cells a level is resampled whole rather than cell by cell
+    PYRAMID_PATCH_LIMIT = 4096
+    # Rows of the finer level reduced per build_next_level call, so each idle step stays short
+    PYRAMID_BAND_ROWS = 512
+
+    def __init__(self):
+        self.raster = None
+        self.levels = []
+        self._level_dirty_cells = []
+        self._built_levels = 0
+        self._band_row = 0
+        self._patterns = None
+        self._colors = None
+        self._definitions = None
+        self._map = None
+
+    def _tile_pixels(self, tile_indices):
+        return tileset.palette_indices(tile_indices).astype(np.uint8)
+
+    def _supertile_blocks(self, definitions):
+        """(k, h*8, w*8) rasters of k supertile definitions."""
+        tile_refs = np.minimum(definitions, len(tileset)) # Refs past the tileset use the invalid tile
+        blocks = self.tile_pixels[tile_refs] # (k, h, w, 8, 8)
+        num_blocks, grid_h, grid_w = tile_refs.shape
+        return blocks.transpose(0, 1, 3, 2, 4).reshape(num_blocks, grid_h * TILE_HEIGHT, grid_w * TILE_WIDTH)
+
+    def _cell_blocks(self):
+        """(H, W, st_h, st_w) view of the raster, one block per map cell."""
+        map_h, map_w = self._map.shape
+        block_h, block_w = self.supertile_rasters.shape[1:]
+        return self.raster.reshape(map_h, block_h, map_w, block_w).transpose(0, 2, 1, 3)
+
+    def _rebuild(self):
+        invalid_tile = np.full((1, TILE_HEIGHT, TILE_WIDTH), self.INVALID_TILE_SLOT, dtype=np.uint8)
+        self.tile_pixels = np.concatenate([self._tile_pixels(None), invalid_tile])
+        supertile_rasters = self._supertile_blocks(supertiles_data.definitions)
+        invalid_supertile = np.full((1,) + supertile_rasters.shape[1:], self.INVALID_SUPERTILE_SLOT, dtype=np.uint8)
+        self.supertile_rasters = np.concatenate([supertile_rasters, invalid_supertile])
+        map_h, map_w = map_data.shape
+        block_h, block_w = self.supertile_rasters.shape[1:]
+        cells = self.supertile_rasters[np.minimum(map_data, len(supertiles_data))] # (H, W, st_h, st_w)
+        self.raster = cells.transpose(0, 2, 1, 3).reshape(map_h * block_h, map_w * block_w)
+        self.levels = [self.raster]
+        self._level_dirty_cells = [None]
+        self._built_levels = 1
+
+    def sync(self):
+        """Brings the raster up to date. Returns the number of re-patched map cells (-1: full rebuild)."""
+        full_rebuild = (self.raster is None
+                        or self._patterns.shape != tileset.patterns.shape
+                        or self._definitions.shape != supertiles_data.definitions.shape
+                        or self._map.shape != map_data.shape)
+        if full_rebuild:
+            self._rebuild()
+            patched_cells = -1
+        else:
+            changed_tiles = np.flatnonzero((self._patterns != tileset.patterns).any(axis=1) |
+                                           (self._colors != tileset.colors).any(axis=1))
+            if len(changed_tiles) > 0:
+                self.tile_pixels[changed_tiles] = self._tile_pixels(changed_tiles)
+
+            changed_supertiles = (self._definitions != supertiles_data.definitions).any(axis=(1, 2))
+            if len(changed_tiles) > 0:
+                changed_supertiles |= np.isin(supertiles_data.definitions, changed_tiles).any(axis=(1, 2))
+            changed_supertiles = np.flatnonzero(changed_supertiles)
+            if len(changed_supertiles) > 0:
+                self.supertile_rasters[changed_supertiles] = self._supertile_blocks(supertiles_data.definitions[changed_supertiles])
+
+            changed_cells = self._map != map_data
+            if len(changed_supertiles) > 0:
+                changed_cells |= np.isin(map_data, changed_supertiles)
+            rows, cols = np.nonzero(changed_cells)
+            if len(rows) > 0:
+                self._cell_blocks()[rows, cols] = self.supertile_rasters[np.minimum(map_data[rows, cols], len(supertiles_data))]
+                for dirty_cells in self._level_dirty_cells[1:]:
+                    dirty_cells |= changed_cells
+            patched_cells = len(rows)
+
+        self._patterns = tileset.patterns.copy()
+        self._colors = tileset.colors.copy()
+        self._definitions = supertiles_data.definitions.copy()
+        self._map = map_data.copy()
+        return patched_cells
+
+    # --- Pyramid ---
+    def pyramid_complete(self):
+        return self.raster is not None and self._built_levels > self.MAX_PYRAMID_LEVEL
+
+    def build_next_level(self):
+        """
+        Reduces the next band of rows of the first unfinished pyramid level from the level below.
+        Returns False when the pyramid is complete.
+        """
+        if self.raster is None or self.pyramid_complete():
+            return False
+        level = self._built_levels
+        if len(self.levels) == level:
+            finer_h, finer_w = self.levels[level - 1].shape
+            self.levels.append(np.empty((finer_h // 2, finer_w // 2), dtype=np.uint8))
+            self._level_dirty_cells.append(np.zeros(self._map.shape, dtype=bool))
+            self._band_row = 0
+        # Cells patched in bands already reduced are marked dirty and redone when the level is used
+        self._refresh_level(level - 1)
+        finer = self.levels[level - 1]
+        band_end = min(finer.shape[0], self._band_row + self.PYRAMID_BAND_ROWS)
+        self.levels[level][self._band_row // 2:band_end // 2] = reduce_slots_2x2(finer[self._band_row:band_end])
+        self._band_row = band_end
+        if band_end == finer.shape[0]:
+            self._built_levels += 1
+        return True
+
+    def _refresh_level(self, level):
+        """Reduces again, from the level below, the map cells patched since the level was last used."""
+        dirty_cells = self._level_dirty_cells[level]
+        if level == 0 or not dirty_cells.any():
+            return
+        self._refresh_level(level - 1)
+        finer = self.levels[level - 1]
+        rows, cols = np.nonzero(dirty_cells)
+        if len(rows) > self.PYRAMID_PATCH_LIMIT:
+            self.levels[level] = reduce_slots_2x2(finer)
+        else:
+            # Supertile blocks are multiples of 8 pixels, so map cells stay aligned down to 1/8 scale
+            map_h, map_w = self._map.shape
+            cell_h, cell_w = finer.shape[0] // map_h // 2, finer.shape[1] // map_w // 2
+            finer_cells = finer.reshape(map_h, cell_h * 2, map_w, cell_w * 2).transpose(0, 2, 1, 3)
+            level_cells = self.levels[level].reshape(map_h, cell_h, map_w, cell_w).transpose(0, 2, 1, 3)
+            level_cells[rows, cols] = reduce_slots_2x2(finer_cells[rows, cols])
+        dirty_cells[...] = False
+
+    def render_viewport(self, x, y, width, height, pixels_per_tile, palette_rgb):
+        """
+        RGB image of a width x height viewport whose top-left is (x, y) in zoomed map pixels,
+        with pixels_per_tile screen pixels per 8x8 tile. palette_rgb is a (19, 3) uint8 LUT:
+        the 16 palette slots, then the invalid tile, invalid supertile and background colors.
+        Below 1x the nearest pyramid level that has been built is sampled.
+        """
+        self.sync()
+        source_y = (y + np.arange(height)) * TILE_HEIGHT // pixels_per_tile
+        source_x = (x + np.arange(width)) * TILE_WIDTH // pixels_per_tile
+        level = 0
+        while level + 1 < self._built_levels and (2 << level) * pixels_per_tile <= TILE_WIDTH:
+            level += 1
+        self._refresh_level(level)
+        level_raster = self.levels[level]
+        source_y >>= level
+        source_x >>= level
+        inside_y = np.flatnonzero((source_y >= 0) & (source_y < level_raster.shape[0]))
+        inside_x = np.flatnonzero((source_x >= 0) & (source_x < level_raster.shape[1]))
+        view = np.full((height, width), self.BACKGROUND_SLOT, dtype=np.uint8)
+        view[np.ix_(inside_y, inside_x)] = level_raster[np.ix_(source_y[inside_y], source_x[inside_x])]
+        return Image.fromarray(palette_rgb[view], "RGB")
+
+# Initialize tileset with one "empty" tile. The store grows dynamically.
+tileset = TilesetStore()
+
+# Initialize supertileset with one "empty" supertile. The store grows dynamically.
+supertiles_data = SupertileStore()
 
 current_tile_index = 0
 selected_color_index = WHITE_IDX
@@ -177,10 +855,127 @@ current_supertile_index = 0
 selected_tile_for_supertile = 0
 map_width = DEFAULT_MAP_WIDTH  # In supertiles
 map_height = DEFAULT_MAP_HEIGHT  # In supertiles
-map_data = [[0 for _ in range(map_width)] for _ in range(map_height)]
+map_data = new_map_array(map_width, map_height)  # uint16[map_height, map_width] supertile indices
+usage_index = UsageIndex()
 selected_supertile_for_map = 0
 last_painted_map_cell = None
 
+# --- Indexed Renders ---
+def nearest_scale_slots(pixels, width, height):
+    """Nearest-neighbour scale of a 2D array of palette slots to width x height."""
+    rows = np.arange(height) * pixels.shape[0] // height
+    cols = np.arange(width) * pixels.shape[1] // width
+    return pixels[rows[:, None], cols]
+
+def tile_slot_pixels(tile_index):
+    """(8, 8) palette slots of a tile, all invalid-tile slots if the index is out of range."""
+    if 0 <= tile_index < len(tileset):
+        return tileset.palette_indices([tile_index])[0].astype(np.uint8)
+    return np.full((TILE_HEIGHT, TILE_WIDTH), MapRaster.INVALID_TILE_SLOT, dtype=np.uint8)
+
+def supertile_slot_pixels(supertile_index):
+    """(h*8, w*8) palette slots of a supertile at 1x, or None if the index is out of range."""
+    if not (0 <= supertile_index < len(supertiles_data)):
+        return None
+    tile_refs = supertiles_data[supertile_index]
+    grid_h, grid_w = tile_refs.shape
+    pixels = np.full((grid_h, grid_w, TILE_HEIGHT, TILE_WIDTH), MapRaster.INVALID_TILE_SLOT, dtype=np.uint8)
+    valid = tile_refs < len(tileset)
+    if valid.any():
+        pixels[valid] = tileset.palette_indices(tile_refs[valid]).astype(np.uint8)
+    return pixels.transpose(0, 2, 1, 3).reshape(grid_h * TILE_HEIGHT, grid_w * TILE_WIDTH)
+
+class IndexedRender:
+    """
+    A cached render kept as a uint8 array of palette slots (MapRaster's slot numbering). The
+    palette is only applied when it is shown: the Tk photo is made on first use and recoloured
+    in place when the palette changes, so palette edits never throw a render away.
+    """
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.photo = None
+        self.palette_key = None
+
+    @property
+    def nbytes(self):
+        photo_bytes = self.pixels.size * 4 if self.photo is not None else 0 # Tk keeps 32-bit pixels
+        return self.pixels.nbytes + photo_bytes
+
+    def pil_image(self, palette):
+        """'P' mode PIL image of the render; palette is flat putpalette() data."""
+        image = Image.fromarray(self.pixels, "P")
+        image.putpalette(palette)
+        return image
+
+    def photo_image(self, palette_key, palette):
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(self.pil_image(palette))
+        elif self.palette_key != palette_key:
+            self.photo.paste(self.pil_image(palette))
+        self.palette_key = palette_key
+        return self.photo
+
+# --- Tileset Atlas ---
+class TilesetAtlas:
+    """
+    The tileset viewer as one palette-slot image: every tile at viewer size on a grid, the grid
+    lines in MapRaster.BACKGROUND_SLOT. Each sync compares the tileset with the snapshot the atlas
+    was built from and re-renders only the cells of the tiles that changed.
+    """
+    # Past this many changed tiles the Tk photo is repainted whole rather than cell by cell
+    PATCH_LIMIT = 64
+
+    def __init__(self, tile_size=VIEWER_TILE_SIZE, padding=1, tiles_across=NUM_TILES_ACROSS):
+        self.tile_size = tile_size
+        self.padding = padding
+        self.tiles_across = tiles_across
+        self.render = None
+        self._patterns = None
+        self._colors = None
+
+    def tile_origin(self, tile_index):
+        tile_r, tile_c = divmod(tile_index, self.tiles_across)
+        return (tile_c * (self.tile_size + self.padding) + self.padding,
+                tile_r * (self.tile_size + self.padding) + self.padding)
+
+    def cell_box(self, tile_index):
+        """Canvas box of a tile's border, centred on the grid lines around it."""
+        base_x, base_y = self.tile_origin(tile_index)
+        half_padding = self.padding / 2
+        return (max(0, base_x - half_padding), max(0, base_y - half_padding),
+                base_x + self.tile_size + half_padding, base_y + self.tile_size + half_padding)
+
+    def atlas_size(self, num_tiles):
+        max_rows = math.ceil(num_tiles / self.tiles_across)
+        return (max(1, self.tiles_across * (self.tile_size + self.padding) + self.padding),
+                max(1, max_rows * (self.tile_size + self.padding) + self.padding))
+
+    def _paste_tiles(self, tile_indices):
+        rows = np.arange(self.tile_size) * TILE_HEIGHT // self.tile_size
+        cols = np.arange(self.tile_size) * TILE_WIDTH // self.tile_size
+        blocks = tileset.palette_indices(tile_indices).astype(np.uint8)[:, rows[:, None], cols]
+        for tile_index, block in zip(tile_indices.tolist(), blocks):
+            base_x, base_y = self.tile_origin(tile_index)
+            self.render.pixels[base_y:base_y + self.tile_size, base_x:base_x + self.tile_size] = block
+
+    def sync(self):
+        """Brings the atlas up to date. Returns the indices of the re-rendered tiles (None: full rebuild)."""
+        num_tiles = len(tileset)
+        if self.render is None or self._patterns.shape != tileset.patterns.shape:
+            atlas_width, atlas_height = self.atlas_size(num_tiles)
+            self.render = IndexedRender(np.full((atlas_height, atlas_width), MapRaster.BACKGROUND_SLOT, dtype=np.uint8))
+            if num_tiles:
+                self._paste_tiles(np.arange(num_tiles))
+            changed_tiles = None
+        else:
+            changed_tiles = np.flatnonzero((self._patterns != tileset.patterns).any(axis=1) |
+                                           (self._colors != tileset.colors).any(axis=1))
+            if changed_tiles.size:
+                self._paste_tiles(changed_tiles)
+        self._patterns = tileset.patterns.copy()
+        self._colors = tileset.colors.copy()
+        return changed_tiles
+
 # --- Utility Functions ---
 def get_contrast_color(hex_color):
     try:
@@ -211,9 +1006,55 @@ def _error(message):
 def _critical(message):
     logger.critical(f"{str(message)}")
 
+# --- Change Notifications ---
+class ChangeBus:
+    """
+    Typed change notifications between commands and views. Commands publish what they changed,
+    views subscribe to the kinds of change they depend on, and flush() hands each view the
+    pending events it subscribed to, at most once per flush. A view callback returns True when
+    it actually redrew; those redraws are counted per source (usually a command description).
+    """
+    TILE_PIXELS = "tile_pixels" # payload: tile index
+    TILE_COLORS = "tile_colors" # payload: tile index
+    SUPERTILE_DEFINITION = "supertile_definition" # payload: supertile index
+    MAP_REGION = "map_region" # payload: (row, col, height, width) in map cells
+    PALETTE_SLOT = "palette_slot" # payload: slot index
+    PROJECT_STRUCTURE = "project_structure" # payload: None; anything may have changed
+
+    def __init__(self):
+        self.subscribers = [] # (view name, kinds, callback)
+        self.pending = []
+        self.redraw_counts = {} # source -> {view name: redraws}
+
+    def subscribe(self, view_name, kinds, callback):
+        self.subscribers.append((view_name, frozenset(kinds), callback))
+
+    def publish(self, kind, payload=None):
+        self.pending.append((kind, payload))
+
+    def discard(self):
+        self.pending = []
+
+    def flush(self, source=""):
+        """Delivers the pending events. Returns the number of views that redrew."""
+        events, self.pending = self.pending, []
+        if not events:
+            return 0
+        redraws = 0
+        for view_name, kinds, callback in self.subscribers:
+            view_events = [event for event in events if event[0] in kinds]
+            if view_events and callback(view_events):
+                source_counts = self.redraw_counts.setdefault(source, {})
+                source_counts[view_name] = source_counts.get(view_name, 0) + 1
+                redraws += 1
+        return redraws
+
 # --- Undo/Redo Framework Classes ------------------------------------------------------------------------------
 class ICommand:
     """An interface for an undoable action."""
+    # Commands that publish their changes on the app's change_bus; others trigger a full redraw
+    publishes_changes = False
+
     def __init__(self, description=""):
         self.description = description # For potential UI hints, e.g., "Undo Paint Pixel"
 
@@ -244,7 +1085,7 @@ class UndoManager:
         _debug(f"[UndoManager.execute] Executing command: {command.description}")
         command.execute()
         self.register(command)
-        self.app_ref.update_all_displays(changed_level="all")
+        self._publish_changes(command)
 
     def undo(self):
         if not self.undo_stack:
@@ -255,7 +1096,7 @@ class UndoManager:
         command.undo()
         self.redo_stack.append(command)
         _debug("[UndoManager.undo] Redrawing screen.")
-        self.app_ref.update_all_displays(changed_level="all")
+        self._publish_changes(command)
         self.app_ref._update_edit_menu_state()
 
     def redo(self):
@@ -267,9 +1108,17 @@ class UndoManager:
         command.execute()
         self.undo_stack.append(command)
         _debug("[UndoManager.redo] Redrawing screen.")
-        self.app_ref.update_all_displays(changed_level="all")
+        self._publish_changes(command)
         self.app_ref._update_edit_menu_state()
         
+    def _publish_changes(self, command):
+        """Redraws what the command changed; commands that publish nothing get a full redraw."""
+        change_bus = self.app_ref.change_bus
+        if not command.publishes_changes:
+            change_bus.discard()
+            change_bus.publish(ChangeBus.PROJECT_STRUCTURE)
+        change_bus.flush(command.description)
+
     def clear(self):
         self.undo_stack.clear()
         self.redo_stack.clear()
@@ -283,20 +1132,23 @@ class UndoManager:
 
 class PaintPixelCommand(ICommand):
     """Command for a single pixel paint action in the Tile Editor."""
+    publishes_changes = True
+
     def __init__(self, app_ref, tile_index, r, c, new_value):
         super().__init__("Paint Pixel")
         self.app_ref = app_ref
         self.tile_index = tile_index
         self.r, self.c = r, c
         self.new_value = new_value
-        self.old_value = tileset_patterns[tile_index][r][c]
+        self.old_value = tileset.get_pixel(tile_index, r, c)
         _debug(f"[PaintPixelCommand CREATED] Tile {self.tile_index} ({self.r},{self.c}). Old->New: {self.old_value}->{self.new_value}")
 
     def _apply_and_update(self, value):
         _debug(f"  [_apply_and_update] Setting pixel ({self.r},{self.c}) to {value}")
-        tileset_patterns[self.tile_index][self.r][self.c] = value
+        tileset.set_pixel(self.tile_index, self.r, self.c, value)
         self.app_ref._mark_project_modified()
         self.app_ref.invalidate_tile_cache(self.tile_index)
+        self.app_ref.change_bus.publish(ChangeBus.TILE_PIXELS, self.tile_index)
         self.app_ref._request_color_usage_refresh()
         self.app_ref._request_tile_usage_refresh()
         self.app_ref._request_supertile_usage_refresh()
@@ -311,6 +1163,8 @@ class PaintPixelCommand(ICommand):
 
 class SetRowColorCommand(ICommand):
     """Command to set the foreground or background color of a tile row."""
+    publishes_changes = True
+
     def __init__(self, app_ref, tile_index, row, fg_or_bg, new_color_index):
         super().__init__("Set Row Color")
         self.app_ref = app_ref
@@ -318,12 +1172,13 @@ class SetRowColorCommand(ICommand):
         self.row = row
         self.fg_or_bg = fg_or_bg
         self.new_color_index = new_color_index
-        self.old_colors = tileset_colors[tile_index][row]
+        self.old_colors = tileset.get_row_colors(tile_index, row)
 
     def _apply_and_update(self, colors_tuple):
-        tileset_colors[self.tile_index][self.row] = colors_tuple
+        tileset.set_row_colors(self.tile_index, self.row, colors_tuple)
         self.app_ref._mark_project_modified()
         self.app_ref.invalidate_tile_cache(self.tile_index)
+        self.app_ref.change_bus.publish(ChangeBus.TILE_COLORS, self.tile_index)
         self.app_ref._request_color_usage_refresh()
         self.app_ref._request_tile_usage_refresh()
         self.app_ref._request_supertile_usage_refresh()
@@ -338,21 +1193,26 @@ class SetRowColorCommand(ICommand):
 
 class PlaceTileInSupertileCommand(ICommand):
     """Command to place a single tile in a supertile definition."""
+    publishes_changes = True
+
     def __init__(self, app_ref, st_index, r, c, new_tile_index):
         super().__init__("Place Tile")
         self.app_ref = app_ref
         self.st_index = st_index
         self.r, self.c = r, c
         self.new_tile_index = new_tile_index
-        self.old_tile_index = supertiles_data[st_index][r][c]
+        self.old_tile_index = int(supertiles_data[st_index][r][c])
         _debug(f"[PlaceTileInSupertileCommand CREATED] ST {self.st_index} ({self.r},{self.c}). Old->New: {self.old_tile_index}->{self.new_tile_index}")
 
 
     def _apply_and_update(self, value):
         _debug(f"  [_apply_and_update] Setting ST {self.st_index} pixel ({self.r},{self.c}) to {value}")
-        supertiles_data[self.st_index][self.r][self.c] = value
+        definition = supertiles_data[self.st_index]
+        usage_index.tile_reference_changed(self.st_index, int(definition[self.r, self.c]), value)
+        definition[self.r, self.c] = value
         self.app_ref._mark_project_modified()
         self.app_ref.invalidate_supertile_cache(self.st_index)
+        self.app_ref.change_bus.publish(ChangeBus.SUPERTILE_DEFINITION, self.st_index)
         self.app_ref._request_tile_usage_refresh()
         self.app_ref._request_supertile_usage_refresh()
 
@@ -366,17 +1226,21 @@ class PlaceTileInSupertileCommand(ICommand):
 
 class PaintMapCellCommand(ICommand):
     """Command to paint a single supertile onto the map."""
+    publishes_changes = True
+
     def __init__(self, app_ref, r, c, new_st_index):
         super().__init__("Paint Map")
         self.app_ref = app_ref
         self.r, self.c = r, c
         self.new_st_index = new_st_index
-        self.old_st_index = map_data[r][c]
+        self.old_st_index = int(map_data[r][c])
 
     def _apply_and_update(self, value):
-        map_data[self.r][self.c] = value
+        usage_index.map_reference_changed(self.r, self.c, int(map_data[self.r, self.c]), value)
+        map_data[self.r, self.c] = value
         self.app_ref._mark_project_modified()
-        self.app_ref.invalidate_minimap_background_cache()
+        self.app_ref.minimap_dirty_cells.add((self.r, self.c))
+        self.app_ref.change_bus.publish(ChangeBus.MAP_REGION, (self.r, self.c, 1, 1))
         self.app_ref._request_supertile_usage_refresh()
 
     def execute(self):
@@ -394,6 +1258,11 @@ class CompositeCommand(ICommand):
         # Always take a copy, and expect the argument to be a list.
         self.post_hooks = list(post_hooks) if post_hooks else []
 
+    @property
+    def publishes_changes(self):
+        # Post hooks can do anything, so only hook-free groups of publishing commands qualify
+        return not self.post_hooks and all(cmd.publishes_changes for cmd in self.commands)
+
     def execute(self):
         for cmd in self.commands:
             cmd.execute()
@@ -411,78 +1280,85 @@ class CompositeCommand(ICommand):
 
 class ClearTileCommand(ICommand):
     """Command to clear a single tile's pattern and color data."""
+    publishes_changes = True
+
     def __init__(self, app_ref, tile_index):
         super().__init__("Clear Tile")
         self.app_ref = app_ref
         self.tile_index = tile_index
-        self.old_pattern = copy.deepcopy(tileset_patterns[self.tile_index])
-        self.old_colors = copy.deepcopy(tileset_colors[self.tile_index])
+        self.old_tile = tileset[self.tile_index]
 
     def execute(self):
-        tileset_patterns[self.tile_index] = [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-        tileset_colors[self.tile_index] = [(WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)]
+        tileset[self.tile_index] = TilesetStore.blank_tile()
         self._apply_side_effects()
 
     def undo(self):
-        tileset_patterns[self.tile_index] = copy.deepcopy(self.old_pattern)
-        tileset_colors[self.tile_index] = copy.deepcopy(self.old_colors)
+        tileset[self.tile_index] = self.old_tile
         self._apply_side_effects()
     
     def _apply_side_effects(self):
         self.app_ref._mark_project_modified()
         self.app_ref.invalidate_tile_cache(self.tile_index)
+        self.app_ref.change_bus.publish(ChangeBus.TILE_PIXELS, self.tile_index)
+        self.app_ref.change_bus.publish(ChangeBus.TILE_COLORS, self.tile_index)
         self.app_ref._request_color_usage_refresh()
         self.app_ref._request_tile_usage_refresh()
         self.app_ref._request_supertile_usage_refresh()
 
 class ClearSupertileCommand(ICommand):
     """Command to clear a single supertile's definition."""
+    publishes_changes = True
+
     def __init__(self, app_ref, supertile_index):
         super().__init__("Clear Supertile")
         self.app_ref = app_ref
         self.supertile_index = supertile_index
-        self.old_definition = copy.deepcopy(supertiles_data[self.supertile_index])
+        self.old_definition = supertiles_data[self.supertile_index].copy()
 
     def execute(self):
-        supertiles_data[self.supertile_index] = [
-            [0 for _c in range(self.app_ref.supertile_grid_width)] for _r in range(self.app_ref.supertile_grid_height)
-        ]
+        supertiles_data[self.supertile_index] = 0
         self._apply_side_effects()
 
     def undo(self):
-        supertiles_data[self.supertile_index] = copy.deepcopy(self.old_definition)
+        supertiles_data[self.supertile_index] = self.old_definition
         self._apply_side_effects()
         
     def _apply_side_effects(self):
         self.app_ref._mark_project_modified()
         self.app_ref.invalidate_supertile_cache(self.supertile_index)
+        self.app_ref.change_bus.publish(ChangeBus.SUPERTILE_DEFINITION, self.supertile_index)
         self.app_ref._request_tile_usage_refresh()
         self.app_ref._request_supertile_usage_refresh()
 
 class ClearMapCommand(ICommand):
     """Command to clear the entire map."""
+    publishes_changes = True
+
     def __init__(self, app_ref):
         super().__init__("Clear Map")
         self.app_ref = app_ref
-        self.old_map_data = copy.deepcopy(map_data)
+        self.old_map_data = map_data.copy()
 
     def execute(self):
         global map_data, map_width, map_height
-        map_data = [[0 for _ in range(map_width)] for _ in range(map_height)]
+        map_data = new_map_array(map_width, map_height)
         self._apply_side_effects()
 
     def undo(self):
         global map_data
-        map_data = copy.deepcopy(self.old_map_data)
+        map_data = self.old_map_data.copy()
         self._apply_side_effects()
 
     def _apply_side_effects(self):
         self.app_ref._mark_project_modified()
         self.app_ref.invalidate_minimap_background_cache()
+        self.app_ref.change_bus.publish(ChangeBus.MAP_REGION, (0, 0, map_height, map_width))
         self.app_ref._request_supertile_usage_refresh()
 
 class TransformCommand(ICommand):
     """A general command for any transformation on a single data item."""
+    publishes_changes = True
+
     def __init__(self, description, app_ref, data_list, index, invalidate_func):
         super().__init__(description)
         self.app_ref = app_ref
@@ -507,12 +1383,19 @@ class TransformCommand(ICommand):
     def _apply_side_effects(self):
         self.app_ref._mark_project_modified()
         self.invalidate_func(self.index)
+        if self.data_list is tileset:
+            self.app_ref.change_bus.publish(ChangeBus.TILE_PIXELS, self.index)
+            self.app_ref.change_bus.publish(ChangeBus.TILE_COLORS, self.index)
+        else:
+            self.app_ref.change_bus.publish(ChangeBus.SUPERTILE_DEFINITION, self.index)
         self.app_ref._request_color_usage_refresh()
         self.app_ref._request_tile_usage_refresh()
         self.app_ref._request_supertile_usage_refresh()
 
 class SetPaletteColorCommand(ICommand):
     """Command to change a single color in the active palette."""
+    publishes_changes = True
+
     def __init__(self, app_ref, slot_index, new_hex_color):
         super().__init__("Set Palette Color")
         self.app_ref = app_ref
@@ -523,8 +1406,8 @@ class SetPaletteColorCommand(ICommand):
     def _apply_and_update(self, hex_color):
         self.app_ref.active_msx_palette[self.slot_index] = hex_color
         self.app_ref._mark_project_modified()
-        self.app_ref.clear_all_caches()
         self.app_ref.invalidate_minimap_background_cache()
+        self.app_ref.change_bus.publish(ChangeBus.PALETTE_SLOT, self.slot_index)
         self.app_ref._request_color_usage_refresh()
         self.app_ref._request_tile_usage_refresh()
         self.app_ref._request_supertile_usage_refresh()
@@ -597,38 +1480,27 @@ class ReplaceRefsCommand(ICommand):
         self.target_index = target_index
         
         if self.item_type == "palette_color":
-            self.old_data = copy.deepcopy(tileset_colors)
+            self.old_data = tileset.snapshot()
         elif self.item_type == "tile":
-            self.old_data = copy.deepcopy(supertiles_data)
+            self.old_data = supertiles_data.snapshot()
         elif self.item_type == "supertile":
-            self.old_data = copy.deepcopy(map_data)
+            self.old_data = map_data.copy()
 
     def execute(self):
         self.app_ref._mark_project_modified()
         if self.item_type == "palette_color":
-            for tile_color_def in tileset_colors:
-                for i, (fg, bg) in enumerate(tile_color_def):
-                    new_fg, new_bg = fg, bg
-                    if fg == self.target_index: new_fg = self.source_index
-                    if bg == self.target_index: new_bg = self.source_index
-                    if (new_fg, new_bg) != (fg, bg):
-                        tile_color_def[i] = (new_fg, new_bg)
+            tileset.replace_color(self.target_index, self.source_index)
+            self.app_ref.clear_all_caches()
             self.app_ref._apply_palette_change_updates()
         elif self.item_type == "tile":
-            for st_def in supertiles_data:
-                for r in range(len(st_def)):
-                    for c in range(len(st_def[r])):
-                        if st_def[r][c] == self.target_index:
-                            st_def[r][c] = self.source_index
+            supertiles_data.remap_tiles(replace_reference_lut(self.target_index, self.source_index))
             self.app_ref.clear_all_caches()
             self.app_ref.invalidate_minimap_background_cache()
             self.app_ref._request_tile_usage_refresh()
             self.app_ref._request_supertile_usage_refresh()
         elif self.item_type == "supertile":
-            for r in range(len(map_data)):
-                for c in range(len(map_data[r])):
-                    if map_data[r][c] == self.target_index:
-                        map_data[r][c] = self.source_index
+            global map_data
+            map_data = replace_reference_lut(self.target_index, self.source_index)[map_data]
             self.app_ref.clear_all_caches()
             self.app_ref.invalidate_minimap_background_cache()
             self.app_ref._request_supertile_usage_refresh()
@@ -636,19 +1508,18 @@ class ReplaceRefsCommand(ICommand):
     def undo(self):
         self.app_ref._mark_project_modified()
         if self.item_type == "palette_color":
-            global tileset_colors
-            tileset_colors = copy.deepcopy(self.old_data)
+            tileset.restore(self.old_data)
+            self.app_ref.clear_all_caches()
             self.app_ref._apply_palette_change_updates()
         elif self.item_type == "tile":
-            global supertiles_data
-            supertiles_data = copy.deepcopy(self.old_data)
+            supertiles_data.restore(self.old_data)
             self.app_ref.clear_all_caches()
             self.app_ref.invalidate_minimap_background_cache()
             self.app_ref._request_tile_usage_refresh()
             self.app_ref._request_supertile_usage_refresh()
         elif self.item_type == "supertile":
             global map_data
-            map_data = copy.deepcopy(self.old_data)
+            map_data = self.old_data.copy()
             self.app_ref.clear_all_caches()
             self.app_ref.invalidate_minimap_background_cache()
             self.app_ref._request_supertile_usage_refresh()
@@ -665,24 +1536,12 @@ class UpdateSupertileRefsForTileCommand(ICommand):
 
     def _process_refs(self, is_forward):
         # is_forward = True for execute, False for undo
-        active_slice = supertiles_data[:len(supertiles_data)]
-        
         if (self.is_insert and is_forward) or (not self.is_insert and not is_forward):
             # This is an INSERT action
-            for st_def in active_slice:
-                for r in range(len(st_def)):
-                    for c in range(len(st_def[r])):
-                        if st_def[r][c] >= self.tile_index:
-                            st_def[r][c] += 1
+            supertiles_data.remap_tiles(insert_reference_lut(self.tile_index))
         else:
             # This is a DELETE action
-            for st_def in active_slice:
-                for r in range(len(st_def)):
-                    for c in range(len(st_def[r])):
-                        if st_def[r][c] == self.tile_index:
-                            st_def[r][c] = 0
-                        elif st_def[r][c] > self.tile_index:
-                            st_def[r][c] -= 1
+            supertiles_data.remap_tiles(delete_reference_lut(self.tile_index))
 
     def execute(self):
         self._process_refs(is_forward=True)
@@ -700,11 +1559,15 @@ class ReorderListCommand(ICommand):
         self.is_swap = is_swap
         self.moved_item = None # To store item during move
 
+    def _swap_items(self):
+        # Array-backed stores hand out views, so take copies before overwriting either slot.
+        item_a = copy.deepcopy(self.list_obj[self.source_index])
+        item_b = copy.deepcopy(self.list_obj[self.target_index])
+        self.list_obj[self.source_index], self.list_obj[self.target_index] = item_b, item_a
+
     def execute(self):
         if self.is_swap:
-            # Swap the items at the two indices
-            self.list_obj[self.source_index], self.list_obj[self.target_index] = \
-                self.list_obj[self.target_index], self.list_obj[self.source_index]
+            self._swap_items()
         else: # It's a move (reposition)
             # Remove item from its original position and store it
             self.moved_item = self.list_obj.pop(self.source_index)
@@ -714,8 +1577,7 @@ class ReorderListCommand(ICommand):
     def undo(self):
         if self.is_swap:
             # A swap is its own inverse
-            self.list_obj[self.source_index], self.list_obj[self.target_index] = \
-                self.list_obj[self.target_index], self.list_obj[self.source_index]
+            self._swap_items()
         else: # Undo a move
             # Remove the item from its new position
             item_to_move_back = self.list_obj.pop(self.target_index)
@@ -731,18 +1593,8 @@ class UpdateSupertileRefsForTileReorderCommand(ICommand):
         self.actual_insert_idx = actual_insert_idx
 
     def _process_refs(self, is_undo):
-        active_slice = supertiles_data[:len(supertiles_data)]
         source, target = (self.actual_insert_idx, self.source_index) if is_undo else (self.source_index, self.actual_insert_idx)
-
-        for st_def in active_slice:
-            for r in range(len(st_def)):
-                for c in range(len(st_def[r])):
-                    val = st_def[r][c]
-                    if val == source: st_def[r][c] = target
-                    elif source < target: # Moved down
-                        if source < val <= target: st_def[r][c] -= 1
-                    else: # Moved up
-                        if target <= val < source: st_def[r][c] += 1
+        supertiles_data.remap_tiles(move_reference_lut(source, target))
         self._apply_side_effects()
 
     def execute(self):
@@ -766,12 +1618,7 @@ class UpdateSupertileRefsForTileSwapCommand(ICommand):
         self.index_b = index_b
 
     def _swap_logic(self):
-        active_slice = supertiles_data[:len(supertiles_data)]
-        for st_def in active_slice:
-            for r in range(len(st_def)):
-                for c in range(len(st_def[r])):
-                    if st_def[r][c] == self.index_a: st_def[r][c] = self.index_b
-                    elif st_def[r][c] == self.index_b: st_def[r][c] = self.index_a
+        supertiles_data.remap_tiles(swap_reference_lut(self.index_a, self.index_b))
         
         self.app_ref.clear_all_caches()
         self.app_ref.invalidate_minimap_background_cache()
@@ -793,12 +1640,8 @@ class UpdateMapRefsForSupertileSwapCommand(ICommand):
         self.index_b = index_b
 
     def _swap_logic(self):
-        for r in range(map_height):
-            for c in range(map_width):
-                if map_data[r][c] == self.index_a:
-                    map_data[r][c] = self.index_b
-                elif map_data[r][c] == self.index_b:
-                    map_data[r][c] = self.index_a
+        global map_data
+        map_data = swap_reference_lut(self.index_a, self.index_b)[map_data]
         
         self.app_ref.clear_all_caches()
         self.app_ref.invalidate_minimap_background_cache()
@@ -818,9 +1661,8 @@ class SetTilesetLimitCommand(ICommand):
         
         # --- Capture "Before" State ---
         self.old_limit = self.app_ref.project_tile_limit
-        self.old_patterns = copy.deepcopy(tileset_patterns)
-        self.old_colors = copy.deepcopy(tileset_colors)
-        self.old_supertiles_data = copy.deepcopy(supertiles_data)
+        self.old_tileset = tileset.snapshot()
+        self.old_supertiles_data = supertiles_data.snapshot()
         self.old_current_tile_index = current_tile_index
         self.old_selected_tile_for_supertile = selected_tile_for_supertile
 
@@ -828,32 +1670,25 @@ class SetTilesetLimitCommand(ICommand):
         self.new_limit = new_limit
         
         # Start with a copy of the "before" state to calculate the "after" state
-        after_patterns = copy.deepcopy(self.old_patterns)
-        after_colors = copy.deepcopy(self.old_colors)
-        after_supertiles_data = copy.deepcopy(self.old_supertiles_data)
+        after_patterns, after_colors = self.old_tileset
+        after_supertiles_data = self.old_supertiles_data.copy()
         current_size = len(after_patterns)
 
         if self.new_limit < current_size:
             # Truncation logic applied to our temporary "after" state copies
-            for st_def in after_supertiles_data:
-                for r in range(self.app_ref.supertile_grid_height):
-                    for c in range(self.app_ref.supertile_grid_width):
-                        if st_def[r][c] >= self.new_limit:
-                            st_def[r][c] = 0
+            after_supertiles_data = clamp_reference_lut(self.new_limit)[after_supertiles_data]
             
-            del after_patterns[self.new_limit:]
-            del after_colors[self.new_limit:]
+            after_patterns = after_patterns[:self.new_limit]
+            after_colors = after_colors[:self.new_limit]
 
         # Store the calculated "after" state in the command
-        self.after_patterns = after_patterns
-        self.after_colors = after_colors
+        self.after_tileset = (after_patterns.copy(), after_colors.copy())
         self.after_supertiles_data = after_supertiles_data
-        self.after_current_tile_index = min(self.old_current_tile_index, len(self.after_patterns) - 1)
-        self.after_selected_tile_for_supertile = min(self.old_selected_tile_for_supertile, len(self.after_patterns) - 1)
+        self.after_current_tile_index = min(self.old_current_tile_index, len(after_patterns) - 1)
+        self.after_selected_tile_for_supertile = min(self.old_selected_tile_for_supertile, len(after_patterns) - 1)
 
-    def _apply_and_update(self, limit, patterns, colors, st_data, cti, sts):
+    def _apply_and_update(self, limit, tileset_state, st_data, cti, sts):
         """Helper method to apply a given state by modifying lists in-place."""
-        global tileset_patterns, tileset_colors, supertiles_data
         global current_tile_index, selected_tile_for_supertile
 
         self.app_ref.project_tile_limit = limit
@@ -861,14 +1696,8 @@ class SetTilesetLimitCommand(ICommand):
         # Adhere to the State Isolation standard: apply a DEEP COPY of the
         # backup state to the live lists. This breaks the reference chain
         # and prevents future commands from contaminating this command's state.
-        tileset_patterns.clear()
-        tileset_patterns.extend(copy.deepcopy(patterns))
-        
-        tileset_colors.clear()
-        tileset_colors.extend(copy.deepcopy(colors))
-        
-        supertiles_data.clear()
-        supertiles_data.extend(copy.deepcopy(st_data))
+        tileset.restore(tileset_state)
+        supertiles_data.restore(st_data)
 
         current_tile_index = cti
         selected_tile_for_supertile = sts
@@ -886,11 +1715,11 @@ class SetTilesetLimitCommand(ICommand):
 
     def execute(self):
         _debug("Executing SetTilesetLimitCommand: Applying pre-calculated 'after' state.")
-        self._apply_and_update(self.new_limit, self.after_patterns, self.after_colors, self.after_supertiles_data, self.after_current_tile_index, self.after_selected_tile_for_supertile)
+        self._apply_and_update(self.new_limit, self.after_tileset, self.after_supertiles_data, self.after_current_tile_index, self.after_selected_tile_for_supertile)
 
     def undo(self):
         _debug("Undoing SetTilesetLimitCommand: Applying pre-calculated 'before' state.")
-        self._apply_and_update(self.old_limit, self.old_patterns, self.old_colors, self.old_supertiles_data, self.old_current_tile_index, self.old_selected_tile_for_supertile)
+        self._apply_and_update(self.old_limit, self.old_tileset, self.old_supertiles_data, self.old_current_tile_index, self.old_selected_tile_for_supertile)
 
 class SetSupertileLimitCommand(ICommand):
     """Command to handle changing the supertile limit."""
@@ -900,26 +1729,23 @@ class SetSupertileLimitCommand(ICommand):
 
         # --- Capture "Before" State ---
         self.old_limit = self.app_ref.project_supertile_limit
-        self.old_supertiles_data = copy.deepcopy(supertiles_data)
-        self.old_map_data = copy.deepcopy(map_data)
+        self.old_supertiles_data = supertiles_data.snapshot()
+        self.old_map_data = map_data.copy()
         self.old_current_supertile_index = current_supertile_index
         self.old_selected_supertile_for_map = selected_supertile_for_map
 
         # --- Calculate and Capture Definitive "After" State ---
         self.new_limit = new_limit
         
-        after_supertiles_data = copy.deepcopy(self.old_supertiles_data)
-        after_map_data = copy.deepcopy(self.old_map_data)
+        after_supertiles_data = self.old_supertiles_data.copy()
+        after_map_data = self.old_map_data.copy()
         current_size = len(after_supertiles_data)
 
         if self.new_limit < current_size:
             # Truncate supertiles
-            del after_supertiles_data[self.new_limit:]
+            after_supertiles_data = after_supertiles_data[:self.new_limit].copy()
             # Reset references in map
-            for r in range(len(after_map_data)):
-                for c in range(len(after_map_data[r])):
-                    if after_map_data[r][c] >= self.new_limit:
-                        after_map_data[r][c] = 0
+            after_map_data = clamp_reference_lut(self.new_limit)[after_map_data]
 
         # Store the calculated "after" state
         self.after_supertiles_data = after_supertiles_data
@@ -929,17 +1755,14 @@ class SetSupertileLimitCommand(ICommand):
 
     def _apply_and_update(self, limit, st_data, m_data, csi, ssm):
         """Helper method to apply a given state."""
-        global supertiles_data, map_data
+        global map_data
         global current_supertile_index, selected_supertile_for_map
 
         _debug(f"[_apply_and_update] Setting app_ref.project_supertile_limit to: {limit}")
         self.app_ref.project_supertile_limit = limit
         
-        supertiles_data.clear()
-        supertiles_data.extend(copy.deepcopy(st_data))
-        
-        map_data.clear()
-        map_data.extend(copy.deepcopy(m_data))
+        supertiles_data.restore(st_data)
+        map_data = m_data.copy()
 
         current_supertile_index = csi
         selected_supertile_for_map = ssm
@@ -1636,11 +2459,11 @@ class TileUsageWindow(tk.Toplevel):
                 usage_data = self.app_ref._calculate_tile_usage_data() 
             except Exception as e:
                 _error(f" Error calling _calculate_tile_usage_data: {e}")
-                for i in range(getattr(self.app_ref, 'len(tileset_patterns)', 1)): 
+                for i in range(len(tileset)): 
                      usage_data.append({'tile_index': i, 'total_uses_count': 0, 'used_by_sts_count': 0})
         else: 
             _debug(" TileUsageWindow: _calculate_tile_usage_data not found for refresh.")
-            for i in range(getattr(self.app_ref, 'len(tileset_patterns)', 1)): 
+            for i in range(len(tileset)): 
                 usage_data.append({'tile_index': i, 'total_uses_count': 0, 'used_by_sts_count': 0})
 
         valid_sort_key = self.current_sort_column_id
@@ -1709,7 +2532,7 @@ class TileUsageWindow(tk.Toplevel):
             _error(f" TileUsageWindow: Error parsing tile_index from iid '{item_id_str}': {e}")
             return
         
-        if 0 <= actual_item_idx < len(tileset_patterns):
+        if 0 <= actual_item_idx < len(tileset):
             if hasattr(self.app_ref, 'synchronize_selection_from_usage_window'):
                 self.app_ref.synchronize_selection_from_usage_window("tile", actual_item_idx)
         else:
@@ -1785,7 +2608,7 @@ class TileUsageWindow(tk.Toplevel):
 
             try:
                 tile_index = int(item_iid.split("_")[1])
-                if not (0 <= tile_index < len(tileset_patterns)): return
+                if not (0 <= tile_index < len(tileset)): return
 
                 item_tags = self.tree.item(item_iid, "tags")
 
@@ -2699,9 +3522,11 @@ class ImageImportDialog(tk.Toplevel):
         self.dither_var = tk.BooleanVar(value=False)
         self.offset_var = tk.BooleanVar(value=False)
         self.synth_var = tk.BooleanVar(value=False)
+        self.quick_preview_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(advanced_frame, text="Enable Dithering", variable=self.dither_var).pack(anchor="w", padx=10, pady=2)
         ttk.Checkbutton(advanced_frame, text="Find best grid offset", variable=self.offset_var).pack(anchor="w", padx=10, pady=2)
         ttk.Checkbutton(advanced_frame, text="Synthesize new tiles for merged groups", variable=self.synth_var).pack(anchor="w", padx=10, pady=2)
+        ttk.Checkbutton(advanced_frame, text=f"Quick preview (finish in ~{QUICK_PREVIEW_TIME_BUDGET_SECONDS}s, lower quality)", variable=self.quick_preview_var).pack(anchor="w", padx=10, pady=2)
         
         # --- Core Limiter Frame ---
         cores_frame = ttk.Frame(advanced_frame)
@@ -2806,6 +3631,7 @@ class ImageImportDialog(tk.Toplevel):
             "dithering": self.dither_var.get(),
             "find_offset": self.offset_var.get(),
             "synthesize": self.synth_var.get(),
+            "quick_preview": self.quick_preview_var.get(),
             "limit_cores": self.limit_cores_var.get(),
             "cores": self.cores_var.get(),
             "palette_rules": palette_rules
@@ -2833,6 +3659,179 @@ class ImageTileImportDialog(ImageImportDialog):
         self.st_label.grid_forget()
         self.st_frame.grid_forget()
 
+class ScriptRunHandle:
+    """Handle to a helper script started by _run_script_and_stream_output."""
+    def __init__(self):
+        self.process = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def attach(self, process):
+        with self._lock:
+            self.process = process
+            cancel_now = self.cancelled
+        if cancel_now:
+            self._terminate_tree()
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def cancel(self):
+        """Terminates the script and every child it spawned (e.g. multiprocessing workers)."""
+        with self._lock:
+            self.cancelled = True
+            has_process = self.process is not None
+        if has_process:
+            self._terminate_tree()
+
+    def _terminate_tree(self):
+        if self.process.poll() is not None:
+            return
+        try:
+            if os.name == 'nt':
+                subprocess.run(
+                    ["taskkill", "/F", "/T", "/PID", str(self.process.pid)],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    creationflags=subprocess.CREATE_NO_WINDOW
+                )
+            else:
+                # The script runs as leader of its own session, so its pgid is its pid
+                os.killpg(self.process.pid, signal.SIGTERM)
+        except (OSError, subprocess.SubprocessError) as e:
+            _warning(f"Could not terminate script process tree: {e}")
+            with suppress(OSError):
+                self.process.kill()
+
+class ScriptProgressDialog(tk.Toplevel):
+    """
+    Runs a helper script with '--progress-format jsonl' and shows its stage,
+    a progress bar, and the plain log output, with a working Cancel button.
+    on_complete_callback(success, cancelled) is called once the script exits.
+    """
+    def __init__(self, parent, app_instance, title, command, on_complete_callback, on_close_callback=None):
+        super().__init__(parent)
+        self.transient(parent)
+        self.grab_set()
+        self.title(title)
+        self.resizable(False, False)
+
+        self.app_ref = app_instance
+        self.on_complete_callback = on_complete_callback
+        self.on_close_callback = on_close_callback
+        self.finished = False
+
+        self.stage_var = tk.StringVar(value="Starting...")
+        self.detail_var = tk.StringVar(value="")
+
+        main_frame = ttk.Frame(self, padding="10")
+        main_frame.pack(expand=True, fill="both")
+
+        ttk.Label(main_frame, textvariable=self.stage_var, font=("Segoe UI", 10, "bold")).pack(anchor="w")
+        self.progress_bar = ttk.Progressbar(main_frame, orient=tk.HORIZONTAL, length=560, mode="indeterminate", maximum=100)
+        self.progress_bar.pack(fill="x", pady=(5, 2))
+        self.progress_bar.start(15)
+        ttk.Label(main_frame, textvariable=self.detail_var).pack(anchor="w")
+
+        log_frame = ttk.LabelFrame(main_frame, text="Log")
+        log_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        self.log_text = tk.Text(log_frame, height=14, width=90, wrap=tk.WORD, state=tk.DISABLED, bg="#1E1E1E", fg="#D4D4D4", font=("Consolas", 9))
+        scrollbar = ttk.Scrollbar(log_frame, command=self.log_text.yview)
+        self.log_text['yscrollcommand'] = scrollbar.set
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill="x", pady=(10, 0))
+        self.close_button = ttk.Button(button_frame, text="Close", state=tk.DISABLED, command=self._on_close_click)
+        self.close_button.pack(side="right", padx=(5, 0))
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self._on_cancel_click)
+        self.cancel_button.pack(side="right")
+
+        self.protocol("WM_DELETE_WINDOW", self._on_window_close)
+        self.bind("<Escape>", lambda e: self._on_window_close())
+
+        self.run_handle = self.app_ref._run_script_and_stream_output(
+            command, self.log_text, self._on_script_complete, event_callback=self._on_progress_event
+        )
+
+    def _on_progress_event(self, event):
+        """Consumes one JSON event; returns the text to append to the log, if any."""
+        event_type = event.get("event")
+        if event_type == "stage":
+            stage_text = f"{event.get('stage')}. {event.get('message', '')}"
+            self.stage_var.set(stage_text)
+            self.detail_var.set("")
+            self._set_indeterminate(True)
+            return stage_text + "\n"
+        if event_type == "progress":
+            done, total = event.get("done", 0), event.get("total")
+            if total:
+                self._set_indeterminate(False)
+                self.progress_bar["value"] = 100.0 * done / total
+                detail = f"{event.get('task', '')}: {done:,} / {total:,}"
+            else:
+                self._set_indeterminate(True)
+                detail = f"{event.get('task', '')}: {done:,}"
+            rate, eta, rss = event.get("rate"), event.get("eta"), event.get("rss")
+            if rate:
+                detail += f"   {rate:,.0f}/s"
+            if eta is not None:
+                minutes, seconds = divmod(int(eta), 60)
+                detail += f"   ETA {minutes}:{seconds:02d}"
+            if rss:
+                detail += f"   RAM {rss / (1024 * 1024):,.0f} MB"
+            self.detail_var.set(detail)
+        return None
+
+    def _set_indeterminate(self, indeterminate):
+        mode = "indeterminate" if indeterminate else "determinate"
+        if str(self.progress_bar.cget("mode")) == mode:
+            return
+        if indeterminate:
+            self.progress_bar.config(mode=mode)
+            self.progress_bar.start(15)
+        else:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode=mode)
+
+    def _on_script_complete(self, success):
+        self.finished = True
+        if not self.winfo_exists():
+            return
+        cancelled = self.run_handle.cancelled
+        self._set_indeterminate(False)
+        if success:
+            self.progress_bar["value"] = 100
+            self.stage_var.set("Finished.")
+        else:
+            self.progress_bar["value"] = 0
+            self.stage_var.set("Cancelled." if cancelled else "Failed.")
+        self.detail_var.set("")
+        self.cancel_button.config(state=tk.DISABLED)
+        self.close_button.config(state=tk.NORMAL)
+        self.grab_release()
+        if self.on_complete_callback:
+            self.on_complete_callback(success, cancelled)
+
+    def _on_cancel_click(self):
+        if self.finished:
+            return
+        self.stage_var.set("Cancelling...")
+        self.cancel_button.config(state=tk.DISABLED)
+        self.run_handle.cancel()
+
+    def _on_close_click(self):
+        if self.on_close_callback:
+            self.on_close_callback()
+        if self.winfo_exists():
+            self.destroy()
+
+    def _on_window_close(self):
+        if self.finished:
+            self._on_close_click()
+        else:
+            self._on_cancel_click()
+
 # --- Color tooltip Class  ---------------------------------------------------------------------------------------------
 class ColorTooltip:
     """Creates a floating tooltip window for displaying color information."""
@@ -2894,6 +3893,8 @@ class TileEditorApp:
     
         # --- All instance attributes are initialized first ---
         self.undo_manager = UndoManager(self)
+        self.change_bus = ChangeBus()
+        self._subscribe_views()
         self.current_project_base_path = None
         self.project_modified = False
         self.project_tile_limit = MAX_TILES
@@ -2930,9 +3931,18 @@ class TileEditorApp:
         self.link_font = font.Font(font=default_font_info)
         self.link_font.configure(underline=True)
 
-        self.tile_image_cache = {}      
-        self.supertile_image_cache = {} 
-        self.map_render_cache = {}      
+        # Render caches are grouped by source item; together with usage_index (tile -> supertiles)
+        # they form the dependency graph used to invalidate only the affected renders
+        self.render_cache_budget = RenderCacheBudget(RENDER_CACHE_BUDGET_MB * 1024 * 1024, is_pinned=self._is_tk_image_in_use)
+        self.tile_image_cache = RenderCache("tile_image_cache", self.render_cache_budget)
+        self.supertile_image_cache = RenderCache("supertile_image_cache", self.render_cache_budget)
+        self.map_render_cache = RenderCache("map_render_cache", self.render_cache_budget)
+        self.map_raster = MapRaster() # Backing store of the map canvas
+        self._render_palette_cache = None # (palette key, flat putpalette data) for indexed renders
+        self.tileset_atlas = TilesetAtlas() # Shared by both tileset viewers
+        self.tileset_viewer_items = {} # canvas name -> persistent atlas and overlay items
+        self.supertile_selector_pools = {} # canvas name -> recycled (image, border) item pairs
+        self.map_pyramid_job = None
         self.pil_map_viewport_image = None 
         self.tk_map_photoimage = None      
 
@@ -2974,6 +3984,10 @@ class TileEditorApp:
         self.minimap_background_cache = None
         self.minimap_bg_rendered_width = 0
         self.minimap_bg_rendered_height = 0
+        self.minimap_bg_slots = None # Palette slots shown by minimap_background_cache
+        self.minimap_source_x = None # Map raster column sampled by each minimap column (-1: border)
+        self.minimap_source_y = None
+        self.minimap_dirty_cells = set() # Map cells changed since the minimap background was drawn
         self.minimap_resize_timer = None
         self._minimap_resizing_internally = False
 
@@ -3009,6 +4023,9 @@ class TileEditorApp:
 
         # --- Load settings, which will be used later ---
         self._load_app_settings()
+        with suppress(TypeError, ValueError):
+            budget_mb = int(self.app_settings.get('render_cache_budget_mb', RENDER_CACHE_BUDGET_MB))
+            self.render_cache_budget.max_bytes = max(1, budget_mb) * 1024 * 1024
 
         # --- Create ALL UI widgets and bind events BEFORE loading data ---
         self.create_menu()
@@ -3086,6 +4103,60 @@ class TileEditorApp:
         _debug(" TileEditorApp __init__ finished.")
 
     # --- Palette Conversion Helpers ---
+    def _render_palette(self):
+        """
+        (key, flat putpalette data) for palette-slot renders: the 16 palette slots, then the
+        invalid tile and invalid supertile colours. The key changes whenever the palette does.
+        """
+        palette_key = tuple(self.active_msx_palette)
+        if self._render_palette_cache is None or self._render_palette_cache[0] != palette_key:
+            slot_colors = list(palette_key) + [INVALID_TILE_COLOR, INVALID_SUPERTILE_COLOR]
+            flat_palette = []
+            for hex_color in slot_colors:
+                flat_palette.extend(channel >> 8 for channel in self.root.winfo_rgb(hex_color))
+            self._render_palette_cache = (palette_key, flat_palette)
+        return self._render_palette_cache
+
+    def _indexed_photo(self, render):
+        """The Tk photo of an IndexedRender in the current palette."""
+        return render.photo_image(*self._render_palette())
+
+    def _slot_photo(self, pixels, background_color):
+        """Tk photo of a palette-slot array whose MapRaster.BACKGROUND_SLOT pixels show background_color."""
+        background_rgb = [channel >> 8 for channel in self.root.winfo_rgb(background_color)]
+        image = Image.fromarray(pixels, "P")
+        image.putpalette(self._render_palette()[1] + background_rgb)
+        return ImageTk.PhotoImage(image)
+
+    def _tileset_atlas_photo(self):
+        """Syncs the tileset atlas and returns its Tk photo, repainting only the cells of changed tiles."""
+        atlas = self.tileset_atlas
+        changed_tiles = atlas.sync()
+        render = atlas.render
+        palette_key, palette = self._render_palette()
+        palette = palette + [channel >> 8 for channel in self.root.winfo_rgb("grey")] # Grid lines
+        if changed_tiles is None or render.photo is None or render.palette_key != palette_key \
+           or changed_tiles.size > atlas.PATCH_LIMIT:
+            render.palette_key = None # Forces a full repaint of an existing photo
+            return render.photo_image(palette_key, palette)
+        size = atlas.tile_size
+        for tile_index in changed_tiles.tolist():
+            base_x, base_y = atlas.tile_origin(tile_index)
+            cell_image = Image.fromarray(render.pixels[base_y:base_y + size, base_x:base_x + size], "P")
+            cell_image.putpalette(palette)
+            cell_photo = ImageTk.PhotoImage(cell_image)
+            self.root.tk.call(str(render.photo), "copy", str(cell_photo), "-to", base_x, base_y)
+        return render.photo
+
+    def _map_raster_palette(self, canvas):
+        """(19, 3) RGB LUT for MapRaster: the 16 palette slots, invalid tile, invalid supertile, background."""
+        palette_rgb = np.array(self._render_palette()[1], dtype=np.uint8).reshape(-1, 3)
+        try:
+            background_rgb = [channel >> 8 for channel in canvas.winfo_rgb(canvas.cget("bg"))]
+        except tk.TclError:
+            background_rgb = [0, 0, 0]
+        return np.vstack([palette_rgb, np.array([background_rgb], dtype=np.uint8)])
+
     def _hex_to_rgb7(self, hex_color):
         try:
             if not isinstance(hex_color, str):
@@ -3124,58 +4195,142 @@ class TileEditorApp:
 
     # --- Cache Management ---
     def invalidate_tile_cache(self, tile_index):
-        keys_to_remove = [k for k in self.tile_image_cache if k[0] == tile_index]
-        for key in keys_to_remove:
-            self.tile_image_cache.pop(key, None)
-        for st_index in range(len(supertiles_data)):
-            definition = supertiles_data[st_index]
-            used = False
-            # Check if definition is valid for current dimensions before iterating
-            if len(definition) == self.supertile_grid_height and \
-               (self.supertile_grid_height == 0 or (self.supertile_grid_width > 0 and len(definition[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0) :
-                for r_st_def in range(self.supertile_grid_height):
-                    # Ensure row exists (it should if height check passed)
-                    if r_st_def < len(definition):
-                        for c_st_def in range(self.supertile_grid_width):
-                             # Ensure column exists within row
-                            if c_st_def < len(definition[r_st_def]):
-                                if definition[r_st_def][c_st_def] == tile_index:
-                                    used = True
-                                    break
-                            else: # Should not happen if width check above is good
-                                _warning(f"Invalidate tile cache, ST {st_index} row {r_st_def} too short for width {self.supertile_grid_width}")
-                                break
-                    else: # Should not happen if height check passed
-                        _warning(f"Invalidate tile cache, ST {st_index} definition too short for height {self.supertile_grid_height}")
-                        break
-                    if used:
-                        break
-            else:
-                # This case indicates an inconsistency between self.supertile_grid_width/height
-                # and the actual structure of supertiles_data[st_index].
-                # This might happen if dimensions change but data isn't properly migrated/reinitialized.
-                # For now, we'll skip invalidating supertile cache if the structure is unexpected,
-                # or one could choose to invalidate all supertile caches as a precaution.
-                _error(f"Supertile {st_index} definition dimensions mismatch project settings during tile cache invalidation. Skipping ST cache invalidation for this ST.")
-                pass # Or: self.invalidate_supertile_cache(st_index) if aggressive
+        self.tile_image_cache.invalidate(tile_index)
+        # Only the supertiles that contain the tile depend on it
+        for st_index in usage_index.supertiles_using_tile(tile_index):
+            self.invalidate_supertile_cache(st_index)
 
+    def invalidate_supertile_cache(self, supertile_index):
+        self.supertile_image_cache.invalidate(supertile_index)
+        # Also invalidate corresponding entries in map_render_cache
+        self.map_render_cache.invalidate(supertile_index)
 
-            if used:
-                self.invalidate_supertile_cache(st_index)
+    def _is_tk_image_in_use(self, image):
+        """True for a Tk image shown by a widget; evicting it would blank that widget."""
+        if isinstance(image, IndexedRender):
+            image = image.photo
+        if image is None or isinstance(image, (Image.Image, np.ndarray)):
+            return False
+        try:
+            return bool(self.root.tk.call("image", "inuse", str(image)))
+        except tk.TclError:
+            return False
 
-    def invalidate_supertile_cache(self, supertile_index):
-        keys_to_remove_st_img = [
-            k for k in self.supertile_image_cache if k[0] == supertile_index
-        ]
-        for key_st_img in keys_to_remove_st_img:
-            self.supertile_image_cache.pop(key_st_img, None)
+    def benchmark_thumbnails(self, repeats=50):
+        """
+        Times the thumbnail builds that palette-slot renders replaced against the current ones.
+        The old create_tile_image and create_supertile_image decoded every output pixel through
+        tileset.pattern_rows/color_rows (tiles) or get_pixel/get_row_colors (supertiles) into a
+        hex colour string and filled a tk.PhotoImage row by row with put; those loops are kept
+        here as they were. The current path scales a palette-slot array and makes one 'P' image.
+        Both sides skip the caches.
+        """
+        palette = self.active_msx_palette
+
+        def legacy_tile_thumbnail(tile_index, size):
+            img = tk.PhotoImage(width=size, height=size)
+            pattern = tileset.pattern_rows(tile_index)
+            colors = tileset.color_rows(tile_index)
+            pixel_w_ratio = TILE_WIDTH / size
+            pixel_h_ratio = TILE_HEIGHT / size
+            for y in range(size):
+                tile_r = min(TILE_HEIGHT - 1, int(y * pixel_h_ratio))
+                try:
+                    fg_idx, bg_idx = colors[tile_r]
+                    fg_color = palette[fg_idx]
+                    bg_color = palette[bg_idx]
+                except IndexError:
+                    fg_color, bg_color = INVALID_TILE_COLOR, INVALID_TILE_COLOR
+                row_colors_hex = []
+                for x in range(size):
+                    tile_c = min(TILE_WIDTH - 1, int(x * pixel_w_ratio))
+                    try:
+                        pixel_val = pattern[tile_r][tile_c]
+                    except IndexError:
+                        pixel_val = 0
+                    row_colors_hex.append(fg_color if pixel_val == 1 else bg_color)
+                img.put("{" + " ".join(row_colors_hex) + "}", to=(0, y))
+            return img
 
-        # Also invalidate corresponding entries in map_render_cache
-        keys_to_remove_map_render = [
-            k for k in self.map_render_cache if k[0] == supertile_index
+        def legacy_supertile_thumbnail(supertile_index, width, height):
+            img = tk.PhotoImage(width=width, height=height)
+            definition = supertiles_data[supertile_index]
+            grid_w, grid_h = self.supertile_grid_width, self.supertile_grid_height
+            out_per_tile_w = width / grid_w
+            out_per_tile_h = height / grid_h
+            src_per_out_w = TILE_WIDTH / out_per_tile_w
+            src_per_out_h = TILE_HEIGHT / out_per_tile_h
+            for y in range(height):
+                row_colors_hex = []
+                for x in range(width):
+                    st_c = min(grid_w - 1, int(x / out_per_tile_w))
+                    st_r = min(grid_h - 1, int(y / out_per_tile_h))
+                    x_in_tile = (x / out_per_tile_w - st_c) * out_per_tile_w
+                    y_in_tile = (y / out_per_tile_h - st_r) * out_per_tile_h
+                    pixel_c = min(TILE_WIDTH - 1, int(x_in_tile * src_per_out_w))
+                    pixel_r = min(TILE_HEIGHT - 1, int(y_in_tile * src_per_out_h))
+                    color_hex = INVALID_TILE_COLOR
+                    try:
+                        tile_idx = int(definition[st_r, st_c])
+                        if 0 <= tile_idx < len(tileset):
+                            pixel_val = tileset.get_pixel(tile_idx, pixel_r, pixel_c)
+                            fg_idx, bg_idx = tileset.get_row_colors(tile_idx, pixel_r)
+                            if 0 <= fg_idx < len(palette) and 0 <= bg_idx < len(palette):
+                                color_hex = palette[fg_idx] if pixel_val == 1 else palette[bg_idx]
+                    except IndexError:
+                        color_hex = INVALID_TILE_COLOR
+                    row_colors_hex.append(color_hex)
+                img.put("{" + " ".join(row_colors_hex) + "}", to=(0, y))
+            return img
+
+        def slot_tile_thumbnail(tile_index, size):
+            return self._indexed_photo(IndexedRender(nearest_scale_slots(tile_slot_pixels(tile_index), size, size)))
+
+        def slot_supertile_thumbnail(supertile_index, width, height):
+            return self._indexed_photo(IndexedRender(nearest_scale_slots(supertile_slot_pixels(supertile_index), width, height)))
+
+        st_width = self.supertile_grid_width * TILE_WIDTH
+        st_height = self.supertile_grid_height * TILE_HEIGHT
+        cases = [
+            (f"Tile {VIEWER_TILE_SIZE}x{VIEWER_TILE_SIZE}", legacy_tile_thumbnail, slot_tile_thumbnail,
+             (current_tile_index, VIEWER_TILE_SIZE)),
+            (f"Supertile {st_width}x{st_height}", legacy_supertile_thumbnail, slot_supertile_thumbnail,
+             (current_supertile_index, st_width, st_height)),
+            (f"Supertile {st_width * 2}x{st_height * 2}", legacy_supertile_thumbnail, slot_supertile_thumbnail,
+             (current_supertile_index, st_width * 2, st_height * 2)),
         ]
-        for key_map_render in keys_to_remove_map_render:
-            self.map_render_cache.pop(key_map_render, None)
+        lines = [f"Per-thumbnail cost over {repeats} builds:", ""]
+        for label, legacy_build, slot_build, build_args in cases:
+            timings = []
+            for build in (legacy_build, slot_build):
+                start_time = time.perf_counter()
+                for _ in range(repeats):
+                    build(*build_args)
+                timings.append((time.perf_counter() - start_time) * 1000.0 / repeats)
+            speedup = timings[0] / timings[1] if timings[1] > 0 else float('inf')
+            lines.append(f"{label}: per-pixel decode {timings[0]:.3f} ms, palette slots {timings[1]:.3f} ms ({speedup:.1f}x)")
+        _info("\n".join(lines))
+        messagebox.showinfo("Thumbnail Benchmark", "\n".join(lines), parent=self.root)
+
+    def show_render_cache_stats(self):
+        stats = self.render_cache_budget.stats()
+        lines = [f"Budget: {stats['budget_bytes'] / (1024 * 1024):.0f} MB, in use: {stats['bytes'] / (1024 * 1024):.1f} MB", ""]
+        for name, cache_stats in stats['caches'].items():
+            lookups = cache_stats['hits'] + cache_stats['misses']
+            hit_rate = 100.0 * cache_stats['hits'] / lookups if lookups else 0.0
+            lines.append(f"{name}: {cache_stats['entries']} entries, {cache_stats['bytes'] / 1024:.0f} KB")
+            lines.append(f"    hits {cache_stats['hits']}, misses {cache_stats['misses']} ({hit_rate:.1f}% hits), evictions {cache_stats['evictions']}")
+        messagebox.showinfo("Render Cache Statistics", "\n".join(lines), parent=self.root)
+
+    def set_render_cache_budget(self):
+        current_mb = self.render_cache_budget.max_bytes // (1024 * 1024)
+        budget_mb = simpledialog.askinteger("Render Cache Budget", "Memory budget for render caches (MB):",
+                                            initialvalue=current_mb, minvalue=1, parent=self.root)
+        if budget_mb is None:
+            return
+        self.render_cache_budget.max_bytes = budget_mb * 1024 * 1024
+        self.render_cache_budget.enforce()
+        self.app_settings['render_cache_budget_mb'] = budget_mb
 
     def clear_all_caches(self):
         self.tile_image_cache.clear()
@@ -3185,44 +4340,13 @@ class TileEditorApp:
     # --- Image Generation ---
     def create_tile_image(self, tile_index, size):
         cache_key = (tile_index, size)
-        if cache_key in self.tile_image_cache:
-            return self.tile_image_cache[cache_key]
+        cached_render = self.tile_image_cache.lookup(cache_key)
+        if cached_render is not None:
+            return self._indexed_photo(cached_render)
         render_size = max(1, int(size))
-        img = tk.PhotoImage(width=render_size, height=render_size)
-        if not (0 <= tile_index < len(tileset_patterns)):
-            img.put(INVALID_TILE_COLOR, to=(0, 0, render_size, render_size))
-            self.tile_image_cache[cache_key] = img
-            return img
-        pattern = tileset_patterns[tile_index]
-        colors = tileset_colors[tile_index]
-        pixel_w_ratio = TILE_WIDTH / render_size
-        pixel_h_ratio = TILE_HEIGHT / render_size
-        for y in range(render_size):
-            tile_r = min(TILE_HEIGHT - 1, int(y * pixel_h_ratio))
-            try:
-                fg_idx, bg_idx = colors[tile_r]
-                fg_color = self.active_msx_palette[fg_idx]
-                bg_color = self.active_msx_palette[bg_idx]
-            except IndexError:
-                fg_color, bg_color = INVALID_TILE_COLOR, INVALID_TILE_COLOR
-            row_colors_hex = []
-            for x in range(render_size):
-                tile_c = min(TILE_WIDTH - 1, int(x * pixel_w_ratio))
-                try:
-                    pixel_val = pattern[tile_r][tile_c]
-                except IndexError:
-                    pixel_val = 0
-                color_hex = fg_color if pixel_val == 1 else bg_color
-                row_colors_hex.append(color_hex)
-            try:
-                img.put("{" + " ".join(row_colors_hex) + "}", to=(0, y))
-            except tk.TclError as e:
-                print(
-                    f"Warning [create_tile_image]: TclError tile {tile_index} size {size} row {y}: {e}"
-                )
-                if row_colors_hex:
-                    img.put(row_colors_hex[0], to=(0, y, render_size, y + 1))
-        self.tile_image_cache[cache_key] = img
+        render = IndexedRender(nearest_scale_slots(tile_slot_pixels(tile_index), render_size, render_size))
+        img = self._indexed_photo(render)
+        self.tile_image_cache[cache_key] = render
         return img
 
     def create_supertile_image(self, supertile_index, target_preview_width, target_preview_height): # Renamed parameters
@@ -3232,95 +4356,19 @@ class TileEditorApp:
 
         # Cache key now includes actual target dimensions and source supertile grid dimensions
         cache_key = (supertile_index, safe_target_preview_width, safe_target_preview_height, self.supertile_grid_width, self.supertile_grid_height)
-        if cache_key in self.supertile_image_cache: # Use supertile_image_cache
-            return self.supertile_image_cache[cache_key]
-
-        img = tk.PhotoImage(width=safe_target_preview_width, height=safe_target_preview_height)
+        cached_render = self.supertile_image_cache.lookup(cache_key)
+        if cached_render is not None:
+            return self._indexed_photo(cached_render)
 
-        if not (0 <= supertile_index < len(supertiles_data)):
-            img.put(INVALID_SUPERTILE_COLOR, to=(0, 0, safe_target_preview_width, safe_target_preview_height))
-            self.supertile_image_cache[cache_key] = img
-            return img
-
-        definition = supertiles_data[supertile_index]
-        src_st_tile_grid_w = self.supertile_grid_width
-        src_st_tile_grid_h = self.supertile_grid_height
-
-        if src_st_tile_grid_w <= 0 or src_st_tile_grid_h <= 0:
-            img.put(INVALID_SUPERTILE_COLOR, to=(0, 0, safe_target_preview_width, safe_target_preview_height))
-            self.supertile_image_cache[cache_key] = img
-            return img
-        
-        if len(definition) != src_st_tile_grid_h or \
-           (src_st_tile_grid_h > 0 and (len(definition[0]) != src_st_tile_grid_w)):
-            _warning(f"Supertile {supertile_index} internal dim mismatch for create_supertile_image. Expected {src_st_tile_grid_w}x{src_st_tile_grid_h}")
-            img.put(INVALID_SUPERTILE_COLOR, to=(0, 0, safe_target_preview_width, safe_target_preview_height))
-            self.supertile_image_cache[cache_key] = img
-            return img
-
-        # --- Letterboxing/Pillarboxing logic REMOVED ---
-        # The image is created with exact target dimensions, and we render directly into it.
-
-        # Pixels of one original base tile (e.g., 8x8) when rendered within the target_preview_width/height
-        output_pixels_per_base_tile_w = safe_target_preview_width / src_st_tile_grid_w
-        output_pixels_per_base_tile_h = safe_target_preview_height / src_st_tile_grid_h
-        
+        pixels = supertile_slot_pixels(supertile_index)
         # Heuristic: if rendering a source tile column/row to less than 1 pixel on average.
-        if safe_target_preview_width < src_st_tile_grid_w or safe_target_preview_height < src_st_tile_grid_h:
-             img.put(INVALID_SUPERTILE_COLOR, to=(0, 0, safe_target_preview_width, safe_target_preview_height))
-             self.supertile_image_cache[cache_key] = img
-             return img
-
-        # Ratio of source base tile pixels (e.g., TILE_WIDTH) to its display size in the preview.
-        src_pixels_per_output_pixel_w_ratio = TILE_WIDTH / output_pixels_per_base_tile_w if output_pixels_per_base_tile_w > 1e-9 else float('inf')
-        src_pixels_per_output_pixel_h_ratio = TILE_HEIGHT / output_pixels_per_base_tile_h if output_pixels_per_base_tile_h > 1e-9 else float('inf')
-
-        for y_out_preview in range(safe_target_preview_height):
-            row_colors_hex_preview = []
-            for x_out_preview in range(safe_target_preview_width):
-                src_base_tile_c_in_st_grid_preview = min(src_st_tile_grid_w - 1, int(x_out_preview / output_pixels_per_base_tile_w))
-                src_base_tile_r_in_st_grid_preview = min(src_st_tile_grid_h - 1, int(y_out_preview / output_pixels_per_base_tile_h))
-
-                x_in_scaled_base_tile_area_preview = (x_out_preview / output_pixels_per_base_tile_w - src_base_tile_c_in_st_grid_preview) * output_pixels_per_base_tile_w
-                y_in_scaled_base_tile_area_preview = (y_out_preview / output_pixels_per_base_tile_h - src_base_tile_r_in_st_grid_preview) * output_pixels_per_base_tile_h
-                
-                src_pixel_c_in_base_tile_preview = min(TILE_WIDTH - 1, int(x_in_scaled_base_tile_area_preview * src_pixels_per_output_pixel_w_ratio))
-                src_pixel_r_in_base_tile_preview = min(TILE_HEIGHT - 1, int(y_in_scaled_base_tile_area_preview * src_pixels_per_output_pixel_h_ratio))
+        if pixels is None or pixels.size == 0 or \
+           safe_target_preview_width < self.supertile_grid_width or safe_target_preview_height < self.supertile_grid_height:
+            pixels = np.full((1, 1), MapRaster.INVALID_SUPERTILE_SLOT, dtype=np.uint8)
 
-                pixel_color_hex_final_preview = INVALID_TILE_COLOR
-
-                try:
-                    tile_idx_from_st_def_preview = definition[src_base_tile_r_in_st_grid_preview][src_base_tile_c_in_st_grid_preview]
-                    if 0 <= tile_idx_from_st_def_preview < len(tileset_patterns):
-                        if not (0 <= src_pixel_r_in_base_tile_preview < TILE_HEIGHT and \
-                                len(tileset_patterns[tile_idx_from_st_def_preview]) > src_pixel_r_in_base_tile_preview and \
-                                0 <= src_pixel_c_in_base_tile_preview < TILE_WIDTH and \
-                                len(tileset_patterns[tile_idx_from_st_def_preview][src_pixel_r_in_base_tile_preview]) > src_pixel_c_in_base_tile_preview and \
-                                len(tileset_colors[tile_idx_from_st_def_preview]) > src_pixel_r_in_base_tile_preview):
-                            pixel_color_hex_final_preview = INVALID_TILE_COLOR
-                        else:
-                            pattern_pixel_val_preview = tileset_patterns[tile_idx_from_st_def_preview][src_pixel_r_in_base_tile_preview][src_pixel_c_in_base_tile_preview]
-                            fg_idx_val_preview, bg_idx_val_preview = tileset_colors[tile_idx_from_st_def_preview][src_pixel_r_in_base_tile_preview]
-                            
-                            if not (0 <= fg_idx_val_preview < len(self.active_msx_palette) and 0 <= bg_idx_val_preview < len(self.active_msx_palette)):
-                                fg_color_preview = INVALID_TILE_COLOR; bg_color_preview = INVALID_TILE_COLOR
-                            else:
-                                fg_color_preview = self.active_msx_palette[fg_idx_val_preview]
-                                bg_color_preview = self.active_msx_palette[bg_idx_val_preview]
-                            pixel_color_hex_final_preview = fg_color_preview if pattern_pixel_val_preview == 1 else bg_color_preview
-                except IndexError:
-                    pixel_color_hex_final_preview = INVALID_TILE_COLOR
-                
-                row_colors_hex_preview.append(pixel_color_hex_final_preview)
-            
-            try:
-                if safe_target_preview_width > 0:
-                    img.put("{" + " ".join(row_colors_hex_preview) + "}", to=(0, y_out_preview))
-            except tk.TclError as e:
-                if row_colors_hex_preview and safe_target_preview_width > 0:
-                    img.put(row_colors_hex_preview[0], to=(0, y_out_preview, safe_target_preview_width, y_out_preview + 1))
-        
-        self.supertile_image_cache[cache_key] = img # Store in the original cache
+        render = IndexedRender(nearest_scale_slots(pixels, safe_target_preview_width, safe_target_preview_height))
+        img = self._indexed_photo(render)
+        self.supertile_image_cache[cache_key] = render
         return img
 
     # --- Menu Creation ---
@@ -3462,6 +4510,15 @@ class TileEditorApp:
             command=self.handle_export_raw
         )
 
+        if self.root.app_debug_mode:
+            debug_menu = tk.Menu(menubar, tearoff=0)
+            menubar.add_cascade(label="Debug", menu=debug_menu)
+            debug_menu.add_command(label="Render Cache Statistics...", command=self.show_render_cache_stats)
+            debug_menu.add_command(label="Set Render Cache Budget...", command=self.set_render_cache_budget)
+            debug_menu.add_command(label="Clear Render Caches", command=self.clear_all_caches)
+            debug_menu.add_command(label="Benchmark Thumbnails...", command=self.benchmark_thumbnails)
+            debug_menu.add_command(label="Redraw Counts...", command=self.show_redraw_counts)
+
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Help", menu=help_menu)
         help_menu.add_command(label="About...", command=self.show_about_box)
@@ -4472,7 +5529,149 @@ class TileEditorApp:
             self.map_vbar.bind("<ButtonRelease-1>", self._handle_map_scroll_event)
 
     # --- Drawing Functions ---
+    # --- Change Subscribers ---
+    def _subscribe_views(self):
+        """Subscribes every view to the kinds of change it depends on (see ChangeBus)."""
+        tile_kinds = (ChangeBus.TILE_PIXELS, ChangeBus.TILE_COLORS)
+        bus = self.change_bus
+        bus.subscribe("all_views", (ChangeBus.PROJECT_STRUCTURE,), self._on_project_structure_change)
+        bus.subscribe("palette", (ChangeBus.PALETTE_SLOT,), self._on_palette_change)
+        bus.subscribe("tile_editor", tile_kinds + (ChangeBus.PALETTE_SLOT,), self._on_tile_editor_change)
+        bus.subscribe("tileset_viewer", tile_kinds + (ChangeBus.PALETTE_SLOT,), self._on_tileset_viewer_change)
+        bus.subscribe("supertile_editor", tile_kinds + (ChangeBus.SUPERTILE_DEFINITION, ChangeBus.PALETTE_SLOT),
+                      self._on_supertile_editor_change)
+        bus.subscribe("supertile_selector", tile_kinds + (ChangeBus.SUPERTILE_DEFINITION, ChangeBus.PALETTE_SLOT),
+                      self._on_supertile_selector_change)
+        bus.subscribe("map_view", tile_kinds + (ChangeBus.SUPERTILE_DEFINITION, ChangeBus.MAP_REGION, ChangeBus.PALETTE_SLOT),
+                      self._on_map_view_change)
+        bus.subscribe("minimap", tile_kinds + (ChangeBus.SUPERTILE_DEFINITION, ChangeBus.MAP_REGION, ChangeBus.PALETTE_SLOT),
+                      self._on_minimap_change)
+
+    def _current_tab_index(self):
+        try:
+            if self.notebook and self.notebook.winfo_exists():
+                selected_tab = self.notebook.select()
+                if selected_tab:
+                    return self.notebook.index(selected_tab)
+        except tk.TclError:
+            pass
+        return -1
+
+    def _supertiles_affected_by(self, events):
+        """Supertiles whose look the events change, or None when all of them may have (palette)."""
+        affected = set()
+        for kind, payload in events:
+            if kind == ChangeBus.PALETTE_SLOT:
+                return None
+            if kind in (ChangeBus.TILE_PIXELS, ChangeBus.TILE_COLORS):
+                affected.update(usage_index.supertiles_using_tile(payload))
+            elif kind == ChangeBus.SUPERTILE_DEFINITION:
+                affected.add(payload)
+        return affected
+
+    def _on_project_structure_change(self, events):
+        self.update_all_displays(changed_level="all")
+        return True
+
+    def _on_palette_change(self, events):
+        self.draw_current_palette()
+        self.update_palette_info_labels()
+        return True
+
+    def _on_tile_editor_change(self, events):
+        if self._current_tab_index() != 1:
+            return False
+        palette_changed = any(kind == ChangeBus.PALETTE_SLOT for kind, _ in events)
+        if not palette_changed and all(payload != current_tile_index for _, payload in events):
+            return False
+        self.draw_editor_canvas()
+        self.draw_attribute_editor()
+        if palette_changed:
+            self.draw_palette()
+        self._update_selected_tile_info_panel(update_usage_counts=False)
+        return True
+
+    def _on_tileset_viewer_change(self, events):
+        current_tab_index = self._current_tab_index()
+        if current_tab_index == 1:
+            self.draw_tileset_viewer(self.tileset_canvas, current_tile_index)
+        elif current_tab_index == 2:
+            self.draw_tileset_viewer(self.st_tileset_canvas, selected_tile_for_supertile)
+        else:
+            return False
+        return True
+
+    def _on_supertile_editor_change(self, events):
+        if self._current_tab_index() != 2:
+            return False
+        affected = self._supertiles_affected_by(events)
+        if affected is not None and current_supertile_index not in affected:
+            return False
+        self.draw_supertile_definition_canvas()
+        self._update_selected_supertile_info_panel()
+        self._update_st_tab_selected_tile_info_panel()
+        return True
+
+    def _on_supertile_selector_change(self, events):
+        current_tab_index = self._current_tab_index()
+        if current_tab_index not in (2, 3) or self._supertiles_affected_by(events) == set():
+            return False
+        if current_tab_index == 2:
+            self.draw_supertile_selector(self.supertile_selector_canvas, current_supertile_index)
+        else:
+            self.draw_supertile_selector(self.map_supertile_selector_canvas, selected_supertile_for_map)
+        return True
+
+    def _changed_map_cells(self, events):
+        """Map cells named by the events' MAP_REGION payloads, or None past a full-redraw threshold."""
+        cells = []
+        for kind, payload in events:
+            if kind == ChangeBus.MAP_REGION:
+                row, col, height, width = payload
+                if len(cells) + height * width > 64:
+                    return None
+                cells.extend((r, c) for r in range(row, row + height) for c in range(col, col + width))
+        return cells
+
+    def _affects_placed_supertiles(self, events):
+        affected = self._supertiles_affected_by([event for event in events if event[0] != ChangeBus.MAP_REGION])
+        return affected is None or any(usage_index.supertile_placement_count(st) > 0 for st in affected
+                                       if 0 <= st < len(supertiles_data))
+
+    def _on_map_view_change(self, events):
+        if self._current_tab_index() != 3:
+            return False
+        cells = self._changed_map_cells(events)
+        if cells is None or self._affects_placed_supertiles(events):
+            self.draw_map_canvas()
+        elif cells:
+            self._repaint_map_cells(cells)
+        else:
+            return False
+        return True
+
+    def _on_minimap_change(self, events):
+        if self.minimap_window is None or not tk.Toplevel.winfo_exists(self.minimap_window):
+            return False
+        if self._affects_placed_supertiles(events):
+            self.invalidate_minimap_background_cache()
+        elif not any(kind == ChangeBus.MAP_REGION for kind, _ in events):
+            return False
+        self.draw_minimap()
+        return True
+
+    def show_redraw_counts(self):
+        """Shows how many view redraws each command (or edit stroke) has triggered."""
+        lines = []
+        for source, view_counts in sorted(self.change_bus.redraw_counts.items()):
+            total = sum(view_counts.values())
+            details = ", ".join(f"{view} {count}" for view, count in sorted(view_counts.items()))
+            lines.append(f"{source or '(unnamed)'}: {total} ({details})")
+        messagebox.showinfo("Redraw Counts", "\n".join(lines) or "No redraws recorded yet.", parent=self.root)
+
     def update_all_displays(self, changed_level="all"):
+        if changed_level == "all":
+            self.change_bus.discard() # Everything visible is redrawn anyway
         current_tab_index = -1
         try:
             if self.notebook and self.notebook.winfo_exists():
@@ -4531,10 +5730,10 @@ class TileEditorApp:
     # ... (draw_editor_canvas, draw_attribute_editor, draw_palette unchanged) ...
     def draw_editor_canvas(self):
         self.editor_canvas.delete("all")
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        if not (0 <= current_tile_index < len(tileset)):
             return
-        pattern = tileset_patterns[current_tile_index]
-        colors = tileset_colors[current_tile_index]
+        pattern = tileset.pattern_rows(current_tile_index)
+        colors = tileset.color_rows(current_tile_index)
         for r in range(TILE_HEIGHT):
             try:
                 fg_idx, bg_idx = colors[r]
@@ -4557,9 +5756,9 @@ class TileEditorApp:
                 )
 
     def draw_attribute_editor(self):
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        if not (0 <= current_tile_index < len(tileset)):
             return
-        colors = tileset_colors[current_tile_index]
+        colors = tileset.color_rows(current_tile_index)
         for r in range(TILE_HEIGHT):
             try:
                 fg_idx, bg_idx = colors[r]
@@ -4718,21 +5917,16 @@ class TileEditorApp:
     def draw_tileset_viewer(self, canvas, highlighted_tile_index):
         """Draws tileset viewer, highlighting selected, dragged, or unused tile."""
         _debug(f"\n--- DRAW: draw_tileset_viewer called for canvas {canvas._name}.")
-        _debug(f"\n--- DRAW: draw_tileset_viewer called. Drawing {len(tileset_patterns)} tiles.")
+        _debug(f"\n--- DRAW: draw_tileset_viewer called. Atlas of {len(tileset)} tiles.")
         _debug(f"--- DRAW: AT THIS MOMENT, self.marked_unused_tiles is: {self.marked_unused_tiles}")
 
         is_dragging_tile = self.drag_active and self.drag_item_type == "tile"
         dragged_tile_index = self.drag_start_index if is_dragging_tile else -1
 
         try:
-            canvas.delete("all")
-            padding = 1
-            size = VIEWER_TILE_SIZE
-            max_rows = math.ceil(len(tileset_patterns) / NUM_TILES_ACROSS)
-            canvas_height = max(1, max_rows * (size + padding) + padding)  
-            canvas_width = max(
-                1, NUM_TILES_ACROSS * (size + padding) + padding
-            )  
+            atlas = self.tileset_atlas
+            atlas_photo = self._tileset_atlas_photo()
+            canvas_width, canvas_height = atlas.atlas_size(len(tileset))
             str_scroll = f"0 0 {float(canvas_width)} {float(canvas_height)}"
 
             current_scroll = ""
@@ -4748,46 +5942,44 @@ class TileEditorApp:
             if current_scroll != str_scroll:
                 canvas.config(scrollregion=(0, 0, canvas_width, canvas_height))
 
-            for i in range(len(tileset_patterns)):
-                tile_r, tile_c = divmod(i, NUM_TILES_ACROSS)
-                base_x = tile_c * (size + padding) + padding
-                base_y = tile_r * (size + padding) + padding
-
-                img = self.create_tile_image(i, size)
-                canvas.create_image(
-                    base_x,
-                    base_y,
-                    image=img,
-                    anchor=tk.NW,
-                    tags=(f"tile_img_{i}", "tile_image"),
+            # The atlas image and the overlays persist between draws; they are only moved or re-pointed
+            items = self.tileset_viewer_items.get(str(canvas))
+            if items is None or not canvas.find_withtag(items["atlas"]):
+                canvas.delete("all")
+                items = {
+                    "atlas": canvas.create_image(0, 0, image=atlas_photo, anchor=tk.NW, tags="tileset_atlas"),
+                    "photo": atlas_photo,
+                    "highlight": canvas.create_rectangle(0, 0, 0, 0, outline="red", width=2, state=tk.HIDDEN, tags="tile_highlight"),
+                    "drag": canvas.create_rectangle(0, 0, 0, 0, outline="yellow", width=3, state=tk.HIDDEN, tags="tile_drag_highlight"),
+                    "unused": {},
+                }
+                self.tileset_viewer_items[str(canvas)] = items
+            elif items["photo"] is not atlas_photo:
+                canvas.itemconfig(items["atlas"], image=atlas_photo)
+                items["photo"] = atlas_photo
+
+            num_tiles = len(tileset)
+            for item_id, tile_index in ((items["highlight"], highlighted_tile_index), (items["drag"], dragged_tile_index)):
+                if 0 <= tile_index < num_tiles and not (item_id == items["highlight"] and tile_index == dragged_tile_index):
+                    canvas.coords(item_id, *atlas.cell_box(tile_index))
+                    canvas.itemconfig(item_id, state=tk.NORMAL)
+                else:
+                    canvas.itemconfig(item_id, state=tk.HIDDEN)
+
+            unused_marks = items["unused"]
+            marked_tiles = {i for i in self.marked_unused_tiles
+                            if 0 <= i < num_tiles and i != highlighted_tile_index and i != dragged_tile_index}
+            for tile_index in set(unused_marks) - marked_tiles:
+                canvas.delete(unused_marks.pop(tile_index))
+            for tile_index in marked_tiles - set(unused_marks):
+                unused_marks[tile_index] = canvas.create_rectangle(
+                    *atlas.cell_box(tile_index), outline="blue", width=3, tags="tile_unused_mark"
                 )
 
-                outline_color = "grey" 
-                outline_width = 1
-                if i == dragged_tile_index:
-                    outline_color = "yellow" 
-                    outline_width = 3
-                elif i == highlighted_tile_index:
-                    outline_color = "red"
-                    outline_width = 2
-                elif i in self.marked_unused_tiles:
-                    _debug(f"--- DRAW: Highlighting tile {i} because it's in the marked set.")
-                    outline_color = "blue"
-                    outline_width = 3
-
-                bx1 = max(0, base_x - padding / 2)
-                by1 = max(0, base_y - padding / 2)
-                bx2 = base_x + size + padding / 2
-                by2 = base_y + size + padding / 2
-                canvas.create_rectangle(
-                    bx1,
-                    by1,
-                    bx2,
-                    by2,
-                    outline=outline_color,
-                    width=outline_width,
-                    tags=f"tile_border_{i}",
-                )
+            canvas.tag_raise("tile_unused_mark")
+            canvas.tag_raise("tile_highlight")
+            canvas.tag_raise("tile_drag_highlight")
+            canvas.tag_raise("drop_indicator")
 
         except tk.TclError as e:
             print(f"TclError during draw_tileset_viewer: {e}")
@@ -4795,7 +5987,7 @@ class TileEditorApp:
             _error(f"Unexpected error during draw_tileset_viewer: {e}")
 
     def update_tile_info_label(self):
-        self.tile_info_label.config(text=f"Tiles: {len(tileset_patterns)} /")
+        self.tile_info_label.config(text=f"Tiles: {len(tileset)} /")
 
     def _update_supertile_info_label(self):
         self.supertile_sel_info_label.config(text=f"Supertiles: {len(supertiles_data)} /")
@@ -4811,7 +6003,7 @@ class TileEditorApp:
         # Ensure definition has expected structure based on current project dimensions
         # This is a safeguard. Data should ideally be consistent.
         _debug(f"Definition: {str(definition)}")
-        if not definition or len(definition) != self.supertile_grid_height or \
+        if len(definition) == 0 or len(definition) != self.supertile_grid_height or \
            (self.supertile_grid_height > 0 and (len(definition[0]) != self.supertile_grid_width)):
             _error(f"Supertile {current_supertile_index} definition dimensions mismatch in draw_supertile_definition_canvas.")
             # Optionally draw an error indicator on the canvas
@@ -4826,7 +6018,7 @@ class TileEditorApp:
         for r_def in range(self.supertile_grid_height):
             for c_def in range(self.supertile_grid_width):
                 try:
-                    tile_idx = definition[r_def][c_def]
+                    tile_idx = int(definition[r_def, c_def])
                 except IndexError: # Should be caught by the check above, but for safety
                     _error(f"Error drawing ST def: index out of bounds for ST {current_supertile_index} at {r_def},{c_def}")
                     tile_idx = 0 # Default to tile 0 on error
@@ -4849,7 +6041,6 @@ class TileEditorApp:
         try:
             if not canvas.winfo_exists():
                 return
-            canvas.delete("all") # Clear previous items
             
             item_pixel_w = self.supertile_grid_width * TILE_WIDTH
             item_pixel_h = self.supertile_grid_height * TILE_HEIGHT
@@ -4918,40 +6109,83 @@ class TileEditorApp:
 
             _debug(f" draw_supertile_selector: Drawing rows {start_draw_row} to {end_draw_row-1}")
 
-
-            for r_grid in range(start_draw_row, end_draw_row):
-                for c_grid in range(items_across):
-                    st_idx = r_grid * items_across + c_grid
-                    if st_idx >= len(supertiles_data): break
-
-                    base_x = (c_grid * (item_pixel_w + padding)) + padding
-                    base_y = (r_grid * (item_pixel_h + padding)) + padding
-
-                    img = self.create_supertile_image(st_idx, item_pixel_w, item_pixel_h) 
-                    
-                    if not canvas.winfo_exists(): return
-                    canvas.create_image(
-                        base_x, base_y, image=img, anchor=tk.NW, tags=(f"st_img_{st_idx}", "st_image")
-                    )
-
-                    outline_color = "grey"; outline_width = 1
-                    if st_idx == dragged_supertile_index: outline_color = "yellow"; outline_width = 3
-                    elif st_idx == highlighted_supertile_index: outline_color = "red"; outline_width = 2
-                    elif st_idx in self.marked_unused_supertiles: outline_color = "blue"; outline_width = 3
-                    
-                    bx1 = base_x - (padding / 2 if padding > 0 else 0.5) 
-                    by1 = base_y - (padding / 2 if padding > 0 else 0.5)
-                    bx2 = base_x + item_pixel_w + (padding / 2 if padding > 0 else 0.5)
-                    by2 = base_y + item_pixel_h + (padding / 2 if padding > 0 else 0.5)
-                    
-                    if not canvas.winfo_exists(): return
-                    canvas.create_rectangle(
-                        bx1, by1, bx2, by2, outline=outline_color, width=outline_width, tags=f"st_border_{st_idx}"
-                    )
-                if st_idx >= len(supertiles_data) -1 : break # Break outer loop if all STs processed
+            # Only the visible slots get items: a pool of image/border pairs, recycled on every draw
+            # and grown only when the viewport shows more slots than ever before
+            pool = self.supertile_selector_pools.get(str(canvas))
+            if pool is None or (pool and not canvas.find_withtag(pool[0][0])):
+                canvas.delete("st_image", "st_border")
+                pool = []
+                self.supertile_selector_pools[str(canvas)] = pool
+
+            visible_indices = range(start_draw_row * items_across, min(len(supertiles_data), end_draw_row * items_across))
+            while len(pool) < len(visible_indices):
+                pool.append((canvas.create_image(0, 0, anchor=tk.NW, tags="st_image"),
+                             canvas.create_rectangle(0, 0, 0, 0, tags="st_border")))
+
+            for (image_id, border_id), st_idx in zip(pool, visible_indices):
+                r_grid, c_grid = divmod(st_idx, items_across)
+                base_x = (c_grid * (item_pixel_w + padding)) + padding
+                base_y = (r_grid * (item_pixel_h + padding)) + padding
+
+                img = self.create_supertile_image(st_idx, item_pixel_w, item_pixel_h) 
+                canvas.coords(image_id, base_x, base_y)
+                canvas.itemconfig(image_id, image=img, state=tk.NORMAL)
+
+                outline_color = "grey"; outline_width = 1
+                if st_idx == dragged_supertile_index: outline_color = "yellow"; outline_width = 3
+                elif st_idx == highlighted_supertile_index: outline_color = "red"; outline_width = 2
+                elif st_idx in self.marked_unused_supertiles: outline_color = "blue"; outline_width = 3
+                
+                bx1 = base_x - (padding / 2 if padding > 0 else 0.5) 
+                by1 = base_y - (padding / 2 if padding > 0 else 0.5)
+                bx2 = base_x + item_pixel_w + (padding / 2 if padding > 0 else 0.5)
+                by2 = base_y + item_pixel_h + (padding / 2 if padding > 0 else 0.5)
+                canvas.coords(border_id, bx1, by1, bx2, by2)
+                canvas.itemconfig(border_id, outline=outline_color, width=outline_width, state=tk.NORMAL)
+
+            for image_id, border_id in pool[len(visible_indices):]:
+                canvas.itemconfig(image_id, state=tk.HIDDEN)
+                canvas.itemconfig(border_id, state=tk.HIDDEN)
+
+            canvas.tag_raise("drop_indicator")
         except tk.TclError as e: _error(f" TclError in draw_supertile_selector: {e}")
         except Exception as e: _error(f" Unexpected error in draw_supertile_selector: {e}")
 
+    def _repaint_map_cells(self, cells):
+        """
+        Re-renders only the given map cells' rectangles of the displayed viewport image. Falls back
+        to draw_map_canvas when there is no viewport image at the current scroll position to patch.
+        """
+        canvas = self.map_canvas
+        if not canvas.winfo_exists():
+            return
+        photo = self.tk_map_photoimage
+        view_x = int(canvas.canvasx(0))
+        view_y = int(canvas.canvasy(0))
+        try:
+            image_xy = canvas.coords("map_render_image")[:2]
+        except tk.TclError:
+            image_xy = []
+        if photo is None or self.pil_map_viewport_image is None or image_xy != [view_x, view_y]:
+            self.draw_map_canvas()
+            return
+
+        zoomed_tile_size = self.get_zoomed_tile_size()
+        zoomed_st_w, zoomed_st_h = self._get_zoomed_supertile_pixel_dims()
+        palette_rgb = self._map_raster_palette(canvas)
+        view_w, view_h = self.pil_map_viewport_image.size
+        for r_map, c_map in cells:
+            x1 = max(c_map * zoomed_st_w, view_x)
+            y1 = max(r_map * zoomed_st_h, view_y)
+            x2 = min((c_map + 1) * zoomed_st_w, view_x + view_w)
+            y2 = min((r_map + 1) * zoomed_st_h, view_y + view_h)
+            if x1 >= x2 or y1 >= y2:
+                continue # Cell is outside the viewport
+            patch = self.map_raster.render_viewport(x1, y1, x2 - x1, y2 - y1, zoomed_tile_size, palette_rgb)
+            self.pil_map_viewport_image.paste(patch, (x1 - view_x, y1 - view_y))
+            patch_photo = ImageTk.PhotoImage(patch)
+            self.root.tk.call(str(photo), "copy", str(patch_photo), "-to", x1 - view_x, y1 - view_y)
+
     def draw_map_canvas(self):
         canvas = self.map_canvas
         if not canvas.winfo_exists():
@@ -5014,77 +6248,27 @@ class TileEditorApp:
         _debug(f" draw_map_canvas: Viewport WxH: {canvas_viewport_width}x{canvas_viewport_height}, Content scroll: ({view_content_x1:.1f}, {view_content_y1:.1f})")
 
 
-        # --- 4. Create/Resize Pillow Viewport Image Buffer ---
-        # self.pil_map_viewport_image stores the Pillow Image
-        # self.tk_map_photoimage stores the Tk PhotoImage for display (and keeps a reference)
-        if self.pil_map_viewport_image is None or \
-           self.pil_map_viewport_image.width != canvas_viewport_width or \
-           self.pil_map_viewport_image.height != canvas_viewport_height:
-            try:
-                self.pil_map_viewport_image = Image.new('RGB', 
-                                                        (max(1,canvas_viewport_width), max(1,canvas_viewport_height)), 
-                                                        canvas.cget("bg")) # Fill with canvas BG
-                _debug(f" draw_map_canvas: Created/Resized self.pil_map_viewport_image to {canvas_viewport_width}x{canvas_viewport_height}")
-            except ValueError as e_pil_new:
-                _error(f" draw_map_canvas: Error creating pil_map_viewport_image: {e_pil_new}")
-                return
-        else:
-            # Fill existing image with background color
-            try:
-                self.pil_map_viewport_image.paste(canvas.cget("bg"), (0,0,canvas_viewport_width,canvas_viewport_height) )
-            except Exception as e_fill: # Catch potential errors if canvas.cget("bg") is not a valid color for paste
-                _error(f" draw_map_canvas: Error filling pil_map_viewport_image: {e_fill}. Filling with black.")
-                self.pil_map_viewport_image.paste("black", (0,0,canvas_viewport_width,canvas_viewport_height) )
-
-
-        # --- 5. Determine Visible Supertile Range & Composite onto Pillow Viewport Image ---
-        start_st_col = max(0, int(view_content_x1 // zoomed_supertile_pixel_width))
-        start_st_row = max(0, int(view_content_y1 // zoomed_supertile_pixel_height))
-        
-        # End column/row (exclusive) needed to cover the viewport
-        end_st_col = min(map_width, int(math.ceil((view_content_x1 + canvas_viewport_width) / zoomed_supertile_pixel_width)))
-        end_st_row = min(map_height, int(math.ceil((view_content_y1 + canvas_viewport_height) / zoomed_supertile_pixel_height)))
-        
-        _debug(f" draw_map_canvas: Visible STs - Cols: {start_st_col}-{end_st_col-1}, Rows: {start_st_row}-{end_st_row-1}")
-
-        rendered_st_count = 0
-        for r_map in range(start_st_row, end_st_row):
-            for c_map in range(start_st_col, end_st_col):
-                if not (0 <= r_map < map_height and 0 <= c_map < map_width): # Should be redundant due to loop bounds
-                    continue
-                
-                try:
-                    supertile_idx = map_data[r_map][c_map]
-                    
-                    # Get the scaled Pillow Image for this supertile
-                    pil_supertile_render = self.create_map_render_of_supertile(
-                        supertile_idx, 
-                        round(zoomed_supertile_pixel_width), # Pass rounded int sizes
-                        round(zoomed_supertile_pixel_height)
-                    )
-
-                    if pil_supertile_render:
-                        # Calculate paste position on the pil_map_viewport_image
-                        # Target X,Y on the viewport image is the ST's content position MINUS the scroll offset
-                        content_st_x = c_map * zoomed_supertile_pixel_width
-                        content_st_y = r_map * zoomed_supertile_pixel_height
-                        
-                        paste_x_on_viewport_img = round(content_st_x - view_content_x1)
-                        paste_y_on_viewport_img = round(content_st_y - view_content_y1)
-                        
-                        # Paste (Pillow handles clipping if ST partially outside viewport bounds for paste)
-                        self.pil_map_viewport_image.paste(pil_supertile_render, (paste_x_on_viewport_img, paste_y_on_viewport_img))
-                        rendered_st_count +=1
-                except IndexError:
-                    _error(f" draw_map_canvas: IndexError for map_data[{r_map}][{c_map}]")
-                except Exception as e_render_st:
-                    _error(f" draw_map_canvas: Error rendering/pasting ST ({r_map},{c_map}): {e_render_st}")
-        
-        _debug(f" draw_map_canvas: Rendered {rendered_st_count} supertiles onto Pillow viewport image.")
+        # --- 4. Render the Visible Part of the Map Raster ---
+        # Crop + nearest-neighbour scale + palette LUT; cost depends on the viewport size only
+        try:
+            self.pil_map_viewport_image = self.map_raster.render_viewport(
+                int(view_content_x1), int(view_content_y1),
+                canvas_viewport_width, canvas_viewport_height,
+                zoomed_tile_size, self._map_raster_palette(canvas)
+            )
+        except Exception as e_render:
+            _error(f" draw_map_canvas: Error rendering map raster viewport: {e_render}")
+            return
+        self._schedule_map_pyramid_build()
 
-        # --- 6. Convert Pillow Viewport Image to Tk PhotoImage and Display ---
+        # --- 5. Convert Pillow Viewport Image to Tk PhotoImage and Display ---
         try:
-            self.tk_map_photoimage = ImageTk.PhotoImage(self.pil_map_viewport_image)
+            # Reuse the PhotoImage while the viewport size is unchanged
+            if self.tk_map_photoimage is not None and \
+               (self.tk_map_photoimage.width(), self.tk_map_photoimage.height()) == self.pil_map_viewport_image.size:
+                self.tk_map_photoimage.paste(self.pil_map_viewport_image)
+            else:
+                self.tk_map_photoimage = ImageTk.PhotoImage(self.pil_map_viewport_image)
         except Exception as e_photoimg:
             _error(f" draw_map_canvas: Error converting PIL to Tk PhotoImage: {e_photoimg}")
             return
@@ -5101,7 +6285,7 @@ class TileEditorApp:
             _debug(f" draw_map_canvas: TclError creating canvas image: {e_create_img}")
 
 
-        # --- 7. Re-draw Overlays (Grid, Selection, Window View, Paste Preview, HIGHLIGHTS) ---
+        # --- 6. Re-draw Overlays (Grid, Selection, Window View, Paste Preview, HIGHLIGHTS) ---
         # These are drawn directly on the canvas, on top of the "map_render_image".
         
         canvas.delete("supertile_grid") # Delete old grid lines
@@ -5193,12 +6377,24 @@ class TileEditorApp:
             canvas.tag_raise(self.map_paste_preview_rect_id)
 
 
-        # --- 8. Update Zoom Label ---
+        # --- 7. Update Zoom Label ---
         if hasattr(self, 'map_zoom_label') and self.map_zoom_label.winfo_exists():
             self.map_zoom_label.config(text=f"{int(self.map_zoom_level * 100)}%")
         
         _debug(" draw_map_canvas: End.")
 
+    def _schedule_map_pyramid_build(self):
+        """Builds the missing zoomed-out levels of the map raster, one band of rows per idle callback."""
+        if self.map_pyramid_job is not None or self.map_raster.pyramid_complete():
+            return
+
+        def build_step():
+            self.map_pyramid_job = None
+            if self.map_raster.build_next_level():
+                self._schedule_map_pyramid_build()
+
+        self.map_pyramid_job = self.root.after_idle(build_step)
+
     def update_map_info_labels(self):
         self.map_size_label.config(text=f"{map_width} x {map_height}")
         self.map_supertile_select_label.config(
@@ -5372,7 +6568,6 @@ class TileEditorApp:
                     selected_color_index = WHITE_IDX
                     # These side-effects are still needed here because they are
                     # specific to this high-level "reset" action.
-                    self.clear_all_caches()
                     self.invalidate_minimap_background_cache()
                     self._request_color_usage_refresh()
                     self._request_tile_usage_refresh()
@@ -5393,7 +6588,7 @@ class TileEditorApp:
     # --- Tile Editor Handlers ---
     def handle_editor_click(self, event):
         global last_drawn_pixel, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        if not (0 <= current_tile_index < len(tileset)):
             return
         
         self.pending_command_list.clear()
@@ -5402,24 +6597,19 @@ class TileEditorApp:
         r = event.y // EDITOR_PIXEL_SIZE
 
         if 0 <= r < TILE_HEIGHT and 0 <= c < TILE_WIDTH:
-            if r >= len(tileset_patterns[current_tile_index]) or c >= len(tileset_patterns[current_tile_index][r]):
-                _debug(f"Editor click out of pattern bounds for tile {current_tile_index} at {r},{c}")
-                last_drawn_pixel = (r, c)
-                return
-
             pixel_value_to_set = 1 if event.num == 1 else 0
             
-            if tileset_patterns[current_tile_index][r][c] != pixel_value_to_set:
+            if tileset.get_pixel(current_tile_index, r, c) != pixel_value_to_set:
                 command = PaintPixelCommand(self, current_tile_index, r, c, pixel_value_to_set)
                 command.execute() # Apply change immediately for visual feedback
                 self.pending_command_list.append(command)
-                self.update_all_displays(changed_level="tile_edit")
+                self.change_bus.flush(command.description)
                 
             last_drawn_pixel = (r, c)
 
     def handle_editor_drag(self, event):
         global last_drawn_pixel, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        if not (0 <= current_tile_index < len(tileset)):
             return
         
         self.is_currently_painting_tile = True 
@@ -5428,12 +6618,6 @@ class TileEditorApp:
 
         if 0 <= r < TILE_HEIGHT and 0 <= c < TILE_WIDTH:
             if (r, c) != last_drawn_pixel:
-                # This critical bounds check is preserved.
-                if r >= len(tileset_patterns[current_tile_index]) or c >= len(tileset_patterns[current_tile_index][r]):
-                    _debug(f"Editor drag out of pattern bounds for tile {current_tile_index} at {r},{c}")
-                    last_drawn_pixel = (r, c)
-                    return
-
                 pixel_value_to_set = -1
                 if event.state & 0x100: # Left mouse button drag
                     pixel_value_to_set = 1
@@ -5441,12 +6625,12 @@ class TileEditorApp:
                     pixel_value_to_set = 0
                 
                 if (pixel_value_to_set != -1 and
-                    tileset_patterns[current_tile_index][r][c] != pixel_value_to_set):
+                    tileset.get_pixel(current_tile_index, r, c) != pixel_value_to_set):
                   
                     command = PaintPixelCommand(self, current_tile_index, r, c, pixel_value_to_set)
                     command.execute() # Apply change immediately for visual feedback
                     self.pending_command_list.append(command)
-                    self.update_all_displays(changed_level="tile_edit")
+                    self.change_bus.flush(command.description)
 
                 last_drawn_pixel = (r, c)
 
@@ -5477,19 +6661,15 @@ class TileEditorApp:
             self.single_click_timer = self.root.after(250, lambda: select_color(clicked_index))
 
     def set_row_color(self, row, fg_or_bg):
-        global tileset_colors, current_tile_index, selected_color_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        global current_tile_index, selected_color_index
+        if not (0 <= current_tile_index < len(tileset)):
             return
         if not (0 <= selected_color_index < 16):
             messagebox.showwarning("Set Row Color", "No valid color selected from palette.", parent=self.root)
             return
             
         if 0 <= row < TILE_HEIGHT:
-            if row >= len(tileset_colors[current_tile_index]):
-                _error(f"Row {row} out of bounds for tile {current_tile_index} color data.")
-                return
-
-            current_fg_idx, current_bg_idx = tileset_colors[current_tile_index][row]
+            current_fg_idx, current_bg_idx = tileset.get_row_colors(current_tile_index, row)
             changed = False
             
             if fg_or_bg == "fg" and current_fg_idx != selected_color_index:
@@ -5523,7 +6703,7 @@ class TileEditorApp:
             if canvas.winfo_exists(): canvas.config(cursor="")
         except tk.TclError: pass
 
-        if 0 <= clicked_index < len(tileset_patterns):
+        if 0 <= clicked_index < len(tileset):
             self.drag_item_type = "tile"
             self.drag_start_index = clicked_index
             self.drag_press_x = event.x 
@@ -5532,172 +6712,93 @@ class TileEditorApp:
             # self.drag_active is NOT set to True here
 
     def flip_tile_horizontal(self):
-        global tileset_patterns, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        global current_tile_index
+        if not (0 <= current_tile_index < len(tileset)):
             return
 
-        command = TransformCommand("Flip Tile Horizontal", self, tileset_patterns, current_tile_index, self.invalidate_tile_cache)
+        command = TransformCommand("Flip Tile Horizontal", self, tileset, current_tile_index, self.invalidate_tile_cache)
 
-        # Original flip logic (modifies global state)
-        current_pattern = tileset_patterns[current_tile_index]
-        new_pattern = [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-        for r in range(TILE_HEIGHT):
-            new_pattern[r] = current_pattern[r][::-1]
-        tileset_patterns[current_tile_index] = new_pattern
+        # Mirror the bit order of every pattern byte
+        pattern_bits = tileset.pixel_bits([current_tile_index])[0]
+        tileset.patterns[current_tile_index] = np.packbits(pattern_bits[:, ::-1], axis=1).reshape(TILE_HEIGHT)
         
         # Capture the result of the modification
         command.capture_new_state()
         self.undo_manager.execute(command)
 
     def flip_tile_vertical(self):
-        global tileset_patterns, tileset_colors, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        global current_tile_index
+        if not (0 <= current_tile_index < len(tileset)):
             return
 
-        # Create a command for each data list that will be changed
-        pattern_command = TransformCommand("Flip Tile Vertical", self, tileset_patterns, current_tile_index, self.invalidate_tile_cache)
-        color_command = TransformCommand("Flip Tile Vertical", self, tileset_colors, current_tile_index, self.invalidate_tile_cache)
+        command = TransformCommand("Flip Tile Vertical", self, tileset, current_tile_index, self.invalidate_tile_cache)
 
-        # Original flip logic
-        tileset_patterns[current_tile_index].reverse()
-        tileset_colors[current_tile_index].reverse()
-        
-        # Capture the new state for both commands
-        pattern_command.capture_new_state()
-        color_command.capture_new_state()
+        # Rows carry their colors with them
+        tileset.patterns[current_tile_index] = tileset.patterns[current_tile_index][::-1]
+        tileset.colors[current_tile_index] = tileset.colors[current_tile_index][::-1]
         
-        # Group them into a single undoable action
-        composite_command = CompositeCommand("Flip Tile Vertical", [pattern_command, color_command])
-        self.undo_manager.execute(composite_command)
+        command.capture_new_state()
+        self.undo_manager.execute(command)
 
     def rotate_tile_90cw(self):
-        global tileset_patterns, tileset_colors, current_tile_index, WHITE_IDX, BLACK_IDX
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        global current_tile_index
+        if not (0 <= current_tile_index < len(tileset)):
             return
 
-        pattern_command = TransformCommand("Rotate Tile", self, tileset_patterns, current_tile_index, self.invalidate_tile_cache)
-        color_command = TransformCommand("Rotate Tile", self, tileset_colors, current_tile_index, self.invalidate_tile_cache)
+        command = TransformCommand("Rotate Tile", self, tileset, current_tile_index, self.invalidate_tile_cache)
 
-        # Original rotate logic
-        current_pattern = tileset_patterns[current_tile_index]
-        new_pattern = [[0 for _ in range(TILE_WIDTH)] for _ in range(TILE_HEIGHT)]
-        for r in range(TILE_HEIGHT):
-            for c in range(TILE_WIDTH):
-                new_pattern[c][(TILE_HEIGHT - 1) - r] = current_pattern[r][c]
-        tileset_patterns[current_tile_index] = new_pattern
-        tileset_colors[current_tile_index] = [
-            (WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)
-        ]  
+        pattern_bits = tileset.pixel_bits([current_tile_index])[0]
+        tileset.patterns[current_tile_index] = np.packbits(np.rot90(pattern_bits, k=-1), axis=1).reshape(TILE_HEIGHT)
+        tileset.colors[current_tile_index] = TilesetStore.BLANK_COLOR_BYTE
         
-        pattern_command.capture_new_state()
-        color_command.capture_new_state()
-
-        composite_command = CompositeCommand("Rotate Tile", [pattern_command, color_command])
-        self.undo_manager.execute(composite_command)
+        command.capture_new_state()
+        self.undo_manager.execute(command)
         
         messagebox.showinfo(
             "Rotation Complete", "Tile rotated.\nRow colors have been reset to default."
         )
 
-    def shift_tile_up(self):
-        global tileset_patterns, tileset_colors, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+    def _shift_tile_rows(self, description, row_shift):
+        global current_tile_index
+        if not (0 <= current_tile_index < len(tileset)):
             messagebox.showwarning("Shift Tile", "No valid tile selected to shift.", parent=self.root)
             return
-        if not (len(tileset_patterns[current_tile_index]) == TILE_HEIGHT and 
-                len(tileset_colors[current_tile_index]) == TILE_HEIGHT):
-            _error(f"Tile {current_tile_index} data is malformed. Cannot shift up.")
-            messagebox.showerror("Shift Error", f"Tile {current_tile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
 
-        pattern_command = TransformCommand("Shift Tile Up", self, tileset_patterns, current_tile_index, self.invalidate_tile_cache)
-        color_command = TransformCommand("Shift Tile Up", self, tileset_colors, current_tile_index, self.invalidate_tile_cache)
+        command = TransformCommand(description, self, tileset, current_tile_index, self.invalidate_tile_cache)
 
-        current_pattern = tileset_patterns[current_tile_index]
-        current_colors = tileset_colors[current_tile_index]
-        first_pattern_row = current_pattern.pop(0)
-        first_color_row = current_colors.pop(0)
-        current_pattern.append(first_pattern_row)
-        current_colors.append(first_color_row)
+        # Rows wrap around and carry their colors with them
+        tileset.patterns[current_tile_index] = np.roll(tileset.patterns[current_tile_index], row_shift)
+        tileset.colors[current_tile_index] = np.roll(tileset.colors[current_tile_index], row_shift)
         
-        pattern_command.capture_new_state()
-        color_command.capture_new_state()
-        
-        composite_command = CompositeCommand("Shift Tile Up", [pattern_command, color_command])
-        self.undo_manager.execute(composite_command)
-        
-    def shift_tile_down(self):
-        global tileset_patterns, tileset_colors, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
-            messagebox.showwarning("Shift Tile", "No valid tile selected to shift.", parent=self.root)
-            return
-        if not (len(tileset_patterns[current_tile_index]) == TILE_HEIGHT and 
-                len(tileset_colors[current_tile_index]) == TILE_HEIGHT):
-            _error(f"Tile {current_tile_index} data is malformed. Cannot shift down.")
-            messagebox.showerror("Shift Error", f"Tile {current_tile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
-
-        pattern_command = TransformCommand("Shift Tile Down", self, tileset_patterns, current_tile_index, self.invalidate_tile_cache)
-        color_command = TransformCommand("Shift Tile Down", self, tileset_colors, current_tile_index, self.invalidate_tile_cache)
+        command.capture_new_state()
+        self.undo_manager.execute(command)
 
-        current_pattern = tileset_patterns[current_tile_index]
-        current_colors = tileset_colors[current_tile_index]
-        last_pattern_row = current_pattern.pop(-1)
-        last_color_row = current_colors.pop(-1)
-        current_pattern.insert(0, last_pattern_row)
-        current_colors.insert(0, last_color_row)
-        
-        pattern_command.capture_new_state()
-        color_command.capture_new_state()
-        
-        composite_command = CompositeCommand("Shift Tile Down", [pattern_command, color_command])
-        self.undo_manager.execute(composite_command)
-        
-    def shift_tile_left(self):
-        global tileset_patterns, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+    def _shift_tile_columns(self, description, column_shift):
+        global current_tile_index
+        if not (0 <= current_tile_index < len(tileset)):
             messagebox.showwarning("Shift Tile", "No valid tile selected to shift.", parent=self.root)
             return
-        current_pattern = tileset_patterns[current_tile_index]
-        if not (isinstance(current_pattern, list) and 
-                len(current_pattern) == TILE_HEIGHT and
-                all(isinstance(row, list) and len(row) == TILE_WIDTH for row in current_pattern)):
-            _error(f"Tile {current_tile_index} pattern data is malformed. Cannot shift left.")
-            messagebox.showerror("Shift Error", f"Tile {current_tile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
-        
-        command = TransformCommand("Shift Tile Left", self, tileset_patterns, current_tile_index, self.invalidate_tile_cache)
 
-        for r_idx_shift in range(TILE_HEIGHT):
-            row_data = current_pattern[r_idx_shift]
-            first_pixel_val = row_data.pop(0)
-            row_data.append(first_pixel_val)
+        command = TransformCommand(description, self, tileset, current_tile_index, self.invalidate_tile_cache)
+
+        # Pixels wrap around within each row
+        pattern_bits = tileset.pixel_bits([current_tile_index])[0]
+        tileset.patterns[current_tile_index] = np.packbits(np.roll(pattern_bits, column_shift, axis=1), axis=1).reshape(TILE_HEIGHT)
         
         command.capture_new_state()
         self.undo_manager.execute(command)
+
+    def shift_tile_up(self):
+        self._shift_tile_rows("Shift Tile Up", -1)
         
-    def shift_tile_right(self):
-        global tileset_patterns, current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
-            messagebox.showwarning("Shift Tile", "No valid tile selected to shift.", parent=self.root)
-            return
-        current_pattern = tileset_patterns[current_tile_index]
-        if not (isinstance(current_pattern, list) and 
-                len(current_pattern) == TILE_HEIGHT and
-                all(isinstance(row, list) and len(row) == TILE_WIDTH for row in current_pattern)):
-            _error(f"Tile {current_tile_index} pattern data is malformed. Cannot shift right.")
-            messagebox.showerror("Shift Error", f"Tile {current_tile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
+    def shift_tile_down(self):
+        self._shift_tile_rows("Shift Tile Down", 1)
         
-        command = TransformCommand("Shift Tile Right", self, tileset_patterns, current_tile_index, self.invalidate_tile_cache)
-
-        for r_idx_shift_r in range(TILE_HEIGHT):
-            row_data = current_pattern[r_idx_shift_r]
-            last_pixel_val = row_data.pop(-1)
-            row_data.insert(0, last_pixel_val)
+    def shift_tile_left(self):
+        self._shift_tile_columns("Shift Tile Left", -1)
         
-        command.capture_new_state()
-        self.undo_manager.execute(command)
+    def shift_tile_right(self):
+        self._shift_tile_columns("Shift Tile Right", 1)
         
     # --- Supertile Editor Handlers ---
     def handle_st_tileset_click(self, event):
@@ -5727,7 +6828,7 @@ class TileEditorApp:
 
         # This part sets up the drag-and-drop state, which is fine to do instantly.
         # The actual selection action will be delayed.
-        if 0 <= clicked_index < len(tileset_patterns):
+        if 0 <= clicked_index < len(tileset):
             self.drag_item_type = "tile"
             self.drag_start_index = clicked_index
             self.drag_press_x = event.x
@@ -5747,7 +6848,7 @@ class TileEditorApp:
             self.single_click_timer = self.root.after(250, lambda: select_tile_for_supertile(clicked_index))
 
     def handle_supertile_def_click(self, event):
-        if not (0 <= selected_tile_for_supertile < len(tileset_patterns)):
+        if not (0 <= selected_tile_for_supertile < len(tileset)):
             messagebox.showwarning("Place Tile", "Please select a valid tile first.")
             return
             
@@ -5838,7 +6939,7 @@ class TileEditorApp:
 
         current_cell_id = (r_map, c_map)
         try:
-            current_data_val = map_data[r_map][c_map]
+            current_data_val = int(map_data[r_map, c_map])
         except IndexError:
             _error(f"IndexError accessing map_data[{r_map}][{c_map}]. Map size: {map_width}x{map_height}")
             return
@@ -5853,8 +6954,7 @@ class TileEditorApp:
                 self.pending_command_list.append(command)
                 
                 self._mark_project_modified()
-                self.draw_map_canvas() 
-                self.draw_minimap()    
+                self.change_bus.flush(command.description)
                 self._request_supertile_usage_refresh()
 
             last_painted_map_cell = current_cell_id
@@ -6245,7 +7345,7 @@ class TileEditorApp:
     # --- File Menu Commands ---
     def new_project(self, interactive=True):
         # Resets all project data structures to a default new state.
-        global tileset_patterns, tileset_colors, current_tile_index
+        global current_tile_index
         global supertiles_data, current_supertile_index, selected_tile_for_supertile
         global map_data, map_width, map_height, selected_supertile_for_map, last_painted_map_cell
         global selected_color_index
@@ -6296,24 +7396,17 @@ class TileEditorApp:
 
         self._clear_marked_unused(trigger_redraw=False)
 
-        tileset_patterns = [
-            [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-        ]
-        tileset_colors = [
-            [(WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)]
-        ]
+        tileset.reset()
         current_tile_index = 0
         selected_tile_for_supertile = 0
 
-        supertiles_data = [
-            [[0 for _c in range(self.supertile_grid_width)] for _r in range(self.supertile_grid_height)]
-        ]
+        supertiles_data.reset(1, self.supertile_grid_width, self.supertile_grid_height)
         current_supertile_index = 0
         selected_supertile_for_map = 0
 
         map_width = DEFAULT_MAP_WIDTH
         map_height = DEFAULT_MAP_HEIGHT
-        map_data = [[0 for _ in range(map_width)] for _ in range(map_height)]
+        map_data = new_map_array(map_width, map_height)
         last_painted_map_cell = None
 
         self.map_clipboard_data = None
@@ -6526,7 +7619,6 @@ class TileEditorApp:
             return False
 
     def save_tileset(self, filepath=None, is_standalone_operation=True):
-        global tileset_patterns, tileset_colors # Using globals
         save_path = filepath
         if not save_path:
             save_path = filedialog.asksaveasfilename(
@@ -6539,11 +7631,11 @@ class TileEditorApp:
 
         try:
             with open(save_path, "wb") as f:
-                tiles_to_write_count = len(tileset_patterns)
+                tiles_to_write_count = len(tileset)
 
                 header_byte_value = 0 if tiles_to_write_count == 256 else tiles_to_write_count
                 if not (0 <= header_byte_value <= 255):
-                    _debug(f" save_tileset: Invalid header_byte_value {header_byte_value} for len(tileset_patterns) {tiles_to_write_count}")
+                    _debug(f" save_tileset: Invalid header_byte_value {header_byte_value} for len(tileset) {tiles_to_write_count}")
                     raise ValueError(f"Calculated header byte value {header_byte_value} is out of 0-255 range.")
                 
                 num_byte_header = struct.pack("B", header_byte_value)
@@ -6556,49 +7648,10 @@ class TileEditorApp:
                 # Write the remaining reserved bytes.
                 f.write(bytes([0] * (RESERVED_BYTES_COUNT - 1)))
 
-                # --- Write ALL pattern data first ---
-                for i in range(tiles_to_write_count):
-                    if i >= len(tileset_patterns): 
-                        _warning(f" save_tileset: len(tileset_patterns) ({tiles_to_write_count}) > len(tileset_patterns). Stopping pattern write at tile {i}.")
-                        # Pad remaining patterns for this block if this happens, to keep file structure valid
-                        # This assumes we must write pattern data for all 'tiles_to_write_count'
-                        for _ in range(tiles_to_write_count - i):
-                            for _ in range(TILE_HEIGHT):
-                                f.write(struct.pack("B", 0)) # Write blank pattern row
-                        break 
-                    pattern = tileset_patterns[i]
-                    for r in range(TILE_HEIGHT):
-                        byte_val = 0
-                        if r < len(pattern):
-                            row_pattern = pattern[r]
-                            for c in range(TILE_WIDTH):
-                                if c < len(row_pattern) and row_pattern[c] == 1:
-                                    byte_val = byte_val | (1 << (7 - c))
-                        pattern_byte = struct.pack("B", byte_val)
-                        f.write(pattern_byte)
-                
-                # --- Then, write ALL color data ---
-                for i in range(tiles_to_write_count):
-                    if i >= len(tileset_colors):
-                        _warning(f" save_tileset: len(tileset_patterns) ({tiles_to_write_count}) > len(tileset_colors). Stopping color write at tile {i}.")
-                        # Pad remaining colors for this block
-                        for _ in range(tiles_to_write_count - i):
-                            for _ in range(TILE_HEIGHT):
-                                default_color_byte = ((WHITE_IDX & 0x0F) << 4) | (BLACK_IDX & 0x0F)
-                                f.write(struct.pack("B", default_color_byte))
-                        break
-                    colors = tileset_colors[i]
-                    for r in range(TILE_HEIGHT):
-                        fg_idx, bg_idx = (WHITE_IDX, BLACK_IDX) 
-                        if r < len(colors):
-                           fg_idx, bg_idx = colors[r]
-                        
-                        safe_fg_idx = max(0, min(15, fg_idx))
-                        safe_bg_idx = max(0, min(15, bg_idx))
-
-                        color_byte_val = ((safe_fg_idx & 0x0F) << 4) | (safe_bg_idx & 0x0F)
-                        color_byte = struct.pack("B", color_byte_val)
-                        f.write(color_byte)
+                # --- Write ALL pattern data first, then ALL color data ---
+                # The store already holds both blocks in file layout.
+                f.write(tileset.patterns.tobytes())
+                f.write(tileset.colors.tobytes())
 
             if filepath is None:
                 messagebox.showinfo(
@@ -6620,7 +7673,7 @@ class TileEditorApp:
 
     def open_tileset(self, filepath=None, is_standalone_operation=True):
         # Loads a tileset file, returning True on success, False on failure.
-        global tileset_patterns, tileset_colors, current_tile_index, selected_tile_for_supertile
+        global current_tile_index, selected_tile_for_supertile
         load_path = filepath
         if not load_path:
             load_path = filedialog.askopenfilename(
@@ -6678,45 +7731,17 @@ class TileEditorApp:
                     # For legacy files without the reserved block, default to max.
                     self.project_tile_limit = MAX_TILES
 
-                new_patterns = [
-                    [[0] * TILE_WIDTH for _r in range(TILE_HEIGHT)]
-                    for _i in range(loaded_num_tiles)
-                ]
-                new_colors = [
-                    [(WHITE_IDX, BLACK_IDX) for _r in range(TILE_HEIGHT)]
-                    for _i in range(loaded_num_tiles)
-                ]
-
-                bytes_per_tile_pattern = TILE_HEIGHT
-                total_pattern_bytes_to_read = loaded_num_tiles * bytes_per_tile_pattern
+                total_pattern_bytes_to_read = loaded_num_tiles * TILE_HEIGHT
                 all_pattern_data_bytes = f.read(total_pattern_bytes_to_read)
                 if len(all_pattern_data_bytes) < total_pattern_bytes_to_read:
                     raise EOFError(f"EOF while reading pattern data block. Expected {total_pattern_bytes_to_read}, got {len(all_pattern_data_bytes)}.")
-
-                current_byte_offset_pattern = 0
-                for i in range(loaded_num_tiles):
-                    tile_pattern_bytes = all_pattern_data_bytes[current_byte_offset_pattern : current_byte_offset_pattern + bytes_per_tile_pattern]
-                    for r_idx in range(TILE_HEIGHT):
-                        byte_val = tile_pattern_bytes[r_idx]
-                        for c in range(TILE_WIDTH):
-                            new_patterns[i][r_idx][c] = (byte_val >> (7 - c)) & 1
-                    current_byte_offset_pattern += bytes_per_tile_pattern
+                new_patterns = np.frombuffer(all_pattern_data_bytes, dtype=np.uint8).reshape(loaded_num_tiles, TILE_HEIGHT).copy()
                 
-                bytes_per_tile_colors = TILE_HEIGHT
-                total_color_bytes_to_read = loaded_num_tiles * bytes_per_tile_colors
+                total_color_bytes_to_read = loaded_num_tiles * TILE_HEIGHT
                 all_color_data_bytes = f.read(total_color_bytes_to_read)
                 if len(all_color_data_bytes) < total_color_bytes_to_read:
                     raise EOFError(f"EOF while reading color data block. Expected {total_color_bytes_to_read}, got {len(all_color_data_bytes)}.")
-
-                current_byte_offset_colors = 0
-                for i in range(loaded_num_tiles):
-                    tile_color_bytes = all_color_data_bytes[current_byte_offset_colors : current_byte_offset_colors + bytes_per_tile_colors]
-                    for r_idx in range(TILE_HEIGHT):
-                        byte_val = tile_color_bytes[r_idx]
-                        fg_idx = (byte_val >> 4) & 0x0F
-                        bg_idx = byte_val & 0x0F
-                        new_colors[i][r_idx] = (fg_idx, bg_idx)
-                    current_byte_offset_colors += bytes_per_tile_colors
+                new_colors = np.frombuffer(all_color_data_bytes, dtype=np.uint8).reshape(loaded_num_tiles, TILE_HEIGHT).copy()
                 
                 extra_data_check = f.read(1)
                 if extra_data_check:
@@ -6737,11 +7762,11 @@ class TileEditorApp:
                 if self._clear_marked_unused(trigger_redraw=False):
                     pass
 
-                tileset_patterns = new_patterns
-                tileset_colors = new_colors
+                tileset.patterns = new_patterns
+                tileset.colors = new_colors
 
-                current_tile_index = max(0, min(current_tile_index, len(tileset_patterns) - 1))
-                selected_tile_for_supertile = max(0, min(selected_tile_for_supertile, len(tileset_patterns) - 1))
+                current_tile_index = max(0, min(current_tile_index, len(tileset) - 1))
+                selected_tile_for_supertile = max(0, min(selected_tile_for_supertile, len(tileset) - 1))
 
                 if is_standalone_operation:
                     self.undo_manager.clear()
@@ -6759,7 +7784,7 @@ class TileEditorApp:
                         _debug(" open_tileset: TclError selecting tile editor tab.")
                     messagebox.showinfo(
                         "Load Successful",
-                        f"Loaded {len(tileset_patterns)} tiles from {os.path.basename(load_path)}",
+                        f"Loaded {len(tileset)} tiles from {os.path.basename(load_path)}",
                     )
                     self._mark_project_modified()
                     self._add_to_recent_list("modules", load_path)
@@ -6831,35 +7856,10 @@ class TileEditorApp:
                     _debug(f" save_supertiles: Invalid supertile dimensions ({self.supertile_grid_width}x{self.supertile_grid_height}), cannot save data.")
                     raise ValueError("Supertile dimensions are zero or negative, cannot save definition data.")
 
-                # Write data for each supertile
-                for i in range(len(supertiles_data)): # Iterate up to the actual number of supertiles
-                    if i >= len(supertiles_data): # Safety break
-                        _de_warningbug(f" save_supertiles: len(supertiles_data) ({len(supertiles_data)}) > len(supertiles_data). Stopping ST data write at ST {i}.")
-                        # Pad remaining ST definitions if this happens
-                        for _ in range(len(supertiles_data) - i):
-                            for _ in range(tiles_per_definition):
-                                f.write(struct.pack("B", 0)) # Write 0 for each tile index
-                        break
-                    
-                    definition = supertiles_data[i]
-                    
-                    # Ensure definition matches project dimensions before writing
-                    # Pad/truncate row or cells if necessary for robustness, though ideally data is consistent
-                    for r_st in range(self.supertile_grid_height):
-                        if r_st < len(definition): # Row exists
-                            row_data = definition[r_st]
-                            for c_st in range(self.supertile_grid_width):
-                                tile_index_val = 0 # Default if cell missing
-                                if c_st < len(row_data): # Cell exists
-                                    tile_index_val = row_data[c_st]
-                                # Ensure tile_index_val is within byte range (0-255) as it's packed as "B"
-                                safe_tile_index_val = max(0, min(255, tile_index_val))
-                                if tile_index_val != safe_tile_index_val:
-                                    _debug(f" save_supertiles: Clamping tile index {tile_index_val} to {safe_tile_index_val} in ST {i} at ({r_st},{c_st}).")
-                                f.write(struct.pack("B", safe_tile_index_val))
-                        else: # Row missing, pad entire row with 0s
-                            for _ in range(self.supertile_grid_width):
-                                f.write(struct.pack("B", 0))
+                # Write data for each supertile, one byte per tile index
+                if int(supertiles_data.definitions.max(initial=0)) > 255:
+                    _debug(" save_supertiles: Clamping tile indices above 255 to 255.")
+                f.write(np.minimum(supertiles_data.definitions, 255).astype(np.uint8).tobytes())
             
             if filepath is None:
                 messagebox.showinfo(
@@ -6880,7 +7880,7 @@ class TileEditorApp:
 
     def open_supertiles(self, filepath=None, is_standalone_operation=True):
         # Loads a supertile file, returning True on success, False on failure.
-        global supertiles_data, current_supertile_index, selected_supertile_for_map
+        global current_supertile_index, selected_supertile_for_map
         load_path = filepath
         if not load_path:
             load_path = filedialog.askopenfilename(
@@ -6939,20 +7939,15 @@ class TileEditorApp:
                     self.project_supertile_limit = limit_from_file
                 _debug(f"[open_supertiles] project_supertile_limit set to {self.project_supertile_limit}.")
 
-                temp_supertiles_data = []
+                loaded_definitions = None
                 if loaded_num_st_from_file > 0:
                     bytes_per_def = loaded_grid_width_from_file * loaded_grid_height_from_file
-                    for i in range(loaded_num_st_from_file):
-                        st_bytes = f.read(bytes_per_def)
-                        if len(st_bytes) < bytes_per_def: raise EOFError(f"EOF reading data for supertile {i}.")
-                        
-                        st_def = [[0] * loaded_grid_width_from_file for _ in range(loaded_grid_height_from_file)]
-                        byte_idx = 0
-                        for r in range(loaded_grid_height_from_file):
-                            for c in range(loaded_grid_width_from_file):
-                                st_def[r][c] = st_bytes[byte_idx]
-                                byte_idx += 1
-                        temp_supertiles_data.append(st_def)
+                    total_definition_bytes = loaded_num_st_from_file * bytes_per_def
+                    st_bytes = f.read(total_definition_bytes)
+                    if len(st_bytes) < total_definition_bytes: raise EOFError(f"EOF reading data for supertile {len(st_bytes) // bytes_per_def}.")
+                    loaded_definitions = np.frombuffer(st_bytes, dtype=np.uint8).reshape(
+                        loaded_num_st_from_file, loaded_grid_height_from_file, loaded_grid_width_from_file
+                    ).astype(np.uint16)
             
             confirm_load = True
             if is_standalone_operation:
@@ -6974,26 +7969,22 @@ class TileEditorApp:
                     if not messagebox.askokcancel("Dimension Mismatch", "Supertile dimensions in file differ from current project. Loading will change project dimensions. Continue?", icon="warning"):
                         return False 
     
-                supertiles_data = temp_supertiles_data
-                # Ensure at least one supertile exists if the file was empty.
-                if not supertiles_data:
-                    supertiles_data.append([[0] * self.supertile_grid_width for _ in range(self.supertile_grid_height)])
+                if loaded_definitions is not None:
+                    supertiles_data.definitions = loaded_definitions
+                else:
+                    # Ensure at least one supertile exists if the file was empty.
+                    supertiles_data.reset(1)
     
-                if self.supertile_grid_width != loaded_grid_width_from_file or \
-                    self.supertile_grid_height != loaded_grid_height_from_file:
-                    self.supertile_grid_width = loaded_grid_width_from_file
-                    self.supertile_grid_height = loaded_grid_height_from_file
+                if self.supertile_grid_width != supertiles_data.grid_width or \
+                    self.supertile_grid_height != supertiles_data.grid_height:
+                    self.supertile_grid_width = supertiles_data.grid_width
+                    self.supertile_grid_height = supertiles_data.grid_height
                     self._reconfigure_supertile_definition_canvas()
                 
                 current_supertile_index = max(0, min(current_supertile_index, len(supertiles_data) - 1))
                 selected_supertile_for_map = max(0, min(selected_supertile_for_map, len(supertiles_data) - 1))
                 
-                max_valid_tile_idx = len(tileset_patterns) - 1
-                for st_idx in range(len(supertiles_data)):
-                    for r in range(self.supertile_grid_height):
-                        for c in range(self.supertile_grid_width):
-                            if supertiles_data[st_idx][r][c] > max_valid_tile_idx:
-                                supertiles_data[st_idx][r][c] = 0
+                supertiles_data.remap_tiles(clamp_reference_lut(len(tileset)))
 
                 if is_standalone_operation:
                     self.undo_manager.clear()
@@ -7057,38 +8048,13 @@ class TileEditorApp:
                 else:
                     _debug(f" save_map: Using 1-byte ST indices (len(supertiles_data)={len(supertiles_data)}).")
 
-                for r in range(map_height):
-                    if r >= len(map_data): # Should not happen if map_data is consistent
-                        _debug(f" save_map: map_height > len(map_data) at row {r}. Padding rest of map.")
-                        # Pad remaining rows if data is inconsistent
-                        for _pad_r in range(map_height - r):
-                            for _pad_c in range(map_width):
-                                if use_2_byte_indices_for_map:
-                                    f.write(struct.pack(">H", 0))
-                                else:
-                                    f.write(struct.pack("B", 0))
-                        break # Stop processing rows
-
-                    row_data = map_data[r]
-                    for c in range(map_width):
-                        supertile_index_val = 0 # Default if cell data missing
-                        if c < len(row_data):
-                            supertile_index_val = row_data[c]
-                        
-                        if use_2_byte_indices_for_map:
-                            # Ensure index is within 2-byte range (0-65535)
-                            safe_supertile_index_val = max(0, min(65535, supertile_index_val))
-                            if supertile_index_val != safe_supertile_index_val:
-                                _debug(f" save_map: Clamping ST index {supertile_index_val} to {safe_supertile_index_val} for 2-byte save.")
-                            index_bytes = struct.pack("<H", safe_supertile_index_val)
-                            f.write(index_bytes)
-                        else:
-                            # Ensure index is within 1-byte range (0-255)
-                            safe_supertile_index_val = max(0, min(255, supertile_index_val))
-                            if supertile_index_val != safe_supertile_index_val:
-                                _debug(f" save_map: Clamping ST index {supertile_index_val} to {safe_supertile_index_val} for 1-byte save (project ST count <= 255).")
-                            index_byte = struct.pack("B", safe_supertile_index_val)
-                            f.write(index_byte)
+                if use_2_byte_indices_for_map:
+                    f.write(map_data.astype("<u2").tobytes())
+                else:
+                    # Ensure indices are within 1-byte range (0-255)
+                    if int(map_data.max(initial=0)) > 255:
+                        _debug(" save_map: Clamping ST indices above 255 for 1-byte save (project ST count <= 255).")
+                    f.write(np.minimum(map_data, 255).astype(np.uint8).tobytes())
             
             if filepath is None:
                 messagebox.showinfo(
@@ -7146,17 +8112,11 @@ class TileEditorApp:
 
                 if has_reserved_bytes: f.read(RESERVED_BYTES_COUNT)
 
-                new_map_data = [[0] * loaded_w_map for _ in range(loaded_h_map)]
-                for r in range(loaded_h_map):
-                    for c in range(loaded_w_map):
-                        if use_2byte_indices:
-                            idx_bytes = f.read(2)
-                            if len(idx_bytes) < 2: raise EOFError("EOF reading 2-byte map index.")
-                            new_map_data[r][c] = struct.unpack("<H", idx_bytes)[0]
-                        else:
-                            idx_byte = f.read(1)
-                            if not idx_byte: raise EOFError("EOF reading 1-byte map index.")
-                            new_map_data[r][c] = struct.unpack("B", idx_byte)[0]
+                index_dtype = np.dtype("<u2") if use_2byte_indices else np.dtype(np.uint8)
+                cell_bytes = f.read(num_cells * index_dtype.itemsize)
+                if len(cell_bytes) < num_cells * index_dtype.itemsize:
+                    raise EOFError(f"EOF reading {index_dtype.itemsize}-byte map index.")
+                new_map_data = np.frombuffer(cell_bytes, dtype=index_dtype).reshape(loaded_h_map, loaded_w_map).astype(np.uint16)
             
             confirm_load = True
             if is_standalone_operation:
@@ -7172,13 +8132,9 @@ class TileEditorApp:
             if confirm_load:
                 if self._clear_marked_unused(trigger_redraw=False): pass
 
-                missing_st_indices = set()
-                for r in range(loaded_h_map):
-                    for c in range(loaded_w_map):
-                        st_idx = new_map_data[r][c]
-                        if not (0 <= st_idx < len(supertiles_data)):
-                            missing_st_indices.add(st_idx)
-                            new_map_data[r][c] = 0
+                missing_cells = new_map_data >= len(supertiles_data)
+                missing_st_indices = set(np.unique(new_map_data[missing_cells]).tolist())
+                new_map_data[missing_cells] = 0
                 
                 map_width = loaded_w_map
                 map_height = loaded_h_map
@@ -7509,7 +8465,7 @@ class TileEditorApp:
         if new_limit == self.project_tile_limit:
             return
 
-        current_size = len(tileset_patterns)
+        current_size = len(tileset)
 
         # 2. Handle confirmation only if tiles will be deleted (truncation)
         if new_limit < current_size:
@@ -7606,14 +8562,12 @@ class TileEditorApp:
                     if self._clear_marked_unused(trigger_redraw=False):
                         pass
 
-                    old_map_tuple = (map_width, map_height, copy.deepcopy(map_data))
+                    old_map_tuple = (map_width, map_height, map_data.copy())
                     
-                    new_map_data_temp = [[0 for _ in range(new_w)] for _ in range(new_h)]
+                    new_map_data_temp = new_map_array(new_w, new_h)
                     rows_to_copy = min(map_height, new_h)
                     cols_to_copy = min(map_width, new_w)
-                    for r_idx in range(rows_to_copy): 
-                        for c_idx in range(cols_to_copy): 
-                            new_map_data_temp[r_idx][c_idx] = map_data[r_idx][c_idx]
+                    new_map_data_temp[:rows_to_copy, :cols_to_copy] = map_data[:rows_to_copy, :cols_to_copy]
                     
                     new_map_tuple = (new_w, new_h, new_map_data_temp)
 
@@ -7637,7 +8591,7 @@ class TileEditorApp:
 
     def clear_current_tile(self):
         global current_tile_index
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        if not (0 <= current_tile_index < len(tileset)):
             messagebox.showwarning("Clear Tile", "No valid tile selected to clear.", parent=self.root)
             return
             
@@ -7666,8 +8620,8 @@ class TileEditorApp:
             self.undo_manager.execute(command)
 
     def copy_current_tile(self):
-        global current_tile_index, tileset_patterns, tileset_colors
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        global current_tile_index
+        if not (0 <= current_tile_index < len(tileset)):
             messagebox.showwarning("Copy Tile", "No valid tile selected.")
             return
 
@@ -7677,8 +8631,8 @@ class TileEditorApp:
             "data_type": "tile",
             "version": "1.1", # Version for format with palette
             "payload": {
-                "pattern": tileset_patterns[current_tile_index],
-                "colors": tileset_colors[current_tile_index],
+                "pattern": tileset.pattern_rows(current_tile_index),
+                "colors": tileset.color_rows(current_tile_index),
                 "source_palette_hex": self.active_msx_palette
             }
         }
@@ -7695,8 +8649,8 @@ class TileEditorApp:
             messagebox.showerror("Copy Error", "Could not copy tile data to the system clipboard.")
 
     def paste_tile(self):
-        global current_tile_index, tileset_patterns, tileset_colors
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        global current_tile_index
+        if not (0 <= current_tile_index < len(tileset)):
             messagebox.showwarning("Paste Tile", "No valid tile selected to paste onto.")
             return
 
@@ -7728,13 +8682,10 @@ class TileEditorApp:
             # Capture the index at the time of command creation.
             target_tile_index = current_tile_index
 
-            def pattern_setter(data):
-                tileset_patterns[target_tile_index] = data
-            def colors_setter(data):
-                tileset_colors[target_tile_index] = data
+            def tile_setter(data):
+                tileset[target_tile_index] = data
 
-            pattern_command = SetDataCommand("Paste Tile (Pattern)", self, pattern_setter, pasted_pattern, tileset_patterns[target_tile_index])
-            colors_command = SetDataCommand("Paste Tile (Colors)", self, colors_setter, remapped_colors, tileset_colors[target_tile_index])
+            tile_command = SetDataCommand("Paste Tile", self, tile_setter, TilesetStore.pack_tile(pasted_pattern, remapped_colors), tileset[target_tile_index])
             
             post_paste_hooks = [
                 lambda: self.invalidate_tile_cache(target_tile_index),
@@ -7745,7 +8696,7 @@ class TileEditorApp:
 
             composite = CompositeCommand(
                 "Paste Tile", 
-                [pattern_command, colors_command],
+                [tile_command],
                 app_ref=self,
                 post_hooks=post_paste_hooks
             )
@@ -7760,29 +8711,25 @@ class TileEditorApp:
             messagebox.showinfo("Paste Tile", "The clipboard does not contain valid MSX Tile Forge tile data.")
 
     def copy_current_supertile(self):
-        global current_supertile_index, supertiles_data
-        global tileset_patterns, tileset_colors
+        global current_supertile_index
 
         if not (0 <= current_supertile_index < len(supertiles_data)):
             messagebox.showwarning("Copy Supertile", "No valid supertile selected.")
             return
 
-        definition = supertiles_data[current_supertile_index]
+        definition = supertiles_data[current_supertile_index].tolist()
 
         # Find all unique tile indices used in this supertile.
-        unique_tile_indices = set()
-        for row in definition:
-            for tile_idx in row:
-                unique_tile_indices.add(tile_idx)
+        unique_tile_indices = set(np.unique(supertiles_data[current_supertile_index]).tolist())
         
         # For each unique tile, package its pattern and color data.
         # This creates a self-contained tileset on the clipboard.
         source_tiles_payload = {}
         for tile_idx in unique_tile_indices:
-            if 0 <= tile_idx < len(tileset_patterns):
+            if 0 <= tile_idx < len(tileset):
                 source_tiles_payload[tile_idx] = {
-                    "pattern": tileset_patterns[tile_idx],
-                    "colors": tileset_colors[tile_idx]
+                    "pattern": tileset.pattern_rows(tile_idx),
+                    "colors": tileset.color_rows(tile_idx)
                 }
 
         # Assemble the final clipboard data structure.
@@ -7811,7 +8758,7 @@ class TileEditorApp:
             messagebox.showerror("Copy Error", "Could not copy supertile data to the system clipboard.")
 
     def paste_supertile(self):
-        global current_supertile_index, supertiles_data
+        global current_supertile_index
         if not (0 <= current_supertile_index < len(supertiles_data)):
             messagebox.showwarning("Paste Supertile", "No valid supertile selected to paste onto.")
             return
@@ -7835,9 +8782,9 @@ class TileEditorApp:
                 raise ValueError("Clipboard data payload is missing definition, tiles, or palette information.")
             
             dest_tileset_fingerprints = {}
-            for i in range(len(tileset_patterns)):
+            for i in range(len(tileset)):
                 fingerprint = self._render_tile_to_lab_pixels(
-                    tileset_patterns[i], tileset_colors[i], self.active_msx_palette
+                    tileset.pattern_rows(i), tileset.color_rows(i), self.active_msx_palette
                 )
                 if fingerprint:
                     dest_tileset_fingerprints[i] = fingerprint
@@ -7852,17 +8799,16 @@ class TileEditorApp:
                     best_match_dest_idx = self._find_best_tile_match(source_lab_pixels, dest_tileset_fingerprints)
                     tile_remap_table[src_idx] = best_match_dest_idx
 
-            new_definition = copy.deepcopy(pasted_definition)
-            for r in range(len(new_definition)):
-                for c in range(len(new_definition[r])):
-                    original_tile_idx = new_definition[r][c]
-                    new_definition[r][c] = tile_remap_table.get(original_tile_idx, 0)
-
-            if len(new_definition) != self.supertile_grid_height or \
-               len(new_definition[0]) != self.supertile_grid_width:
+            if len(pasted_definition) != self.supertile_grid_height or \
+               len(pasted_definition[0]) != self.supertile_grid_width:
                 messagebox.showerror("Paste Error", "Supertile clipboard dimensions do not match current project dimensions. Paste aborted.")
                 return
 
+            new_definition = np.array(
+                [[tile_remap_table.get(original_tile_idx, 0) for original_tile_idx in row] for row in pasted_definition],
+                dtype=np.uint16
+            )
+
             # Capture the index at the time of command creation.
             target_st_index = current_supertile_index
 
@@ -7874,7 +8820,7 @@ class TileEditorApp:
                 self._request_tile_usage_refresh()
                 self._request_supertile_usage_refresh()
             
-            command = SetDataCommand("Paste Supertile", self, st_data_setter, new_definition, supertiles_data[target_st_index])
+            command = SetDataCommand("Paste Supertile", self, st_data_setter, new_definition, supertiles_data[target_st_index].copy())
             # The CompositeCommand is not needed for a single command
             self.undo_manager.execute(command)
 
@@ -7907,26 +8853,18 @@ class TileEditorApp:
             messagebox.showinfo("Paste Map Region", "Cannot paste here: Current mouse position is outside the map boundaries.", parent=self.root)
             return
 
-        old_map_data = copy.deepcopy(map_data)
-        new_map_data = copy.deepcopy(map_data)
+        old_map_data = map_data.copy()
+        new_map_data = map_data.copy()
         paste_st_col, paste_st_row = paste_coords
-        clip_w = self.map_clipboard_data["width"]
-        clip_h = self.map_clipboard_data["height"]
-        clip_data = self.map_clipboard_data["data"]
-        
-        for r_offset in range(clip_h):
-            for c_offset in range(clip_w):
-                target_map_row = paste_st_row + r_offset
-                target_map_col = paste_st_col + c_offset
-                if (0 <= target_map_row < map_height and 0 <= target_map_col < map_width):
-                    if r_offset < len(clip_data) and c_offset < len(clip_data[r_offset]):
-                        st_index_to_paste = clip_data[r_offset][c_offset]
-                        if 0 <= st_index_to_paste < len(supertiles_data):
-                            new_map_data[target_map_row][target_map_col] = st_index_to_paste
-                        else:
-                            new_map_data[target_map_row][target_map_col] = 0
+        clip_data = np.asarray(self.map_clipboard_data["data"], dtype=np.uint16)
         
-        if new_map_data != old_map_data:
+        # Clip the region to the map; references to missing supertiles become 0
+        rows_to_paste = max(0, min(clip_data.shape[0], map_height - paste_st_row))
+        cols_to_paste = max(0, min(clip_data.shape[1], map_width - paste_st_col))
+        region = clamp_reference_lut(len(supertiles_data))[clip_data[:rows_to_paste, :cols_to_paste]]
+        new_map_data[paste_st_row:paste_st_row + rows_to_paste, paste_st_col:paste_st_col + cols_to_paste] = region
+        
+        if not np.array_equal(new_map_data, old_map_data):
             def map_data_setter(data):
                 global map_data
                 map_data = data
@@ -8428,6 +9366,9 @@ class TileEditorApp:
             self.minimap_background_cache = self._create_minimap_background_image(
                 current_minimap_w_px, current_minimap_h_px
             )
+        elif self.minimap_dirty_cells:
+            self._patch_minimap_background(self.minimap_dirty_cells)
+        self.minimap_dirty_cells.clear()
 
         if self.minimap_background_cache:
             canvas_mm.create_image(
@@ -8584,117 +9525,84 @@ class TileEditorApp:
     def invalidate_minimap_background_cache(self):
         """Clears the cached minimap background image."""
         self.minimap_background_cache = None
+        self.minimap_bg_slots = None
+        self.minimap_dirty_cells.clear()
         # Reset rendered size trackers too
         self.minimap_bg_rendered_width = 0
         self.minimap_bg_rendered_height = 0
 
+    def _minimap_palette(self):
+        """(19, 3) RGB LUT for minimap slots; the background slot is the black border."""
+        return np.array(self._render_palette()[1] + [0, 0, 0], dtype=np.uint8).reshape(-1, 3)
+
     def _create_minimap_background_image(self, target_width_mm, target_height_mm):
         if target_width_mm <= 0 or target_height_mm <= 0:
             return None
 
-        minimap_img_bg = tk.PhotoImage(width=target_width_mm, height=target_height_mm)
-        
         map_base_pixel_w = map_width * self.supertile_grid_width * TILE_WIDTH
         map_base_pixel_h = map_height * self.supertile_grid_height * TILE_HEIGHT
 
+        self.minimap_bg_slots = np.full((target_height_mm, target_width_mm), MapRaster.BACKGROUND_SLOT, dtype=np.uint8)
+        self.minimap_source_x = np.full(target_width_mm, -1)
+        self.minimap_source_y = np.full(target_height_mm, -1)
+
         if map_base_pixel_w <= 0 or map_base_pixel_h <= 0:
             _warning("Invalid base map pixel dimensions for minimap background.")
-            minimap_img_bg.put("black", to=(0, 0, target_width_mm, target_height_mm))
-            self.minimap_bg_rendered_width = target_width_mm
-            self.minimap_bg_rendered_height = target_height_mm
-            self.minimap_background_cache = minimap_img_bg
-            return minimap_img_bg
-
-        scale_x_mm = target_width_mm / map_base_pixel_w
-        scale_y_mm = target_height_mm / map_base_pixel_h
-        scale_mm = min(scale_x_mm, scale_y_mm)
-        
-        scaled_map_content_w = map_base_pixel_w * scale_mm
-        scaled_map_content_h = map_base_pixel_h * scale_mm
-        offset_x_mm_render = (target_width_mm - scaled_map_content_w) / 2
-        offset_y_mm_render = (target_height_mm - scaled_map_content_h) / 2
-        
-        bg_fill_color_mm = "#000000"
-
-        for y_pix_mm in range(target_height_mm):
-            row_hex_colors_mm = []
-            for x_pix_mm in range(target_width_mm):
-                pixel_color_hex_mm = bg_fill_color_mm
-
-                if (offset_x_mm_render <= x_pix_mm < offset_x_mm_render + scaled_map_content_w and
-                    offset_y_mm_render <= y_pix_mm < offset_y_mm_render + scaled_map_content_h):
-
-                    map_src_base_x = (x_pix_mm - offset_x_mm_render) / max(1e-9, scale_mm)
-                    map_src_base_y = (y_pix_mm - offset_y_mm_render) / max(1e-9, scale_mm)
-
-                    map_src_base_x = max(0, min(map_base_pixel_w - 1, map_src_base_x))
-                    map_src_base_y = max(0, min(map_base_pixel_h - 1, map_src_base_y))
-
-                    map_pixel_col_src = int(map_src_base_x)
-                    map_pixel_row_src = int(map_src_base_y)
-
-                    pixels_per_st_w = self.supertile_grid_width * TILE_WIDTH
-                    pixels_per_st_h = self.supertile_grid_height * TILE_HEIGHT
-                    if pixels_per_st_w <=0 : pixels_per_st_w = 1
-                    if pixels_per_st_h <=0 : pixels_per_st_h = 1
-
-                    st_col_mm = map_pixel_col_src // pixels_per_st_w
-                    st_row_mm = map_pixel_row_src // pixels_per_st_h
-
-                    tile_col_in_st_mm = (map_pixel_col_src % pixels_per_st_w) // TILE_WIDTH
-                    tile_row_in_st_mm = (map_pixel_row_src % pixels_per_st_h) // TILE_HEIGHT
-                    
-                    pixel_col_in_tile_mm = map_pixel_col_src % TILE_WIDTH
-                    pixel_row_in_tile_mm = map_pixel_row_src % TILE_HEIGHT
-                    
-                    try:
-                        if 0 <= st_row_mm < map_height and 0 <= st_col_mm < map_width:
-                            supertile_idx_mm = map_data[st_row_mm][st_col_mm]
-                            if 0 <= supertile_idx_mm < len(supertiles_data):
-                                st_def_mm = supertiles_data[supertile_idx_mm]
-                                if st_def_mm and len(st_def_mm) == self.supertile_grid_height and \
-                                   (self.supertile_grid_height == 0 or (self.supertile_grid_width > 0 and len(st_def_mm[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0) and \
-                                   0 <= tile_row_in_st_mm < self.supertile_grid_height and \
-                                   0 <= tile_col_in_st_mm < self.supertile_grid_width:
-
-                                    tile_idx_mm = st_def_mm[tile_row_in_st_mm][tile_col_in_st_mm]
-                                    if 0 <= tile_idx_mm < len(tileset_patterns):
-                                        if 0 <= pixel_row_in_tile_mm < TILE_HEIGHT and \
-                                           0 <= pixel_col_in_tile_mm < TILE_WIDTH:
-                                            pattern_val_mm = tileset_patterns[tile_idx_mm][pixel_row_in_tile_mm][pixel_col_in_tile_mm]
-                                            fg_idx_mm, bg_idx_mm = tileset_colors[tile_idx_mm][pixel_row_in_tile_mm]
-                                            
-                                            if not (0 <= fg_idx_mm < len(self.active_msx_palette) and \
-                                                    0 <= bg_idx_mm < len(self.active_msx_palette)):
-                                                _warning(f"Invalid palette indices ({fg_idx_mm}, {bg_idx_mm}) in minimap render.")
-                                                fg_idx_mm = WHITE_IDX; bg_idx_mm = BLACK_IDX
-
-                                            fg_color_mm = self.active_msx_palette[fg_idx_mm]
-                                            bg_color_mm = self.active_msx_palette[bg_idx_mm]
-                                            pixel_color_hex_mm = fg_color_mm if pattern_val_mm == 1 else bg_color_mm
-                                        else: pixel_color_hex_mm = INVALID_TILE_COLOR
-                                    else: pixel_color_hex_mm = INVALID_TILE_COLOR
-                                else: pixel_color_hex_mm = INVALID_SUPERTILE_COLOR
-                            else: pixel_color_hex_mm = INVALID_SUPERTILE_COLOR
-                        else: pixel_color_hex_mm = "#808080"
-                    except IndexError:
-                        pixel_color_hex_mm = "#FF0000"
-                
-                row_hex_colors_mm.append(pixel_color_hex_mm)
-
-            try:
-                minimap_img_bg.put("{" + " ".join(row_hex_colors_mm) + "}", to=(0, y_pix_mm))
-            except tk.TclError as e:
-                _warning(f"[Minimap BG]: TclError put row {y_pix_mm}: {e}")
-                if row_hex_colors_mm:
-                    minimap_img_bg.put(row_hex_colors_mm[0], to=(0, y_pix_mm, target_width_mm, y_pix_mm + 1))
-
-        _debug("Minimap background generated.")
+        else:
+            scale_x_mm = target_width_mm / map_base_pixel_w
+            scale_y_mm = target_height_mm / map_base_pixel_h
+            scale_mm = min(scale_x_mm, scale_y_mm)
+            
+            scaled_map_content_w = map_base_pixel_w * scale_mm
+            scaled_map_content_h = map_base_pixel_h * scale_mm
+            offset_x_mm_render = (target_width_mm - scaled_map_content_w) / 2
+            offset_y_mm_render = (target_height_mm - scaled_map_content_h) / 2
+
+            # Map raster pixel sampled by every minimap column and row; -1 in the black border
+            for source, size_mm, offset, content_size, base_size in (
+                    (self.minimap_source_x, target_width_mm, offset_x_mm_render, scaled_map_content_w, map_base_pixel_w),
+                    (self.minimap_source_y, target_height_mm, offset_y_mm_render, scaled_map_content_h, map_base_pixel_h)):
+                positions = np.arange(size_mm)
+                inside = (positions >= offset) & (positions < offset + content_size)
+                source[inside] = np.clip(((positions[inside] - offset) / max(1e-9, scale_mm)).astype(int), 0, base_size - 1)
+
+            self.map_raster.sync()
+            self._sample_minimap_block(slice(0, target_height_mm), slice(0, target_width_mm))
+
+        minimap_img_bg = ImageTk.PhotoImage(Image.fromarray(self._minimap_palette()[self.minimap_bg_slots], "RGB"))
         self.minimap_bg_rendered_width = target_width_mm
         self.minimap_bg_rendered_height = target_height_mm
         self.minimap_background_cache = minimap_img_bg
         return minimap_img_bg
 
+    def _sample_minimap_block(self, rows, cols):
+        """Resamples a block of minimap_bg_slots from the map raster."""
+        source_y = self.minimap_source_y[rows]
+        source_x = self.minimap_source_x[cols]
+        inside_y = np.flatnonzero(source_y >= 0)
+        inside_x = np.flatnonzero(source_x >= 0)
+        block = self.minimap_bg_slots[rows, cols]
+        block[np.ix_(inside_y, inside_x)] = self.map_raster.raster[np.ix_(source_y[inside_y], source_x[inside_x])]
+
+    def _patch_minimap_background(self, cells):
+        """Resamples only the minimap blocks of the given map cells into the cached background image."""
+        if self.minimap_bg_slots is None or self.minimap_background_cache is None:
+            return
+        self.map_raster.sync()
+        cell_pixel_w = self.supertile_grid_width * TILE_WIDTH
+        cell_pixel_h = self.supertile_grid_height * TILE_HEIGHT
+        palette_rgb = self._minimap_palette()
+        for r_map, c_map in cells:
+            cols = np.flatnonzero((self.minimap_source_x >= c_map * cell_pixel_w) & (self.minimap_source_x < (c_map + 1) * cell_pixel_w))
+            rows = np.flatnonzero((self.minimap_source_y >= r_map * cell_pixel_h) & (self.minimap_source_y < (r_map + 1) * cell_pixel_h))
+            if len(cols) == 0 or len(rows) == 0:
+                continue # Cell is smaller than a minimap pixel and was not sampled
+            row_block = slice(rows[0], rows[-1] + 1)
+            col_block = slice(cols[0], cols[-1] + 1)
+            self._sample_minimap_block(row_block, col_block)
+            patch_photo = ImageTk.PhotoImage(Image.fromarray(palette_rgb[self.minimap_bg_slots[row_block, col_block]], "RGB"))
+            self.root.tk.call(str(self.minimap_background_cache), "copy", str(patch_photo), "-to", int(cols[0]), int(rows[0]))
+
     def _update_window_title(self):
         """Updates the main window title based on the current project path."""
         base_title = "MSX Tile Forge"
@@ -8928,10 +9836,10 @@ class TileEditorApp:
         if selected_tab_index == 1:
             copy_label = "Copy Tile"
             paste_label = "Paste Tile"
-            can_copy = 0 <= current_tile_index < len(tileset_patterns)
+            can_copy = 0 <= current_tile_index < len(tileset)
             
             can_paste = False
-            if 0 <= current_tile_index < len(tileset_patterns):
+            if 0 <= current_tile_index < len(tileset):
                 try:
                     clipboard_data = json.loads(self.root.clipboard_get())
                     if isinstance(clipboard_data, dict) and \
@@ -9022,15 +9930,12 @@ class TileEditorApp:
                 min_c, min_r, max_c, max_r = norm_coords
                 sel_w = max_c - min_c + 1
                 sel_h = max_r - min_r + 1
-                copied_data = []
-                for r_idx in range(min_r, max_r + 1):
-                    row_data = []
-                    for c_idx in range(min_c, max_c + 1):
-                        if 0 <= r_idx < map_height and 0 <= c_idx < map_width:
-                            row_data.append(map_data[r_idx][c_idx])
-                        else:
-                            row_data.append(0)  # Append default if outside map
-                    copied_data.append(row_data)
+                # Cells outside the map are copied as 0
+                copied_data = np.zeros((sel_h, sel_w), dtype=np.uint16)
+                src_r0, src_c0 = max(0, min_r), max(0, min_c)
+                src_r1, src_c1 = min(map_height, max_r + 1), min(map_width, max_c + 1)
+                if src_r0 < src_r1 and src_c0 < src_c1:
+                    copied_data[src_r0 - min_r:src_r1 - min_r, src_c0 - min_c:src_c1 - min_c] = map_data[src_r0:src_r1, src_c0:src_c1]
 
                 # Set the map clipboard
                 self.map_clipboard_data = {
@@ -9144,14 +10049,14 @@ class TileEditorApp:
         
         if not (0 <= current_supertile_index < len(supertiles_data)):
             return False
-        if not (0 <= selected_tile_for_supertile < len(tileset_patterns)):
+        if not (0 <= selected_tile_for_supertile < len(tileset)):
             return False
         
         if not (0 <= r_place < self.supertile_grid_height and 0 <= c_place < self.supertile_grid_width):
             return False
 
         current_definition_place = supertiles_data[current_supertile_index]
-        if not current_definition_place or len(current_definition_place) != self.supertile_grid_height or \
+        if len(current_definition_place) == 0 or len(current_definition_place) != self.supertile_grid_height or \
            (self.supertile_grid_height > 0 and (len(current_definition_place[0]) != self.supertile_grid_width)):
             _warning(f"Supertile {current_supertile_index} dim mismatch in _place_tile_in_supertile.")
             return False
@@ -9165,7 +10070,7 @@ class TileEditorApp:
             self.pending_command_list.append(command)
             
             if not (self.marked_unused_tiles or self.marked_unused_supertiles):
-                self.update_all_displays(changed_level="supertile")
+                self.change_bus.flush(command.description)
             else:
                 self.update_all_displays(changed_level="all")
             self._mark_project_modified()
@@ -9179,7 +10084,7 @@ class TileEditorApp:
         if self.last_placed_supertile_cell is None:
             return
 
-        if not (0 <= selected_tile_for_supertile < len(tileset_patterns)):
+        if not (0 <= selected_tile_for_supertile < len(tileset)):
             return
 
         canvas = self.supertile_def_canvas
@@ -9253,58 +10158,36 @@ class TileEditorApp:
             self.project_modified = True
             self._update_window_title()  # Update title when first marked as modified
 
+    def _transform_current_supertile(self, description, transform):
+        """Replaces the current supertile definition by transform(definition) as one undoable step."""
+        global current_supertile_index
+        command = TransformCommand(description, self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
+        supertiles_data[current_supertile_index] = transform(supertiles_data[current_supertile_index].copy())
+        command.capture_new_state()
+        self.undo_manager.execute(command)
+
     def flip_supertile_horizontal(self):
-        global supertiles_data, current_supertile_index
+        global current_supertile_index
         if not (0 <= current_supertile_index < len(supertiles_data)):
             messagebox.showwarning("Flip Supertile", "No valid supertile selected.", parent=self.root)
             return
-        current_definition = supertiles_data[current_supertile_index]
-        if not (current_definition and 
-                len(current_definition) == self.supertile_grid_height and
-                (self.supertile_grid_height == 0 or (self.supertile_grid_width > 0 and len(current_definition[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0)):
-            _warning(f"Supertile {current_supertile_index} dimensions mismatch for horizontal flip. Cannot flip.")
-            messagebox.showerror("Flip Error", f"Supertile {current_supertile_index} data is inconsistent. Cannot flip.", parent=self.root)
-            return
-
-        command = TransformCommand("Flip Supertile Horizontal", self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
 
-        new_definition_flipped_h_st = []
-        for r_flip_st_h in range(self.supertile_grid_height):
-            if r_flip_st_h < len(current_definition) and isinstance(current_definition[r_flip_st_h], list):
-                 new_definition_flipped_h_st.append(current_definition[r_flip_st_h][::-1]) 
-            else: 
-                 new_definition_flipped_h_st.append([0] * self.supertile_grid_width)
-        supertiles_data[current_supertile_index] = new_definition_flipped_h_st
-
-        command.capture_new_state()
-        self.undo_manager.execute(command)
+        self._transform_current_supertile("Flip Supertile Horizontal", lambda definition: definition[:, ::-1])
         
         _debug(f"Supertile {current_supertile_index} flipped horizontally.")
 
     def flip_supertile_vertical(self):
-        global supertiles_data, current_supertile_index
+        global current_supertile_index
         if not (0 <= current_supertile_index < len(supertiles_data)):
             messagebox.showwarning("Flip Supertile", "No valid supertile selected.", parent=self.root)
             return
-        current_definition_to_flip_st = supertiles_data[current_supertile_index]
-        if not (current_definition_to_flip_st and 
-                len(current_definition_to_flip_st) == self.supertile_grid_height and
-                (self.supertile_grid_height == 0 or (self.supertile_grid_width > 0 and len(current_definition_to_flip_st[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0)):
-            _warning(f"Supertile {current_supertile_index} dimensions mismatch for vertical flip. Cannot flip.")
-            messagebox.showerror("Flip Error", f"Supertile {current_supertile_index} data is inconsistent. Cannot flip.", parent=self.root)
-            return
-            
-        command = TransformCommand("Flip Supertile Vertical", self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
-        
-        current_definition_to_flip_st.reverse()
 
-        command.capture_new_state()
-        self.undo_manager.execute(command)
+        self._transform_current_supertile("Flip Supertile Vertical", lambda definition: definition[::-1, :])
         
         _debug(f"Supertile {current_supertile_index} flipped vertically.")
 
     def rotate_supertile_90cw(self):
-        global supertiles_data, current_supertile_index
+        global current_supertile_index
         if not (0 <= current_supertile_index < len(supertiles_data)):
             messagebox.showwarning("Rotate Supertile", "No valid supertile selected.", parent=self.root)
             return
@@ -9312,146 +10195,37 @@ class TileEditorApp:
             messagebox.showinfo("Rotate Supertile", "Rotation is only enabled for square supertiles.", parent=self.root)
             return
 
-        current_definition_rotate_st = supertiles_data[current_supertile_index]
-        dim_st_rotate = self.supertile_grid_width
-        if not (current_definition_rotate_st and 
-                len(current_definition_rotate_st) == dim_st_rotate and
-                (dim_st_rotate == 0 or all(len(row) == dim_st_rotate for row in current_definition_rotate_st))):
-            _warning(f"Supertile {current_supertile_index} dimensions mismatch for rotation. Cannot rotate.")
-            messagebox.showerror("Rotate Error", f"Supertile {current_supertile_index} data is inconsistent. Cannot rotate.", parent=self.root)
-            return
-
-        command = TransformCommand("Rotate Supertile", self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
-
-        new_definition_rotated_st = [[0 for _c in range(dim_st_rotate)] for _r in range(dim_st_rotate)]
-        for r_rot_st_val in range(dim_st_rotate):
-            for c_rot_st_val in range(dim_st_rotate):
-                if r_rot_st_val < len(current_definition_rotate_st) and c_rot_st_val < len(current_definition_rotate_st[r_rot_st_val]):
-                    new_definition_rotated_st[c_rot_st_val][(dim_st_rotate - 1) - r_rot_st_val] = current_definition_rotate_st[r_rot_st_val][c_rot_st_val]
-        supertiles_data[current_supertile_index] = new_definition_rotated_st
-
-        command.capture_new_state()
-        self.undo_manager.execute(command)
+        self._transform_current_supertile("Rotate Supertile", lambda definition: np.rot90(definition, k=-1))
         
         _debug(f"Supertile {current_supertile_index} rotated 90 CW.")
 
-    def shift_supertile_up(self):
-        global supertiles_data, current_supertile_index
-        current_st_h_for_shift = self.supertile_grid_height
-        if not (0 <= current_supertile_index < len(supertiles_data)) or current_st_h_for_shift <= 0:
-            if current_st_h_for_shift <=1 and 0 <= current_supertile_index < len(supertiles_data) :
-                 _debug(f"Supertile {current_supertile_index} is {current_st_h_for_shift} unit(s) high, cannot shift up.")
-                 return
-            messagebox.showwarning("Shift Supertile", "Invalid supertile or dimensions for shift operation.", parent=self.root)
-            return
-        current_definition_shift_st_up = supertiles_data[current_supertile_index]
-        if not (current_definition_shift_st_up and 
-                len(current_definition_shift_st_up) == current_st_h_for_shift and
-                (current_st_h_for_shift == 0 or (self.supertile_grid_width > 0 and len(current_definition_shift_st_up[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0)):
-            _warning(f"Supertile {current_supertile_index} dimensions mismatch for shift up. Cannot shift.")
-            messagebox.showerror("Shift Error", f"Supertile {current_supertile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
-            
-        command = TransformCommand("Shift Supertile Up", self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
-
-        first_row_data_st = current_definition_shift_st_up.pop(0)
-        current_definition_shift_st_up.append(first_row_data_st)
-        
-        command.capture_new_state()
-        self.undo_manager.execute(command)
-        
-        _debug(f"Supertile {current_supertile_index} shifted up.")
-
-    def shift_supertile_down(self):
-        global supertiles_data, current_supertile_index
-        current_st_h_for_shift_d = self.supertile_grid_height
-        if not (0 <= current_supertile_index < len(supertiles_data)) or current_st_h_for_shift_d <= 0:
-            if current_st_h_for_shift_d <=1 and 0 <= current_supertile_index < len(supertiles_data):
-                _debug(f"Supertile {current_supertile_index} is {current_st_h_for_shift_d} unit(s) high, cannot shift down.")
+    def _shift_current_supertile(self, direction, row_shift, column_shift):
+        global current_supertile_index
+        grid_extent, extent_name = (self.supertile_grid_height, "high") if row_shift else (self.supertile_grid_width, "wide")
+        if not (0 <= current_supertile_index < len(supertiles_data)) or grid_extent <= 1:
+            if 0 <= current_supertile_index < len(supertiles_data):
+                _debug(f"Supertile {current_supertile_index} is {grid_extent} unit(s) {extent_name}, cannot shift {direction}.")
                 return
             messagebox.showwarning("Shift Supertile", "Invalid supertile or dimensions for shift operation.", parent=self.root)
             return
-        current_definition_shift_st_d = supertiles_data[current_supertile_index]
-        if not (current_definition_shift_st_d and 
-                len(current_definition_shift_st_d) == current_st_h_for_shift_d and
-                (current_st_h_for_shift_d == 0 or (self.supertile_grid_width > 0 and len(current_definition_shift_st_d[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0)):
-            _warning(f"Supertile {current_supertile_index} dimensions mismatch for shift down. Cannot shift.")
-            messagebox.showerror("Shift Error", f"Supertile {current_supertile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
-            
-        command = TransformCommand("Shift Supertile Down", self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
 
-        last_row_data_st = current_definition_shift_st_d.pop(-1)
-        current_definition_shift_st_d.insert(0, last_row_data_st)
-
-        command.capture_new_state()
-        self.undo_manager.execute(command)
+        # Rows and columns wrap around
+        self._transform_current_supertile(f"Shift Supertile {direction.capitalize()}",
+                                          lambda definition: np.roll(definition, (row_shift, column_shift), axis=(0, 1)))
         
-        _debug(f"Supertile {current_supertile_index} shifted down.")
-
-    def shift_supertile_left(self):
-        global supertiles_data, current_supertile_index
-        current_st_w_for_shift_l = self.supertile_grid_width
-        current_st_h_for_shift_l = self.supertile_grid_height
-        if not (0 <= current_supertile_index < len(supertiles_data)) or current_st_w_for_shift_l <= 0 or current_st_h_for_shift_l <= 0:
-            if current_st_w_for_shift_l <=1 and 0 <= current_supertile_index < len(supertiles_data) :
-                 _debug(f"Supertile {current_supertile_index} is {current_st_w_for_shift_l} unit(s) wide, cannot shift left.")
-                 return
-            messagebox.showwarning("Shift Supertile", "Invalid supertile or dimensions for shift operation.", parent=self.root)
-            return
-        current_definition_shift_st_l = supertiles_data[current_supertile_index]
-        if not (current_definition_shift_st_l and 
-                len(current_definition_shift_st_l) == current_st_h_for_shift_l and
-                (current_st_h_for_shift_l == 0 or (current_st_w_for_shift_l > 0 and len(current_definition_shift_st_l[0]) == current_st_w_for_shift_l) or current_st_w_for_shift_l == 0)):
-            _warning(f"Supertile {current_supertile_index} dimensions mismatch for shift left. Cannot shift.")
-            messagebox.showerror("Shift Error", f"Supertile {current_supertile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
+        _debug(f"Supertile {current_supertile_index} shifted {direction}.")
 
-        command = TransformCommand("Shift Supertile Left", self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
+    def shift_supertile_up(self):
+        self._shift_current_supertile("up", -1, 0)
 
-        for r_shift_st_l_val in range(current_st_h_for_shift_l):
-            if r_shift_st_l_val < len(current_definition_shift_st_l):
-                row_data_list_st_l = current_definition_shift_st_l[r_shift_st_l_val]
-                if len(row_data_list_st_l) == current_st_w_for_shift_l and current_st_w_for_shift_l > 0:
-                    first_tile_in_row_st = row_data_list_st_l.pop(0)
-                    row_data_list_st_l.append(first_tile_in_row_st)
+    def shift_supertile_down(self):
+        self._shift_current_supertile("down", 1, 0)
 
-        command.capture_new_state()
-        self.undo_manager.execute(command)
-        
-        _debug(f"Supertile {current_supertile_index} shifted left.")
+    def shift_supertile_left(self):
+        self._shift_current_supertile("left", 0, -1)
 
     def shift_supertile_right(self):
-        global supertiles_data, current_supertile_index
-        current_st_w_for_shift_r = self.supertile_grid_width
-        current_st_h_for_shift_r = self.supertile_grid_height
-        if not (0 <= current_supertile_index < len(supertiles_data)) or current_st_w_for_shift_r <= 0 or current_st_h_for_shift_r <= 0:
-            if current_st_w_for_shift_r <= 1 and 0 <= current_supertile_index < len(supertiles_data) :
-                 _debug(f"Supertile {current_supertile_index} is {current_st_w_for_shift_r} unit(s) wide, cannot shift right.")
-                 return
-            messagebox.showwarning("Shift Supertile", "Invalid supertile or dimensions for shift operation.", parent=self.root)
-            return
-        current_definition_shift_st_r = supertiles_data[current_supertile_index]
-        if not (current_definition_shift_st_r and 
-                len(current_definition_shift_st_r) == current_st_h_for_shift_r and
-                (current_st_h_for_shift_r == 0 or (current_st_w_for_shift_r > 0 and len(current_definition_shift_st_r[0]) == current_st_w_for_shift_r) or current_st_w_for_shift_r == 0)):
-            _warning(f"Supertile {current_supertile_index} dimensions mismatch for shift right. Cannot shift.")
-            messagebox.showerror("Shift Error", f"Supertile {current_supertile_index} data is inconsistent. Cannot shift.", parent=self.root)
-            return
-
-        command = TransformCommand("Shift Supertile Right", self, supertiles_data, current_supertile_index, self.invalidate_supertile_cache)
-
-        for r_shift_st_r_val in range(current_st_h_for_shift_r):
-            if r_shift_st_r_val < len(current_definition_shift_st_r):
-                row_data_list_st_r = current_definition_shift_st_r[r_shift_st_r_val]
-                if len(row_data_list_st_r) == current_st_w_for_shift_r and current_st_w_for_shift_r > 0:
-                    last_tile_in_row_st = row_data_list_st_r.pop(-1)
-                    row_data_list_st_r.insert(0, last_tile_in_row_st)
-        
-        command.capture_new_state()
-        self.undo_manager.execute(command)
-        
-        _debug(f"Supertile {current_supertile_index} shifted right.")
+        self._shift_current_supertile("right", 0, 1)
 
     def handle_supertile_def_right_click(self, event):
         global selected_tile_for_supertile, current_supertile_index, supertiles_data
@@ -9474,14 +10248,14 @@ class TileEditorApp:
             try:
                 # Ensure definition structure matches before accessing
                 definition_rc = supertiles_data[current_supertile_index]
-                if not definition_rc or len(definition_rc) != self.supertile_grid_height or \
+                if len(definition_rc) == 0 or len(definition_rc) != self.supertile_grid_height or \
                    (self.supertile_grid_height > 0 and (len(definition_rc[0]) != self.supertile_grid_width)):
                     _warning(f"ST def {current_supertile_index} dim mismatch in right_click.")
                     return
 
-                clicked_tile_index_val = definition_rc[row][col]
+                clicked_tile_index_val = int(definition_rc[row][col])
 
-                if 0 <= clicked_tile_index_val < len(tileset_patterns):
+                if 0 <= clicked_tile_index_val < len(tileset):
                     if selected_tile_for_supertile != clicked_tile_index_val:
                         selected_tile_for_supertile = clicked_tile_index_val
                         _debug(f"Right-click selected Tile: {selected_tile_for_supertile}")
@@ -9491,7 +10265,7 @@ class TileEditorApp:
                         self._update_st_tab_selected_tile_info_panel()
                         self.scroll_viewers_to_tile(selected_tile_for_supertile)
                 # else:
-                    _debug(f"Right-click: Tile index {clicked_tile_index_val} at ST def [{row},{col}] is out of tile bounds (max {len(tileset_patterns)-1}).")
+                    _debug(f"Right-click: Tile index {clicked_tile_index_val} at ST def [{row},{col}] is out of tile bounds (max {len(tileset)-1}).")
 
             except IndexError: # Should be caught by structure check above
                 _error(f"Right-click: IndexError accessing supertile data for ST {current_supertile_index} at def [{row},{col}].")
@@ -9529,7 +10303,7 @@ class TileEditorApp:
         if 0 <= map_row < map_height and 0 <= map_col < map_width:
             try:
                 # Get the supertile index at the clicked map cell
-                clicked_supertile_index = map_data[map_row][map_col]
+                clicked_supertile_index = int(map_data[map_row, map_col])
 
                 # Check if the retrieved supertile index is valid
                 if 0 <= clicked_supertile_index < len(supertiles_data):
@@ -9559,113 +10333,48 @@ class TileEditorApp:
                 _error(f"Right-click: Unexpected error in map canvas handler: {e}")
 
     def _check_tile_usage(self, tile_index_check): # Renamed tile_index
-        used_in_supertiles_list = [] # Renamed
-        if not (0 <= tile_index_check < len(tileset_patterns)):
-            return used_in_supertiles_list
-
-        for st_idx_check in range(len(supertiles_data)):
-            definition_check = supertiles_data[st_idx_check] # global
-            
-            # Check consistency of this definition with project settings
-            if not definition_check or len(definition_check) != self.supertile_grid_height or \
-               (self.supertile_grid_height > 0 and (len(definition_check[0]) != self.supertile_grid_width)):
-                _warning(f"Supertile {st_idx_check} has inconsistent dimensions in _check_tile_usage. Skipping.")
-                continue # Skip this malformed supertile definition
-
-            found_in_current_st = False
-            for r_check in range(self.supertile_grid_height):
-                for c_check in range(self.supertile_grid_width):
-                    # Bounds check for r_check, c_check within definition_check already done by loops
-                    # and the initial structure check.
-                    if definition_check[r_check][c_check] == tile_index_check:
-                        if st_idx_check not in used_in_supertiles_list:
-                            used_in_supertiles_list.append(st_idx_check)
-                        found_in_current_st = True
-                        break 
-                if found_in_current_st:
-                    break 
-        return used_in_supertiles_list
+        if not (0 <= tile_index_check < len(tileset)):
+            return []
+        return usage_index.supertiles_using_tile(tile_index_check)
 
     def _check_supertile_usage(self, supertile_index):
         """Checks if a supertile_index is used in the map data.
         Returns a list of (row, col) map coordinates that use it.
         """
-        used_in_map = []
         if not (0 <= supertile_index < len(supertiles_data)):
-            return used_in_map  # Invalid index
-
-        for r in range(map_height):
-            for c in range(map_width):
-                if map_data[r][c] == supertile_index:
-                    used_in_map.append((r, c))
-        return used_in_map
+            return []  # Invalid index
+        return usage_index.map_cells_using_supertile(supertile_index)
 
     def _update_supertile_refs_for_tile_change(self, tile_idx_changed, action_type): # Renamed index, action
-        references_changed = False # Flag to track if any ST def was actually modified
-        for st_idx_update in range(len(supertiles_data)):
-            current_definition_update = supertiles_data[st_idx_update] 
-
-            if not current_definition_update or len(current_definition_update) != self.supertile_grid_height or \
-               (self.supertile_grid_height > 0 and (len(current_definition_update[0]) != self.supertile_grid_width)):
-                _warning(f"Supertile {st_idx_update} has inconsistent dimensions in _update_supertile_refs. Skipping.")
-                continue
-
-            for r_update in range(self.supertile_grid_height):
-                for c_update in range(self.supertile_grid_width):
-                    current_tile_ref = current_definition_update[r_update][c_update]
-                    original_ref_for_comparison = current_tile_ref # Store before modification
-                    
-                    if action_type == "insert":
-                        if current_tile_ref >= tile_idx_changed:
-                            supertiles_data[st_idx_update][r_update][c_update] += 1
-                    elif action_type == "delete":
-                        if current_tile_ref == tile_idx_changed:
-                            supertiles_data[st_idx_update][r_update][c_update] = 0 
-                        elif current_tile_ref > tile_idx_changed:
-                            supertiles_data[st_idx_update][r_update][c_update] -= 1
-                    
-                    if supertiles_data[st_idx_update][r_update][c_update] != original_ref_for_comparison:
-                        references_changed = True
-                        self.invalidate_supertile_cache(st_idx_update)
-
-        if references_changed:
+        if action_type == "insert":
+            tile_map = insert_reference_lut(tile_idx_changed, MAX_TILES - 1)
+        elif action_type == "delete":
+            tile_map = delete_reference_lut(tile_idx_changed)
+        else:
+            return
+        old_definitions = supertiles_data.snapshot()
+        supertiles_data.remap_tiles(tile_map)
+        # Flag supertiles whose definition was actually modified
+        changed_supertiles = np.flatnonzero((old_definitions != supertiles_data.definitions).any(axis=(1, 2)))
+        for st_idx_update in changed_supertiles:
+            self.invalidate_supertile_cache(int(st_idx_update))
+
+        if len(changed_supertiles) > 0:
             self._request_tile_usage_refresh()
             self._request_supertile_usage_refresh()
 
     def _update_map_refs_for_supertile_change(self, index, action):
-        map_changed_by_refs = False 
+        global map_data
         if action == "insert":
-            for r in range(map_height):
-                for c in range(map_width):
-                    if map_data[r][c] >= index:
-                        # Ensure incremented index does not exceed MAX_SUPERTILES - 1
-                        if map_data[r][c] < MAX_SUPERTILES - 1:
-                            map_data[r][c] += 1
-                            map_changed_by_refs = True
-                        elif map_data[r][c] == MAX_SUPERTILES -1 and index <= MAX_SUPERTILES -1 :
-                             # If current ref is already at max, and we insert before/at it,
-                             # it effectively gets pushed "out of bounds" conceptually.
-                             # For safety, could map to a default like 0, or log.
-                             # Current logic: it would remain MAX_SUPERTILES-1 if index makes it shift.
-                             # If index makes map_data[r][c] need to be > MAX_SUPERTILES-1, it's an issue.
-                             # Let's assume for now that len(supertiles_data) management prevents this.
-                             # A safer increment:
-                             # original_val = map_data[r][c]
-                             # map_data[r][c] = min(MAX_SUPERTILES - 1, original_val + 1)
-                             # if map_data[r][c] != original_val: map_changed_by_refs = True
-                             pass # Current logic might be okay if MAX_SUPERTILES is large
-
+            supertile_map = insert_reference_lut(index)
         elif action == "delete":
-            for r in range(map_height):
-                for c in range(map_width):
-                    if map_data[r][c] == index:
-                        map_data[r][c] = 0
-                        map_changed_by_refs = True
-                    elif map_data[r][c] > index:
-                        map_data[r][c] -= 1
-                        map_changed_by_refs = True # Also a change
+            supertile_map = delete_reference_lut(index)
         else:
             _warning(f"Unknown action '{action}' in _update_map_refs_for_supertile_change")
+            return
+        new_map_data = supertile_map[map_data]
+        map_changed_by_refs = not np.array_equal(new_map_data, map_data)
+        map_data = new_map_data
 
         if map_changed_by_refs:
             self._mark_project_modified() # If map data changed, project is modified
@@ -9674,27 +10383,20 @@ class TileEditorApp:
             self._request_supertile_usage_refresh()
 
     def _insert_tile(self, index):
-        global tileset_patterns, tileset_colors, WHITE_IDX, BLACK_IDX
 
         if not (
-            0 <= index <= len(tileset_patterns)
+            0 <= index <= len(tileset)
         ):  
-            _error(f"Insert tile index {index} out of range [0, {len(tileset_patterns)}].")
+            _error(f"Insert tile index {index} out of range [0, {len(tileset)}].")
             return False
-        if len(tileset_patterns) >= MAX_TILES:
+        if len(tileset) >= MAX_TILES:
             _error("Cannot insert tile, maximum tiles reached.")
             return False
 
-        blank_pattern = [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-        blank_colors = [(WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)]
-
-        tileset_patterns.insert(index, blank_pattern)
-        tileset_colors.insert(index, blank_colors)
+        tileset.insert(index, TilesetStore.blank_tile())
         
-        if len(tileset_patterns) > MAX_TILES:
-            tileset_patterns.pop()
-        if len(tileset_colors) > MAX_TILES:
-            tileset_colors.pop()
+        if len(tileset) > MAX_TILES:
+            tileset.truncate(MAX_TILES)
 
         self._update_supertile_refs_for_tile_change(index, "insert") # calls _request_tile_usage_refresh
 
@@ -9702,18 +10404,16 @@ class TileEditorApp:
         return True
 
     def _delete_tile(self, index):
-        global tileset_patterns, tileset_colors
 
-        if not (0 <= index < len(tileset_patterns)):
-            _error(f"Delete tile index {index} out of range [0, {len(tileset_patterns) - 1}]."
+        if not (0 <= index < len(tileset)):
+            _error(f"Delete tile index {index} out of range [0, {len(tileset) - 1}]."
             )
             return False
-        if len(tileset_patterns) <= 1:
+        if len(tileset) <= 1:
             _error("Cannot delete the last tile.")
             return False
 
-        del tileset_patterns[index]
-        del tileset_colors[index]
+        tileset.pop(index)
 
         self._update_supertile_refs_for_tile_change(index, "delete") # calls _request_tile_usage_refresh
 
@@ -9730,14 +10430,10 @@ class TileEditorApp:
             _error("Cannot insert supertile, maximum reached.")
             return False
 
-        blank_st_definition = [
-            [0 for _c in range(self.supertile_grid_width)] for _r in range(self.supertile_grid_height)
-        ]
-
-        supertiles_data.insert(index_to_insert_at, blank_st_definition) 
+        supertiles_data.insert(index_to_insert_at, supertiles_data.blank_definition()) 
         
         if len(supertiles_data) > MAX_SUPERTILES:
-            supertiles_data.pop() 
+            supertiles_data.truncate(MAX_SUPERTILES) 
 
         self._update_map_refs_for_supertile_change(index_to_insert_at, "insert")
         self._mark_project_modified()
@@ -9765,9 +10461,8 @@ class TileEditorApp:
 
         # --- Confirmation is handled by the UI caller ---
 
-        # Delete from data list
-        del supertiles_data[index]
-        # Let list shrink
+        # Delete from the store
+        supertiles_data.pop(index)
 
         # Update references in map
         self._update_map_refs_for_supertile_change(index, "delete")
@@ -9777,9 +10472,9 @@ class TileEditorApp:
 
     def _update_editor_button_states(self):
         # --- Tile Editor Buttons ---
-        can_add_tile = len(tileset_patterns) < self.project_tile_limit
-        can_insert_tile = len(tileset_patterns) < self.project_tile_limit
-        can_delete_tile = len(tileset_patterns) > 1
+        can_add_tile = len(tileset) < self.project_tile_limit
+        can_insert_tile = len(tileset) < self.project_tile_limit
+        can_delete_tile = len(tileset) > 1
 
         if hasattr(self, "add_tile_button") and self.add_tile_button.winfo_exists():
             self.add_tile_button.config(
@@ -9822,19 +10517,15 @@ class TileEditorApp:
     def handle_add_tile(self):  
         global current_tile_index
 
-        if len(tileset_patterns) >= self.project_tile_limit:
+        if len(tileset) >= self.project_tile_limit:
             messagebox.showwarning("Add Tile Failed", f"Could not add tile. The tileset limit is set to {self.project_tile_limit}.")
             return
     
         if self._clear_marked_unused(trigger_redraw=False):
             pass
 
-        new_tile_idx = len(tileset_patterns)
-        blank_pattern = [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-        blank_colors = [(WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)]
-
-        pattern_command = ModifyListCommand("Add Tile", tileset_patterns, new_tile_idx, blank_pattern, is_insert=True)
-        color_command = ModifyListCommand("Add Tile", tileset_colors, new_tile_idx, blank_colors, is_insert=True)
+        new_tile_idx = len(tileset)
+        tile_command = ModifyListCommand("Add Tile", tileset, new_tile_idx, TilesetStore.blank_tile(), is_insert=True)
         
         # Command to update application state (counts and selections)
         old_state = (current_tile_index,)
@@ -9857,7 +10548,7 @@ class TileEditorApp:
 
         composite = CompositeCommand(
             "Add Tile", 
-            [pattern_command, color_command, state_command],
+            [tile_command, state_command],
             app_ref=self,
             post_hooks=[post_add_hooks]
     )
@@ -9867,22 +10558,19 @@ class TileEditorApp:
 
     def handle_insert_tile(self):
         global current_tile_index, selected_tile_for_supertile
-        if len(tileset_patterns) >= self.project_tile_limit:
+        if len(tileset) >= self.project_tile_limit:
             messagebox.showwarning("Insert Tile Failed", f"Could not insert tile. The tileset limit is set to {self.project_tile_limit}.")
             return
         if self._clear_marked_unused(trigger_redraw=False): pass 
 
         insert_idx = current_tile_index
         
-        blank_pattern = [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-        blank_colors = [(WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)]
-        pattern_command = ModifyListCommand("Insert Tile", tileset_patterns, insert_idx, blank_pattern, is_insert=True)
-        color_command = ModifyListCommand("Insert Tile", tileset_colors, insert_idx, blank_colors, is_insert=True)
+        tile_command = ModifyListCommand("Insert Tile", tileset, insert_idx, TilesetStore.blank_tile(), is_insert=True)
         
         st_refs_command = UpdateSupertileRefsForTileCommand("Update Supertile Refs", self, insert_idx, is_insert=True)
 
         old_state = (current_tile_index, selected_tile_for_supertile)
-        new_num_tiles = len(tileset_patterns) + 1 # This is still needed to calculate the clamped new_st_selection
+        new_num_tiles = len(tileset) + 1 # This is still needed to calculate the clamped new_st_selection
         new_selection = insert_idx
         new_st_selection = selected_tile_for_supertile + 1 if selected_tile_for_supertile >= insert_idx else selected_tile_for_supertile
         new_st_selection = min(new_st_selection, new_num_tiles - 1)
@@ -9900,17 +10588,17 @@ class TileEditorApp:
             self._request_color_usage_refresh()
             self.scroll_viewers_to_tile(current_tile_index)
 
-        composite = CompositeCommand("Insert Tile", [pattern_command, color_command, st_refs_command, state_command], app_ref=self, post_hooks=[post_insert_hooks])
+        composite = CompositeCommand("Insert Tile", [tile_command, st_refs_command, state_command], app_ref=self, post_hooks=[post_insert_hooks])
         self.undo_manager.execute(composite)
         _debug(f"Inserted tile at index {insert_idx}")
 
     def handle_delete_tile(self):
         global current_tile_index, selected_tile_for_supertile
-        if len(tileset_patterns) <= 1:
+        if len(tileset) <= 1:
             messagebox.showinfo("Delete Tile", "Cannot delete the last tile.")
             return
         delete_idx = current_tile_index
-        if not (0 <= delete_idx < len(tileset_patterns)):
+        if not (0 <= delete_idx < len(tileset)):
             messagebox.showerror("Delete Tile Error", "Invalid tile index selected.")
             return
 
@@ -9924,14 +10612,13 @@ class TileEditorApp:
 
         self._adjust_marked_indices_after_delete(self.marked_unused_tiles, delete_idx)
 
-        pattern_command = ModifyListCommand("Delete Tile", tileset_patterns, delete_idx, is_insert=False)
-        color_command = ModifyListCommand("Delete Tile", tileset_colors, delete_idx, is_insert=False)
+        tile_command = ModifyListCommand("Delete Tile", tileset, delete_idx, is_insert=False)
         
         # Use the new, optimized command for updating supertile references
         st_refs_command = UpdateSupertileRefsForTileCommand("Update Supertile Refs", self, delete_idx, is_insert=False)
         
         old_state = (current_tile_index, selected_tile_for_supertile)
-        new_num_tiles = len(tileset_patterns) - 1
+        new_num_tiles = len(tileset) - 1
         new_selection = min(delete_idx, new_num_tiles - 1)
         new_st_selection = selected_tile_for_supertile
         if selected_tile_for_supertile == delete_idx: new_st_selection = 0
@@ -9951,7 +10638,7 @@ class TileEditorApp:
             self._request_color_usage_refresh()
             self.scroll_viewers_to_tile(current_tile_index)
 
-        composite = CompositeCommand("Delete Tile", [pattern_command, color_command, st_refs_command, state_command], app_ref=self, post_hooks=[post_delete_hooks])
+        composite = CompositeCommand("Delete Tile", [tile_command, st_refs_command, state_command], app_ref=self, post_hooks=[post_delete_hooks])
         self.undo_manager.execute(composite)
         _debug(f"Deleted tile at index {delete_idx}")
 
@@ -9966,11 +10653,7 @@ class TileEditorApp:
             pass
 
         new_st_idx = len(supertiles_data)
-        blank_st_definition = [
-            [0 for _c in range(self.supertile_grid_width)] for _r in range(self.supertile_grid_height)
-        ]
-
-        st_add_command = ModifyListCommand("Add Supertile", supertiles_data, new_st_idx, blank_st_definition, is_insert=True)
+        st_add_command = ModifyListCommand("Add Supertile", supertiles_data, new_st_idx, supertiles_data.blank_definition(), is_insert=True)
         
         # Command to update application state
         old_state = (current_supertile_index,)
@@ -10016,17 +10699,10 @@ class TileEditorApp:
 
         insert_idx = current_supertile_index
         
-        blank_st_definition = [
-            [0 for _c in range(self.supertile_grid_width)] for _r in range(self.supertile_grid_height)
-        ]
-        st_insert_command = ModifyListCommand("Insert Supertile", supertiles_data, insert_idx, blank_st_definition, is_insert=True)
+        st_insert_command = ModifyListCommand("Insert Supertile", supertiles_data, insert_idx, supertiles_data.blank_definition(), is_insert=True)
         
-        old_map_data = copy.deepcopy(map_data)
-        new_map_data = copy.deepcopy(map_data)
-        for r in range(map_height - 1, -1, -1):
-            for c in range(map_width - 1, -1, -1):
-                if new_map_data[r][c] >= insert_idx:
-                    new_map_data[r][c] += 1
+        old_map_data = map_data.copy()
+        new_map_data = insert_reference_lut(insert_idx)[map_data]
         
         def map_data_setter(data):
             global map_data
@@ -10096,14 +10772,8 @@ class TileEditorApp:
         
         st_delete_command = ModifyListCommand("Delete Supertile", supertiles_data, delete_idx, is_insert=False)
         
-        old_map_data = copy.deepcopy(map_data)
-        new_map_data = copy.deepcopy(map_data)
-        for r in range(map_height - 1, -1, -1):
-            for c in range(map_width - 1, -1, -1):
-                if new_map_data[r][c] == delete_idx:
-                    new_map_data[r][c] = 0
-                elif new_map_data[r][c] > delete_idx:
-                    new_map_data[r][c] -= 1
+        old_map_data = map_data.copy()
+        new_map_data = delete_reference_lut(delete_idx)[map_data]
 
         def map_data_setter(data):
             global map_data
@@ -10144,11 +10814,10 @@ class TileEditorApp:
         _debug(f"Deleted supertile at index {delete_idx}")
 
     def _reposition_tile(self, source_index, target_index):
-        global tileset_patterns, tileset_colors
         global current_tile_index, selected_tile_for_supertile
 
-        if not (0 <= source_index < len(tileset_patterns)): return False
-        clamped_target = max(0, min(target_index, len(tileset_patterns)))
+        if not (0 <= source_index < len(tileset)): return False
+        clamped_target = max(0, min(target_index, len(tileset)))
         
         actual_insert_idx = clamped_target
         if source_index < clamped_target:
@@ -10156,8 +10825,7 @@ class TileEditorApp:
             
         if source_index == actual_insert_idx: return False
 
-        pattern_command = ReorderListCommand("Move Tile", tileset_patterns, source_index, actual_insert_idx)
-        color_command = ReorderListCommand("Move Tile", tileset_colors, source_index, actual_insert_idx)
+        tile_command = ReorderListCommand("Move Tile", tileset, source_index, actual_insert_idx)
 
         # Use the new, fast, procedural command
         st_refs_command = UpdateSupertileRefsForTileReorderCommand("Update Supertile Refs", self, source_index, actual_insert_idx)
@@ -10189,7 +10857,7 @@ class TileEditorApp:
             # for the state command and final redraw coordination.
             self.scroll_viewers_to_tile(current_tile_index)
 
-        composite = CompositeCommand("Move Tile", [pattern_command, color_command, st_refs_command, state_command], app_ref=self, post_hooks=[post_hooks])
+        composite = CompositeCommand("Move Tile", [tile_command, st_refs_command, state_command], app_ref=self, post_hooks=[post_hooks])
         self.undo_manager.execute(composite)
         return True
 
@@ -10214,19 +10882,8 @@ class TileEditorApp:
         # --- Create Commands ---
         st_reorder_command = ReorderListCommand("Move Supertile", supertiles_data, source_index_st, actual_insert_idx_st)
 
-        old_map_data = copy.deepcopy(map_data)
-        new_map_data = copy.deepcopy(map_data)
-        for r_map_refo in range(map_height):
-            for c_map_refo in range(map_width):
-                current_map_ref = new_map_data[r_map_refo][c_map_refo]
-                if current_map_ref == source_index_st:
-                    new_map_data[r_map_refo][c_map_refo] = actual_insert_idx_st
-                elif source_index_st < actual_insert_idx_st: 
-                    if source_index_st < current_map_ref <= actual_insert_idx_st:
-                         new_map_data[r_map_refo][c_map_refo] -= 1
-                elif source_index_st > actual_insert_idx_st: 
-                    if actual_insert_idx_st <= current_map_ref < source_index_st:
-                         new_map_data[r_map_refo][c_map_refo] += 1
+        old_map_data = map_data.copy()
+        new_map_data = move_reference_lut(source_index_st, actual_insert_idx_st)[map_data]
         def map_data_setter(data):
             global map_data
             map_data = data
@@ -10281,7 +10938,7 @@ class TileEditorApp:
             items_across_calc = NUM_TILES_ACROSS # Constant for tile viewers
             item_render_w = VIEWER_TILE_SIZE
             item_render_h = VIEWER_TILE_SIZE
-            max_items_count = len(tileset_patterns)
+            max_items_count = len(tileset)
         elif item_type_str == "supertile":
             item_render_w = self.supertile_grid_width * TILE_WIDTH
             item_render_h = self.supertile_grid_height * TILE_HEIGHT
@@ -10442,7 +11099,7 @@ class TileEditorApp:
                 item_w_ind = VIEWER_TILE_SIZE
                 item_h_ind = VIEWER_TILE_SIZE
                 items_across_ind = NUM_TILES_ACROSS
-                max_items_ind = len(tileset_patterns)
+                max_items_ind = len(tileset)
             elif self.drag_item_type == "supertile":
                 item_w_ind = self.supertile_grid_width * TILE_WIDTH
                 item_h_ind = self.supertile_grid_height * TILE_HEIGHT
@@ -10486,7 +11143,7 @@ class TileEditorApp:
                 if item_type_for_click is None: return
 
                 max_items = 0
-                if item_type_for_click == "tile": max_items = len(tileset_patterns)
+                if item_type_for_click == "tile": max_items = len(tileset)
                 elif item_type_for_click == "supertile": max_items = len(supertiles_data)
 
                 index_at_release = self._get_index_from_canvas_coords(canvas, event.x, event.y, item_type_for_click)
@@ -10524,7 +11181,7 @@ class TileEditorApp:
             elif self.drag_item_type is not None: # Drag was active
                 item_type = self.drag_item_type
                 max_items = 0
-                if item_type == "tile": max_items = len(tileset_patterns)
+                if item_type == "tile": max_items = len(tileset)
                 elif item_type == "supertile": max_items = len(supertiles_data)
                 
                 is_alt_down = (event.state & 0x20000) != 0
@@ -11044,37 +11701,12 @@ class TileEditorApp:
         about_win.wait_window()
 
     def _find_unused_tiles(self):
-        used_tile_indices = set()
-        for st_idx in range(len(supertiles_data)):
-            definition = supertiles_data[st_idx]
-            if not definition or len(definition) != self.supertile_grid_height or \
-               (self.supertile_grid_height > 0 and len(definition[0]) != self.supertile_grid_width):
-                continue
-
-            for r in range(self.supertile_grid_height):
-                for c in range(self.supertile_grid_width):
-                    used_tile_indices.add(definition[r][c])
-        
-        unused_tiles = set()
-        for i in range(1, len(tileset_patterns)):
-            if i not in used_tile_indices:
-                unused_tiles.add(i)
-        return unused_tiles
+        return usage_index.unused_tiles(len(tileset))
 
     def _find_unused_supertiles(self):
         """Identifies supertiles not used in the map_data."""
-        global map_data, map_width, map_height
-        used_st_indices = set()
         # Supertile 0 is implicitly used/reserved
-        for r_idx in range(map_height): # Renamed r
-            for c_idx in range(map_width): # Renamed c
-                used_st_indices.add(map_data[r_idx][c_idx])
-        # _debug(f"DEBUG: Used Supertile Indices from map_data: {used_st_indices}") # DEBUG
-
-        unused_supertiles = set()
-        for i in range(1, len(supertiles_data)): # Start from 1
-            if i not in used_st_indices:
-                unused_supertiles.add(i)
+        unused_supertiles = usage_index.unused_supertiles(len(supertiles_data))
         _debug(f"DEBUG: Found Unused Supertiles (indices): {unused_supertiles}") # DEBUG
         return unused_supertiles
 
@@ -12173,7 +12805,7 @@ class TileEditorApp:
         Reads selected tile data from ROM and appends to the main tileset.
         This operation is now fully undoable.
         """
-        global current_tile_index, tileset_patterns, tileset_colors
+        global current_tile_index
 
         if not self.rom_import_dialog or not tk.Toplevel.winfo_exists(self.rom_import_dialog):
             return
@@ -12190,16 +12822,15 @@ class TileEditorApp:
         
         # --- Prepare data and commands without modifying global state yet ---
         commands_to_execute = []
-        tiles_to_add_patterns = []
-        tiles_to_add_colors = []
+        tiles_to_add = []
         
         for current_rom_tile_absolute_idx, (fg_idx, bg_idx, fine_offset) in sorted_selected_items:
-            current_tileset_size = len(tileset_patterns) + len(tiles_to_add_patterns)
+            current_tileset_size = len(tileset) + len(tiles_to_add)
             if current_tileset_size >= self.project_tile_limit:
                 messagebox.showinfo(
                     "Import Limit Reached",
                     f"Project tileset limit of {self.project_tile_limit} reached.\n"
-                    f"Staged {len(tiles_to_add_patterns)} of {num_tiles_to_import_attempt} selected tiles for import.",
+                    f"Staged {len(tiles_to_add)} of {num_tiles_to_import_attempt} selected tiles for import.",
                     parent=dialog
                 )
                 break
@@ -12209,9 +12840,6 @@ class TileEditorApp:
                 _debug(f"ROM Import: Skipping out-of-bounds tile index {current_rom_tile_absolute_idx}")
                 continue
 
-            new_pattern = [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-            new_colors = [(fg_idx, bg_idx) for _ in range(TILE_HEIGHT)]
-
             bytes_to_read = TILE_HEIGHT
             if rom_byte_start_pos + bytes_to_read > len(rom_data):
                 num_bytes_avail = len(rom_data) - rom_byte_start_pos
@@ -12219,16 +12847,12 @@ class TileEditorApp:
             else:
                 tile_bytes = rom_data[rom_byte_start_pos : rom_byte_start_pos + bytes_to_read]
 
-            for r in range(TILE_HEIGHT):
-                if r < len(tile_bytes):
-                    row_byte = tile_bytes[r]
-                    for c in range(TILE_WIDTH):
-                        new_pattern[r][c] = (row_byte >> (7 - c)) & 1
-            
-            tiles_to_add_patterns.append(new_pattern)
-            tiles_to_add_colors.append(new_colors)
+            # ROM pattern bytes are already in the tileset's row layout
+            new_pattern = np.frombuffer(bytes(tile_bytes), dtype=np.uint8).copy()
+            new_colors = np.full(TILE_HEIGHT, ((fg_idx & 0x0F) << 4) | (bg_idx & 0x0F), dtype=np.uint8)
+            tiles_to_add.append((new_pattern, new_colors))
 
-        if not tiles_to_add_patterns:
+        if not tiles_to_add:
             messagebox.showwarning("Import Notice",
                                    "No new tiles were imported. Tileset might be full or selected ROM data was out of bounds.",
                                    parent=self.root)
@@ -12240,12 +12864,11 @@ class TileEditorApp:
         # Clear any "Marked Unused" highlights before proceeding
         self._clear_marked_unused(trigger_redraw=False)
 
-        first_new_tile_idx = len(tileset_patterns)
+        first_new_tile_idx = len(tileset)
         
-        for i in range(len(tiles_to_add_patterns)):
-            new_idx = len(tileset_patterns) + i
-            commands_to_execute.append(ModifyListCommand("Import Tile", tileset_patterns, new_idx, tiles_to_add_patterns[i], is_insert=True))
-            commands_to_execute.append(ModifyListCommand("Import Tile", tileset_colors, new_idx, tiles_to_add_colors[i], is_insert=True))
+        for i in range(len(tiles_to_add)):
+            new_idx = len(tileset) + i
+            commands_to_execute.append(ModifyListCommand("Import Tile", tileset, new_idx, tiles_to_add[i], is_insert=True))
         
         old_state = (current_tile_index,)
         new_state = (first_new_tile_idx,)
@@ -12269,7 +12892,7 @@ class TileEditorApp:
             self._request_tile_usage_refresh()
             self._request_supertile_usage_refresh()
 
-        composite = CompositeCommand(f"Import {len(tiles_to_add_patterns)} Tiles", commands_to_execute, app_ref=self, post_hooks=[post_import_hooks])
+        composite = CompositeCommand(f"Import {len(tiles_to_add)} Tiles", commands_to_execute, app_ref=self, post_hooks=[post_import_hooks])
         
         # Close dialog *before* executing the command
         self._close_rom_importer_dialog()
@@ -12277,9 +12900,9 @@ class TileEditorApp:
         # Now execute the entire import as one undoable action
         self.undo_manager.execute(composite)
         
-        final_message = f"Successfully imported {len(tiles_to_add_patterns)} tile(s)."
-        if len(tiles_to_add_patterns) < num_tiles_to_import_attempt:
-            final_message += f"\n({num_tiles_to_import_attempt - len(tiles_to_add_patterns)} tiles were not imported due to limits.)"
+        final_message = f"Successfully imported {len(tiles_to_add)} tile(s)."
+        if len(tiles_to_add) < num_tiles_to_import_attempt:
+            final_message += f"\n({num_tiles_to_import_attempt - len(tiles_to_add)} tiles were not imported due to limits.)"
         messagebox.showinfo("Import Successful", final_message, parent=self.root)
 
     def _get_zoomed_supertile_pixel_dims(self):
@@ -12352,8 +12975,8 @@ class TileEditorApp:
 
 
     def create_map_render_of_supertile(self, supertile_index, target_render_width, target_render_height):
-        # Creates a Pillow Image for a supertile, scaled to target_render_width/height.
-        # Cache now stores Pillow.Image objects.
+        # Creates a Pillow Image ('P' mode, current palette) for a supertile, scaled to target_render_width/height.
+        # The cache keeps the palette-slot render, so palette changes do not invalidate it.
 
         safe_target_render_width = max(1, int(target_render_width))
         safe_target_render_height = max(1, int(target_render_height))
@@ -12361,132 +12984,14 @@ class TileEditorApp:
         cache_key = (supertile_index, safe_target_render_width, safe_target_render_height, 
                      self.supertile_grid_width, self.supertile_grid_height)
         
-        if cache_key in self.map_render_cache:
-            return self.map_render_cache[cache_key]
-
-        # Create a Pillow Image for the entire scaled supertile
-        # Use 'RGB' mode. If alpha is needed later, can change to 'RGBA'.
-        try:
-            # Ensure dimensions are positive for Image.new
-            pil_supertile_image = Image.new('RGB', 
-                                          (max(1, safe_target_render_width), max(1, safe_target_render_height)), 
-                                          INVALID_SUPERTILE_COLOR) # Fill with invalid color initially
-        except ValueError as e_img_new: # e.g. negative size if calculations somehow fail
-            _error(f"Error creating Pillow image for supertile {supertile_index} (size {safe_target_render_width}x{safe_target_render_height}): {e_img_new}")
-            # Return a minimal placeholder Pillow image on error
-            placeholder_pil = Image.new('RGB', (1,1), INVALID_SUPERTILE_COLOR)
-            self.map_render_cache[cache_key] = placeholder_pil # Cache placeholder to avoid re-erroring
-            return placeholder_pil
-
-
-        if not (0 <= supertile_index < len(supertiles_data)):
-            # Already filled with INVALID_SUPERTILE_COLOR
-            self.map_render_cache[cache_key] = pil_supertile_image
-            return pil_supertile_image
-
-        definition = supertiles_data[supertile_index]
-        src_st_tile_grid_w = self.supertile_grid_width
-        src_st_tile_grid_h = self.supertile_grid_height
-
-        if src_st_tile_grid_w <= 0 or src_st_tile_grid_h <= 0:
-            self.map_render_cache[cache_key] = pil_supertile_image # Already filled with invalid
-            return pil_supertile_image
-        
-        if len(definition) != src_st_tile_grid_h or \
-           (src_st_tile_grid_h > 0 and (len(definition[0]) != src_st_tile_grid_w)):
-            _debug(f" Supertile {supertile_index} dim mismatch for map render.")
-            self.map_render_cache[cache_key] = pil_supertile_image # Already filled with invalid
-            return pil_supertile_image
-
-        # Size of one base 8x8 tile when scaled to fit within the target_render_width/height
-        scaled_base_tile_w = safe_target_render_width / src_st_tile_grid_w
-        scaled_base_tile_h = safe_target_render_height / src_st_tile_grid_h
-
-        # Ensure scaled base tile dimensions are at least 1 pixel for Pillow's resize
-        # Pillow's resize to (0,0) or (0,X) or (X,0) might error or produce unexpected results.
-        # We round them, then ensure they are at least 1.
-        final_scaled_base_tile_w = max(1, round(scaled_base_tile_w))
-        final_scaled_base_tile_h = max(1, round(scaled_base_tile_h))
-
-
-        # Temporary 8x8 Pillow image for rendering individual base tiles
-        pil_temp_base_tile = Image.new('RGB', (TILE_WIDTH, TILE_HEIGHT))
-
-        for r_st_def in range(src_st_tile_grid_h): # Row in supertile definition
-            for c_st_def in range(src_st_tile_grid_w): # Col in supertile definition
-                tile_idx_from_st_def = definition[r_st_def][c_st_def]
-                
-                pixel_data_for_base_tile = [] # Flat list of (r,g,b) tuples for 8x8 tile
-                valid_tile = True
-
-                if not (0 <= tile_idx_from_st_def < len(tileset_patterns)):
-                    valid_tile = False
-                else:
-                    pattern = tileset_patterns[tile_idx_from_st_def]
-                    colors = tileset_colors[tile_idx_from_st_def]
-
-                    for y_pixel_in_base in range(TILE_HEIGHT): # 0-7
-                        if not (y_pixel_in_base < len(pattern) and y_pixel_in_base < len(colors)):
-                            valid_tile = False; break # Malformed tile data
-                        
-                        fg_idx, bg_idx = colors[y_pixel_in_base]
-                        if not (0 <= fg_idx < len(self.active_msx_palette) and \
-                                0 <= bg_idx < len(self.active_msx_palette)):
-                            fg_color_hex = INVALID_TILE_COLOR; bg_color_hex = INVALID_TILE_COLOR
-                        else:
-                            fg_color_hex = self.active_msx_palette[fg_idx]
-                            bg_color_hex = self.active_msx_palette[bg_idx]
-
-                        row_pattern_data = pattern[y_pixel_in_base]
-                        if not (len(row_pattern_data) == TILE_WIDTH):
-                            valid_tile = False; break # Malformed tile row
-
-                        for x_pixel_in_base in range(TILE_WIDTH): # 0-7
-                            pixel_val = row_pattern_data[x_pixel_in_base]
-                            color_hex_to_use = fg_color_hex if pixel_val == 1 else bg_color_hex
-                            try:
-                                # Pillow needs RGB tuples, not hex strings for putdata
-                                r_int = int(color_hex_to_use[1:3], 16)
-                                g_int = int(color_hex_to_use[3:5], 16)
-                                b_int = int(color_hex_to_use[5:7], 16)
-                                pixel_data_for_base_tile.append((r_int, g_int, b_int))
-                            except ValueError: # Invalid hex string
-                                pixel_data_for_base_tile.append((255,0,255)) # Magenta for error
-                    if not valid_tile: break
-                
-                if not valid_tile or len(pixel_data_for_base_tile) != TILE_WIDTH * TILE_HEIGHT:
-                    # Fill this part of supertile with invalid color if base tile is bad
-                    # Create a temporary Pillow image for the scaled error tile
-                    error_scaled_tile = Image.new('RGB', (final_scaled_base_tile_w, final_scaled_base_tile_h), INVALID_TILE_COLOR)
-                    paste_x = round(c_st_def * scaled_base_tile_w)
-                    paste_y = round(r_st_def * scaled_base_tile_h)
-                    pil_supertile_image.paste(error_scaled_tile, (paste_x, paste_y))
-                    continue
-
-                # Populate the 8x8 temporary Pillow image
-                pil_temp_base_tile.putdata(pixel_data_for_base_tile)
-
-                # Scale the 8x8 temporary image to its final size within the supertile
-                try:
-                    pil_scaled_base_tile = pil_temp_base_tile.resize(
-                        (final_scaled_base_tile_w, final_scaled_base_tile_h),
-                        Image.Resampling.NEAREST
-                    )
-                except ValueError as e_resize: # e.g. if final_scaled_base_tile_w/h are zero
-                    _error(f"Error resizing base tile in supertile {supertile_index}: {e_resize}")
-                    pil_scaled_base_tile = Image.new('RGB', (final_scaled_base_tile_w, final_scaled_base_tile_h), INVALID_TILE_COLOR)
-
-
-                # Calculate paste position (top-left) for this scaled base tile
-                # Use floating point scaled_base_tile_w/h for paste position calculation
-                # then round for the final integer paste coordinates.
-                paste_x = round(c_st_def * scaled_base_tile_w)
-                paste_y = round(r_st_def * scaled_base_tile_h)
-
-                pil_supertile_image.paste(pil_scaled_base_tile, (paste_x, paste_y))
-
-        self.map_render_cache[cache_key] = pil_supertile_image
-        return pil_supertile_image
+        render = self.map_render_cache.lookup(cache_key)
+        if render is None:
+            pixels = supertile_slot_pixels(supertile_index)
+            if pixels is None or pixels.size == 0:
+                pixels = np.full((1, 1), MapRaster.INVALID_SUPERTILE_SLOT, dtype=np.uint8)
+            render = IndexedRender(nearest_scale_slots(pixels, safe_target_render_width, safe_target_render_height))
+            self.map_render_cache[cache_key] = render
+        return render.pil_image(self._render_palette()[1])
 
     def _handle_map_scroll_event(self, event=None):
         # This method is called by scrollbar interactions.
@@ -13095,33 +13600,30 @@ class TileEditorApp:
 
     def handle_add_many_tiles(self):
         global current_tile_index
-        if len(tileset_patterns) >= self.project_tile_limit:
+        if len(tileset) >= self.project_tile_limit:
             messagebox.showinfo("Add Many Tiles", f"Tileset is at its limit of {self.project_tile_limit}.", parent=self.root)
             return
-        space_available = self.project_tile_limit - len(tileset_patterns)
+        space_available = self.project_tile_limit - len(tileset)
 
         num_to_add = self._create_add_many_dialog(
             parent=self.root, 
             title_text="Add Many Tiles",
             prompt_text=f"How many tiles to add? (1-{space_available})",
-            current_items=len(tileset_patterns),
+            current_items=len(tileset),
             max_items_total=self.project_tile_limit
         )
         if num_to_add is None or num_to_add <= 0: return
 
         if self._clear_marked_unused(trigger_redraw=False): pass
         
-        first_new_tile_idx = len(tileset_patterns)
+        first_new_tile_idx = len(tileset)
         commands = []
         for i in range(num_to_add):
-            new_idx = len(tileset_patterns) + i
-            blank_pattern = [[0] * TILE_WIDTH for _ in range(TILE_HEIGHT)]
-            blank_colors = [(WHITE_IDX, BLACK_IDX) for _ in range(TILE_HEIGHT)]
-            commands.append(ModifyListCommand("Add Tile", tileset_patterns, new_idx, blank_pattern, is_insert=True))
-            commands.append(ModifyListCommand("Add Tile", tileset_colors, new_idx, blank_colors, is_insert=True))
-
-        old_state = (len(tileset_patterns), current_tile_index)
-        new_state = (len(tileset_patterns) + num_to_add, first_new_tile_idx)
+            new_idx = len(tileset) + i
+            commands.append(ModifyListCommand("Add Tile", tileset, new_idx, TilesetStore.blank_tile(), is_insert=True))
+
+        old_state = (len(tileset), current_tile_index)
+        new_state = (len(tileset) + num_to_add, first_new_tile_idx)
         def state_setter(state_tuple):
             global current_tile_index
             current_tile_index = state_tuple[1]
@@ -13156,8 +13658,7 @@ class TileEditorApp:
         commands = []
         for i in range(num_to_add):
             new_idx = len(supertiles_data) + i
-            blank_st_definition = [[0 for _c in range(self.supertile_grid_width)] for _r in range(self.supertile_grid_height)]
-            commands.append(ModifyListCommand("Add Supertile", supertiles_data, new_idx, blank_st_definition, is_insert=True))
+            commands.append(ModifyListCommand("Add Supertile", supertiles_data, new_idx, supertiles_data.blank_definition(), is_insert=True))
             _debug(f"[HANDLE ADD MANY] Created ModifyListCommand to insert at index {new_idx}")
 
         old_state = (current_supertile_index,)
@@ -13266,7 +13767,7 @@ class TileEditorApp:
         return result["action"]
 
     def append_supertiles_from_file(self):
-        global supertiles_data, tileset_patterns, tileset_colors
+        global supertiles_data
         global current_supertile_index, current_tile_index 
 
         st_load_path = filedialog.askopenfilename(
@@ -13332,7 +13833,7 @@ class TileEditorApp:
              return
 
         st_space_available = self.project_supertile_limit - len(supertiles_data)
-        tile_space_available = self.project_tile_limit - len(tileset_patterns)
+        tile_space_available = self.project_tile_limit - len(tileset)
 
         if st_space_available <= 0:
             messagebox.showinfo("Append Supertiles", f"Current project supertile set is at its limit of {self.project_supertile_limit}. Cannot append.", parent=self.root)
@@ -13361,9 +13862,8 @@ class TileEditorApp:
             messagebox.showinfo("Append Supertiles", "No supertiles to append after considering limits.", parent=self.root)
             return
         
-        temp_appended_tile_patterns = []
-        temp_appended_tile_colors = []
-        original_starting_tile_index_in_project = len(tileset_patterns) 
+        temp_appended_tiles = []
+        original_starting_tile_index_in_project = len(tileset) 
         num_tiles_actually_staged_from_file = 0
 
         if file_tile_count > 0 and num_tiles_to_attempt_append_from_file > 0:
@@ -13382,29 +13882,12 @@ class TileEditorApp:
                        len(all_color_bytes) < file_tile_count * bytes_per_tile_colors:
                         raise EOFError("Could not read all tile data from linked tileset file.")
 
-                    pat_offset, col_offset = 0,0
-                    for i_tile_file in range(file_tile_count): # Iterate all tiles in file
-                        if i_tile_file >= num_tiles_to_attempt_append_from_file: # Only stage up to allowed amount
-                            break
-                        
-                        tile_pat = [[0]*TILE_WIDTH for _ in range(TILE_HEIGHT)]
-                        tile_col = [(WHITE_IDX,BLACK_IDX)]*TILE_HEIGHT
-                        
-                        tile_pattern_bytes_slice = all_pattern_bytes[pat_offset : pat_offset + bytes_per_tile_pattern]
-                        for r in range(TILE_HEIGHT):
-                            byte_val = tile_pattern_bytes_slice[r]
-                            for c in range(TILE_WIDTH): tile_pat[r][c] = (byte_val >> (7-c)) & 1
-                        temp_appended_tile_patterns.append(tile_pat)
-                        pat_offset += bytes_per_tile_pattern
-
-                        tile_color_bytes_slice = all_color_bytes[col_offset : col_offset + bytes_per_tile_colors]
-                        for r in range(TILE_HEIGHT):
-                            byte_val = tile_color_bytes_slice[r]
-                            fg,bg = (byte_val >> 4)&0xF, byte_val&0xF
-                            tile_col[r] = (fg if 0<=fg<16 else WHITE_IDX, bg if 0<=bg<16 else BLACK_IDX)
-                        temp_appended_tile_colors.append(tile_col)
-                        col_offset += bytes_per_tile_colors
-                        num_tiles_actually_staged_from_file +=1
+                    num_tiles_to_stage = min(file_tile_count, num_tiles_to_attempt_append_from_file)
+                    file_patterns = np.frombuffer(all_pattern_bytes, dtype=np.uint8).reshape(file_tile_count, TILE_HEIGHT)
+                    file_colors = np.frombuffer(all_color_bytes, dtype=np.uint8).reshape(file_tile_count, TILE_HEIGHT)
+                    for i_tile_file in range(num_tiles_to_stage): # Only stage up to allowed amount
+                        temp_appended_tiles.append((file_patterns[i_tile_file].copy(), file_colors[i_tile_file].copy()))
+                        num_tiles_actually_staged_from_file += 1
             except Exception as e:
                 messagebox.showerror("Append Error", f"Error reading data from linked tileset file '{os.path.basename(tile_load_path)}':\n{e}", parent=self.root)
                 return
@@ -13480,7 +13963,7 @@ class TileEditorApp:
             messagebox.showerror("Append Error", f"Error processing supertile file '{os.path.basename(st_load_path)}':\n{e}", parent=self.root)
             return
 
-        if not temp_appended_tile_patterns and not temp_appended_supertile_definitions:
+        if not temp_appended_tiles and not temp_appended_supertile_definitions:
             messagebox.showinfo("Append Supertiles", "No new tiles or supertiles were ultimately appended.", parent=self.root)
             return
 
@@ -13490,9 +13973,8 @@ class TileEditorApp:
         appended_tiles_actual_count = 0
         if num_tiles_actually_staged_from_file > 0:
             for i_append_tile in range(num_tiles_actually_staged_from_file): # Iterate only staged tiles
-                if len(tileset_patterns) < MAX_TILES:
-                    tileset_patterns[len(tileset_patterns)] = temp_appended_tile_patterns[i_append_tile]
-                    tileset_colors[len(tileset_patterns)] = temp_appended_tile_colors[i_append_tile]
+                if len(tileset) < MAX_TILES:
+                    tileset.insert(len(tileset), temp_appended_tiles[i_append_tile])
                     appended_tiles_actual_count +=1
                 else: break
         
@@ -13677,8 +14159,8 @@ class TileEditorApp:
                 _error(f"   Unexpected error during color selection synchronization: {e}")
 
         elif item_type == "tile":
-            if not (0 <= index < len(tileset_patterns)): 
-                _error(f"   Invalid tile index {index} (len(tileset_patterns): {len(tileset_patterns)}). Sync aborted.")
+            if not (0 <= index < len(tileset)): 
+                _error(f"   Invalid tile index {index} (len(tileset): {len(tileset)}). Sync aborted.")
                 return
             
             try:
@@ -13788,7 +14270,7 @@ class TileEditorApp:
         # calling the new, granular _calculate_single_tile_usage method.
         results = []
         # Iterate only up to the current number of active tiles
-        for t_idx in range(len(tileset_patterns)):
+        for t_idx in range(len(tileset)):
             # Call the new helper to get the counts for this specific tile
             total_uses, unique_sts = self._calculate_single_tile_usage(t_idx)
             
@@ -13832,9 +14314,7 @@ class TileEditorApp:
 
     def _calculate_supertile_usage_data(self):
         results = []
-        for st_idx in range(len(supertiles_data)):
-            map_usage, _ = self._get_info_for_single_supertile(st_idx)
-            
+        for st_idx, map_usage in enumerate(usage_index.supertile_placement_counts(len(supertiles_data))):
             results.append({
                 'st_index': st_idx,
                 'uses_on_map_count': map_usage
@@ -13866,121 +14346,50 @@ class TileEditorApp:
         temp_full_photo_w = max(1, int(temp_full_photo_w))
         temp_full_photo_h = max(1, int(temp_full_photo_h))
 
-        # --- Part 2: Create temp_full_photo with actual scaled content dimensions ---
-        try:
-            temp_full_photo = tk.PhotoImage(width=temp_full_photo_w, height=temp_full_photo_h)
-        except tk.TclError as e:
-            _error(f" Error creating temp_full_photo ({temp_full_photo_w}x{temp_full_photo_h}): {e}")
-            # Fallback placeholder if temp_full_photo creation fails
-            placeholder_w = max(1, int(target_image_content_area_width_in_col0))
-            placeholder_h = max(1, int(final_photo_target_height))
-            ph_photo = tk.PhotoImage(width=placeholder_w, height=placeholder_h)
-            try:
-                ph_photo.put(INVALID_SUPERTILE_COLOR, to=(0, 0, placeholder_w, placeholder_h))
-            except tk.TclError: pass
-            return ph_photo
+        # --- Part 2: Render the supertile content as palette slots at the usage window scale ---
+        content_pixels = None
+        if 0 <= supertile_index < len(supertiles_data) and \
+           supertiles_data[supertile_index].shape == (self.supertile_grid_height, self.supertile_grid_width):
+            content_pixels = supertile_slot_pixels(supertile_index)
+        if content_pixels is None or content_pixels.size == 0:
+            content_pixels = np.full((1, 1), MapRaster.INVALID_SUPERTILE_SLOT, dtype=np.uint8)
+        content_pixels = nearest_scale_slots(content_pixels, temp_full_photo_w, temp_full_photo_h)
 
-        # --- Part 3: Render supertile content onto temp_full_photo ---
-        if not (0 <= supertile_index < len(supertiles_data)):
-            temp_full_photo.put(INVALID_SUPERTILE_COLOR, to=(0,0, temp_full_photo_w, temp_full_photo_h))
-        else:
-            definition = supertiles_data[supertile_index]
-            if not (definition and 
-                    len(definition) == self.supertile_grid_height and
-                    (self.supertile_grid_height == 0 or (self.supertile_grid_width > 0 and len(definition[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0)):
-                temp_full_photo.put(INVALID_SUPERTILE_COLOR, to=(0,0, temp_full_photo_w, temp_full_photo_h))
-            else:
-                # No initial green fill here; temp_full_photo should be fully covered by actual content or error colors
-                px_per_base_tile_w_on_temp = TILE_WIDTH * SUPERTILE_USAGE_SCREEN_PIXELS_PER_MSX_PIXEL
-                px_per_base_tile_h_on_temp = TILE_HEIGHT * SUPERTILE_USAGE_SCREEN_PIXELS_PER_MSX_PIXEL
-
-                for r_st_def in range(self.supertile_grid_height):
-                    for c_st_def in range(self.supertile_grid_width):
-                        tile_idx_val = definition[r_st_def][c_st_def]
-                        base_tile_draw_x = int(c_st_def * px_per_base_tile_w_on_temp)
-                        base_tile_draw_y = int(r_st_def * px_per_base_tile_h_on_temp)
-
-                        if not (0 <= tile_idx_val < len(tileset_patterns)):
-                            for y_fill_inv in range(int(px_per_base_tile_h_on_temp)):
-                                for x_fill_inv in range(int(px_per_base_tile_w_on_temp)):
-                                    dest_x_inv = base_tile_draw_x + x_fill_inv
-                                    dest_y_inv = base_tile_draw_y + y_fill_inv
-                                    if dest_x_inv < temp_full_photo_w and dest_y_inv < temp_full_photo_h:
-                                        temp_full_photo.put(INVALID_TILE_COLOR, to=(dest_x_inv, dest_y_inv))
-                            continue
-                        pattern = tileset_patterns[tile_idx_val]
-                        colors = tileset_colors[tile_idx_val]
-                        for r_msx in range(TILE_HEIGHT): 
-                            fg_idx, bg_idx = WHITE_IDX, BLACK_IDX 
-                            if r_msx < len(colors): fg_idx, bg_idx = colors[r_msx]
-                            safe_fg_idx = fg_idx if 0 <= fg_idx < 16 else WHITE_IDX
-                            safe_bg_idx = bg_idx if 0 <= bg_idx < 16 else BLACK_IDX
-                            fg_color_hex = self.active_msx_palette[safe_fg_idx]
-                            bg_color_hex = self.active_msx_palette[safe_bg_idx]
-                            row_pattern_data_list = []
-                            if r_msx < len(pattern): row_pattern_data_list = pattern[r_msx]
-                            for c_msx in range(TILE_WIDTH):
-                                pixel_pattern_bit = 0
-                                if c_msx < len(row_pattern_data_list): pixel_pattern_bit = row_pattern_data_list[c_msx]
-                                color_to_draw_hex = fg_color_hex if pixel_pattern_bit == 1 else bg_color_hex
-                                for y_offset_in_block in range(SUPERTILE_USAGE_SCREEN_PIXELS_PER_MSX_PIXEL):
-                                    for x_offset_in_block in range(SUPERTILE_USAGE_SCREEN_PIXELS_PER_MSX_PIXEL):
-                                        dest_screen_x = base_tile_draw_x + (c_msx * SUPERTILE_USAGE_SCREEN_PIXELS_PER_MSX_PIXEL) + x_offset_in_block
-                                        dest_screen_y = base_tile_draw_y + (r_msx * SUPERTILE_USAGE_SCREEN_PIXELS_PER_MSX_PIXEL) + y_offset_in_block
-                                        if dest_screen_x < temp_full_photo_w and dest_screen_y < temp_full_photo_h:
-                                            try:
-                                                temp_full_photo.put(color_to_draw_hex, to=(dest_screen_x, dest_screen_y))
-                                            except tk.TclError: break 
-                                    else: continue
-                                    break 
-
-        # --- Part 4: Determine final_photo_width and create final_photo ---
+        # --- Part 3: Determine final photo size ---
         # final_photo_width is the minimum of the actual scaled content width and the available column area
         calculated_final_photo_width = min(temp_full_photo_w, max(1, int(target_image_content_area_width_in_col0)))
         
         # final_photo_height is the target row height for the Treeview cell
         final_photo_height = max(1, int(final_photo_target_height)) 
         
-        final_photo = tk.PhotoImage(width=calculated_final_photo_width, height=final_photo_height)
-        
         if supertile_index == 0: # Debug
              _debug(f"[STP DEBUG {supertile_index}] temp_full_photo WxH: {temp_full_photo_w}x{temp_full_photo_h}")
              _debug(f"[STP DEBUG {supertile_index}] target_image_content_area_width_in_col0: {target_image_content_area_width_in_col0}")
              _debug(f"[STP DEBUG {supertile_index}] final_photo will be WxH: {calculated_final_photo_width}x{final_photo_height}")
 
-        # --- Part 5: Fill final_photo with background ---
+        # --- Part 4: Background, then the content cropped to the photo and vertically centred ---
         hex_bg_color_final = "#F0F0F0" 
         try:
             system_bg_name = "SystemButtonFace" 
-            rgb_tuple = self.root.winfo_rgb(system_bg_name) 
-            r_8bit, g_8bit, b_8bit = rgb_tuple[0]//256, rgb_tuple[1]//256, rgb_tuple[2]//256
-            hex_bg_color_final = f"#{r_8bit:02x}{g_8bit:02x}{b_8bit:02x}"
+            self.root.winfo_rgb(system_bg_name) 
+            hex_bg_color_final = system_bg_name
         except tk.TclError: pass 
-        final_photo.put(hex_bg_color_final, to=(0,0, calculated_final_photo_width, final_photo_height))
+        final_pixels = np.full((final_photo_height, calculated_final_photo_width), MapRaster.BACKGROUND_SLOT, dtype=np.uint8)
 
-        # --- Part 6: Copy/Crop from temp_full_photo to final_photo, vertically centering ---
-        # Width to copy from source is limited by final_photo's (potentially cropped) width
-        width_to_copy_from_source = calculated_final_photo_width 
-        # Height to copy from source is the actual content height from temp_full_photo
-        height_to_copy_from_source = temp_full_photo_h 
-
-        if width_to_copy_from_source > 0 and height_to_copy_from_source > 0:
-            y_offset_for_centering = 0
-            if final_photo.height() > temp_full_photo.height(): # If row is taller than content
-                y_offset_for_centering = (final_photo.height() - temp_full_photo.height()) // 2
-            y_offset_for_centering = max(0, y_offset_for_centering)
+        y_offset_for_centering = max(0, (final_photo_height - temp_full_photo_h) // 2)
+        copied_height = min(temp_full_photo_h, final_photo_height - y_offset_for_centering)
+        final_pixels[y_offset_for_centering:y_offset_for_centering + copied_height, :] = \
+            content_pixels[:copied_height, :calculated_final_photo_width]
 
+        try:
+            return self._slot_photo(final_pixels, hex_bg_color_final)
+        except tk.TclError as e:
+            _error(f" Error creating ST preview photo ({calculated_final_photo_width}x{final_photo_height}): {e}")
+            ph_photo = tk.PhotoImage(width=calculated_final_photo_width, height=final_photo_height)
             try:
-                # Copy from temp_full_photo (0,0) up to (width_to_copy_from_source, height_to_copy_from_source)
-                # To final_photo at (0, y_offset_for_centering)
-                final_photo.tk.call(final_photo, 'copy', temp_full_photo,
-                                    '-from', 0, 0, width_to_copy_from_source, height_to_copy_from_source,
-                                    '-to', 0, y_offset_for_centering)
-                if supertile_index == 0: _debug(f"[STP DEBUG {supertile_index}] Copied {width_to_copy_from_source}x{height_to_copy_from_source} from temp to final at y_offset {y_offset_for_centering}")
-            except tk.TclError as e:
-                _error(f" Error during PhotoImage copy for ST preview: {e}")
-        
-        return final_photo
+                ph_photo.put(INVALID_SUPERTILE_COLOR, to=(0, 0, calculated_final_photo_width, final_photo_height))
+            except tk.TclError: pass
+            return ph_photo
 
     # --- Usage Window Config Management Helpers (NEW) ---
     def _get_config_filepath(self):
@@ -14204,37 +14613,16 @@ class TileEditorApp:
         _debug(" _restore_window_states: Method finished.")
 
     def _calculate_tile_usage_in_single_supertile(self, tile_index, supertile_index):
-        if not (0 <= tile_index < len(tileset_patterns) and 0 <= supertile_index < len(supertiles_data)):
-            return 0
-
-        count = 0
-        st_definition = supertiles_data[supertile_index]
-
-        if not st_definition or len(st_definition) != self.supertile_grid_height or \
-           (self.supertile_grid_height > 0 and len(st_definition[0]) != self.supertile_grid_width):
+        if not (0 <= tile_index < len(tileset) and 0 <= supertile_index < len(supertiles_data)):
             return 0
 
-        for r in range(self.supertile_grid_height):
-            for c in range(self.supertile_grid_width):
-                if st_definition[r][c] == tile_index:
-                    count += 1
-        return count
+        return usage_index.tile_count_in_supertile(tile_index, supertile_index)
 
     def _calculate_single_tile_usage(self, tile_index_to_check):
-        total_placements = 0
-        unique_supertiles_that_use_it = set()
-
-        if not (0 <= tile_index_to_check < len(tileset_patterns)):
+        if not (0 <= tile_index_to_check < len(tileset)):
             return 0, 0
 
-        for st_idx in range(len(supertiles_data)):
-            local_count = self._calculate_tile_usage_in_single_supertile(tile_index_to_check, st_idx)
-
-            if local_count > 0:
-                total_placements += local_count
-                unique_supertiles_that_use_it.add(st_idx)
-        
-        return total_placements, len(unique_supertiles_that_use_it)
+        return usage_index.tile_placement_count(tile_index_to_check), usage_index.tile_user_count(tile_index_to_check)
 
     def _update_selected_tile_info_panel(self, update_usage_counts=True):
         """Updates the new selected tile info panel with the image and usage counts."""
@@ -14275,51 +14663,18 @@ class TileEditorApp:
 
     def _calculate_single_color_usage(self, slot_index, return_set=False):
         """Calculates pixel, line, and unique tile usage for a single palette slot index."""
-        pixel_uses = 0
-        line_references = 0
-        tile_references_set = set()
-
         if not (0 <= slot_index < 16):
             if return_set:
                 return 0, 0, set()
             return 0, 0, 0 
 
-        for tile_idx in range(len(tileset_patterns)):
-            tile_uses_this_slot = False
-            if tile_idx >= len(tileset_colors): continue
-
-            for row_idx in range(TILE_HEIGHT):
-                if row_idx >= len(tileset_colors[tile_idx]): continue
-                
-                fg_slot, bg_slot = tileset_colors[tile_idx][row_idx]
-                line_uses_this_slot_this_row = False
-
-                if fg_slot == slot_index:
-                    line_references += 1
-                    tile_uses_this_slot = True
-                    line_uses_this_slot_this_row = True
-                
-                if bg_slot == slot_index and fg_slot != slot_index:
-                    line_references += 1
-                    tile_uses_this_slot = True
-                    line_uses_this_slot_this_row = True
-                elif bg_slot == slot_index and fg_slot == slot_index:
-                    tile_uses_this_slot = True
-
-                if line_uses_this_slot_this_row:
-                    if tile_idx >= len(tileset_patterns) or row_idx >= len(tileset_patterns[tile_idx]): continue
-                    
-                    for col_idx in range(TILE_WIDTH):
-                        if col_idx >= len(tileset_patterns[tile_idx][row_idx]): continue
-                        
-                        pixel_val = tileset_patterns[tile_idx][row_idx][col_idx]
-                        if pixel_val == 1 and fg_slot == slot_index:
-                            pixel_uses += 1
-                        elif pixel_val == 0 and bg_slot == slot_index:
-                            pixel_uses += 1
-            
-            if tile_uses_this_slot:
-                tile_references_set.add(tile_idx)
+        # A row references the slot once, whether as foreground, background or both.
+        fg_slots = tileset.colors >> 4
+        bg_slots = tileset.colors & 0x0F
+        row_uses_slot = (fg_slots == slot_index) | (bg_slots == slot_index)
+        line_references = int(np.count_nonzero(row_uses_slot))
+        tile_references_set = set(np.flatnonzero(row_uses_slot.any(axis=1)).tolist())
+        pixel_uses = int(np.count_nonzero(tileset.palette_indices() == slot_index))
 
         if return_set:
             return pixel_uses, line_references, tile_references_set
@@ -14329,51 +14684,33 @@ class TileEditorApp:
     def _get_info_for_single_supertile(self, supertile_index):
         map_usage_count = 0
         if 0 <= supertile_index < len(supertiles_data):
-            for r in range(map_height):
-                for c in range(map_width):
-                    if 0 <= r < len(map_data) and 0 <= c < len(map_data[r]):
-                        if map_data[r][c] == supertile_index:
-                            map_usage_count += 1
-                    else:
-                        _debug(f" Map data access out of bounds for ({r},{c}) in _get_info_for_single_supertile")
+            map_usage_count = usage_index.supertile_placement_count(supertile_index)
 
         unique_tile_count = 0
         if 0 <= supertile_index < len(supertiles_data):
-            unique_tiles = set()
             st_definition = supertiles_data[supertile_index]
-            if st_definition and len(st_definition) == self.supertile_grid_height and \
-               (self.supertile_grid_height == 0 or (self.supertile_grid_width > 0 and len(st_definition[0]) == self.supertile_grid_width) or self.supertile_grid_width == 0):
-                for r_st in range(self.supertile_grid_height):
-                    for c_st in range(self.supertile_grid_width):
-                        unique_tiles.add(st_definition[r_st][c_st])
-                unique_tile_count = len(unique_tiles)
+            if st_definition.size > 0 and st_definition.shape == (self.supertile_grid_height, self.supertile_grid_width):
+                unique_tile_count = len(np.unique(st_definition))
             else:
                 _warning(f"Cannot calculate composition for malformed supertile {supertile_index}")
 
         return map_usage_count, unique_tile_count
 
     def create_supertile_preview_image(self, supertile_index, box_width, box_height):
-        final_photo = tk.PhotoImage(width=box_width, height=box_height)
+        box_width = max(1, int(box_width))
+        box_height = max(1, int(box_height))
         try:
             bg_color = self.root.cget("bg")
-            final_photo.put(bg_color, to=(0, 0, box_width, box_height))
+            self.root.winfo_rgb(bg_color)
         except (tk.TclError, AttributeError):
-            final_photo.put("#F0F0F0", to=(0, 0, box_width, box_height))
+            bg_color = "#F0F0F0"
+        box_pixels = np.full((box_height, box_width), MapRaster.BACKGROUND_SLOT, dtype=np.uint8)
 
         st_width_msx = self.supertile_grid_width * TILE_WIDTH
         st_height_msx = self.supertile_grid_height * TILE_HEIGHT
 
         if st_width_msx <= 0 or st_height_msx <= 0:
-             return final_photo
-
-        pil_supertile_native = self.create_map_render_of_supertile(
-            supertile_index,
-            st_width_msx,
-            st_height_msx
-        )
-
-        if not pil_supertile_native:
-            return final_photo
+             return self._slot_photo(box_pixels, bg_color)
 
         scale_x = box_width / st_width_msx
         scale_y = box_height / st_height_msx
@@ -14383,21 +14720,18 @@ class TileEditorApp:
         scaled_height = int(st_height_msx * scale)
 
         if scaled_width < 1 or scaled_height < 1:
-            return final_photo
+            return self._slot_photo(box_pixels, bg_color)
 
-        pil_supertile_scaled = pil_supertile_native.resize(
-            (scaled_width, scaled_height),
-            Image.Resampling.NEAREST
-        )
-
-        temp_photo = ImageTk.PhotoImage(pil_supertile_scaled)
+        st_pixels = supertile_slot_pixels(supertile_index)
+        if st_pixels is None or st_pixels.size == 0:
+            st_pixels = np.full((1, 1), MapRaster.INVALID_SUPERTILE_SLOT, dtype=np.uint8)
 
         paste_x = (box_width - scaled_width) // 2
         paste_y = (box_height - scaled_height) // 2
+        box_pixels[paste_y:paste_y + scaled_height, paste_x:paste_x + scaled_width] = \
+            nearest_scale_slots(st_pixels, scaled_width, scaled_height)
 
-        final_photo.tk.call(final_photo, 'copy', temp_photo, '-from', 0, 0, scaled_width, scaled_height, '-to', paste_x, paste_y)
-
-        return final_photo
+        return self._slot_photo(box_pixels, bg_color)
 
     def _update_selected_supertile_info_panel(self):
         if not hasattr(self, 'selected_supertile_preview_canvas') or \
@@ -14695,7 +15029,7 @@ class TileEditorApp:
 
     def _handle_tile_usage_label_click(self, event=None):
         """Called when the usage label in the Tile Editor is clicked."""
-        if not (0 <= current_tile_index < len(tileset_patterns)):
+        if not (0 <= current_tile_index < len(tileset)):
             return
 
         # Check if the tile is actually used in any supertiles before proceeding
@@ -14880,7 +15214,7 @@ class TileEditorApp:
 
     def _handle_st_tab_global_usage_click(self, event=None):
         """Called when the global tile usage label in the Supertile Editor is clicked."""
-        if not (0 <= selected_tile_for_supertile < len(tileset_patterns)):
+        if not (0 <= selected_tile_for_supertile < len(tileset)):
             return
 
         # Check if the tile is actually used before proceeding
@@ -15104,8 +15438,7 @@ class TileEditorApp:
         commands = []
         
         if item_type == "tile":
-            commands.append(ReorderListCommand("Swap Tiles", tileset_patterns, index_a, index_b, is_swap=True))
-            commands.append(ReorderListCommand("Swap Tiles", tileset_colors, index_a, index_b, is_swap=True))
+            commands.append(ReorderListCommand("Swap Tiles", tileset, index_a, index_b, is_swap=True))
             
             # Use the new, fast, procedural command
             commands.append(UpdateSupertileRefsForTileSwapCommand("Update Supertile Refs", self, index_a, index_b))
@@ -15154,33 +15487,12 @@ class TileEditorApp:
 
     def _update_supertile_refs_for_tile_swap(self, index_a, index_b):
         """Updates supertile definitions after a tile swap."""
-        for st_idx in range(len(supertiles_data)):
-            definition = supertiles_data[st_idx]
-            if not definition: continue
-
-            for r in range(self.supertile_grid_height):
-                if r >= len(definition): continue
-                row = definition[r]
-                for c in range(self.supertile_grid_width):
-                    if c >= len(row): continue
-                    
-                    if row[c] == index_a:
-                        supertiles_data[st_idx][r][c] = index_b
-                    elif row[c] == index_b:
-                        supertiles_data[st_idx][r][c] = index_a
+        supertiles_data.remap_tiles(swap_reference_lut(index_a, index_b))
 
     def _update_map_refs_for_supertile_swap(self, index_a, index_b):
         """Updates map data after a supertile swap."""
-        for r in range(map_height):
-            if r >= len(map_data): continue
-            row = map_data[r]
-            for c in range(map_width):
-                if c >= len(row): continue
-
-                if row[c] == index_a:
-                    map_data[r][c] = index_b
-                elif row[c] == index_b:
-                    map_data[r][c] = index_a
+        global map_data
+        map_data = swap_reference_lut(index_a, index_b)[map_data]
 
     def _display_import_from_image_dialog(self):
         """
@@ -15488,37 +15800,39 @@ class TileEditorApp:
         if not options["dithering"]: command.append("--no-dithering")
         if options["find_offset"]: command.append("--find-best-offset")
         if options["synthesize"]: command.append("--synthesize-tiles")
+        if options["quick_preview"]: command.append("--time-budget"); command.append(str(QUICK_PREVIEW_TIME_BUDGET_SECONDS))
         if options["limit_cores"]: command.append("--cores"); command.append(str(options["cores"]))
             
+        command.extend(["--progress-format", "jsonl"])
+            
         _info(f"Executing tile generation script: {' '.join(command)}")
 
-        # --- Run the script with progress dialog ---
-        runner_dialog = tk.Toplevel(self.root)
-        runner_dialog.title("Generating Tiles from Image...")
-        runner_dialog.transient(self.root)
-        runner_dialog.grab_set()
-        runner_dialog.resizable(False, False)
+        def cleanup_temp_dir():
+            try:
+                if os.path.exists(output_dir): shutil.rmtree(output_dir)
+            except Exception as e:
+                _error(f"Failed to clean up temp dir after failed run: {e}")
 
-        log_text = tk.Text(runner_dialog, height=20, width=90, wrap=tk.WORD, state=tk.DISABLED, bg="#1E1E1E", fg="#D4D4D4", font=("Consolas", 9))
-        log_text.pack(padx=10, pady=10, expand=True, fill="both")
-        
-        def on_script_complete(success):
-            runner_dialog.destroy() # Close the log window
+        # --- Run the script with progress dialog ---
+        def on_script_complete(success, cancelled):
             if success:
+                runner_dialog.destroy() # Close the progress window
                 temp_pal_path = os.path.join(output_dir, f"{basename}.SC4Pal")
                 temp_tiles_path = os.path.join(output_dir, f"{basename}.SC4Tiles")
                 
                 # After success, proceed to the selection dialog (Phase 3)
                 self._show_image_tile_selection_dialog(temp_pal_path, temp_tiles_path, output_dir)
+            elif cancelled:
+                _info("Tile generation cancelled by user.")
+                runner_dialog.destroy()
+                cleanup_temp_dir()
             else:
-                messagebox.showerror("Generation Failed", "The tile generation script failed. See console for details.", parent=self.root)
-                # Cleanup failed run
-                try:
-                    if os.path.exists(output_dir): shutil.rmtree(output_dir)
-                except Exception as e:
-                    _error(f"Failed to clean up temp dir after failed run: {e}")
+                messagebox.showerror("Generation Failed", "The tile generation script failed. See log for details.", parent=runner_dialog)
 
-        self._run_script_and_stream_output(command, log_text, on_script_complete)
+        runner_dialog = ScriptProgressDialog(
+            self.root, self, "Generating Tiles from Image...", command,
+            on_script_complete, on_close_callback=cleanup_temp_dir
+        )
 
     def clear_all_supertiles_non_interactive(self):
         """
@@ -15529,11 +15843,9 @@ class TileEditorApp:
 
         _debug("Performing non-interactive clear of all supertile definitions.")
         
+        # Recreate the definitions based on current project dimensions
+        supertiles_data.reset(len(supertiles_data), self.supertile_grid_width, self.supertile_grid_height)
         for i in range(len(supertiles_data)):
-            # Recreate the definition based on current project dimensions
-            supertiles_data[i] = [
-                [0 for _c in range(self.supertile_grid_width)] for _r in range(self.supertile_grid_height)
-            ]
             self.invalidate_supertile_cache(i)
         
         # Also clear map data as it references old supertiles that now have different content
@@ -15546,13 +15858,11 @@ class TileEditorApp:
         """
         global map_data, map_width, map_height
         _debug("Performing non-interactive clear of map data.")
-        map_data = [[0 for _ in range(map_width)] for _ in range(map_height)]
+        map_data = new_map_array(map_width, map_height)
         self.invalidate_minimap_background_cache()
 
     def _swap_palette_indices(self, index_a, index_b):
         """Swaps two colors in the palette and updates all tile color references."""
-        global tileset_colors
-
         if not (0 <= index_a < 16 and 0 <= index_b < 16):
             return False
         
@@ -15570,21 +15880,15 @@ class TileEditorApp:
         palette_swap_command = SetDataCommand("Swap Palette Colors", self, palette_setter, new_palette, old_palette)
 
         # --- Command for swapping color references in tileset ---
-        old_tileset_colors = copy.deepcopy(tileset_colors)
-        new_tileset_colors = copy.deepcopy(tileset_colors)
-        for tile_color_def in new_tileset_colors:
-            for i, (fg, bg) in enumerate(tile_color_def):
-                new_fg, new_bg = fg, bg
-                if fg == index_a: new_fg = index_b
-                elif fg == index_b: new_fg = index_a
-                if bg == index_a: new_bg = index_b
-                elif bg == index_b: new_bg = index_a
-                if (new_fg, new_bg) != (fg, bg):
-                    tile_color_def[i] = (new_fg, new_bg)
+        slot_map = np.arange(16, dtype=np.uint8)
+        slot_map[index_a], slot_map[index_b] = index_b, index_a
+        old_tileset_colors = tileset.colors.copy()
+        new_tileset_colors = tileset.remapped_colors(slot_map)
 
         def tileset_colors_setter(c):
-            global tileset_colors
-            tileset_colors = c
+            tileset.colors = c
+            # Cached renders hold palette slots, so renumbered slots make them stale
+            self.clear_all_caches()
 
         tileset_refs_command = SetDataCommand("Update Tile Color Refs", self, tileset_colors_setter, new_tileset_colors, old_tileset_colors)
         composite = CompositeCommand("Swap Palette Colors", [palette_swap_command, tileset_refs_command])
@@ -15840,7 +16144,7 @@ class TileEditorApp:
                 if item_type_for_click is None: return
 
                 max_items = 0
-                if item_type_for_click == "tile": max_items = len(tileset_patterns)
+                if item_type_for_click == "tile": max_items = len(tileset)
                 elif item_type_for_click == "supertile": max_items = len(supertiles_data)
 
                 index_at_release = self._get_index_from_canvas_coords(canvas, event.x, event.y, item_type_for_click)
@@ -15878,7 +16182,7 @@ class TileEditorApp:
             elif self.drag_item_type is not None:
                 item_type = self.drag_item_type
                 max_items = 0
-                if item_type == "tile": max_items = len(tileset_patterns)
+                if item_type == "tile": max_items = len(tileset)
                 elif item_type == "supertile": max_items = len(supertiles_data)
                 
                 is_alt_down = (event.state & 0x20000) != 0
@@ -16013,7 +16317,7 @@ class TileEditorApp:
             coords = self._get_supertile_coords_from_canvas(canvas_x, canvas_y)
             if coords:
                 c, r = coords
-                supertile_idx_to_edit = map_data[r][c]
+                supertile_idx_to_edit = int(map_data[r, c])
                 _debug(f"[DEEP DIVE] Diving to edit Supertile {supertile_idx_to_edit}.")
                 current_supertile_index = supertile_idx_to_edit
                 self.notebook.select(self.tab_supertile_editor)
@@ -16027,7 +16331,7 @@ class TileEditorApp:
             col = event.x // mini_tile_dsize
             row = event.y // mini_tile_dsize
             if (0 <= row < self.supertile_grid_height and 0 <= col < self.supertile_grid_width):
-                tile_idx_to_edit = supertiles_data[current_supertile_index][row][col]
+                tile_idx_to_edit = int(supertiles_data[current_supertile_index][row, col])
                 _debug(f"[DEEP DIVE] Diving to edit Tile {tile_idx_to_edit}.")
                 current_tile_index = tile_idx_to_edit
                 self.notebook.select(self.tab_tile_editor)
@@ -16052,7 +16356,7 @@ class TileEditorApp:
         elif source_widget == self.st_tileset_canvas:
             _debug("[DEEP DIVE] Request from Supertile Editor Tileset to Tile Editor.")
             tile_idx_to_edit = self._get_index_from_canvas_coords(source_widget, event.x, event.y, "tile")
-            if 0 <= tile_idx_to_edit < len(tileset_patterns):
+            if 0 <= tile_idx_to_edit < len(tileset):
                 current_tile_index = tile_idx_to_edit
                 selected_tile_for_supertile = tile_idx_to_edit
                 self.notebook.select(self.tab_tile_editor)
@@ -16076,12 +16380,16 @@ class TileEditorApp:
             # This state is for handling drags, so it's fine to set it here.
             self.last_placed_supertile_cell = (r, c)
 
-    def _run_script_and_stream_output(self, command, text_widget, on_complete_callback):
+    def _run_script_and_stream_output(self, command, text_widget, on_complete_callback, event_callback=None):
         """
         Runs an external script in a separate thread and streams its output
         to a tkinter Text widget in a GUI-safe way.
+        If event_callback is given, stdout lines holding a JSON object (the
+        '--progress-format jsonl' protocol) are passed to it instead of the log.
+        Returns a ScriptRunHandle that can cancel the whole process tree.
         """
         output_queue = queue.Queue()
+        run_handle = ScriptRunHandle()
 
         def thread_target(cmd, q):
             """This function runs in a background thread."""
@@ -16090,6 +16398,12 @@ class TileEditorApp:
                 env = os.environ.copy()
                 env['PYTHONIOENCODING'] = 'utf-8'
 
+                # Own process group/job, so cancelling also reaches multiprocessing workers
+                if os.name == 'nt':
+                    group_kwargs = {"creationflags": subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP}
+                else:
+                    group_kwargs = {"start_new_session": True}
+
                 process = subprocess.Popen(
                     cmd,
                     stdout=subprocess.PIPE,
@@ -16099,18 +16413,22 @@ class TileEditorApp:
                     errors='replace',
                     bufsize=1,
                     universal_newlines=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
-                    env=env # Pass the modified environment to the subprocess
+                    env=env, # Pass the modified environment to the subprocess
+                    **group_kwargs
                 )
+                run_handle.attach(process)
 
                 for line in iter(process.stdout.readline, ''):
                     q.put(line)
 
                 process.stdout.close()
                 return_code = process.wait()
-                q.put(f"\n--- Process finished with exit code {return_code} ---")
+                if run_handle.cancelled:
+                    q.put("\n--- Process cancelled by user ---")
+                else:
+                    q.put(f"\n--- Process finished with exit code {return_code} ---")
                 # Put the success status (True/False) on the queue as the final item
-                q.put(return_code == 0)
+                q.put(return_code == 0 and not run_handle.cancelled)
                 
             except Exception as e:
                 q.put(f"\n--- THREAD ERROR: {e} ---")
@@ -16121,28 +16439,52 @@ class TileEditorApp:
         thread = threading.Thread(target=thread_target, args=(command, output_queue))
         thread.daemon = True
         thread.start()
-        self._check_output_queue(text_widget, output_queue, on_complete_callback)
+        self._check_output_queue(text_widget, output_queue, on_complete_callback, event_callback)
+        return run_handle
 
-    def _check_output_queue(self, text_widget, q, on_complete_callback):
-        """Periodically checks the queue for new output and updates the Text widget."""
+    def _check_output_queue(self, text_widget, q, on_complete_callback, event_callback=None):
+        """
+        Periodically drains the queue and updates the Text widget.
+        All pending lines are inserted with a single widget update per tick.
+        """
+        pending_text = []
+        finished_status = None
         try:
-            while True:
+            for _ in range(SCRIPT_OUTPUT_MAX_LINES_PER_TICK):
                 line = q.get_nowait()
 
                 if isinstance(line, bool):
-                    if on_complete_callback:
-                        on_complete_callback(line) # Pass success status to callback
-                    return
+                    finished_status = line
+                    break
 
-                if text_widget.winfo_exists():
-                    text_widget.config(state=tk.NORMAL)
-                    text_widget.insert(tk.END, line)
-                    text_widget.see(tk.END)
-                    text_widget.config(state=tk.DISABLED)
+                if event_callback and line.startswith("{"):
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        event = None
+                    if isinstance(event, dict):
+                        log_line = event_callback(event)
+                        if log_line:
+                            pending_text.append(log_line)
+                        continue
 
+                pending_text.append(line)
         except queue.Empty:
-            if self.root.winfo_exists():
-                self.root.after(100, self._check_output_queue, text_widget, q, on_complete_callback)
+            pass
+
+        if pending_text and text_widget.winfo_exists():
+            text_widget.config(state=tk.NORMAL)
+            text_widget.insert(tk.END, "".join(pending_text))
+            text_widget.see(tk.END)
+            text_widget.config(state=tk.DISABLED)
+
+        if finished_status is not None:
+            if on_complete_callback:
+                on_complete_callback(finished_status) # Pass success status to callback
+            return
+
+        if self.root.winfo_exists():
+            self.root.after(SCRIPT_OUTPUT_POLL_MS, self._check_output_queue, text_widget, q, on_complete_callback, event_callback)
 
     def handle_export_raw(self):
         if self.current_project_base_path is None:
@@ -16439,38 +16781,27 @@ class TileEditorApp:
             command.append("--find-best-offset")
         if options["synthesize"]:
             command.append("--synthesize-tiles")
+        if options["quick_preview"]:
+            command.append("--time-budget")
+            command.append(str(QUICK_PREVIEW_TIME_BUDGET_SECONDS))
         if options["limit_cores"]:
             command.append("--cores")
             command.append(str(options["cores"]))
             
+        command.extend(["--progress-format", "jsonl"])
+            
         _info(f"Executing external command: {' '.join(command)}")
 
         # --- Run the script ---
-        runner_dialog = tk.Toplevel(self.root)
-        runner_dialog.title("Importing Project...")
-        runner_dialog.transient(self.root)
-        runner_dialog.grab_set()
-        runner_dialog.resizable(False, False)
-
-        log_text = tk.Text(runner_dialog, height=20, width=90, wrap=tk.WORD, state=tk.DISABLED, bg="#1E1E1E", fg="#D4D4D4", font=("Consolas", 9))
-        scrollbar = ttk.Scrollbar(runner_dialog, command=log_text.yview)
-        log_text['yscrollcommand'] = scrollbar.set
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        def cleanup_and_close():
+        def cleanup_temp_dir():
             try:
                 if os.path.exists(output_dir):
                     shutil.rmtree(output_dir)
                     _debug(f"Cleaned up temporary import directory: {output_dir}")
             except Exception as e:
                 _error(f"Failed to clean up temporary directory {output_dir}: {e}")
-            runner_dialog.destroy()
 
-        close_button = ttk.Button(runner_dialog, text="Close", state=tk.DISABLED, command=cleanup_and_close)
-        close_button.pack(pady=5)
-        
-        def on_script_complete(success):
+        def on_script_complete(success, cancelled):
             if success:
                 runner_dialog.destroy()
                 project_base_path = os.path.join(output_dir, basename)
@@ -16479,19 +16810,18 @@ class TileEditorApp:
                 self.current_project_base_path = None
                 self._mark_project_modified()
                 messagebox.showinfo("Import Successful", "Project successfully created from image.\nUse 'Save Project As...' to save it.", parent=self.root)
-
-                try:
-                    if os.path.exists(output_dir):
-                        shutil.rmtree(output_dir)
-                        _debug(f"Cleaned up temporary import directory: {output_dir}")
-                except Exception as e:
-                    _error(f"Failed to clean up temporary directory after successful import: {e}")
+                cleanup_temp_dir()
+            elif cancelled:
+                _info("Image import cancelled by user.")
+                runner_dialog.destroy()
+                cleanup_temp_dir()
             else:
-                messagebox.showerror("Import Failed", "The import script failed to complete. See log for details.", parent=self.root)
-                close_button.config(state=tk.NORMAL)
-                runner_dialog.grab_release()
+                messagebox.showerror("Import Failed", "The import script failed to complete. See log for details.", parent=runner_dialog)
 
-        self._run_script_and_stream_output(command, log_text, on_script_complete)
+        runner_dialog = ScriptProgressDialog(
+            self.root, self, "Importing Project...", command,
+            on_script_complete, on_close_callback=cleanup_temp_dir
+        )
 
     def _cleanup_temp_dirs(self):
         """Deletes temporary directories used by the application on startup."""
@@ -16506,7 +16836,7 @@ class TileEditorApp:
     def _apply_palette_change_updates(self):
         """Helper to perform all necessary UI updates after a palette color change."""
         self._mark_project_modified()
-        self.clear_all_caches()
+        # Render caches hold palette slots and are recoloured when shown, so they stay valid
         self.invalidate_minimap_background_cache()
         self.update_all_displays(changed_level="all")
         self._request_color_usage_refresh()
@@ -16715,7 +17045,7 @@ class TileEditorApp:
         Takes the selected tiles from the image import dialog and appends them
         to the project in a single, undoable command.
         """
-        global current_tile_index, tileset_patterns, tileset_colors
+        global current_tile_index
         
         if not dialog.winfo_exists(): return
         
@@ -16735,20 +17065,19 @@ class TileEditorApp:
 
         # 2. Commands to append tiles
         sorted_indices = sorted(selection.keys())
-        first_new_tile_idx = len(tileset_patterns)
+        first_new_tile_idx = len(tileset)
         
         for i, tile_idx in enumerate(sorted_indices):
-            current_project_size = len(tileset_patterns) + i
+            current_project_size = len(tileset) + i
             if current_project_size >= self.project_tile_limit:
                 messagebox.showinfo("Import Limit Reached", f"Project tileset limit of {self.project_tile_limit} reached. Imported {i} tiles.", parent=self.root)
                 break
             
-            new_idx_in_project = len(tileset_patterns) + i
+            new_idx_in_project = len(tileset) + i
             pattern_to_add = dialog.temp_tileset_patterns[tile_idx]
             colors_to_add = dialog.temp_tileset_colors[tile_idx]
             
-            commands.append(ModifyListCommand("Import Tile", tileset_patterns, new_idx_in_project, pattern_to_add, is_insert=True))
-            commands.append(ModifyListCommand("Import Tile", tileset_colors, new_idx_in_project, colors_to_add, is_insert=True))
+            commands.append(ModifyListCommand("Import Tile", tileset, new_idx_in_project, TilesetStore.pack_tile(pattern_to_add, colors_to_add), is_insert=True))
 
         # 3. Command to update selection state
         old_state = (current_tile_index,)
@@ -16952,7 +17281,7 @@ class TileEditorApp:
         Takes the selected tiles from the image import dialog and appends them
         to the project in a single, undoable command.
         """
-        global current_tile_index, tileset_patterns, tileset_colors
+        global current_tile_index
         
         if not dialog.winfo_exists(): return
         
@@ -16972,21 +17301,20 @@ class TileEditorApp:
 
         # 2. Commands to append tiles
         sorted_indices = sorted(selection.keys())
-        first_new_tile_idx = len(tileset_patterns)
+        first_new_tile_idx = len(tileset)
         
         num_actually_imported = 0
         for tile_idx in sorted_indices:
-            current_project_size = len(tileset_patterns) + num_actually_imported
+            current_project_size = len(tileset) + num_actually_imported
             if current_project_size >= self.project_tile_limit:
                 messagebox.showinfo("Import Limit Reached", f"Project tileset limit of {self.project_tile_limit} reached. Imported {num_actually_imported} tiles.", parent=self.root)
                 break
             
-            new_idx_in_project = len(tileset_patterns) + num_actually_imported
+            new_idx_in_project = len(tileset) + num_actually_imported
             pattern_to_add = dialog.temp_tileset_patterns[tile_idx]
             colors_to_add = dialog.temp_tileset_colors[tile_idx]
             
-            commands.append(ModifyListCommand("Import Tile", tileset_patterns, new_idx_in_project, pattern_to_add, is_insert=True))
-            commands.append(ModifyListCommand("Import Tile", tileset_colors, new_idx_in_project, colors_to_add, is_insert=True))
+            commands.append(ModifyListCommand("Import Tile", tileset, new_idx_in_project, TilesetStore.pack_tile(pattern_to_add, colors_to_add), is_insert=True))
             num_actually_imported += 1
 
         if num_actually_imported == 0:
@@ -17028,7 +17356,7 @@ class TileEditorApp:
         Handles the 'Import Tiles from File...' action. Reads a .SC4Tiles file
         and opens a selection dialog for the user to choose which tiles to append.
         """
-        if len(tileset_patterns) >= self.project_tile_limit:
+        if len(tileset) >= self.project_tile_limit:
             messagebox.showinfo("Import Tiles", f"The project tileset is at its limit of {self.project_tile_limit}. Cannot import more tiles.", parent=self.root)
             return
 
@@ -17165,21 +17493,20 @@ class TileEditorApp:
 
         commands = []
         sorted_indices = sorted(selection.keys())
-        first_new_tile_idx = len(tileset_patterns)
+        first_new_tile_idx = len(tileset)
         num_actually_imported = 0
         
         for tile_idx_from_file in sorted_indices:
-            current_project_size = len(tileset_patterns) + num_actually_imported
+            current_project_size = len(tileset) + num_actually_imported
             if current_project_size >= self.project_tile_limit:
                 messagebox.showinfo("Import Limit Reached", f"Project tileset limit of {self.project_tile_limit} reached. Imported {num_actually_imported} tiles.", parent=self.root)
                 break
             
-            new_idx_in_project = len(tileset_patterns) + num_actually_imported
+            new_idx_in_project = len(tileset) + num_actually_imported
             pattern_to_add = dialog.temp_tileset_patterns[tile_idx_from_file]
             colors_to_add = dialog.temp_tileset_colors[tile_idx_from_file]
             
-            commands.append(ModifyListCommand("Import Tile", tileset_patterns, new_idx_in_project, pattern_to_add, is_insert=True))
-            commands.append(ModifyListCommand("Import Tile", tileset_colors, new_idx_in_project, colors_to_add, is_insert=True))
+            commands.append(ModifyListCommand("Import Tile", tileset, new_idx_in_project, TilesetStore.pack_tile(pattern_to_add, colors_to_add), is_insert=True))
             num_actually_imported += 1
 
         if num_actually_imported == 0:
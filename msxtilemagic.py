@@ -11,6 +11,7 @@ import os
 import sys
 import argparse
 from collections import Counter, defaultdict
+from contextlib import suppress
 import numpy as np
 from PIL import Image
 from tqdm import tqdm
@@ -18,6 +19,13 @@ import multiprocessing
 from itertools import combinations
 import heapq
 import warnings
+import json
+import time
+import pickle
+import shutil
+import tempfile
+import hashlib
+import math
 
 # --- Global Warning Filter ---
 warnings.filterwarnings("ignore", message='.*"Matplotlib" related API features are not available.*')
@@ -73,6 +81,103 @@ def print_splash_screen(script_name, script_version):
     print(f"{logo_lines[3]}")
     print("-" * 60)
 
+# --- Progress Reporting ---
+# 'text' draws tqdm bars for humans; 'jsonl' writes one JSON event per line on stdout
+# so a front-end (MSX Tile Forge) can drive a real progress bar. Any stdout line that
+# does not parse as JSON is plain log text.
+progress_format = 'text'
+current_stage = None
+
+def configure_progress_reporting(fmt):
+    global progress_format
+    progress_format = fmt
+
+def get_process_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+    except (ImportError, OSError):
+        return None
+
+def emit_event(event_type, **fields):
+    fields = {"event": event_type, **fields}
+    sys.stdout.write(json.dumps(fields) + "\n")
+    sys.stdout.flush()
+
+def print_stage(step, message):
+    global current_stage
+    current_stage = str(step)
+    if progress_format == 'jsonl':
+        emit_event("stage", stage=current_stage, message=message, rss=get_process_rss_bytes())
+    else:
+        print(f"{step}. {message}")
+
+class JsonlProgress:
+    """Minimal tqdm stand-in that reports progress as throttled 'progress' events."""
+    def __init__(self, iterable=None, total=None, desc=None, mininterval=0.5, initial=0, **kwargs):
+        self.iterable = iterable
+        if total is None and iterable is not None:
+            try:
+                total = len(iterable)
+            except TypeError:
+                total = None
+        self.total = total
+        self.task = (desc or "").strip()
+        self.mininterval = min(mininterval, 1.0)
+        self.n = initial
+        self.start_n = initial
+        self.start_t = time.monotonic()
+        self.last_emit_t = 0.0
+        self.closed = False
+        self._emit()
+
+    def _emit(self):
+        now = time.monotonic()
+        self.last_emit_t = now
+        elapsed = now - self.start_t
+        rate = (self.n - self.start_n) / elapsed if elapsed > 0 and self.n > self.start_n else None
+        eta = (self.total - self.n) / rate if rate and self.total is not None else None
+        emit_event("progress", stage=current_stage, task=self.task, done=self.n, total=self.total,
+                   elapsed=round(elapsed, 3), rate=None if rate is None else round(rate, 3),
+                   eta=None if eta is None else round(eta, 3), rss=get_process_rss_bytes())
+
+    def update(self, n=1):
+        self.n += n
+        if time.monotonic() - self.last_emit_t >= self.mininterval:
+            self._emit()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._emit()
+
+    def __iter__(self):
+        try:
+            for item in self.iterable:
+                yield item
+                self.update(1)
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def progress_bar(iterable=None, **kwargs):
+    if progress_format == 'jsonl':
+        return JsonlProgress(iterable, **kwargs)
+    return tqdm(iterable, **kwargs)
+
 # --- Color Difference Functions ---
 def color_distance_rgb(c1_rgb255, c2_rgb255):
     r1,g1,b1 = c1_rgb255
@@ -100,6 +205,21 @@ if COLOUR_SCIENCE_AVAILABLE:
         delta_e = colour.delta_E(lab_array[0], lab_array[1], method='CIE 2000')
         return delta_e.item()
 
+# Pairwise versions of the distance functions above: (A,3) x (B,3) RGB 0-255 -> (A,B) distances.
+def color_distances_rgb(colors_a, colors_b):
+    diff = np.asarray(colors_a, dtype=np.int64)[:, None, :] - np.asarray(colors_b, dtype=np.int64)[None, :, :]
+    return (diff * diff).sum(axis=2)
+
+def color_distances_weighted_rgb(colors_a, colors_b):
+    diff = np.asarray(colors_a, dtype=np.int64)[:, None, :] - np.asarray(colors_b, dtype=np.int64)[None, :, :]
+    weighted = diff * np.array([30, 59, 11], dtype=np.int64)
+    return (weighted * weighted).sum(axis=2)
+
+PAIRWISE_COLOR_DISTANCE_FUNCS = {
+    color_distance_rgb: color_distances_rgb,
+    color_distance_weighted_rgb: color_distances_weighted_rgb,
+}
+
 def get_color_distance_function(metric_name):
     if metric_name == 'rgb':
         return color_distance_rgb
@@ -130,19 +250,93 @@ def find_closest_msx_color(rgb_tuple_0_255, color_dist_func, exclude_colors_0_7=
             break
     return closest_msx_color_0_7
 
-def find_best_auto_colors_neutral(image: Image.Image, num_auto_colors: int, fixed_colors_0_7: list, color_dist_func):
-    if num_auto_colors <= 0:
-        return []
-    
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-        
+def find_closest_msx_colors(colors_0_255, color_dist_func, exclude_colors_0_7=None):
+    """find_closest_msx_color for a list of colors, evaluated as one distance matrix when the metric allows it."""
+    pairwise_func = PAIRWISE_COLOR_DISTANCE_FUNCS.get(color_dist_func)
+    if pairwise_func is None or not colors_0_255:
+        return [find_closest_msx_color(color, color_dist_func, exclude_colors_0_7) for color in colors_0_255]
+    exclude_set = set(exclude_colors_0_7) if exclude_colors_0_7 else set()
+    candidate_ids = [idx for idx, color in enumerate(MSX2_MASTER_PALETTE_0_7) if color not in exclude_set]
+    if not candidate_ids:
+        return [(0,0,0)] * len(colors_0_255)
+    candidates_255 = [MSX2_MASTER_PALETTE_0_255[idx] for idx in candidate_ids]
+    # argmin keeps the first minimum, like the strict '<' of the scalar search
+    nearest = np.argmin(pairwise_func(colors_0_255, candidates_255), axis=1)
+    return [MSX2_MASTER_PALETTE_0_7[candidate_ids[i]] for i in nearest.tolist()]
+
+# --- Colour Histogram ---
+class ColorHistogram:
+    """
+    Unique colors of an RGB image as packed RGB24 values with their pixel counts.
+    'inverse' maps every pixel (row-major) to its entry, so per-color results can be
+    turned back into an image with a single gather.
+    """
+    def __init__(self, packed, counts, inverse=None, size=None):
+        self.packed = packed
+        self.counts = counts
+        self.inverse = inverse
+        self.size = size
+
+    @classmethod
+    def from_image(cls, image):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        rgb = np.asarray(image, dtype=np.uint8).reshape(-1, 3).astype(np.uint32)
+        packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+        unique_packed, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+        return cls(unique_packed, counts, inverse.reshape(-1), image.size)
+
+    @classmethod
+    def combine(cls, histograms):
+        """The histogram of all pixels of several images (no inverse)."""
+        unique_packed, inverse = np.unique(np.concatenate([h.packed for h in histograms]), return_inverse=True)
+        counts = np.bincount(inverse.reshape(-1), weights=np.concatenate([h.counts for h in histograms]), minlength=len(unique_packed))
+        return cls(unique_packed, counts.astype(np.int64))
+
+    @property
+    def num_pixels(self):
+        return int(self.counts.sum())
+
+    def rgb(self):
+        return np.stack([(self.packed >> 16) & 0xFF, (self.packed >> 8) & 0xFF, self.packed & 0xFF], axis=1).astype(np.uint8)
+
+    def subsampled(self, max_pixels):
+        """
+        Deterministic subsample of exactly max_pixels pixels: systematic sampling along the
+        cumulative counts. Colors too rare to receive a sample are dropped.
+        """
+        total = self.num_pixels
+        if not max_pixels or total <= max_pixels:
+            return self
+        scaled_cumulative = (np.cumsum(self.counts) * max_pixels) // total
+        counts = np.diff(scaled_cumulative, prepend=0)
+        keep = counts > 0
+        return ColorHistogram(self.packed[keep], counts[keep])
+
+    def to_image(self):
+        """An image with exactly this color multiset. Median cut only depends on the multiset, so it
+        quantizes this image to the same palette as the source image."""
+        pixels = np.repeat(self.rgb(), self.counts, axis=0)
+        return Image.fromarray(pixels.reshape(1, -1, 3), 'RGB')
+
+    def colors_image(self):
+        """A 1-pixel-high image holding every unique color once."""
+        return Image.fromarray(self.rgb().reshape(1, -1, 3), 'RGB')
+
+def _median_cut_palette(histogram, num_colors):
+    image = histogram.to_image()
     try:
-        temp_quantized_img = image.quantize(colors=num_auto_colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+        temp_quantized_img = image.quantize(colors=num_colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
     except Exception:
-        temp_quantized_img = image.convert('P', palette=Image.Palette.ADAPTIVE, colors=num_auto_colors, dither=Image.Dither.NONE)
+        temp_quantized_img = image.convert('P', palette=Image.Palette.ADAPTIVE, colors=num_colors, dither=Image.Dither.NONE)
+    return temp_quantized_img.getpalette()
+
+def find_best_auto_colors_neutral(histogram: ColorHistogram, num_auto_colors: int, fixed_colors_0_7: list, color_dist_func):
+    if num_auto_colors <= 0:
+        return []
+
+    pil_palette_255_flat = _median_cut_palette(histogram, num_auto_colors)
     
-    pil_palette_255_flat = temp_quantized_img.getpalette()
     ideal_colors_255 = []
     if pil_palette_255_flat:
         num_ideal_colors = len(pil_palette_255_flat) // 3
@@ -152,8 +346,7 @@ def find_best_auto_colors_neutral(image: Image.Image, num_auto_colors: int, fixe
     auto_colors_0_7_set = set()
     auto_colors_0_7_list = []
     
-    for r255,g255,b255 in ideal_colors_255:
-        msx_color_0_7 = find_closest_msx_color((r255,g255,b255), color_dist_func, exclude_colors_0_7=fixed_colors_0_7)
+    for msx_color_0_7 in find_closest_msx_colors(ideal_colors_255, color_dist_func, exclude_colors_0_7=fixed_colors_0_7):
         if msx_color_0_7 not in auto_colors_0_7_set and msx_color_0_7 not in fixed_colors_0_7:
             auto_colors_0_7_set.add(msx_color_0_7)
             auto_colors_0_7_list.append(msx_color_0_7)
@@ -169,21 +362,14 @@ def find_best_auto_colors_neutral(image: Image.Image, num_auto_colors: int, fixe
             
     return auto_colors_0_7_list[:num_auto_colors]
 
-def find_best_auto_colors_sharp(image: Image.Image, num_auto_colors: int, fixed_colors_0_7: list, color_dist_func):
-    return find_best_auto_colors_neutral(image, num_auto_colors, fixed_colors_0_7, color_dist_func)
+def find_best_auto_colors_sharp(histogram: ColorHistogram, num_auto_colors: int, fixed_colors_0_7: list, color_dist_func):
+    return find_best_auto_colors_neutral(histogram, num_auto_colors, fixed_colors_0_7, color_dist_func)
 
-def find_best_auto_colors_soft(image: Image.Image, num_auto_colors: int, fixed_colors_0_7: list, color_dist_func):
+def find_best_auto_colors_soft(histogram: ColorHistogram, num_auto_colors: int, fixed_colors_0_7: list, color_dist_func):
     if num_auto_colors <= 0:
         return []
 
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    try:
-        temp_quantized_img = image.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
-    except Exception:
-        temp_quantized_img = image.convert('P', palette=Image.Palette.ADAPTIVE, colors=256, dither=Image.Dither.NONE)
-    
-    pil_palette_255_flat = temp_quantized_img.getpalette()
+    pil_palette_255_flat = _median_cut_palette(histogram, 256)
     ideal_colors_255 = []
     if pil_palette_255_flat:
         num_ideal_colors = len(pil_palette_255_flat) // 3
@@ -193,17 +379,155 @@ def find_best_auto_colors_soft(image: Image.Image, num_auto_colors: int, fixed_c
     auto_colors_0_7_set = set()
     auto_colors_0_7_list = []
     
-    for r255,g255,b255 in ideal_colors_255:
+    for msx_color_0_7 in find_closest_msx_colors(ideal_colors_255, color_dist_func, exclude_colors_0_7=fixed_colors_0_7):
         if len(auto_colors_0_7_list) >= num_auto_colors:
             break
-        msx_color_0_7 = find_closest_msx_color((r255,g255,b255), color_dist_func, exclude_colors_0_7=fixed_colors_0_7)
         if msx_color_0_7 not in auto_colors_0_7_set and msx_color_0_7 not in fixed_colors_0_7:
             auto_colors_0_7_set.add(msx_color_0_7)
             auto_colors_0_7_list.append(msx_color_0_7)
     
     return auto_colors_0_7_list
 
-def remap_image_to_palette(image: Image.Image, working_palette_0_7: list, dither_enabled: bool):
+# --- Palette Search ---
+# --palette-search refines the automatic colors of the render palette by local search.
+# Candidates are scored with a cheap proxy of SCREEN 4 color clash: a sample of 8-pixel
+# rows is drawn with the best pair of palette colors for each row, and the per-pixel
+# distances are summed. Distances from every sampled pixel to all 512 MSX colors are
+# computed once, so scoring a palette is a gather and a few reductions.
+PALETTE_SEARCH_SAMPLE_ROWS = 2048   # 8-pixel rows kept for the clash proxy
+PALETTE_SEARCH_COLOR_BITS = 5       # Channel precision of the sampled rows
+
+def sample_pixel_rows(images, max_rows=PALETTE_SEARCH_SAMPLE_ROWS, color_bits=PALETTE_SEARCH_COLOR_BITS):
+    """
+    Unique 8-pixel rows of the tile grid of all images, with channels reduced to color_bits,
+    and their counts. Above max_rows the counts are sampled systematically like
+    ColorHistogram.subsampled. Returns ((R,8,3) uint8 rows, (R,) counts).
+    """
+    shift = 8 - color_bits
+    row_parts = []
+    for image in images:
+        rgb = np.asarray(image.convert('RGB'), dtype=np.uint8)
+        height, width = rgb.shape[:2]
+        rgb = rgb[:, :width - width % 8]
+        # Back to the middle of each reduced step
+        row_parts.append(((rgb >> shift) << shift | ((1 << shift) >> 1)).reshape(-1, 8, 3))
+    rows = np.concatenate(row_parts)
+    if len(rows) == 0:
+        return rows, np.zeros(0, dtype=np.int64)
+    row_keys = np.ascontiguousarray(rows.reshape(len(rows), 24)).view(np.dtype((np.void, 24))).ravel()
+    _, first_index, counts = np.unique(row_keys, return_index=True, return_counts=True)
+    rows = rows[first_index]
+    total = int(counts.sum())
+    if total > max_rows:
+        counts = np.diff((np.cumsum(counts) * max_rows) // total, prepend=0)
+        keep = counts > 0
+        rows, counts = rows[keep], counts[keep]
+    return rows, counts
+
+def msx_color_distances(rows, color_dist_func):
+    """(512, R*8) float32 distances from every MSX color to every pixel of the sampled rows."""
+    pairwise_func = PAIRWISE_COLOR_DISTANCE_FUNCS.get(color_dist_func, color_distances_weighted_rgb)
+    return np.ascontiguousarray(pairwise_func(MSX2_MASTER_PALETTE_0_255, rows.reshape(-1, 3)).astype(np.float32))
+
+def palette_pair_errors(color_distances, palette_ids):
+    """(P,P,R) error of every sampled row drawn with palette colors a and b, for the palette given as MSX color ids (r*64 + g*8 + b)."""
+    distances = color_distances[palette_ids].reshape(len(palette_ids), -1, 8)
+    return np.minimum(distances[:, None], distances[None, :]).sum(axis=3)
+
+def palette_clash_error(color_distances, row_weights, palette_ids):
+    """Proxy error of a palette: every row takes its best color pair."""
+    return float(palette_pair_errors(color_distances, palette_ids).min(axis=(0, 1)) @ row_weights)
+
+def _init_palette_search_worker(color_distances, row_counts):
+    global worker_color_distances, worker_row_weights, worker_search_base
+    worker_color_distances = color_distances
+    worker_row_weights = row_counts.astype(np.float32)
+    worker_search_base = None
+
+def _score_palette_worker(candidate):
+    """
+    Scores the base palette with one slot replaced. Only the pairs with the new color are
+    computed; the best pair without the slot is kept per base palette, so a candidate costs
+    one pass over the sampled rows per palette color.
+    """
+    global worker_search_base
+    candidate_idx, base_ids, slot, new_id = candidate
+    if worker_search_base is None or worker_search_base[0] != base_ids:
+        pair_errors = palette_pair_errors(worker_color_distances, list(base_ids))
+        others = np.arange(len(base_ids))
+        best_without_slot = [pair_errors[np.ix_(others != s, others != s)].min(axis=(0, 1)) for s in others]
+        distances = worker_color_distances[list(base_ids)].reshape(len(base_ids), -1, 8)
+        worker_search_base = (base_ids, best_without_slot, distances)
+    _, best_without_slot, distances = worker_search_base
+    new_distances = worker_color_distances[new_id].reshape(-1, 8)
+    others = np.delete(distances, slot, axis=0)
+    with_new = np.minimum(new_distances[None], np.concatenate([others, new_distances[None]])).sum(axis=2).min(axis=0)
+    return candidate_idx, float(np.minimum(best_without_slot[slot], with_new) @ worker_row_weights)
+
+def search_auto_colors(images, fixed_colors_0_7, auto_colors_0_7, iterations, color_dist_func, worker_pool, time_budget):
+    """
+    Local search from auto_colors_0_7. Each iteration scores, on the pool, every palette that
+    moves one auto color a step along one channel to an unused MSX color, and keeps the best
+    one if it lowers the clash proxy. Fixed colors never change. Returns the new auto colors.
+    """
+    if iterations <= 0 or not auto_colors_0_7:
+        return auto_colors_0_7
+    if len(fixed_colors_0_7) + len(auto_colors_0_7) < 2:
+        # Clash errors are scored on color pairs, so a single-color palette has nothing to compare
+        print("   [INFO] Palette search skipped: the palette has a single color.")
+        return auto_colors_0_7
+    rows, counts = sample_pixel_rows(images)
+    if len(rows) == 0:
+        return auto_colors_0_7
+    color_distances = msx_color_distances(rows, color_dist_func)
+    color_ids = [r * 64 + g * 8 + b for r, g, b in fixed_colors_0_7 + auto_colors_0_7]
+    num_fixed = len(fixed_colors_0_7)
+
+    start_error = best_error = palette_clash_error(color_distances, counts.astype(np.float32), color_ids)
+    stage = worker_pool.publish(_init_palette_search_worker, (color_distances, counts))
+    deadline = time_budget.deadline(TIME_BUDGET_PALETTE_SEARCH_SHARE)
+    start_t = time.monotonic()
+    num_scored = 0
+    num_moves = 0
+    for iteration in progress_bar(range(1, iterations + 1), desc="   Searching palette", unit="step", leave=False):
+        if time.monotonic() > deadline:
+            time_budget.note_degraded("Palette search", f"stopped after {iteration - 1} of {iterations} iterations")
+            break
+        used = set(color_ids)
+        candidates = []
+        for slot in range(num_fixed, len(color_ids)):
+            rgb = [color_ids[slot] >> 6, (color_ids[slot] >> 3) & 7, color_ids[slot] & 7]
+            for channel in range(3):
+                for step in (-1, 1):
+                    moved = list(rgb)
+                    moved[channel] += step
+                    if not 0 <= moved[channel] <= 7:
+                        continue
+                    moved_id = moved[0] * 64 + moved[1] * 8 + moved[2]
+                    if moved_id in used:
+                        continue
+                    candidates.append((len(candidates), tuple(color_ids), slot, moved_id))
+        if not candidates:
+            break
+        chunksize = max(1, len(candidates) // worker_pool.num_cores)
+        scores = dict(worker_pool.imap_unordered(stage, _score_palette_worker, candidates, chunksize))
+        num_scored += len(candidates)
+        # Lowest error wins; ties go to the first candidate, so the search is deterministic
+        best_idx = min(scores, key=lambda idx: (scores[idx], idx))
+        if scores[best_idx] >= best_error:
+            break
+        best_error = scores[best_idx]
+        _, _, slot, moved_id = candidates[best_idx]
+        color_ids[slot] = moved_id
+        num_moves += 1
+    worker_pool.release(stage)
+
+    elapsed = max(time.monotonic() - start_t, 1e-6)
+    print(f"   [INFO] Palette search: clash proxy {start_error:.4g} -> {best_error:.4g} after {num_moves} move(s), "
+          f"{num_scored} palettes scored ({num_scored / elapsed:.0f}/s).")
+    return [(i >> 6, (i >> 3) & 7, i & 7) for i in color_ids[num_fixed:]]
+
+def remap_image_to_palette(image: Image.Image, working_palette_0_7: list, dither_enabled: bool, histogram: ColorHistogram = None):
     if not working_palette_0_7:
         black_image = Image.new('P', image.size, color=0)
         black_image.putpalette([0,0,0]*256)
@@ -221,25 +545,19 @@ def remap_image_to_palette(image: Image.Image, working_palette_0_7: list, dither
     if image.mode != 'RGB':
         image = image.convert('RGB')
         
-    dither_method = Image.Dither.FLOYDSTEINBERG if dither_enabled else Image.Dither.NONE
-    quantized_image = image.quantize(palette=palette_image_for_remap, dither=dither_method)
-
-    quantized_indices_np = np.array(quantized_image, dtype=np.uint8)
-    
-    lut = np.zeros(256, dtype=np.uint8)
-    for i, rogue_color in enumerate(full_pil_palette_255):
-        min_dist = float('inf')
-        best_idx = 0
-        for j, valid_color in enumerate(working_palette_255):
-            dist = color_distance_rgb(rogue_color, valid_color)
-            if dist < min_dist:
-                min_dist = dist
-                best_idx = j
-            if min_dist == 0:
-                break
-        lut[i] = best_idx
-    
-    clean_indices_np = lut[quantized_indices_np]
+    # Folds indices that land outside the working palette back onto their nearest valid color
+    lut = np.argmin(color_distances_rgb(full_pil_palette_255, working_palette_255), axis=1).astype(np.uint8)
+
+    if not dither_enabled and histogram is not None and histogram.inverse is not None:
+        # Without dithering every pixel of a color maps the same way: quantize each unique color
+        # once and expand the result with a single gather.
+        color_indices = np.array(histogram.colors_image().quantize(palette=palette_image_for_remap, dither=Image.Dither.NONE), dtype=np.uint8)
+        width, height = histogram.size
+        clean_indices_np = lut[color_indices.reshape(-1)][histogram.inverse].reshape(height, width)
+    else:
+        dither_method = Image.Dither.FLOYDSTEINBERG if dither_enabled else Image.Dither.NONE
+        quantized_image = image.quantize(palette=palette_image_for_remap, dither=dither_method)
+        clean_indices_np = lut[np.array(quantized_image, dtype=np.uint8)]
     
     clean_image = Image.fromarray(clean_indices_np, 'P')
     minimal_palette_flat = [c for rgb in working_palette_255 for c in rgb]
@@ -287,6 +605,90 @@ def process_palette_constraints(args):
                 print(f"Warning: Invalid slot index '{idx_str}' in --palette-slot. Must be an integer. Ignoring.")
     return rules
 
+# --- Persistent Worker Pool ---
+# One pool is started when the script starts and is reused by every parallel stage.
+# A stage publishes its data once (an initializer plus its arguments, pickled to a
+# temporary file); each worker loads it lazily on its first task for that stage.
+_worker_stage_token = None
+
+def _worker_pool_initializer():
+    if COLOUR_SCIENCE_AVAILABLE:
+        warnings.filterwarnings("ignore", category=ColourUsageWarning)
+
+def _load_stage_data(stage_token, stage_path):
+    global _worker_stage_token
+    if _worker_stage_token != stage_token:
+        with open(stage_path, 'rb') as f:
+            initializer, initargs = pickle.load(f)
+        initializer(*initargs)
+        _worker_stage_token = stage_token
+
+def _run_stage_chunk(task):
+    stage_token, stage_path, func, chunk = task
+    _load_stage_data(stage_token, stage_path)
+    return [func(item) for item in chunk]
+
+class WorkerPool:
+    """Process pool shared by all parallel stages. With a single core, work runs in-process."""
+    def __init__(self, num_cores, start_method='auto'):
+        self.num_cores = max(1, num_cores or 1)
+        self.start_method = start_method
+        self.pool = None
+        self.stage_dir = None
+        self.stage_count = 0
+        if self.num_cores > 1:
+            context = multiprocessing.get_context(None if start_method == 'auto' else start_method)
+            self.pool = context.Pool(processes=self.num_cores, initializer=_worker_pool_initializer)
+            self.stage_dir = tempfile.mkdtemp(prefix="msxtilemagic_stage_")
+
+    def publish(self, initializer, initargs):
+        """Makes the data of a new stage available to the workers. Returns a stage handle."""
+        self.stage_count += 1
+        stage_token = self.stage_count
+        if self.pool is None:
+            initializer(*initargs)
+            return (stage_token, None)
+        stage_path = os.path.join(self.stage_dir, f"stage_{stage_token}.pkl")
+        with open(stage_path, 'wb') as f:
+            pickle.dump((initializer, initargs), f, protocol=pickle.HIGHEST_PROTOCOL)
+        return (stage_token, stage_path)
+
+    def imap_unordered(self, stage, func, items, chunksize=1):
+        """Yields func(item) for every item, in completion order, using the data of 'stage'."""
+        if self.pool is None:
+            for item in items:
+                yield func(item)
+            return
+        stage_token, stage_path = stage
+        chunksize = max(1, chunksize)
+        tasks = ((stage_token, stage_path, func, items[i:i + chunksize]) for i in range(0, len(items), chunksize))
+        for chunk_results in self.pool.imap_unordered(_run_stage_chunk, tasks):
+            yield from chunk_results
+
+    def release(self, stage):
+        """Deletes the published file of a finished stage."""
+        stage_token, stage_path = stage
+        if stage_path and os.path.exists(stage_path):
+            os.remove(stage_path)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.stage_dir:
+            shutil.rmtree(self.stage_dir, ignore_errors=True)
+            self.stage_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self.pool is not None:
+            self.pool.terminate()
+        self.close()
+        return False
+
 def _offset_worker_initializer(img_data):
     global worker_img_data, worker_height, worker_width
     worker_img_data = img_data
@@ -313,15 +715,22 @@ def _calculate_offset_score_worker(offset):
     
     return current_score, offset
 
-def find_best_tiling_offset(quantized_image, num_cores):
+def estimate_offset_search_seconds(quantized_image, num_cores):
+    """Times one offset in-process and extrapolates to all 64 spread over the pool."""
+    _offset_worker_initializer(np.array(quantized_image))
+    start_t = time.monotonic()
+    _calculate_offset_score_worker((0, 0))
+    return (time.monotonic() - start_t) * 64 / max(1, num_cores)
+
+def find_best_tiling_offset(quantized_image, worker_pool):
     img_data = np.array(quantized_image)
     tasks = [(dx, dy) for dy in range(8) for dx in range(8)]
     
     results = []
-    init_args = (img_data,)
-    with multiprocessing.Pool(processes=num_cores, initializer=_offset_worker_initializer, initargs=init_args) as pool:
-        for result in tqdm(pool.imap_unordered(_calculate_offset_score_worker, tasks), total=len(tasks), desc="   Finding best offset", leave=False, unit="offset"):
-            results.append(result)
+    stage = worker_pool.publish(_offset_worker_initializer, (img_data,))
+    for result in progress_bar(worker_pool.imap_unordered(stage, _calculate_offset_score_worker, tasks), total=len(tasks), desc="   Finding best offset", leave=False, unit="offset"):
+        results.append(result)
+    worker_pool.release(stage)
             
     if not results:
         return (0, 0)
@@ -363,6 +772,52 @@ def process_tile_for_screen4(tile_indices_np, palette_0_255, color_dist_func):
         pattern_data[r]=row_pattern_byte
     return pattern_data,color_data
 
+def _init_tile_extraction_worker(render_blocks, metric_blocks, render_palette, metric_palette, metric_name):
+    global worker_render_blocks, worker_metric_blocks, worker_render_palette, worker_metric_palette, worker_color_dist_func
+    worker_render_blocks = render_blocks
+    worker_metric_blocks = metric_blocks
+    worker_render_palette = render_palette
+    worker_metric_palette = metric_palette
+    worker_color_dist_func = get_color_distance_function(metric_name)
+
+def _extract_tile_worker(block_idx):
+    render_tile = process_tile_for_screen4(worker_render_blocks[block_idx], worker_render_palette, worker_color_dist_func)
+    metric_tile = None
+    if worker_metric_blocks is not None:
+        metric_tile = process_tile_for_screen4(worker_metric_blocks[block_idx], worker_metric_palette, worker_color_dist_func)
+    return block_idx, render_tile, metric_tile
+
+def extract_source_tiles(quantized_tiles, render_palette_255, metric_palette_255, metric_name, worker_pool, render_to_metric_lut=None):
+    """
+    Converts (T,8,8) palette-index blocks to SCREEN 4 (pattern, color) tiles. Identical
+    blocks are converted once (the conversion is deterministic) and the unique blocks are
+    spread over the pool. Returns the render tiles and the metric tiles (the same list
+    unless render_to_metric_lut is given), both in block order, and the number of unique blocks.
+    """
+    num_tiles = len(quantized_tiles)
+    block_keys = np.ascontiguousarray(quantized_tiles.reshape(num_tiles, 64)).view(np.dtype((np.void, 64))).ravel()
+    _, first_index, block_inverse = np.unique(block_keys, return_index=True, return_inverse=True)
+    unique_render_blocks = quantized_tiles[first_index]
+    unique_metric_blocks = render_to_metric_lut[unique_render_blocks] if render_to_metric_lut is not None else None
+    num_unique = len(unique_render_blocks)
+
+    unique_render_tiles = [None] * num_unique
+    unique_metric_tiles = [None] * num_unique
+    stage = worker_pool.publish(_init_tile_extraction_worker, (unique_render_blocks, unique_metric_blocks,
+                                                               render_palette_255, metric_palette_255, metric_name))
+    chunksize = max(1, num_unique // (worker_pool.num_cores * 16))
+    for block_idx, render_tile, metric_tile in progress_bar(worker_pool.imap_unordered(stage, _extract_tile_worker, list(range(num_unique)), chunksize),
+                                                            total=num_unique, desc="   Processing Tiles", unit="tile"):
+        unique_render_tiles[block_idx] = render_tile
+        unique_metric_tiles[block_idx] = metric_tile
+    worker_pool.release(stage)
+
+    block_inverse = block_inverse.reshape(-1)
+    render_tiles = [unique_render_tiles[i] for i in block_inverse]
+    if render_to_metric_lut is None:
+        return render_tiles, render_tiles, num_unique
+    return render_tiles, [unique_metric_tiles[i] for i in block_inverse], num_unique
+
 def calculate_tile_difference(tile1_tuple, tile2_tuple, palette_255, color_dist_func):
     pattern1, color1 = tile1_tuple
     pattern2, color2 = tile2_tuple
@@ -393,175 +848,629 @@ def pad_image_to_tile_size(image: Image.Image):
     padded_image.paste(image, (0, 0))
     return padded_image
 
+# --- Checkpoint / Resume ---
+# Expensive state is written to --checkpoint-dir as .npz files next to a JSON manifest.
+# Every write goes to a temporary file that is then renamed over the target, so an
+# interrupted run never leaves a half-written checkpoint behind.
+CHECKPOINT_FORMAT_VERSION = 1
+CHECKPOINT_MANIFEST = "checkpoint.json"
+CHECKPOINT_INTERVAL_SECONDS = 60        # Minimum time between merge-progress checkpoints
+CHECKPOINT_MIN_SEGMENT_PAIRS = 250000   # Pair costs are checkpointed per segment of at least this many pairs
+CHECKPOINT_MAX_SEGMENTS = 64
+
+def hash_file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_options_sha256(options):
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()
+
+class CheckpointStore:
+    """Atomic .npz checkpoints for one run. A store without a directory is disabled and does nothing."""
+    def __init__(self, directory, input_hash=None, options_hash=None, resume=False):
+        self.directory = directory
+        self.enabled = directory is not None
+        self.manifest = {"version": CHECKPOINT_FORMAT_VERSION, "input_sha256": input_hash,
+                         "options_sha256": options_hash, "completed": [], "values": {}}
+        if not self.enabled:
+            return
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, CHECKPOINT_MANIFEST)
+        if resume:
+            try:
+                with open(manifest_path, 'r') as f:
+                    saved_manifest = json.load(f)
+            except FileNotFoundError:
+                print(f"   [RESUME] No checkpoint found in '{directory}'. Starting from the beginning.")
+                saved_manifest = None
+            if saved_manifest is not None:
+                if saved_manifest.get("version") != CHECKPOINT_FORMAT_VERSION:
+                    print(f"Error: Checkpoint in '{directory}' was written by an incompatible version. Remove it or run without --resume.")
+                    sys.exit(1)
+                if saved_manifest.get("input_sha256") != input_hash:
+                    print(f"Error: Checkpoint in '{directory}' belongs to a different input image. Remove it or run without --resume.")
+                    sys.exit(1)
+                if saved_manifest.get("options_sha256") != options_hash:
+                    print(f"Error: Checkpoint in '{directory}' was made with different options. Remove it or run without --resume.")
+                    sys.exit(1)
+                self.manifest = saved_manifest
+                print(f"   [RESUME] Resuming from checkpoint. Completed steps: {', '.join(self.manifest['completed']) or 'none'}.")
+                return
+        self._remove_checkpoint_files()
+        self._write_manifest()
+
+    def _remove_checkpoint_files(self):
+        for name in os.listdir(self.directory):
+            if name == CHECKPOINT_MANIFEST or name.endswith(".npz"):
+                os.remove(os.path.join(self.directory, name))
+
+    def _write_manifest(self):
+        final_path = os.path.join(self.directory, CHECKPOINT_MANIFEST)
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+
+    def is_complete(self, step):
+        return self.enabled and step in self.manifest["completed"]
+
+    def mark_complete(self, step):
+        if self.enabled and step not in self.manifest["completed"]:
+            self.manifest["completed"].append(step)
+            self._write_manifest()
+
+    def get_value(self, key, default=None):
+        return self.manifest["values"].get(key, default) if self.enabled else default
+
+    def set_value(self, key, value):
+        if self.enabled:
+            self.manifest["values"][key] = value
+            self._write_manifest()
+
+    def save_arrays(self, name, **arrays):
+        if not self.enabled:
+            return
+        final_path = os.path.join(self.directory, f"{name}.npz")
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+
+    def load_arrays(self, name):
+        with np.load(os.path.join(self.directory, f"{name}.npz")) as data:
+            return {key: data[key] for key in data.files}
+
+    def remove_arrays(self, name):
+        if self.enabled:
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(self.directory, f"{name}.npz"))
+
+def compute_pair_costs(name, pairs, worker_pool, initializer, initargs, worker_func, desc, checkpoints, mininterval=0.1):
+    """
+    Runs worker_func over all pairs on the pool and returns (costs, idx1, idx2) arrays,
+    leaving out pairs for which the worker returned None. With checkpoints enabled, the
+    pairs are processed in segments and each finished segment is saved, so an
+    interrupted run resumes after the last saved segment.
+    """
+    if checkpoints.is_complete(name):
+        print(f"   [RESUME] Loaded {desc.strip().lower()} from checkpoint.")
+        arrays = checkpoints.load_arrays(name)
+        return arrays["costs"], arrays["idx1"], arrays["idx2"]
+
+    if checkpoints.enabled:
+        segment_size = max(CHECKPOINT_MIN_SEGMENT_PAIRS, math.ceil(len(pairs) / CHECKPOINT_MAX_SEGMENTS))
+    else:
+        segment_size = max(1, len(pairs))
+    num_segments = math.ceil(len(pairs) / segment_size)
+    segments_done = checkpoints.get_value(f"{name}_segments_done", 0)
+
+    cost_parts, idx1_parts, idx2_parts = [], [], []
+    for k in range(segments_done):
+        arrays = checkpoints.load_arrays(f"{name}_part_{k}")
+        cost_parts.append(arrays["costs"]); idx1_parts.append(arrays["idx1"]); idx2_parts.append(arrays["idx2"])
+
+    if segments_done < num_segments:
+        stage = worker_pool.publish(initializer, initargs)
+        with progress_bar(total=len(pairs), initial=min(len(pairs), segments_done * segment_size), desc=desc, mininterval=mininterval) as pbar:
+            for k in range(segments_done, num_segments):
+                segment = pairs[k * segment_size:(k + 1) * segment_size]
+                chunksize = max(1, len(segment) // (worker_pool.num_cores * 16))
+                costs, idx1s, idx2s = [], [], []
+                for result in worker_pool.imap_unordered(stage, worker_func, segment, chunksize=chunksize):
+                    if result:
+                        cost, idx1, idx2 = result
+                        costs.append(cost); idx1s.append(idx1); idx2s.append(idx2)
+                    pbar.update(1)
+                cost_parts.append(np.array(costs) if costs else np.zeros(0, dtype=np.int64))
+                idx1_parts.append(np.array(idx1s, dtype=np.int64))
+                idx2_parts.append(np.array(idx2s, dtype=np.int64))
+                if checkpoints.enabled and k < num_segments - 1:
+                    checkpoints.save_arrays(f"{name}_part_{k}", costs=cost_parts[-1], idx1=idx1_parts[-1], idx2=idx2_parts[-1])
+                    checkpoints.set_value(f"{name}_segments_done", k + 1)
+        worker_pool.release(stage)
+
+    if cost_parts:
+        costs, idx1, idx2 = np.concatenate(cost_parts), np.concatenate(idx1_parts), np.concatenate(idx2_parts)
+    else:
+        costs, idx1, idx2 = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if checkpoints.enabled:
+        checkpoints.save_arrays(name, costs=costs, idx1=idx1, idx2=idx2)
+        checkpoints.mark_complete(name)
+        for k in range(num_segments):
+            checkpoints.remove_arrays(f"{name}_part_{k}")
+    return costs, idx1, idx2
+
+def build_similarity_map(costs, idx1, idx2):
+    similarity_map = defaultdict(list)
+    for cost, a, b in zip(costs.tolist(), idx1.tolist(), idx2.tolist()):
+        similarity_map[a].append((cost, b))
+        similarity_map[b].append((cost, a))
+    for idx in similarity_map:
+        similarity_map[idx].sort()
+    return similarity_map
+
+# --- Time Budget ---
+# With --time-budget, expensive stages estimate their own cost and switch to cheaper
+# strategies (approximate neighbours, sampled pairs, greedy sort) when the full version
+# would not fit, then refine for as long as their share of the remaining time allows.
+TIME_BUDGET_OFFSET_SHARE = 0.15     # Max share of remaining time for --find-best-offset
+TIME_BUDGET_TILE_PAIR_SHARE = 0.75  # Share of remaining time for tile pair costs
+TIME_BUDGET_ST_PAIR_SHARE = 0.5     # Share of remaining time for supertile pair costs
+TIME_BUDGET_SYNTH_RESERVE = 0.25    # Synthesis stops when less than this share of the budget is left
+TIME_BUDGET_INITIAL_NEIGHBOURS = 4  # Neighbours per item in the first approximate round
+TIME_BUDGET_PALETTE_SEARCH_SHARE = 0.1  # Share of remaining time for --palette-search
+
+class TimeBudget:
+    """Tracks the wall-clock budget of a run. A budget of None never expires."""
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.start_t = time.monotonic()
+        self.degraded_stages = []
+
+    @property
+    def enabled(self):
+        return self.seconds is not None
+
+    def remaining(self):
+        if not self.enabled:
+            return float('inf')
+        return max(0.0, self.seconds - (time.monotonic() - self.start_t))
+
+    def deadline(self, share):
+        """Absolute monotonic time by which a stage granted 'share' of the remaining time must end."""
+        return time.monotonic() + self.remaining() * share
+
+    def note_degraded(self, stage, detail):
+        self.degraded_stages.append((stage, detail))
+        print(f"   [BUDGET] {stage}: {detail}")
+
+    def report(self):
+        if not self.enabled:
+            return
+        elapsed = time.monotonic() - self.start_t
+        if self.degraded_stages:
+            print(f"   [BUDGET] Finished in {elapsed:.1f}s of {self.seconds:g}s. Degraded stages:")
+            for stage, detail in self.degraded_stages:
+                print(f"      - {stage}: {detail}")
+        else:
+            print(f"   [BUDGET] Finished in {elapsed:.1f}s of {self.seconds:g}s. No stage was degraded.")
+        if progress_format == 'jsonl':
+            emit_event("budget", seconds=self.seconds, elapsed=round(elapsed, 3),
+                       degraded=[{"stage": stage, "detail": detail} for stage, detail in self.degraded_stages])
+
+def render_tile_indices(patterns, colors):
+    """Renders (N,8) pattern and color bytes to (N,8,8) palette indices."""
+    bits = np.unpackbits(patterns[:, :, None], axis=2)
+    return np.where(bits == 1, (colors >> 4)[:, :, None], (colors & 0x0F)[:, :, None])
+
+def render_tiles_rgb(patterns, colors, palette_255):
+    """Renders (N,8) pattern and color bytes to an (N,8,8,3) float64 RGB array."""
+    palette = np.zeros((16, 3), dtype=np.float64)
+    palette[:len(palette_255)] = palette_255
+    return palette[render_tile_indices(patterns, colors)]
+
+def tile_feature_vectors(patterns, colors, palette_255, cells=4):
+    """Cheap similarity features: mean RGB of a cells x cells grid over each rendered tile."""
+    rgb = render_tiles_rgb(patterns, colors, palette_255)
+    block = 8 // cells
+    return rgb.reshape(len(rgb), cells, block, cells, block, 3).mean(axis=(2, 4)).reshape(len(rgb), -1)
+
+def nearest_neighbour_pairs(features, k, chunk_rows=1024):
+    """Returns unique (i < j) index pairs linking every row of 'features' to its k nearest rows."""
+    n = len(features)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    squared_norms = (features * features).sum(axis=1)
+    pair_blocks = []
+    for start in range(0, n, chunk_rows):
+        rows = np.arange(start, min(n, start + chunk_rows))
+        distances = squared_norms[rows, None] + squared_norms[None, :] - 2.0 * (features[rows] @ features.T)
+        distances[np.arange(len(rows)), rows] = np.inf
+        neighbours = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        pair_blocks.append(np.stack([np.repeat(rows, k), neighbours.ravel()], axis=1))
+    pairs = np.sort(np.concatenate(pair_blocks), axis=1)
+    return np.unique(pairs, axis=0)
+
+def _neighbour_candidate_pairs(features, groups, k):
+    """Pairs of the k-nearest-neighbour graph (or all pairs, for groups of at most k+1 items) within each group."""
+    pair_blocks = []
+    for group in np.unique(groups):
+        members = np.flatnonzero(groups == group)
+        if k >= len(members) - 1:
+            idx_i, idx_j = np.triu_indices(len(members), 1)
+            local_pairs = np.stack([idx_i, idx_j], axis=1)
+        else:
+            local_pairs = nearest_neighbour_pairs(features[members], k)
+        pair_blocks.append(members[local_pairs.astype(np.int64)].reshape(-1, 2))
+    return np.concatenate(pair_blocks) if pair_blocks else np.zeros((0, 2), dtype=np.int64)
+
+def compute_pair_costs_within_budget(name, features, worker_pool, initializer, initargs, worker_func, desc, deadline, time_budget, groups=None):
+    """
+    Anytime variant of compute_pair_costs for --time-budget. Starts with the pairs of a
+    small k-nearest-neighbour graph over 'features', then keeps widening k (at most doubling
+    it per round) by as many neighbours as the measured pair rate and the new pairs each
+    added neighbour brought says still fit before 'deadline'. Switches to the exact
+    all-pairs set once that fits. Only items of the same 'groups' value are paired.
+    Returns (costs, idx1, idx2, exact).
+    """
+    n = len(features)
+    if groups is None:
+        groups = np.zeros(n, dtype=np.int64)
+    group_sizes = np.bincount(groups) if n else np.zeros(1, dtype=np.int64)
+    total_pairs = int((group_sizes * (group_sizes - 1) // 2).sum())
+    largest_group = int(group_sizes.max())
+    k, prev_k = TIME_BUDGET_INITIAL_NEIGHBOURS, 0
+    done_keys = np.zeros(0, dtype=np.int64)
+    cost_parts, idx1_parts, idx2_parts = [], [], []
+    exact = False
+    no_checkpoints = CheckpointStore(None)
+    while True:
+        if k >= largest_group - 1:
+            k = max(k, largest_group - 1)
+        candidates = _neighbour_candidate_pairs(features, groups, k)
+        candidate_keys = candidates[:, 0] * n + candidates[:, 1]
+        new_pairs = candidates[~np.isin(candidate_keys, done_keys)]
+        round_start_t = time.monotonic()
+        costs, idx1, idx2 = compute_pair_costs(name, [tuple(pair) for pair in new_pairs.tolist()], worker_pool,
+                                               initializer, initargs, worker_func, desc, no_checkpoints)
+        round_elapsed = max(time.monotonic() - round_start_t, 1e-6)
+        cost_parts.append(costs); idx1_parts.append(idx1); idx2_parts.append(idx2)
+        done_keys = np.union1d(done_keys, candidate_keys)
+        if k >= largest_group - 1:
+            exact = True
+            break
+        pairs_per_second = max(len(new_pairs), 1) / round_elapsed
+        pairs_per_neighbour = max(len(new_pairs), 1) / (k - prev_k)
+        time_left = deadline - time.monotonic()
+        if (total_pairs - len(done_keys)) / pairs_per_second <= time_left:
+            next_k = largest_group - 1
+        else:
+            affordable_neighbours = int(time_left * pairs_per_second / pairs_per_neighbour)
+            if affordable_neighbours < 1:
+                break
+            next_k = k + min(k, affordable_neighbours)
+        prev_k, k = k, next_k
+    if not exact:
+        time_budget.note_degraded(desc.strip(), f"approximate neighbours, {len(done_keys):,} of {total_pairs:,} pairs evaluated (k={k})")
+    return np.concatenate(cost_parts), np.concatenate(idx1_parts), np.concatenate(idx2_parts), exact
+
 # --- Multiprocessing Worker and Initializer ---
-def _init_worker(tiles_data, palette, metric_name):
-    global worker_tiles_data, worker_palette, worker_color_dist_func
+def _init_worker(patterns, colors, counts, palette, metric_name):
+    global worker_patterns, worker_colors, worker_counts, worker_palette, worker_color_dist_func
     if COLOUR_SCIENCE_AVAILABLE:
         warnings.filterwarnings("ignore", category=ColourUsageWarning)
-    worker_tiles_data = tiles_data
+    worker_patterns = patterns
+    worker_colors = colors
+    worker_counts = counts.tolist()
     worker_palette = palette
     worker_color_dist_func = get_color_distance_function(metric_name)
 
 def _calculate_initial_costs_worker(pair):
     idx1, idx2 = pair
-    tile1, tile2 = worker_tiles_data[idx1], worker_tiles_data[idx2]
-    diff = calculate_tile_difference(tile1["data"], tile2["data"], worker_palette, worker_color_dist_func)
+    diff = calculate_tile_difference((worker_patterns[idx1], worker_colors[idx1]), (worker_patterns[idx2], worker_colors[idx2]),
+                                     worker_palette, worker_color_dist_func)
     if diff == 0:
         return None
-    if tile1["count"] > tile2["count"]:
-        loser_count = tile2["count"]
-    elif tile2["count"] > tile1["count"]:
-        loser_count = tile1["count"]
+    count1, count2 = worker_counts[idx1], worker_counts[idx2]
+    if count1 > count2:
+        loser_count = count2
+    elif count2 > count1:
+        loser_count = count1
     else:
-        loser_count = tile1["count"]
+        loser_count = count1
     cost = diff * loser_count
     return (cost, idx1, idx2)
 
+def synthesize_ideal_tile_indices(quantized_tiles, tile_groups, num_groups, palette_255):
+    """
+    Per-pixel average color of each group of quantized (T,8,8) tiles, snapped to the
+    nearest palette index. tile_groups[t] is the group of tile t, or -1 for none.
+    Returns (num_groups,8,8) palette indices.
+    """
+    palette = np.array(palette_255, dtype=np.float32)
+    in_group = tile_groups >= 0
+    group_ids, group_tiles = tile_groups[in_group], quantized_tiles[in_group]
+    # Sums of 0-255 integers are exact in float64, and so is their float32 cast
+    pixel_slots = (group_ids[:, None] * 64 + np.arange(64)[None, :]).ravel()
+    tile_rgb = palette[group_tiles.reshape(len(group_tiles), 64)].reshape(-1, 3).astype(np.float64)
+    rgb_sums = np.stack([np.bincount(pixel_slots, weights=tile_rgb[:, ch], minlength=num_groups * 64) for ch in range(3)], axis=1)
+    group_sizes = np.bincount(group_ids, minlength=num_groups).astype(np.float32)
+    avg_rgb = rgb_sums.astype(np.float32).reshape(num_groups, 64, 3) / np.maximum(group_sizes, 1)[:, None, None]
+
+    diff = avg_rgb[:, :, None, :] - palette[None, None, :, :]
+    squared = diff * diff
+    distances = squared[..., 0] + squared[..., 1] + squared[..., 2]
+    return np.argmin(distances, axis=2).astype(np.uint8).reshape(num_groups, 8, 8)
+
 def synthesize_ideal_tile(tile_group, palette_255, color_dist_func):
-    num_tiles_in_group = len(tile_group)
-    if num_tiles_in_group == 0:
+    if len(tile_group) == 0:
         return np.zeros(8, dtype=np.uint8), np.zeros(8, dtype=np.uint8)
-
-    avg_rgb_tile = np.zeros((8, 8, 3), dtype=np.float32)
-    for tile_indices in tile_group:
-        for r in range(8):
-            for c in range(8):
-                palette_idx = tile_indices[r, c]
-                avg_rgb_tile[r, c] += palette_255[palette_idx]
-    
-    avg_rgb_tile /= num_tiles_in_group
-
-    final_indices_tile = np.zeros((8, 8), dtype=np.uint8)
-    for r in range(8):
-        for c in range(8):
-            avg_rgb = tuple(avg_rgb_tile[r, c])
-            best_dist = float('inf')
-            best_idx = 0
-            for i, p_color in enumerate(palette_255):
-                dist = color_distance_rgb(avg_rgb, p_color)
-                if dist < best_dist:
-                    best_dist = dist
-                    best_idx = i
-            final_indices_tile[r, c] = best_idx
-            
-    return process_tile_for_screen4(final_indices_tile, palette_255, color_dist_func)
-
-
-def optimize_by_precomputation_and_heap(all_source_tiles_sc4, all_source_tiles_quantized, max_tiles, tm_width, tm_height, palette_255, num_cores, color_metric, synthesize, sort_strategy='cluster'):
+    ideal_indices = synthesize_ideal_tile_indices(np.asarray(tile_group), np.zeros(len(tile_group), dtype=np.int64), 1, palette_255)
+    return process_tile_for_screen4(ideal_indices[0], palette_255, color_dist_func)
+
+
+class TileTable:
+    """
+    Unique tiles of the optimizer as parallel arrays. A merged tile stays in the table
+    with alive=False; 'parent' links it to the tile it was merged into (union-find),
+    so every original tile can be resolved to the surviving tile of its group.
+    """
+    def __init__(self, patterns, colors, counts):
+        self.patterns = patterns                       # (N,8) uint8
+        self.colors = colors                           # (N,8) uint8
+        self.counts = counts                           # (N,) int64, map cells using the tile's group
+        self.alive = np.ones(len(counts), dtype=bool)
+        self.parent = np.arange(len(counts), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def num_alive(self):
+        return int(np.count_nonzero(self.alive))
+
+    def alive_ids(self):
+        return np.flatnonzero(self.alive)
+
+    def tile(self, idx):
+        return self.patterns[idx], self.colors[idx]
+
+    def merge(self, winner_idx, loser_idx):
+        self.counts[winner_idx] += self.counts[loser_idx]
+        self.alive[loser_idx] = False
+        self.parent[loser_idx] = winner_idx
+
+    def roots(self):
+        """Surviving tile of every tile's merge group."""
+        roots = self.parent.copy()
+        while True:
+            next_roots = roots[roots]
+            if np.array_equal(next_roots, roots):
+                return roots
+            roots = next_roots
+
+def _merge_remaining_by_features(tile_table, features, max_tiles, candidate_ids=None):
+    """Fallback when the available pairs run out: folds the least used tiles into their nearest survivor."""
+    active_ids = tile_table.alive_ids() if candidate_ids is None else candidate_ids[tile_table.alive[candidate_ids]]
+    counts = tile_table.counts[active_ids]
+    by_usage = np.lexsort((active_ids, counts))
+    num_losers = len(active_ids) - max_tiles
+    losers, winners = active_ids[by_usage[:num_losers]], active_ids[by_usage[num_losers:]]
+    winner_features = features[winners]
+    winner_norms = (winner_features * winner_features).sum(axis=1)
+    for start in range(0, len(losers), 1024):
+        loser_block = losers[start:start + 1024]
+        distances = winner_norms[None, :] - 2.0 * (features[loser_block] @ winner_features.T)
+        nearest = winners[np.argmin(distances, axis=1)]
+        for loser_idx, winner_idx in zip(loser_block.tolist(), nearest.tolist()):
+            tile_table.merge(winner_idx, loser_idx)
+    return num_losers
+
+SORT_ONLY_NEIGHBOURS = 16   # Nearest neighbours per tile when pair costs are only needed for sorting
+
+def optimize_by_precomputation_and_heap(all_source_tiles_sc4, all_source_tiles_quantized, max_tiles, tm_width, tm_height, palette_255, worker_pool, color_metric, synthesize, sort_strategy='cluster', checkpoints=None, time_budget=None, tile_banks=None):
+    """
+    Reduces the source tiles to at most max_tiles and returns (tiles, tile map).
+    With tile_banks (the bank of every source tile), each bank is deduplicated, merged
+    and sorted on its own against max_tiles; the returned tiles are grouped bank by bank
+    and the map indexes into the whole list.
+    """
+    if checkpoints is None:
+        checkpoints = CheckpointStore(None)
+    if time_budget is None:
+        time_budget = TimeBudget(None)
     print("   Finding unique source tiles and their map counts...")
-    unique_tile_groups = defaultdict(list)
-    for i, tile_data in enumerate(all_source_tiles_sc4):
-        key = tile_data[0].tobytes() + tile_data[1].tobytes()
-        unique_tile_groups[key].append(i)
-    
-    initial_unique_count = len(unique_tile_groups)
-    print(f"   [INFO] Found {initial_unique_count} unique tiles.")
-
-    if initial_unique_count == 0:
+    if len(all_source_tiles_sc4) == 0:
+        print("   [INFO] Found 0 unique tiles.")
         return [], np.zeros((tm_height, tm_width), dtype=np.int16)
 
-    # --- Step 1: Build initial tile data and calculate all-pairs similarity ---
-    unique_sc4_keys = list(unique_tile_groups.keys())
-    unique_sc4_to_idx = {key: i for i, key in enumerate(unique_sc4_keys)}
+    if tile_banks is None:
+        tile_banks = np.zeros(len(all_source_tiles_sc4), dtype=np.uint8)
+    num_banks = int(tile_banks.max()) + 1
+
+    # Unique tiles are numbered bank by bank, in order of first appearance on the map
+    source_bytes = np.ascontiguousarray(np.concatenate([np.array([tile[0] for tile in all_source_tiles_sc4], dtype=np.uint8),
+                                                        np.array([tile[1] for tile in all_source_tiles_sc4], dtype=np.uint8)], axis=1))
+    banked_bytes = np.ascontiguousarray(np.concatenate([tile_banks.astype(np.uint8)[:, None], source_bytes], axis=1))
+    source_keys = banked_bytes.view(np.dtype((np.void, 17))).ravel()
+    _, first_locations, sorted_inverse = np.unique(source_keys, return_index=True, return_inverse=True)
+    appearance_order = np.lexsort((first_locations, tile_banks[first_locations]))
+    unique_rank = np.empty_like(appearance_order)
+    unique_rank[appearance_order] = np.arange(len(appearance_order))
+    source_unique_idx = unique_rank[sorted_inverse.reshape(-1)]
+    first_locations = first_locations[appearance_order]
+
+    initial_unique_count = len(first_locations)
+    unique_banks = tile_banks[first_locations].astype(np.int64)
+    bank_sizes = np.bincount(unique_banks, minlength=num_banks)
+    bank_starts = np.concatenate([[0], np.cumsum(bank_sizes)])
+    if num_banks > 1:
+        print(f"   [INFO] Found {initial_unique_count} unique tiles ({', '.join(f'bank {b}: {n}' for b, n in enumerate(bank_sizes.tolist()))}).")
+    else:
+        print(f"   [INFO] Found {initial_unique_count} unique tiles.")
 
-    active_tiles = { i: {"data": all_source_tiles_sc4[locs[0]], "count": len(locs), "original_indices": {i}}
-                     for i, (key, locs) in enumerate(unique_tile_groups.items()) }
+    # --- Step 1: Build initial tile data and calculate all-pairs similarity ---
+    unique_patterns = source_bytes[first_locations, :8].copy()
+    unique_colors = source_bytes[first_locations, 8:].copy()
+    unique_counts = np.bincount(source_unique_idx, minlength=initial_unique_count).astype(np.int64)
+    tile_table = TileTable(unique_patterns.copy(), unique_colors.copy(), unique_counts.copy())
+    if checkpoints.is_complete("unique_tiles"):
+        saved = checkpoints.load_arrays("unique_tiles")
+        if not (np.array_equal(saved["patterns"], unique_patterns) and np.array_equal(saved["colors"], unique_colors)
+                and np.array_equal(saved["counts"], unique_counts)):
+            print("Error: Checkpointed unique tile table does not match the recomputed one. Remove the checkpoint or run without --resume.")
+            sys.exit(1)
+    else:
+        checkpoints.save_arrays("unique_tiles", patterns=unique_patterns, colors=unique_colors, counts=unique_counts)
+        checkpoints.mark_complete("unique_tiles")
+
+    merges_left = np.maximum(0, bank_sizes - max_tiles)
+    needs_merging = bool(merges_left.any())
+
+    # Pair costs drive merging; without merges they only order the tileset
+    pair_costs = pair_idx1 = pair_idx2 = np.zeros(0, dtype=np.int64)
+    pairs_exact = True
+    tile_features = tile_feature_vectors(unique_patterns, unique_colors, palette_255) if time_budget.enabled else None
+    if not needs_merging and sort_strategy == 'none':
+        print("   Skipping tile pair costs: nothing to merge and no sorting requested.")
+    elif not needs_merging:
+        # Sorting only follows each tile's closest neighbours, so the k-nearest-neighbour graph of the
+        # cheap features is enough; the costs of those pairs are still exact.
+        if tile_features is None:
+            tile_features = tile_feature_vectors(unique_patterns, unique_colors, palette_255)
+        sort_pairs = [tuple(pair) for pair in _neighbour_candidate_pairs(tile_features, unique_banks, SORT_ONLY_NEIGHBOURS).tolist()]
+        print(f"   Computing costs of {len(sort_pairs)} nearest-neighbour tile pairs for sorting only...")
+        if sort_pairs:
+            pair_costs, pair_idx1, pair_idx2 = compute_pair_costs(
+                "tile_sort_pair_costs", sort_pairs, worker_pool, _init_worker, (unique_patterns, unique_colors, unique_counts, palette_255, color_metric),
+                _calculate_initial_costs_worker, "   Pre-calculating costs", checkpoints)
+    elif time_budget.enabled:
+        print(f"   Estimating tile pair costs within the time budget ({time_budget.remaining():.1f}s left)...")
+        pair_costs, pair_idx1, pair_idx2, pairs_exact = compute_pair_costs_within_budget(
+            "tile_pair_costs", tile_features, worker_pool, _init_worker, (unique_patterns, unique_colors, unique_counts, palette_255, color_metric),
+            _calculate_initial_costs_worker, "   Pre-calculating costs", time_budget.deadline(TIME_BUDGET_TILE_PAIR_SHARE), time_budget,
+            groups=unique_banks)
+    else:
+        # Tiles are only compared within their bank; the pairs of all banks share one pool stage
+        all_pairs = [pair for b in range(num_banks) for pair in combinations(range(bank_starts[b], bank_starts[b + 1]), 2)]
+        print(f"   Generating memory structure for {len(all_pairs)} tile pairs...")
+        if all_pairs:
+            print(f"   Transferring tile data to {worker_pool.num_cores} cores...")
+            pair_costs, pair_idx1, pair_idx2 = compute_pair_costs(
+                "tile_pair_costs", all_pairs, worker_pool, _init_worker, (unique_patterns, unique_colors, unique_counts, palette_255, color_metric),
+                _calculate_initial_costs_worker, "   Pre-calculating costs", checkpoints, mininterval=10.0)
 
-    all_pairs = list(combinations(active_tiles.keys(), 2))
-    print(f"   Generating memory structure for {len(all_pairs)} tile pairs...")
-    
-    merge_heap = []
-    similarity_map = defaultdict(list)
-    
-    if all_pairs:
-        print(f"   Initializing worker pool and transferring data to {num_cores} cores.\r\n      -> This may take some seconds, please wait..")
-        chunksize = max(1, len(all_pairs) // (num_cores * 16))
-        init_args = (active_tiles, palette_255, color_metric)
-        with multiprocessing.Pool(processes=num_cores, initializer=_init_worker, initargs=init_args) as pool:
-            for result in tqdm(pool.imap_unordered(_calculate_initial_costs_worker, all_pairs, chunksize=chunksize), total=len(all_pairs), desc="   Pre-calculating costs", mininterval=10.0):
-                if result:
-                    cost, idx1, idx2 = result
-                    heapq.heappush(merge_heap, result)
-                    similarity_map[idx1].append((cost, idx2))
-                    similarity_map[idx2].append((cost, idx1))
-
-    for idx in similarity_map:
-        similarity_map[idx].sort()
+    similarity_map = build_similarity_map(pair_costs, pair_idx1, pair_idx2)
 
     # --- Step 2: Merge tiles if necessary ---
-    if initial_unique_count > max_tiles:
-        num_merges_to_perform = len(active_tiles) - max_tiles
-        print(f"   Performing {num_merges_to_perform} merges to reach target of {max_tiles} tiles...")
-        is_active = {idx: True for idx in active_tiles.keys()}
+    if needs_merging:
+        num_merges_to_perform = int(merges_left.sum())
+        print(f"   Performing {num_merges_to_perform} merges to reach target of {max_tiles} tiles{' per bank' if num_banks > 1 else ''}...")
+        alive, counts = tile_table.alive, tile_table.counts
+
+        # Pairs are visited in (cost, idx1, idx2) order, exactly the order a min-heap would pop them.
+        # That order can be rebuilt from the pair arrays, so merge progress is just a position plus a log.
+        merge_order = np.lexsort((pair_idx2, pair_idx1, pair_costs))
+        pairs_visited = checkpoints.get_value("merge_pairs_visited", 0)
+        merge_log = []
+        if pairs_visited:
+            saved_log = checkpoints.load_arrays("merge_log")["merges"]
+            for winner_idx, loser_idx in saved_log.tolist():
+                tile_table.merge(winner_idx, loser_idx)
+                merges_left[unique_banks[loser_idx]] -= 1
+            merge_log = saved_log.tolist()
+            print(f"   [RESUME] Replayed {len(merge_log)} merges from checkpoint.")
+        last_checkpoint_t = time.monotonic()
         
-        with tqdm(total=num_merges_to_perform, desc="   Merging tiles") as pbar:
-            merges_done = 0
-            while merges_done < num_merges_to_perform and merge_heap:
-                cost, idx1, idx2 = heapq.heappop(merge_heap)
-                if not (is_active.get(idx1) and is_active.get(idx2)):
+        with progress_bar(total=num_merges_to_perform, initial=len(merge_log), desc="   Merging tiles") as pbar:
+            merges_done = len(merge_log)
+            while merges_done < num_merges_to_perform and pairs_visited < len(merge_order):
+                pair_pos = merge_order[pairs_visited]
+                pairs_visited += 1
+                idx1, idx2 = int(pair_idx1[pair_pos]), int(pair_idx2[pair_pos])
+                if not (alive[idx1] and alive[idx2]) or merges_left[unique_banks[idx1]] == 0:
                     continue
                 
-                tile1, tile2 = active_tiles[idx1], active_tiles[idx2]
-                if tile1["count"] > tile2["count"]:
+                if counts[idx1] > counts[idx2]:
                     winner_idx, loser_idx = idx1, idx2
-                elif tile2["count"] > tile1["count"]:
+                elif counts[idx2] > counts[idx1]:
                     winner_idx, loser_idx = idx2, idx1
                 else:
                     winner_idx, loser_idx = (idx1, idx2) if idx1 < idx2 else (idx2, idx1)
                 
-                active_tiles[winner_idx]["count"] += active_tiles[loser_idx]["count"]
-                active_tiles[winner_idx]["original_indices"].update(active_tiles[loser_idx]["original_indices"])
-                del active_tiles[loser_idx]
-                is_active[loser_idx] = False
+                tile_table.merge(winner_idx, loser_idx)
+                merges_left[unique_banks[loser_idx]] -= 1
+                merge_log.append((winner_idx, loser_idx))
                 merges_done += 1
                 pbar.update(1)
+
+                if checkpoints.enabled and time.monotonic() - last_checkpoint_t >= CHECKPOINT_INTERVAL_SECONDS:
+                    checkpoints.save_arrays("merge_log", merges=np.array(merge_log, dtype=np.int64).reshape(-1, 2))
+                    checkpoints.set_value("merge_pairs_visited", pairs_visited)
+                    last_checkpoint_t = time.monotonic()
+        if checkpoints.enabled:
+            checkpoints.save_arrays("merge_log", merges=np.array(merge_log, dtype=np.int64).reshape(-1, 2))
+            checkpoints.set_value("merge_pairs_visited", pairs_visited)
+            checkpoints.mark_complete("merging")
+
+        if merges_left.any() and tile_features is not None:
+            num_fallback = 0
+            for b in np.flatnonzero(merges_left).tolist():
+                num_fallback += _merge_remaining_by_features(tile_table, tile_features, max_tiles, np.arange(bank_starts[b], bank_starts[b + 1]))
+            time_budget.note_degraded("Merging tiles", f"{num_fallback} merges done by nearest features after the sampled pairs ran out")
     else:
         print(f"   [INFO] Initial unique tile count ({initial_unique_count}) is within limit. No merge needed.")
 
     # --- Step 3: Synthesize new tiles if requested ---
-    if synthesize and initial_unique_count > max_tiles:
+    if synthesize and needs_merging:
         print("   Synthesizing ideal tiles for merged groups...")
         color_dist_func = get_color_distance_function(color_metric)
-        for tile_info in tqdm(active_tiles.values(), desc="   Synthesizing"):
-            if len(tile_info["original_indices"]) > 1:
-                group_locations = []
-                for original_unique_idx in tile_info["original_indices"]:
-                    key = unique_sc4_keys[original_unique_idx]
-                    group_locations.extend(unique_tile_groups[key])
-                
-                quantized_tiles_for_group = [all_source_tiles_quantized[i] for i in group_locations]
-                tile_info["data"] = synthesize_ideal_tile(quantized_tiles_for_group, palette_255, color_dist_func)
+        roots = tile_table.roots()
+        merged_groups = np.flatnonzero(np.bincount(roots, minlength=len(tile_table)) > 1)
+        group_of_root = np.full(len(tile_table), -1, dtype=np.int64)
+        group_of_root[merged_groups] = np.arange(len(merged_groups))
+        location_groups = group_of_root[roots[source_unique_idx]]
+        ideal_indices = synthesize_ideal_tile_indices(np.asarray(all_source_tiles_quantized), location_groups, len(merged_groups), palette_255)
+
+        for group_idx, root_idx in enumerate(progress_bar(merged_groups.tolist(), desc="   Synthesizing")):
+            if time_budget.enabled and time_budget.remaining() < time_budget.seconds * TIME_BUDGET_SYNTH_RESERVE:
+                time_budget.note_degraded("Synthesizing", f"stopped after {group_idx} of {len(merged_groups)} merged groups")
+                break
+            tile_table.patterns[root_idx], tile_table.colors[root_idx] = process_tile_for_screen4(ideal_indices[group_idx], palette_255, color_dist_func)
 
     # --- Step 4: Sort final tiles by similarity ---
+    if sort_strategy == 'cluster' and not pairs_exact:
+        sort_strategy = 'greedy'
+        time_budget.note_degraded("Sorting tileset", "greedy chain instead of cluster sort")
     print("   Sorting final tileset for visual coherence...")
-    sorted_tile_infos, old_winner_to_new_map = sort_items_by_similarity(
-        list(active_tiles.values()),
-        similarity_map,
-        active_tiles,
-        strategy=sort_strategy
-    )
+    final_patterns = []
+    # Final index of every unique tile's group; tiles without one fall back to index 0
+    final_index_of_winner = np.zeros(len(tile_table), dtype=np.int16)
+    for b in range(num_banks):
+        bank_ids = np.arange(bank_starts[b], bank_starts[b + 1])
+        alive_tiles = {idx: tile_table.tile(idx) for idx in bank_ids[tile_table.alive[bank_ids]].tolist()}
+        sorted_tiles, old_winner_to_new_map = sort_items_by_similarity(
+            list(alive_tiles.values()),
+            similarity_map,
+            alive_tiles,
+            strategy=sort_strategy
+        )
+        for winner_idx, new_sorted_idx in old_winner_to_new_map.items():
+            if 0 <= winner_idx < len(tile_table) and tile_table.alive[winner_idx]:
+                final_index_of_winner[winner_idx] = len(final_patterns) + new_sorted_idx
+        final_patterns.extend(sorted_tiles)
     
     # --- Step 5: Build final tileset and map based on sorted order ---
     print("   Building final tileset and map...")
-    final_patterns = [info['data'] for info in sorted_tile_infos]
-    
-    # Create the final mapping from an original unique tile to its new sorted final index
-    final_merge_map = {}
-    for winner_idx, tile_info in active_tiles.items():
-        if winner_idx not in old_winner_to_new_map: continue
-        new_sorted_idx = old_winner_to_new_map[winner_idx]
-        for original_unique_idx in tile_info["original_indices"]:
-            final_merge_map[original_unique_idx] = new_sorted_idx
-
-    final_tile_map = np.zeros((tm_height, tm_width), dtype=np.int16)
-    for i, tile_data in enumerate(all_source_tiles_sc4):
-        key = tile_data[0].tobytes() + tile_data[1].tobytes()
-        if key in unique_sc4_to_idx:
-            unique_idx = unique_sc4_to_idx[key]
-            if unique_idx in final_merge_map:
-                final_idx = final_merge_map[unique_idx]
-                r, c = divmod(i, tm_width)
-                final_tile_map[r, c] = final_idx
+    final_tile_map = final_index_of_winner[tile_table.roots()[source_unique_idx]].reshape(tm_height, tm_width)
     
     return final_patterns, final_tile_map
 
@@ -608,6 +1517,21 @@ def write_sc4_map(filename, tile_map, num_supertiles):
         for tile_idx in tile_map.flat:
             f.write(int(tile_idx).to_bytes(bytes_per_index, 'little'))
 
+MAX_ANIM_FRAME_CELLS = 0xFFFF   # .SC4Anim cell counts and cell indices are 16-bit
+
+def write_sc4_frame_deltas(filename, frame_deltas, map_width, map_height, num_tiles):
+    bytes_per_index = 2 if num_tiles > 255 else 1
+    with open(filename, "wb") as f:
+        f.write(len(frame_deltas).to_bytes(2, 'little'))
+        f.write(map_width.to_bytes(2, 'little'))
+        f.write(map_height.to_bytes(2, 'little'))
+        f.write(b'\x00' * 4)
+        for cells, tiles in frame_deltas:
+            f.write(len(cells).to_bytes(2, 'little'))
+            for cell, tile_idx in zip(cells, tiles):
+                f.write(int(cell).to_bytes(2, 'little'))
+                f.write(int(tile_idx).to_bytes(bytes_per_index, 'little'))
+
 def reconstruct_sc4_tile_pil(pattern_data, color_data, pil_palette_flat):
     tile_img = Image.new('P', (8, 8))
     tile_img.putpalette(pil_palette_flat)
@@ -622,6 +1546,155 @@ def reconstruct_sc4_tile_pil(pattern_data, color_data, pil_palette_flat):
             pixels[c, r] = fg_idx if is_fg_pixel else bg_idx
     return tile_img
 
+# --- Quality Metrics ---
+# Error of the final tiles against the source image: RGB MSE/PSNR over all pixels,
+# mean and 95th-percentile CIE76 delta E, and the mean delta E of every tile.
+SRGB_TO_XYZ_D65 = np.array([[0.4124564, 0.3575761, 0.1804375],
+                            [0.2126729, 0.7151522, 0.0721750],
+                            [0.0193339, 0.1191920, 0.9503041]], dtype=np.float32)
+D65_WHITE_XYZ = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+
+def srgb_to_lab(rgb_uint8):
+    """CIE L*a*b* (D65) of an (...,3) uint8 sRGB array, as float32."""
+    channel = np.arange(256, dtype=np.float64) / 255.0
+    linear_lut = np.where(channel <= 0.04045, channel / 12.92, ((channel + 0.055) / 1.055) ** 2.4).astype(np.float32)
+    xyz = linear_lut[rgb_uint8] @ SRGB_TO_XYZ_D65.T / D65_WHITE_XYZ
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1).astype(np.float32)
+
+def compute_reconstruction_metrics(source_rgb, tile_patterns, tile_map, palette_255):
+    """
+    Compares an (H,W,3) uint8 source with the image rendered from tile_map. The rendered
+    image may be larger (padding); only the source area is measured. source_rgb may also
+    be a list of equally sized animation frames stacked in tile_map, one band of (H+7)//8
+    tile rows each. Returns the metrics dict and the (tile rows, tile cols) mean delta E
+    of every tile.
+    """
+    frames = source_rgb if isinstance(source_rgb, list) else [source_rgb]
+    height, width = frames[0].shape[:2]
+    frame_tile_rows = (height + 7) // 8
+    palette = np.zeros((16, 3), dtype=np.uint8)
+    palette[:len(palette_255)] = palette_255
+    palette_lab = srgb_to_lab(palette)
+    tile_indices = render_tile_indices(np.array([p[0] for p in tile_patterns], dtype=np.uint8),
+                                       np.array([p[1] for p in tile_patterns], dtype=np.uint8))
+    map_height, map_width = tile_map.shape
+
+    squared_error_sum = 0
+    delta_e = np.empty((len(frames) * height, width), dtype=np.float32)
+    tile_errors = np.zeros((map_height, map_width), dtype=np.float64)
+    # One band of tile rows at a time keeps the temporaries small on large images
+    for frame_idx, frame_rgb in enumerate(frames):
+        for tile_row in range(frame_tile_rows):
+            map_row = frame_idx * frame_tile_rows + tile_row
+            y0, y1 = tile_row * 8, min(height, tile_row * 8 + 8)
+            band = tile_indices[tile_map[map_row]].transpose(1, 0, 2).reshape(8, -1)[:y1 - y0, :width]
+            source_band = frame_rgb[y0:y1]
+            diff = palette[band].astype(np.int32) - source_band
+            squared_error_sum += int((diff * diff).sum())
+            band_delta_e = np.sqrt(((palette_lab[band] - srgb_to_lab(source_band)) ** 2).sum(axis=2))
+            delta_e[frame_idx * height + y0:frame_idx * height + y1] = band_delta_e
+            padded = np.zeros((8, map_width * 8), dtype=np.float64)
+            padded[:y1 - y0, :width] = band_delta_e
+            valid = np.zeros((8, map_width * 8), dtype=np.float64)
+            valid[:y1 - y0, :width] = 1
+            tile_errors[map_row] = padded.reshape(8, map_width, 8).sum(axis=(0, 2)) / np.maximum(valid.reshape(8, map_width, 8).sum(axis=(0, 2)), 1)
+
+    mse = squared_error_sum / max(1, delta_e.size * 3)
+    worst_row, worst_col = np.unravel_index(np.argmax(tile_errors), tile_errors.shape)
+    metrics = {
+        "width": width, "height": height,
+        "rgb_mse": round(mse, 4),
+        "psnr_db": round(10 * math.log10(255 ** 2 / mse), 3) if mse > 0 else None,
+        "delta_e76_mean": round(float(delta_e.mean()), 4),
+        "delta_e76_p95": round(float(np.percentile(delta_e, 95)), 4),
+        "worst_tile": {"row": int(worst_row), "col": int(worst_col), "delta_e76_mean": round(float(tile_errors[worst_row, worst_col]), 4)},
+    }
+    if len(frames) > 1:
+        metrics["frames"] = len(frames)
+        metrics["worst_tile"]["frame"], metrics["worst_tile"]["row"] = divmod(int(worst_row), frame_tile_rows)
+    return metrics, tile_errors
+
+def write_error_heatmap(filename, tile_errors):
+    """One 8x8 block per tile, black (no error) through red and yellow to white (worst tile)."""
+    peak = tile_errors.max()
+    level = tile_errors / peak if peak > 0 else np.zeros_like(tile_errors)
+    heat = np.stack([np.clip(level * 3, 0, 1), np.clip(level * 3 - 1, 0, 1), np.clip(level * 3 - 2, 0, 1)], axis=-1)
+    heat_img = Image.fromarray((heat * 255).round().astype(np.uint8), 'RGB')
+    heat_img.resize((heat_img.width * 8, heat_img.height * 8), Image.NEAREST).save(filename)
+
+# --- Screen Banks ---
+# SCREEN 4 splits the pattern and color tables into three 256-tile banks, each one
+# serving a fixed band of 8 tile rows (64 pixels) of the 192-pixel screen. With
+# --screen-banks 3 every band of the map gets its own tileset.
+SCREEN_BANK_TILE_ROWS = 8
+
+def tile_rows_to_banks(map_height, num_banks):
+    """
+    Bank of every tile row: rows 0-7 use bank 0, rows 8-15 bank 1 and so on, as in VRAM.
+    A map shorter than the screen leaves the last banks short or unused.
+    """
+    if map_height > SCREEN_BANK_TILE_ROWS * num_banks:
+        raise ValueError(f"{num_banks} screen banks cover at most {SCREEN_BANK_TILE_ROWS * num_banks} tile rows, got {map_height}")
+    return np.arange(map_height) // SCREEN_BANK_TILE_ROWS
+
+def layout_screen_banks(tiles, tile_map, row_banks, num_banks):
+    """
+    Splits tiles (indexed by tile_map, grouped bank by bank) into one tileset per bank
+    and returns (bank tilesets, tile map with bank-local indices). An exact duplicate
+    tile used by several banks is given the same local index in each of them when that
+    index exists in all of those banks, so the same map value means the same tile.
+    """
+    map_banks = np.broadcast_to(row_banks[:, None], tile_map.shape)
+    bank_tile_ids = [np.unique(tile_map[map_banks == b]).tolist() for b in range(num_banks)]
+    tile_keys = [pattern.tobytes() + colors.tobytes() for pattern, colors in tiles]
+
+    banks_of_key = defaultdict(dict)
+    for b, tile_ids in enumerate(bank_tile_ids):
+        for tile_idx in tile_ids:
+            banks_of_key[tile_keys[tile_idx]].setdefault(b, tile_idx)
+    shared = sorted((entry for entry in banks_of_key.values() if len(entry) > 1),
+                    key=lambda entry: (-len(entry), min(entry.values())))
+
+    slots = [[None] * len(tile_ids) for tile_ids in bank_tile_ids]
+    next_shared_slot = 0
+    for entry in shared:
+        if any(next_shared_slot >= len(slots[b]) for b in entry):
+            continue
+        for b, tile_idx in entry.items():
+            slots[b][next_shared_slot] = tile_idx
+        next_shared_slot += 1
+
+    local_index = np.zeros(len(tiles), dtype=np.int16)
+    bank_tilesets = []
+    for b, tile_ids in enumerate(bank_tile_ids):
+        placed = set(tile_idx for tile_idx in slots[b] if tile_idx is not None)
+        remaining = iter(tile_idx for tile_idx in tile_ids if tile_idx not in placed)
+        bank_slots = [tile_idx if tile_idx is not None else next(remaining) for tile_idx in slots[b]]
+        local_index[bank_slots] = np.arange(len(bank_slots))
+        bank_tilesets.append([tiles[tile_idx] for tile_idx in bank_slots])
+    print(f"   [INFO] {next_shared_slot} tiles share the same index in several banks.")
+    return bank_tilesets, local_index[tile_map]
+
+# --- Animation Frames ---
+# With --frames, all frames are converted together: they are stacked vertically into
+# one tall map so the optimizer builds a single shared tileset, and identical tiles in
+# different frames collapse to the same entry. The map file holds the first frame and
+# every following frame is stored as the name-table cells that change.
+def frame_name_table_deltas(frame_maps):
+    """
+    (cells, tiles) that turn each frame's name table into the next one: entry f updates
+    frame f to frame f+1, and the last entry loops from the last frame back to the first.
+    Cells are row-major indices into the map.
+    """
+    deltas = []
+    num_frames = len(frame_maps)
+    for f in range(num_frames):
+        current, following = frame_maps[f].ravel(), frame_maps[(f + 1) % num_frames].ravel()
+        cells = np.flatnonzero(current != following)
+        deltas.append((cells, following[cells]))
+    return deltas
+
 def discover_supertiles(tile_map, super_w, super_h):
     map_h, map_w = tile_map.shape
     if map_w % super_w != 0 or map_h % super_h != 0:
@@ -715,7 +1788,7 @@ def _sort_greedy_chain(items_to_sort, similarity_map, old_indices):
         
         # Fallback if no pre-calculated neighbor is found (shouldn't happen)
         if best_next_index == -1:
-            best_next_index = list(remaining_indices)[0]
+            best_next_index = next(iter(remaining_indices))
 
         sorted_indices.append(best_next_index)
         remaining_indices.remove(best_next_index)
@@ -822,8 +1895,8 @@ def sort_items_by_similarity(items_to_sort, similarity_map, original_indices_map
         sorted_indices = _sort_cluster_aware(items_to_sort, similarity_map, old_indices, threshold)
     elif strategy == 'greedy':
         sorted_indices = _sort_greedy_chain(items_to_sort, similarity_map, old_indices)
-    else: # 'none' or invalid
-        return items_to_sort, {i: i for i in range(len(items_to_sort))}
+    else: # 'none' or invalid: keep the given order
+        sorted_indices = old_indices
 
     old_to_new_map = {old_idx: new_idx for new_idx, old_idx in enumerate(sorted_indices)}
     
@@ -890,12 +1963,52 @@ def main():
                              "  balanced: High contrast palette or rendering,low contrast palette for metrics (better tile reduction).\n"
                              "  soft: Low contrast for render and metrics (better tile reduction, 'washed' final image).")
 
+    parser.add_argument("--screen-banks", type=int, choices=[1, 3], default=1,
+                    help="1 (default): one tileset of up to --max-tiles tiles.\n"
+                            "3: SCREEN 4 three-bank mode. The map is split into the screen's top, middle\n"
+                            "and bottom bands of 8 tile rows (64 pixels), each optimized to its own\n"
+                            "tileset of up to --max-tiles tiles, so the image may be at most 192 pixels high\n"
+                            "(<name>_bank0..2.SC4Tiles). The map holds bank-local tile indices and\n"
+                            "supertiles are not generated.")
+    parser.add_argument("--frames", nargs='+', metavar="IMAGE",
+                    help="Animation mode: further frames of the same size as input_image, in order.\n"
+                            "All frames share one tileset of up to --max-tiles tiles. <name>.SC4Map\n"
+                            "holds the first frame and <name>.SC4Anim the changed name-table cells\n"
+                            "from each frame to the next (the last entry loops back to the first).\n"
+                            "The map holds tile indices and supertiles are not generated. Each frame\n"
+                            "may have at most 65535 tiles (8x8 cells).")
     parser.add_argument("--sort-tileset", type=str, choices=['none', 'greedy', 'cluster'], default='cluster',
                     help="Method to sort the final tileset for visual coherence.\n"
                             "  cluster (default): Groups tiles into visually similar clusters.\n"
                             "  greedy: Creates a continuous chain of most-similar tiles.\n"
                             "  none: Disables sorting, uses arbitrary order.")
 
+    parser.add_argument("--palette-sample-pixels", type=int, metavar="PIXELS",
+                    help="Above this many pixels, palette generation runs on a deterministic subsample\n"
+                            "of exactly PIXELS pixels drawn systematically from the color histogram; colors\n"
+                            "too rare to receive a sample are dropped. Off by default.")
+    parser.add_argument("--palette-search", type=int, default=0, metavar="ITERATIONS",
+                    help="Refine the automatic render palette colors by up to ITERATIONS steps of local\n"
+                            "search, each moving one color to a neighbouring MSX color, scored by a fast\n"
+                            "color clash estimate on sampled tile rows. Fixed and blocked slots are kept.\n"
+                            "CIE metrics use weighted-rgb for the estimate. 0 (default) disables it.")
+    parser.add_argument("--progress-format", type=str, choices=['text', 'jsonl'], default='text',
+                    help="How progress is reported on stdout.\n"
+                            "  text (default): Human-readable progress bars.\n"
+                            "  jsonl: One JSON event per line (stage/progress), for front-ends.")
+    parser.add_argument("--checkpoint-dir", help="Directory for checkpoints of the expensive steps (pair costs, merging),\n"
+                            "so an interrupted run can continue with --resume.")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint in --checkpoint-dir. The input image and\n"
+                            "options must match the checkpointed run.")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                    help="Finish within roughly SECONDS of wall-clock time. Expensive steps switch to\n"
+                            "approximate neighbours, sampled pairs and greedy sorting when needed, and\n"
+                            "refine while time remains. The degraded steps are listed at the end.\n"
+                            "Cannot be combined with --resume.")
+    parser.add_argument("--mp-start-method", type=str, choices=['auto', 'fork', 'spawn', 'forkserver'], default='auto',
+                    help="How worker processes are started. 'auto' (default) uses the platform default.\n"
+                            "'fork' is not available on Windows.")
+
     palette_group = parser.add_argument_group('Palette Constraints', 
         'Rules for controlling palette slots. Later rules override earlier ones.\n'
         'Rule formats: "auto", "block", or a color like "700" (R=7, G=0, B=0).\n'
@@ -906,6 +2019,7 @@ def main():
     palette_group.add_argument("--palette-slot", nargs=2, action='append', metavar=('<INDEX>', '<RULE>'), help="Set a rule for a specific slot. Can be used multiple times.")
 
     args = parser.parse_args()
+    configure_progress_reporting(args.progress_format)
 
     if (args.color_metric in ['cie76', 'ciede2000']) and not COLOUR_SCIENCE_AVAILABLE:
         print("\n--- ERROR ---")
@@ -913,8 +2027,40 @@ def main():
         print("Please install it using: pip install colour-science")
         return
 
+    if args.resume and not args.checkpoint_dir:
+        print("Error: --resume requires --checkpoint-dir.")
+        sys.exit(1)
+
+    if args.time_budget is not None and args.time_budget <= 0:
+        print("Error: --time-budget must be a positive number of seconds.")
+        sys.exit(1)
+
+    if args.time_budget is not None and args.resume:
+        # Budgeted pair sets depend on timing and are not checkpointed, so a resumed merge would not line up
+        print("Error: --time-budget cannot be combined with --resume.")
+        sys.exit(1)
+
+    if args.palette_sample_pixels is not None and args.palette_sample_pixels <= 0:
+        print("Error: --palette-sample-pixels must be a positive number of pixels.")
+        sys.exit(1)
+
+    if args.palette_search < 0:
+        print("Error: --palette-search must be zero or a positive number of iterations.")
+        sys.exit(1)
+
+    if args.mp_start_method != 'auto' and args.mp_start_method not in multiprocessing.get_all_start_methods():
+        print(f"Error: Start method '{args.mp_start_method}' is not available on this platform.")
+        sys.exit(1)
+
+    time_budget = TimeBudget(args.time_budget)
+    # The pool is started while the process is still small, so forking stays cheap.
+    with WorkerPool(args.cores, args.mp_start_method) as worker_pool:
+        convert_image(args, worker_pool, time_budget)
+
+def convert_image(args, worker_pool, time_budget):
+
     # --- 1. Process Palette Constraints ---
-    print("1. Processing palette constraints...")
+    print_stage("1", "Processing palette constraints...")
     final_rules = process_palette_constraints(args)
     
     fixed_colors_0_7 = []
@@ -944,10 +2090,29 @@ def main():
         print("Error: All palette slots are blocked. Cannot process image.")
         return
     
-    try:
-        original_pil_image = Image.open(args.input_image)
-    except FileNotFoundError:
-        print(f"Error: Input image '{args.input_image}' not found.")
+    source_frames = []
+    for frame_path in [args.input_image] + (args.frames or []):
+        try:
+            source_frames.append(Image.open(frame_path))
+        except FileNotFoundError:
+            print(f"Error: Input image '{frame_path}' not found.")
+            return
+    original_pil_image = source_frames[0]
+    num_frames = len(source_frames)
+    for frame_path, frame in zip(args.frames or [], source_frames[1:]):
+        if frame.size != original_pil_image.size:
+            print(f"Error: Frame '{frame_path}' is {frame.size[0]}x{frame.size[1]}, but all frames must be "
+                  f"{original_pil_image.size[0]}x{original_pil_image.size[1]} like '{args.input_image}'.")
+            return
+    image_tile_rows = (original_pil_image.size[1] + 7) // 8
+    if args.screen_banks > 1 and image_tile_rows > SCREEN_BANK_TILE_ROWS * args.screen_banks:
+        print(f"Error: --screen-banks {args.screen_banks} covers at most {SCREEN_BANK_TILE_ROWS * args.screen_banks * 8} pixel rows, "
+              f"but '{args.input_image}' is {original_pil_image.size[1]} pixels high.")
+        return
+    frame_cells = ((original_pil_image.size[0] + 7) // 8) * ((original_pil_image.size[1] + 7) // 8)
+    if num_frames > 1 and frame_cells > MAX_ANIM_FRAME_CELLS:
+        print(f"Error: Frames of {original_pil_image.size[0]}x{original_pil_image.size[1]} have {frame_cells} tiles, "
+              f"but animation mode supports at most {MAX_ANIM_FRAME_CELLS} per frame.")
         return
 
     if args.output_basename:
@@ -958,8 +2123,23 @@ def main():
     full_output_path = os.path.join(args.output_dir, base_name)
     color_dist_func = get_color_distance_function(args.color_metric)
 
+    checkpoints = CheckpointStore(None)
+    if args.checkpoint_dir:
+        checkpoint_options = {
+            "max_tiles": args.max_tiles, "no_dithering": args.no_dithering, "color_metric": args.color_metric,
+            "supertile_width": args.supertile_width, "supertile_height": args.supertile_height,
+            "find_best_offset": args.find_best_offset, "synthesize_tiles": args.synthesize_tiles,
+            "no_maps": args.no_maps, "optimization_mode": args.optimization_mode,
+            "sort_tileset": args.sort_tileset, "palette_rules": final_rules, "time_budget": args.time_budget,
+            "palette_sample_pixels": args.palette_sample_pixels, "screen_banks": args.screen_banks,
+            "palette_search": args.palette_search,
+            "frames": [hash_file_sha256(frame_path) for frame_path in args.frames or []],
+        }
+        checkpoints = CheckpointStore(args.checkpoint_dir, hash_file_sha256(args.input_image),
+                                      hash_options_sha256(checkpoint_options), resume=args.resume)
+
     # --- 2. Generate Palettes based on Mode ---
-    print(f"2. Generating palettes (mode: {args.optimization_mode})...")
+    print_stage("2", f"Generating palettes (mode: {args.optimization_mode})...")
     
     if args.optimization_mode == 'neutral':
         render_palette_func = find_best_auto_colors_neutral
@@ -974,88 +2154,111 @@ def main():
         render_palette_func = find_best_auto_colors_soft
         metric_palette_func = find_best_auto_colors_soft
 
-    render_auto_colors = render_palette_func(original_pil_image, num_auto_colors, fixed_colors_0_7, color_dist_func)
+    frame_histograms = [ColorHistogram.from_image(frame) for frame in source_frames]
+    # In frames mode one palette serves the whole animation
+    source_histogram = frame_histograms[0] if num_frames == 1 else ColorHistogram.combine(frame_histograms)
+    palette_histogram = source_histogram.subsampled(args.palette_sample_pixels)
+    if num_frames > 1:
+        print(f"   [INFO] {num_frames} frames have {len(source_histogram.packed)} unique colors in {source_histogram.num_pixels} pixels.")
+    else:
+        print(f"   [INFO] Image has {len(source_histogram.packed)} unique colors in {source_histogram.num_pixels} pixels.")
+    if palette_histogram is not source_histogram:
+        print(f"   [INFO] Palette generation uses a deterministic subsample of {palette_histogram.num_pixels} pixels "
+              f"({len(palette_histogram.packed)} of {len(source_histogram.packed)} colors).")
+
+    render_auto_colors = render_palette_func(palette_histogram, num_auto_colors, fixed_colors_0_7, color_dist_func)
     print(f"   [INFO] Found {len(render_auto_colors)} unique colors for final render palette.")
+    if args.palette_search:
+        render_auto_colors = search_auto_colors(source_frames, fixed_colors_0_7, render_auto_colors, args.palette_search,
+                                                color_dist_func, worker_pool, time_budget)
     render_working_palette_0_7 = fixed_colors_0_7 + render_auto_colors
     working_to_final_map = {i: final_slot for i, final_slot in enumerate(fixed_slot_indices + auto_slot_indices[:len(render_auto_colors)])}
     
     if args.optimization_mode == 'balanced':
         print(f"   [INFO] Generating separate 'soft' palette for optimization metrics...")
-        metric_auto_colors = metric_palette_func(original_pil_image, num_auto_colors, fixed_colors_0_7, color_dist_func)
+        metric_auto_colors = metric_palette_func(palette_histogram, num_auto_colors, fixed_colors_0_7, color_dist_func)
         metric_working_palette_0_7 = fixed_colors_0_7 + metric_auto_colors
     else:
         metric_working_palette_0_7 = render_working_palette_0_7
 
     # --- 3. Remap image and process tiles ---
-    print(f"   [INFO] Remapping image to {len(render_working_palette_0_7)}-color render palette...")
-    quantized_pil_image = remap_image_to_palette(original_pil_image, render_working_palette_0_7, not args.no_dithering)
-
+    print(f"   [INFO] Remapping {'image' if num_frames == 1 else f'{num_frames} frames'} to {len(render_working_palette_0_7)}-color render palette...")
+    quantized_frames = [remap_image_to_palette(frame, render_working_palette_0_7, not args.no_dithering, histogram)
+                        for frame, histogram in zip(source_frames, frame_histograms)]
+    quantized_pil_image = quantized_frames[0]
+
+    if args.find_best_offset and time_budget.enabled:
+        estimated_t = estimate_offset_search_seconds(quantized_pil_image, worker_pool.num_cores)
+        if estimated_t > time_budget.remaining() * TIME_BUDGET_OFFSET_SHARE:
+            time_budget.note_degraded("Finding best offset", f"skipped, estimated {estimated_t:.1f}s")
+            args.find_best_offset = False
+
+    best_offset = (0, 0)
     if args.find_best_offset:
-        print(f"3b. Evaluating 64 possible offsets on {args.cores} cores...")
-        best_offset = find_best_tiling_offset(quantized_pil_image, args.cores)
+        print_stage("3b", f"Evaluating 64 possible offsets on {args.cores} cores...")
+        best_offset = find_best_tiling_offset(quantized_pil_image, worker_pool)
         dx, dy = best_offset
         print(f"   [INFO] Optimal offset found at ({dx}, {dy}). Cropping image.")
         width, height = quantized_pil_image.size
-        quantized_pil_image = quantized_pil_image.crop((dx, dy, width, height))
+        quantized_frames = [frame.crop((dx, dy, width, height)) for frame in quantized_frames]
 
-    quantized_pil_image = pad_image_to_tile_size(quantized_pil_image)
-    img_width, img_height = quantized_pil_image.size
+    # Frames are stacked top to bottom; a single image is a stack of one
+    quantized_frames = [pad_image_to_tile_size(frame) for frame in quantized_frames]
+    frame_width, frame_height = quantized_frames[0].size
+    quantized_np_indices = np.concatenate([np.array(frame, dtype=np.uint8).reshape((frame_height, frame_width)) for frame in quantized_frames])
+    img_height, img_width = quantized_np_indices.shape
     tile_map_width, tile_map_height = img_width // 8, img_height // 8
+    frame_tile_rows = frame_height // 8
 
-    print("4. Extracting and processing source tiles...")
-    all_source_tiles_sc4_render = []
-    all_source_tiles_sc4_metric = []
-    all_source_tiles_quantized = [] # For synthesis
-    
+    print_stage("4", "Extracting and processing source tiles...")
     render_palette_255 = [(r*255//7, g*255//7, b*255//7) for r,g,b in render_working_palette_0_7]
     metric_palette_255 = [(r*255//7, g*255//7, b*255//7) for r,g,b in metric_working_palette_0_7]
 
-    quantized_np_indices = np.array(quantized_pil_image.getdata(), dtype=np.uint8).reshape((img_height, img_width))
-    for ty in tqdm(range(tile_map_height), desc="   Processing Tiles"):
-        for tx in range(tile_map_width):
-            tile_block = quantized_np_indices[ty*8:(ty+1)*8, tx*8:(tx+1)*8]
-            all_source_tiles_quantized.append(tile_block)
-            
-            all_source_tiles_sc4_render.append(process_tile_for_screen4(tile_block, render_palette_255, color_dist_func))
-            
-            if args.optimization_mode == 'balanced':
-                metric_remapped_tile_block = np.zeros_like(tile_block)
-                for r in range(8):
-                    for c in range(8):
-                        render_idx = tile_block[r,c]
-                        render_color_255 = render_palette_255[render_idx]
-                        best_dist = float('inf')
-                        best_metric_idx = 0
-                        for i, metric_color_255 in enumerate(metric_palette_255):
-                            dist = color_distance_rgb(render_color_255, metric_color_255)
-                            if dist < best_dist:
-                                best_dist = dist
-                                best_metric_idx = i
-                        metric_remapped_tile_block[r,c] = best_metric_idx
-                all_source_tiles_sc4_metric.append(process_tile_for_screen4(metric_remapped_tile_block, metric_palette_255, color_dist_func))
-            else:
-                all_source_tiles_sc4_metric = all_source_tiles_sc4_render
+    # (T,8,8) tile blocks in map order, kept for synthesis
+    all_source_tiles_quantized = quantized_np_indices.reshape(tile_map_height, 8, tile_map_width, 8).swapaxes(1, 2).reshape(-1, 8, 8)
+
+    render_to_metric_lut = None
+    if args.optimization_mode == 'balanced':
+        # At most 16 render colors: remap them once and apply the LUT to every tile at the same time
+        render_to_metric_lut = np.argmin(color_distances_rgb(render_palette_255, metric_palette_255), axis=1).astype(np.uint8)
 
-    print(f"   [INFO] Image contains a total of {len(all_source_tiles_sc4_render)} tiles (including duplicates).")
+    all_source_tiles_sc4_render, all_source_tiles_sc4_metric, num_distinct_blocks = extract_source_tiles(
+        all_source_tiles_quantized, render_palette_255, metric_palette_255, args.color_metric, worker_pool, render_to_metric_lut)
+
+    print(f"   [INFO] Image contains a total of {len(all_source_tiles_sc4_render)} tiles (including duplicates), {num_distinct_blocks} distinct.")
 
     # --- 5. Optimize Tiles ---
-    print("5. Optimizing tiles...")
+    print_stage("5", "Optimizing tiles...")
+    tile_banks = None
+    if args.screen_banks > 1:
+        row_banks = np.tile(tile_rows_to_banks(frame_tile_rows, args.screen_banks), num_frames)
+        tile_banks = np.repeat(row_banks, tile_map_width)
+        print(f"   [INFO] Optimizing {args.screen_banks} screen banks of up to {args.max_tiles} tiles each.")
     optimized_patterns_metric, final_tile_map_indices = optimize_by_precomputation_and_heap(
         all_source_tiles_sc4_metric, all_source_tiles_quantized, args.max_tiles, tile_map_width, tile_map_height,
-        metric_palette_255, args.cores, args.color_metric, args.synthesize_tiles, args.sort_tileset)    
+        metric_palette_255, worker_pool, args.color_metric, args.synthesize_tiles, args.sort_tileset, checkpoints, time_budget,
+        tile_banks)
+
     # --- 6. Translate to Final Render Tiles ---
-    print("6. Translating tiles to final format...")
+    print_stage("6", "Translating tiles to final format...")
     if args.optimization_mode == 'balanced':
         unique_metric_tile_groups = defaultdict(list)
         for i, tile_data in enumerate(all_source_tiles_sc4_metric):
             key = tile_data[0].tobytes() + tile_data[1].tobytes()
             unique_metric_tile_groups[key].append(i)
         
+        metric_to_render_lut = np.argmin(color_distances_rgb(metric_palette_255, render_palette_255), axis=1).astype(np.uint8)
         final_render_patterns = []
         for metric_tile in optimized_patterns_metric:
             key = metric_tile[0].tobytes() + metric_tile[1].tobytes()
-            original_location = unique_metric_tile_groups[key][0]
-            final_render_patterns.append(all_source_tiles_sc4_render[original_location])
+            if key in unique_metric_tile_groups:
+                original_location = unique_metric_tile_groups[key][0]
+                final_render_patterns.append(all_source_tiles_sc4_render[original_location])
+            else:
+                # Synthesized tiles have no source location: translate their colors instead
+                pattern_data, color_data = metric_tile
+                render_colors = (metric_to_render_lut[color_data >> 4] << 4) | metric_to_render_lut[color_data & 0x0F]
+                final_render_patterns.append((pattern_data, render_colors.astype(np.uint8)))
     else:
         final_render_patterns = optimized_patterns_metric
 
@@ -1073,21 +2276,27 @@ def main():
         final_palette_0_7[final_slot] = color
     
     # --- 7. Supertile Discovery and Sorting ---
-    if not args.no_maps:
+    if args.screen_banks > 1:
+        print_stage("7", f"Laying out {args.screen_banks} screen banks...")
+        bank_tilesets, final_map_to_write = layout_screen_banks(final_unique_patterns, final_tile_map_indices, row_banks, args.screen_banks)
+        print(f"   [INFO] Bank tile counts: {', '.join(str(len(bank)) for bank in bank_tilesets)}.")
+    elif not args.no_maps:
         supertile_definitions = []
         final_map_to_write = final_tile_map_indices
         num_supertiles = num_unique_base_patterns
-        use_supertiles = args.supertile_width > 1 or args.supertile_height > 1
+        use_supertiles = (args.supertile_width > 1 or args.supertile_height > 1) and num_frames == 1
+        if num_frames > 1 and (args.supertile_width > 1 or args.supertile_height > 1):
+            print("   [INFO] Frames mode works on single tiles: supertiles are 1x1.")
 
         # Part 7.1: Discover unique supertiles
         if use_supertiles:
-            print(f"7. Discovering {args.supertile_width}x{args.supertile_height} supertiles...")
+            print_stage("7", f"Discovering {args.supertile_width}x{args.supertile_height} supertiles...")
             supertile_definitions, supertile_map = discover_supertiles(final_tile_map_indices, args.supertile_width, args.supertile_height)
             num_supertiles = len(supertile_definitions)
             final_map_to_write = supertile_map
             print(f"   [INFO] Found {num_supertiles} unique {args.supertile_width}x{args.supertile_height} supertiles.")
         else:
-            print("7. Generating 1x1 supertile definitions...")
+            print_stage("7", "Generating 1x1 supertile definitions...")
             for i in range(num_unique_base_patterns):
                 supertile_definitions.append(np.array([[i]], dtype=np.int16))
 
@@ -1098,37 +2307,40 @@ def main():
             pil_final_palette_flat_for_compare = [comp for rgb in final_pil_palette_for_compare for comp in rgb]
         
             print(f"   Sorting {num_supertiles} supertiles for visual coherence...")
-            st_similarity_map = defaultdict(list)
-            st_pairs = list(combinations(range(num_supertiles), 2))
-        
-            st_similarity_map = defaultdict(list)
-            st_pairs = list(combinations(range(num_supertiles), 2))
-
+            st_sort_strategy = args.sort_tileset
             init_args = (supertile_definitions, final_unique_patterns, final_pil_palette_for_compare, args.color_metric)
-            chunksize = max(1, len(st_pairs) // (args.cores * 16))
-
-            with multiprocessing.Pool(processes=args.cores, initializer=_init_supertile_worker, initargs=init_args) as pool:
-                for dist, idx1, idx2 in tqdm(pool.imap_unordered(_calculate_supertile_cost_worker, st_pairs, chunksize=chunksize), total=len(st_pairs), desc="   Clustering supertiles", leave=False):
-                    st_similarity_map[idx1].append((dist, idx2))
-                    st_similarity_map[idx2].append((dist, idx1))
-
-            for idx in st_similarity_map:
-                st_similarity_map[idx].sort()
+            if time_budget.enabled:
+                tile_patterns = np.array([p[0] for p in final_unique_patterns], dtype=np.uint8)
+                tile_colors = np.array([p[1] for p in final_unique_patterns], dtype=np.uint8)
+                tile_means = tile_feature_vectors(tile_patterns, tile_colors, final_pil_palette_for_compare, cells=1)
+                st_features = tile_means[np.array(supertile_definitions)].reshape(num_supertiles, -1)
+                st_costs, st_idx1, st_idx2, st_exact = compute_pair_costs_within_budget(
+                    "supertile_pair_costs", st_features, worker_pool, _init_supertile_worker, init_args,
+                    _calculate_supertile_cost_worker, "   Clustering supertiles", time_budget.deadline(TIME_BUDGET_ST_PAIR_SHARE), time_budget)
+                if st_sort_strategy == 'cluster' and not st_exact:
+                    st_sort_strategy = 'greedy'
+                    time_budget.note_degraded("Sorting supertiles", "greedy chain instead of cluster sort")
+            else:
+                st_pairs = list(combinations(range(num_supertiles), 2))
+                st_costs, st_idx1, st_idx2 = compute_pair_costs(
+                    "supertile_pair_costs", st_pairs, worker_pool, _init_supertile_worker, init_args,
+                    _calculate_supertile_cost_worker, "   Clustering supertiles", checkpoints)
+            st_similarity_map = build_similarity_map(st_costs, st_idx1, st_idx2)
 
             original_st_map = {i: st for i, st in enumerate(supertile_definitions)}
             sorted_supertiles, old_st_to_new_map = sort_items_by_similarity(
                 supertile_definitions,
                 st_similarity_map,
                 original_st_map,
-                strategy=args.sort_tileset
+                strategy=st_sort_strategy
             )
 
-        # Update the definitions and map with the new sorted order
-        supertile_definitions = sorted_supertiles
-        final_map_to_write = remap_indices(supertile_map, old_st_to_new_map)
+            # Update the definitions and map with the new sorted order
+            supertile_definitions = sorted_supertiles
+            final_map_to_write = remap_indices(supertile_map, old_st_to_new_map)
 
     # --- 8. Generate Output Files ---
-    print("8. Generating output files...")
+    print_stage("8", "Generating output files...")
     os.makedirs(args.output_dir, exist_ok=True)
     
     final_palette_0_7 = [(0,0,0)] * 16
@@ -1141,15 +2353,32 @@ def main():
         final_palette_0_7[final_slot] = color
         
     write_sc4_palette(f"{full_output_path}.SC4Pal", final_palette_0_7)
-    write_sc4_tiles(f"{full_output_path}.SC4Tiles", final_unique_patterns)
+    if args.screen_banks > 1:
+        for b, bank_tiles in enumerate(bank_tilesets):
+            write_sc4_tiles(f"{full_output_path}_bank{b}.SC4Tiles", bank_tiles)
+    else:
+        write_sc4_tiles(f"{full_output_path}.SC4Tiles", final_unique_patterns)
 
     if not args.no_maps:
-        write_sc4_supertiles(f"{full_output_path}.SC4Super", supertile_definitions, args.supertile_width, args.supertile_height)
-        write_sc4_map(f"{full_output_path}.SC4Map", final_map_to_write, num_supertiles)
+        if args.screen_banks > 1:
+            # Tile-level map: every value is an index into the tileset of its row's bank
+            map_index_count = max(len(bank) for bank in bank_tilesets)
+        else:
+            if num_frames == 1:
+                write_sc4_supertiles(f"{full_output_path}.SC4Super", supertile_definitions, args.supertile_width, args.supertile_height)
+            map_index_count = num_supertiles
+        frame_maps = final_map_to_write.reshape(num_frames, -1, final_map_to_write.shape[1])
+        write_sc4_map(f"{full_output_path}.SC4Map", frame_maps[0], map_index_count)
+        if num_frames > 1:
+            frame_deltas = frame_name_table_deltas(frame_maps)
+            write_sc4_frame_deltas(f"{full_output_path}.SC4Anim", frame_deltas, frame_maps.shape[2], frame_maps.shape[1], map_index_count)
+            changed_cells = [len(cells) for cells, _ in frame_deltas]
+            print(f"   [INFO] {num_frames} frames: {min(changed_cells)} to {max(changed_cells)} of {frame_maps[0].size} "
+                  f"name-table cells change per step ({sum(changed_cells)} in total).")
 
     # --- 9. Generate Visual Outputs ---
     if not args.no_maps:
-        print("9. Generating visual outputs...")
+        print_stage("9", "Generating visual outputs...")
         final_pil_palette = [(0,0,0)] * 16
         for i, color in enumerate(final_palette_0_7):
             if color[0] < 128:
@@ -1178,6 +2407,27 @@ def main():
             tileset_vis.paste(tile_to_paste, (c_vis * 8, r_vis * 8))
         tileset_vis.save(f"{full_output_path}_tileset.png")
     
+    # --- 10. Measure Reconstruction Quality ---
+    print_stage("10", "Measuring reconstruction quality...")
+    metrics_start_t = time.monotonic()
+    final_pil_palette = [(c[0]*255//7, c[1]*255//7, c[2]*255//7) if c[0] < 128 else (0,0,0) for c in final_palette_0_7]
+    dx, dy = best_offset
+    source_rgb = [np.asarray(frame.convert('RGB'), dtype=np.uint8)[dy:, dx:] for frame in source_frames]
+    if num_frames == 1:
+        source_rgb = source_rgb[0]
+    metrics, tile_errors = compute_reconstruction_metrics(source_rgb, final_unique_patterns, final_tile_map_indices, final_pil_palette)
+    metrics["seconds"] = round(time.monotonic() - metrics_start_t, 3)
+    with open(f"{full_output_path}_metrics.json", "w") as f:
+        json.dump(metrics, f, indent=2)
+    if not args.no_maps:
+        write_error_heatmap(f"{full_output_path}_error_heatmap.png", tile_errors)
+    psnr_text = f"{metrics['psnr_db']:.2f} dB" if metrics["psnr_db"] is not None else "lossless"
+    print(f"   [INFO] PSNR {psnr_text}, mean dE76 {metrics['delta_e76_mean']:.2f}, p95 dE76 {metrics['delta_e76_p95']:.2f} "
+          f"(worst tile at {metrics['worst_tile']['col']},{metrics['worst_tile']['row']}).")
+    if progress_format == 'jsonl':
+        emit_event("metrics", **metrics)
+
+    time_budget.report()
     print("\nProcessing complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+import pytest
+
+import msxtileforge as forge
+
+
+class StubApp:
+    """The parts of the application the undo manager and tile commands talk to."""
+    def __init__(self):
+        self.change_bus = forge.ChangeBus()
+        self.tile_redraws = []
+        self.full_redraws = 0
+        self.change_bus.subscribe("all_views", {forge.ChangeBus.PROJECT_STRUCTURE}, self._redraw_all)
+        self.change_bus.subscribe("tile", {forge.ChangeBus.TILE_PIXELS, forge.ChangeBus.TILE_COLORS}, self._redraw_tiles)
+
+    def _redraw_all(self, events):
+        self.full_redraws += 1
+        return True
+
+    def _redraw_tiles(self, events):
+        self.tile_redraws.append(sorted({payload for _, payload in events}))
+        return True
+
+    def _mark_project_modified(self):
+        pass
+
+    def invalidate_tile_cache(self, tile_index):
+        pass
+
+    def _request_color_usage_refresh(self):
+        pass
+
+    def _request_tile_usage_refresh(self):
+        pass
+
+    def _request_supertile_usage_refresh(self):
+        pass
+
+    def _update_edit_menu_state(self):
+        pass
+
+
+class OtherCommand(forge.ICommand):
+    def __init__(self):
+        super().__init__("Other")
+
+    def execute(self):
+        pass
+
+    def undo(self):
+        pass
+
+
+@pytest.fixture
+def app():
+    saved_pixels = [[forge.tileset.get_pixel(0, r, c) for c in range(8)] for r in range(8)]
+    yield StubApp()
+    for r in range(8):
+        for c in range(8):
+            forge.tileset.set_pixel(0, r, c, saved_pixels[r][c])
+
+
+def test_paint_undo_and_redo_each_redraw_the_tile_view_once(app):
+    manager = forge.UndoManager(app)
+    new_value = 1 - forge.tileset.get_pixel(0, 0, 0)
+
+    manager.execute(forge.PaintPixelCommand(app, 0, 0, 0, new_value))
+    assert forge.tileset.get_pixel(0, 0, 0) == new_value
+    manager.undo()
+    manager.redo()
+
+    assert app.change_bus.redraw_counts == {"Paint Pixel": {"tile": 3}}
+    assert app.tile_redraws == [[0], [0], [0]]
+    assert app.full_redraws == 0
+
+
+def test_stroke_redraws_per_pixel_while_painting_and_once_on_undo_and_redo(app):
+    # Like handle_editor_click/drag and _handle_editor_paint_release: every pixel is applied and
+    # flushed as it is painted, then the stroke is registered as one already executed command
+    manager = forge.UndoManager(app)
+    pixels = [(0, 0), (0, 1), (1, 1)]
+    old_values = [forge.tileset.get_pixel(0, r, c) for r, c in pixels]
+    pending = []
+    for (r, c), old_value in zip(pixels, old_values):
+        command = forge.PaintPixelCommand(app, 0, r, c, 1 - old_value)
+        command.execute()
+        pending.append(command)
+        app.change_bus.flush(command.description)
+    manager.register(forge.CompositeCommand("Paint Stroke", pending[:], app))
+    assert app.change_bus.redraw_counts == {"Paint Pixel": {"tile": 3}}
+
+    manager.undo()
+    assert [forge.tileset.get_pixel(0, r, c) for r, c in pixels] == old_values
+    assert app.change_bus.redraw_counts["Paint Stroke"] == {"tile": 1}
+    manager.redo()
+
+    assert app.change_bus.redraw_counts == {"Paint Pixel": {"tile": 3}, "Paint Stroke": {"tile": 2}}
+    assert app.tile_redraws == [[0]] * 5
+    assert app.full_redraws == 0
+
+
+def test_commands_that_do_not_publish_redraw_everything(app):
+    manager = forge.UndoManager(app)
+    app.change_bus.publish(forge.ChangeBus.TILE_PIXELS, 0) # Stale event, superseded by the full redraw
+
+    manager.execute(OtherCommand())
+
+    assert app.change_bus.redraw_counts == {"Other": {"all_views": 1}}
+    assert app.tile_redraws == []
+
+
+def test_post_hooks_turn_a_stroke_into_a_full_redraw(app):
+    manager = forge.UndoManager(app)
+    stroke = forge.CompositeCommand("Paint Stroke", [forge.PaintPixelCommand(app, 0, 0, 0, 1)], app, post_hooks=[lambda: None])
+
+    manager.execute(stroke)
+
+    assert app.change_bus.redraw_counts == {"Paint Stroke": {"all_views": 1}}
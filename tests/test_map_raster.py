@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import msxtileforge as forge
+
+
+@pytest.fixture
+def random_map(monkeypatch):
+    """A 24x16 map of 2x2 supertiles over 32 random tiles, installed as the app's globals."""
+    rng = np.random.default_rng(7)
+    tileset = forge.TilesetStore()
+    tileset.reset(32)
+    tileset.patterns[:] = rng.integers(0, 256, tileset.patterns.shape)
+    tileset.colors[:] = rng.integers(0, 256, tileset.colors.shape)
+    supertiles = forge.SupertileStore()
+    supertiles.reset(12, 2, 2)
+    supertiles.definitions[:] = rng.integers(0, 32, supertiles.definitions.shape)
+    map_array = rng.integers(0, 12, (16, 24)).astype(np.uint16)
+    monkeypatch.setattr(forge, "tileset", tileset)
+    monkeypatch.setattr(forge, "supertiles_data", supertiles)
+    monkeypatch.setattr(forge, "map_data", map_array)
+    return map_array
+
+
+def full_pyramid(raster):
+    levels = [raster]
+    for _ in range(forge.MapRaster.MAX_PYRAMID_LEVEL):
+        levels.append(forge.reduce_slots_2x2(levels[-1]))
+    return levels
+
+
+def test_reduce_keeps_the_most_frequent_slot():
+    pixels = np.array([[1, 2, 5, 5],
+                       [2, 2, 6, 7]], dtype=np.uint8)
+    assert forge.reduce_slots_2x2(pixels).tolist() == [[2, 5]]
+
+
+def test_reduce_ties_keep_the_top_left_slot():
+    pixels = np.array([[3, 4],
+                       [4, 3]], dtype=np.uint8)
+    assert forge.reduce_slots_2x2(pixels).tolist() == [[3]]
+
+
+def test_pyramid_levels_are_reductions(random_map):
+    raster = forge.MapRaster()
+    raster.sync()
+    while raster.build_next_level():
+        pass
+    for built, expected in zip(raster.levels, full_pyramid(raster.raster)):
+        np.testing.assert_array_equal(built, expected)
+    assert raster.levels[-1].shape == (16 * 16 // 8, 24 * 16 // 8)
+
+
+def test_painted_cells_are_reduced_again(random_map):
+    raster = forge.MapRaster()
+    raster.sync()
+    while raster.build_next_level():
+        pass
+    random_map[3, 5] = (random_map[3, 5] + 1) % 12
+    random_map[15, 23] = (random_map[15, 23] + 5) % 12
+
+    palette = np.arange(19 * 3, dtype=np.uint8).reshape(19, 3)
+    raster.render_viewport(0, 0, 48, 32, 1, palette) # 1/8 zoom: samples the coarsest level
+
+    for built, expected in zip(raster.levels, full_pyramid(raster.raster)):
+        np.testing.assert_array_equal(built, expected)
+
+
+def test_zoomed_out_viewport_samples_the_pyramid(random_map):
+    raster = forge.MapRaster()
+    raster.sync()
+    while raster.build_next_level():
+        pass
+    palette = np.zeros((19, 3), dtype=np.uint8)
+    palette[:, 0] = np.arange(19)
+    view = np.asarray(raster.render_viewport(0, 0, 48, 32, 1, palette))[:, :, 0]
+    np.testing.assert_array_equal(view, raster.levels[3])
+
+
+def test_cells_painted_while_a_level_is_built_are_reduced_again(random_map, monkeypatch):
+    monkeypatch.setattr(forge.MapRaster, "PYRAMID_BAND_ROWS", 64)
+    raster = forge.MapRaster()
+    raster.sync()
+    assert raster.build_next_level() # First band of level 1
+    random_map[0, 0] = (random_map[0, 0] + 1) % 12 # Inside the band already reduced
+    random_map[12, 4] = (random_map[12, 4] + 1) % 12 # In a band still to come
+    raster.sync()
+    while raster.build_next_level():
+        pass
+
+    palette = np.zeros((19, 3), dtype=np.uint8)
+    for pixels_per_tile in (4, 2, 1):
+        raster.render_viewport(0, 0, 8, 8, pixels_per_tile, palette)
+    for built, expected in zip(raster.levels, full_pyramid(raster.raster)):
+        np.testing.assert_array_equal(built, expected)
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import msxtilemagic as magic
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "msxtilemagic.py")
+
+
+def test_full_screen_uses_three_fixed_bands_of_8_rows():
+    assert magic.tile_rows_to_banks(24, 3).tolist() == [0] * 8 + [1] * 8 + [2] * 8
+
+
+def test_short_map_keeps_the_vram_bands():
+    # 20 rows is not a multiple of 8: the bottom bank only serves the last 4 rows
+    assert magic.tile_rows_to_banks(20, 3).tolist() == [0] * 8 + [1] * 8 + [2] * 4
+    assert magic.tile_rows_to_banks(5, 3).tolist() == [0] * 5
+
+
+def test_map_taller_than_the_screen_is_rejected():
+    with pytest.raises(ValueError):
+        magic.tile_rows_to_banks(30, 3)
+
+
+def test_cli_rejects_images_taller_than_the_screen(tmp_path):
+    image_path = tmp_path / "tall.png"
+    Image.fromarray(np.zeros((240, 64, 3), dtype=np.uint8), 'RGB').save(image_path)
+    result = subprocess.run([sys.executable, SCRIPT, str(image_path), "--screen-banks", "3", "--cores", "1",
+                             "--output-dir", str(tmp_path)], capture_output=True, text=True)
+    assert "at most 192 pixel rows" in result.stdout
+    assert not (tmp_path / "tall_bank0.SC4Tiles").exists()
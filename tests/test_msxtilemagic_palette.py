@@ -0,0 +1,71 @@
+import hashlib
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import msxtilemagic as magic
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "msxtilemagic.py")
+
+# SHA-256 of the files the baseline msxtilemagic.py writes for photo_image() with
+# --no-dithering --max-tiles 128, per --optimization-mode
+BASELINE_OUTPUT = {
+    "neutral": {
+        "SC4Pal": "b924c440482cb37c048769158ebe311a09cc73d6101d23d706b9da68a07f77e7",
+        "SC4Tiles": "634a518a6be9c0308e5c872e5c2a6309d0808b763439f2a55ef582215482b3dd",
+    },
+    "soft": {
+        "SC4Pal": "e5854d5ee07785eb7e71ab6923f96b9fc9001c146c68f07be54578489b049f63",
+        "SC4Tiles": "05ef2a447eaab5b8fe22896ca796721f13ef7c23a1e4e13817a9fba0bbf46b2f",
+    },
+}
+
+
+def photo_image(width=128, height=96):
+    """A photo-like image with smooth gradients and about 12,000 unique colors."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    r = 128 + 100 * np.sin(x / 9.0) * np.cos(y / 13.0)
+    g = 128 + 90 * np.sin((x + y) / 11.0)
+    b = 128 + 110 * np.cos(np.hypot(x - width / 2, y - height / 2) / 7.0)
+    rgb = np.stack([r, g, b], axis=2) + ((x * 7 + y * 13) % 17 - 8)[:, :, None]
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), 'RGB')
+
+
+@pytest.mark.parametrize("num_colors", [4, 16])
+def test_histogram_median_cut_matches_quantizing_the_image(num_colors):
+    image = photo_image()
+    expected = image.quantize(colors=num_colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE).getpalette()
+    assert magic._median_cut_palette(magic.ColorHistogram.from_image(image), num_colors) == expected
+
+
+@pytest.mark.parametrize("mode", sorted(BASELINE_OUTPUT))
+def test_palette_and_tiles_match_baseline_without_subsampling(tmp_path, mode):
+    image_path = tmp_path / "photo.png"
+    photo_image().save(image_path)
+    subprocess.run([sys.executable, SCRIPT, str(image_path), "--no-dithering", "--max-tiles", "128",
+                    "--optimization-mode", mode, "--cores", "1", "--output-dir", str(tmp_path)],
+                   check=True, capture_output=True)
+    for extension, expected_digest in BASELINE_OUTPUT[mode].items():
+        digest = hashlib.sha256((tmp_path / f"photo.{extension}").read_bytes()).hexdigest()
+        assert digest == expected_digest, extension
+
+
+def test_palette_search_skips_a_single_color_palette():
+    with magic.WorkerPool(1) as worker_pool:
+        auto_colors = magic.search_auto_colors([photo_image()], [], [(3, 4, 5)], 5,
+                                               magic.get_color_distance_function("rgb"), worker_pool, magic.TimeBudget())
+    assert auto_colors == [(3, 4, 5)]
+
+
+def test_palette_search_cli_with_one_auto_slot(tmp_path):
+    image_path = tmp_path / "photo.png"
+    photo_image().save(image_path)
+    result = subprocess.run([sys.executable, SCRIPT, str(image_path), "--palette", ",".join(["auto"] + ["block"] * 15),
+                             "--palette-search", "5", "--cores", "1", "--output-dir", str(tmp_path)],
+                            check=True, capture_output=True, text=True)
+    assert "Palette search skipped" in result.stdout
+    assert (tmp_path / "photo.SC4Tiles").exists()
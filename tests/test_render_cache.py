@@ -0,0 +1,64 @@
+import numpy as np
+
+import msxtileforge as forge
+
+
+def entry(size):
+    return np.zeros(size, dtype=np.uint8)
+
+
+def make_caches(max_bytes, is_pinned=None):
+    budget = forge.RenderCacheBudget(max_bytes, is_pinned)
+    return budget, forge.RenderCache("tiles", budget), forge.RenderCache("supertiles", budget)
+
+
+def test_evicts_least_recently_used_across_caches():
+    budget, tiles, supertiles = make_caches(300)
+    tiles[(0, 'a')] = entry(100)
+    supertiles[(0, 'a')] = entry(100)
+    tiles[(1, 'a')] = entry(100)
+    assert tiles.lookup((0, 'a')) is not None  # Now the most recently used
+
+    supertiles[(1, 'a')] = entry(100)
+
+    assert (0, 'a') not in supertiles
+    assert set(tiles) == {(0, 'a'), (1, 'a')}
+    assert budget.bytes == 300
+    assert supertiles.evictions == 1 and tiles.evictions == 0
+
+
+def test_pinned_entries_are_skipped():
+    pinned = entry(100)
+    budget, tiles, supertiles = make_caches(200, is_pinned=lambda image: image is pinned)
+    tiles[(0, 'a')] = pinned
+    tiles[(1, 'a')] = entry(100)
+
+    supertiles[(0, 'a')] = entry(100)
+
+    assert (0, 'a') in tiles
+    assert (1, 'a') not in tiles
+    assert budget.bytes == 200
+
+
+def test_counters():
+    budget, tiles, _ = make_caches(10_000)
+    assert tiles.lookup((0, 'a')) is None
+    tiles[(0, 'a')] = entry(64)
+    tiles[(0, 'b')] = entry(32)
+    tiles[(1, 'a')] = entry(16)
+    assert tiles.lookup((0, 'a')) is not None
+    assert tiles.lookup((0, 'b')) is not None
+
+    tiles.invalidate(0)
+
+    assert tiles.stats() == {'entries': 1, 'bytes': 16, 'hits': 2, 'misses': 1, 'evictions': 0}
+    assert budget.stats()['bytes'] == 16
+    tiles.clear()
+    assert budget.bytes == 0 and tiles.bytes == 0
+
+
+def test_replacing_an_entry_does_not_double_count():
+    budget, tiles, _ = make_caches(10_000)
+    tiles[(0, 'a')] = entry(100)
+    tiles[(0, 'a')] = entry(40)
+    assert tiles.bytes == 40 and budget.bytes == 40